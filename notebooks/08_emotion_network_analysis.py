@@ -50,7 +50,6 @@ def _():
     from datetime import datetime, timedelta
     from collections import defaultdict, Counter
     import time
-    from janome.tokenizer import Tokenizer
     
     # プロジェクトルートをパスに追加
     project_root = Path.cwd().parent if Path.cwd().name == "notebooks" else Path.cwd()
@@ -58,6 +57,16 @@ def _():
         sys.path.insert(0, str(project_root / "src"))
     
     from ai_data_lab.connectors.bigquery import BigQueryConnector
+    from ai_data_lab.llm.client import InstrumentedGenAIClient
+    from ai_data_lab.llm.usage import UsageRecorder
+    from ai_data_lab.network import (
+        LayoutCache,
+        MetricsCache,
+        apply_pyvis_positions,
+        build_group_cooccurrence,
+        compute_group_metrics,
+    )
+    from ai_data_lab.text import TokenizerService
     
     # 高解像度プロット設定
     plt.rcParams['figure.dpi'] = 300
@@ -86,19 +95,30 @@ def _():
     # 環境変数から読み込み: export GEMINI_API_KEY="your-api-key"
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
     if GEMINI_API_KEY:
-        genai_client = genai.Client(api_key=GEMINI_API_KEY)
+        # 利用量（トークン・レイテンシ・リトライ・エラー）を data/llm_usage/usage.jsonl に記録
+        genai_client = InstrumentedGenAIClient(
+            genai.Client(api_key=GEMINI_API_KEY),
+            notebook="08_emotion_network_analysis",
+            template="emotion_extraction",
+            recorder=UsageRecorder(project_root / "data" / "llm_usage" / "usage.jsonl"),
+        )
     else:
         genai_client = None
         print("⚠️ GEMINI_API_KEY が設定されていません。API抽出機能は使用できません。")
     
-    # 日本語トークナイザー
-    tokenizer = Tokenizer()
+    # 日本語トークナイザー（Janome をプロセス並列で実行し、結果をテキストハッシュ単位でキャッシュ）
+    tokenizer = TokenizerService(project_root / "data" / "cache" / "janome_tokens.duckdb")
     
     return (
         BigQueryConnector,
         Counter,
+        LayoutCache,
+        MetricsCache,
         Network,
         WordCloud,
+        apply_pyvis_positions,
+        build_group_cooccurrence,
+        compute_group_metrics,
         datetime,
         defaultdict,
         genai_client,
@@ -393,39 +413,43 @@ def _(EMOTION_CATEGORIES, genai_client, json, mo, pd, project_root, time, use_ca
     # API抽出モード（スイッチOFF時）
     # ========================================
     else:
-        # 感情抽出関数（新SDK: google-genai + gemini-2.5-flash）
-        def extract_emotions_gemini(text, client):
-            """Gemini APIを使用して投稿から感情を抽出"""
+        from ai_data_lab.llm.batching import MalformedResponseError
+        from ai_data_lab.llm.schemas import PostEmotions
+        from ai_data_lab.llm.structured import ItemLedger, generation_config, validate_payload
+
+        # 投稿ごとの抽出結果・失敗理由の記録（感情なしの投稿も「成功」として再計算しない）
+        emotion_ledger = ItemLedger(project_root / "data" / "llm_ledger" / "08_emotions.jsonl")
+
+        # 感情抽出関数（新SDK: google-genai + gemini-2.5-flash、JSONスキーマ指定）
+        def extract_emotions_gemini(post_id, text, client):
+            """Gemini APIを使用して投稿から感情を抽出（失敗時は例外を送出し、台帳に記録）"""
             emotions_str = ", ".join([f'"{e}"' for e in EMOTION_CATEGORIES])
             prompt = f"""
             以下の投稿から感情を最大3つまで抽出し、その強度(1-5)を判定してください。
             感情は以下のリストから選んでください: {emotions_str}
 
+            投稿ID: {post_id}
             投稿: {text}
 
-            JSONフォーマットで回答してください:
-            [
-                {{"emotion": "感情名", "strength": 強度, "evidence": "根拠となる部分"}}
-            ]
-
-            投稿が短すぎる場合や感情が読み取れない場合は空のリスト[]を返してください。
+            "id" には投稿IDをそのまま、"emotions" には {{"emotion": 感情名, "strength": 強度, "evidence": 根拠となる部分}} のリストを返してください。
+            投稿が短すぎる場合や感情が読み取れない場合は "emotions" を空のリスト[]にしてください。
             """
             try:
                 response = client.models.generate_content(
                     model='gemini-2.5-flash',
-                    contents=prompt
+                    contents=prompt,
+                    config=generation_config(PostEmotions),
                 )
-                response_text = response.text.strip()
-                if response_text.startswith('```'):
-                    lines = response_text.split('\n')
-                    json_lines = [l for l in lines if not l.startswith('```')]
-                    response_text = '\n'.join(json_lines)
-                result = json.loads(response_text)
-                return result
+                result = validate_payload(response.text, PostEmotions)
+                unknown = [m.emotion for m in result.emotions if m.emotion not in EMOTION_CATEGORIES]
+                if unknown:
+                    raise MalformedResponseError(f"unknown emotions: {unknown}")
             except Exception as e:
-                print(f"Error: {e}")
-                return []
-        
+                emotion_ledger.record_failures({str(post_id): f"{type(e).__name__}: {str(e)[:200]}"})
+                raise
+            emotion_ledger.record_success({str(post_id): result})
+            return [mention.model_dump() for mention in result.emotions]
+
         # キャッシュの読み込み
         if cache_file.exists():
             df_cache = pd.read_csv(cache_file)
@@ -433,7 +457,9 @@ def _(EMOTION_CATEGORIES, genai_client, json, mo, pd, project_root, time, use_ca
         else:
             df_cache = pd.DataFrame()
             cached_ids = set()
-        
+        # 感情なしと判定済みの投稿もスキップ対象（失敗した投稿だけが再抽出される）
+        cached_ids |= set(emotion_ledger.results())
+
         # ※ df_all_posts が必要な場合は、BigQuery取得セルを有効にしてください
         mo.stop(True, mo.md("""
         ⚠️ **API抽出モードを使用するには、以下の手順が必要です：**
@@ -473,59 +499,31 @@ def _(
     Counter,
     EMOTION_COLORS,
     EMOTION_POLARITY,
-    defaultdict,
+    build_group_cooccurrence,
     df_emotions,
     mo,
-    nx,
 ):
-    # 感情ネットワークの構築
-    def build_emotion_network(df_group_emotions):
-        """グループの感情データからネットワークを構築"""
-
-        # 感情の共起をカウント
-        co_occurrence = defaultdict(int)
-        emotion_counts = Counter()
-
-        # 投稿ごとに感情の組み合わせをカウント
-        for post_id in df_group_emotions['xPostId'].unique():
-            post_emotions = df_group_emotions[df_group_emotions['xPostId'] == post_id]['emotion'].tolist()
-            emotion_counts.update(post_emotions)
-
-            # 同じ投稿内の感情ペアをカウント
-            for i in range(len(post_emotions)):
-                for j in range(i+1, len(post_emotions)):
-                    pair = tuple(sorted([post_emotions[i], post_emotions[j]]))
-                    co_occurrence[pair] += 1
-
-        # NetworkXグラフの構築
-        G = nx.Graph()
-
-        # ノード（感情）を追加
-        for emotion, count in emotion_counts.items():
-            G.add_node(emotion, 
-                      size=count,
-                      color=EMOTION_COLORS.get(emotion, '#808080'),
-                      polarity=EMOTION_POLARITY.get(emotion, 0))
-
-        # エッジ（共起関係）を追加
-        for (e1, e2), weight in co_occurrence.items():
-            if weight > 1:  # 閾値を設定
-                G.add_edge(e1, e2, weight=weight)
-
-        return G, emotion_counts, co_occurrence
-
-    # 各グループのネットワークを構築
-    group_networks = {}
-
-    for group_net in df_emotions['idol_name'].unique():
-        df_group_net = df_emotions[df_emotions['idol_name'] == group_net]
-        G_net, counts_net, co_occur_net = build_emotion_network(df_group_net)
-        group_networks[group_net] = {
-            'graph': G_net,
-            'emotion_counts': counts_net,
-            'co_occurrence': co_occur_net
+    # 感情ネットワークの構築（投稿×感情の疎行列から全グループの共起を一括計算）
+    group_cooccurrence = build_group_cooccurrence(
+        df_emotions, item_col='xPostId', label_col='emotion', group_col='idol_name'
+    )
+
+    def _emotion_node_attrs(emotion, count):
+        return {
+            'color': EMOTION_COLORS.get(emotion, '#808080'),
+            'polarity': EMOTION_POLARITY.get(emotion, 0),
         }
 
+    # 各グループのネットワークを構築（共起2回以上をエッジとする）
+    group_networks = {
+        group_net: {
+            'graph': cooccur_net.to_graph(min_weight=2, node_attrs=_emotion_node_attrs),
+            'emotion_counts': Counter(cooccur_net.label_counts()),
+            'co_occurrence': cooccur_net.pairs(),
+        }
+        for group_net, cooccur_net in group_cooccurrence.items()
+    }
+
     mo.md(f"""
     ### ✅ ネットワーク構築完了
 
@@ -561,7 +559,22 @@ def _(group_networks, mo):
 
 
 @app.cell
-def _(Network, group_networks, group_selector, mo, project_root):
+def _(LayoutCache, project_root):
+    # ノード座標のキャッシュ（グラフ構造が同じなら再計算しない・少しの変化はウォームスタート）
+    layout_cache = LayoutCache(project_root / "data" / "cache" / "network_layouts", k=1, iterations=50)
+    return (layout_cache,)
+
+
+@app.cell
+def _(
+    Network,
+    apply_pyvis_positions,
+    group_networks,
+    group_selector,
+    layout_cache,
+    mo,
+    project_root,
+):
     # 選択されたグループのネットワークを可視化
     selected_group = group_selector.value
 
@@ -587,18 +600,12 @@ def _(Network, group_networks, group_selector, mo, project_root):
             edge_weight = edge_sel.get('weight', 1)
             edge_sel['width'] = edge_weight * 0.5
 
-        # 物理シミュレーション設定
+        # キャッシュ済みの座標に固定し、ブラウザ側の物理シミュレーションは無効化
+        apply_pyvis_positions(net, layout_cache.layout(G_sel, f"emotion_network:{selected_group}"))
         net.set_options("""
         {
             "physics": {
-                "enabled": true,
-                "solver": "forceAtlas2Based",
-                "forceAtlas2Based": {
-                    "gravitationalConstant": -50,
-                    "centralGravity": 0.01,
-                    "springLength": 100,
-                    "springConstant": 0.08
-                }
+                "enabled": false
             },
             "interaction": {
                 "hover": true,
@@ -628,7 +635,7 @@ def _(Network, group_networks, group_selector, mo, project_root):
 
 
 @app.cell
-def _(group_networks, nx, plt, project_root):
+def _(group_networks, layout_cache, nx, plt, project_root):
     # 静的なネットワーク図（全グループ比較）
     fig_static, axes_static = plt.subplots(2, 3, figsize=(18, 12))
     axes_static = axes_static.flatten()
@@ -640,8 +647,8 @@ def _(group_networks, nx, plt, project_root):
         ax_static = axes_static[idx_static]
         G_static = ndata_static['graph']
 
-        # レイアウト計算
-        pos_static = nx.spring_layout(G_static, k=1, iterations=50)
+        # レイアウト（pyvis 表示と同じキャッシュ済み座標）
+        pos_static = layout_cache.layout(G_static, f"emotion_network:{gname_static}")
 
         # ノードサイズの正規化
         node_sizes_static = [G_static.nodes[n]['size'] * 50 for n in G_static.nodes()]
@@ -737,40 +744,41 @@ def _(mo):
 
 
 @app.cell
-def _(group_networks, mo, nx, pd):
-    # ネットワーク分析指標の計算
-    network_metrics = []
-
-    for gname_metrics, ndata_metrics in group_networks.items():
-        G_metrics = ndata_metrics['graph']
-
-        if len(G_metrics.nodes()) > 0 and len(G_metrics.edges()) > 0:
-            # 基本指標
-            metrics_dict = {
-                'グループ': gname_metrics,
-                'ノード数': len(G_metrics.nodes()),
-                'エッジ数': len(G_metrics.edges()),
-                '密度': nx.density(G_metrics),
-                '平均次数': sum(dict(G_metrics.degree()).values()) / len(G_metrics.nodes()),
-            }
+def _(MetricsCache, compute_group_metrics, group_networks, mo, pd, project_root):
+    # ネットワーク分析指標の計算（グラフのエッジハッシュでキャッシュ、大規模グラフは媒介中心性をサンプリング推定）
+    group_metrics = compute_group_metrics(
+        {gname_metrics: ndata_metrics['graph'] for gname_metrics, ndata_metrics in group_networks.items()},
+        pivots=256,
+        cache=MetricsCache(project_root / "data" / "cache" / "network_metrics"),
+    )
 
-            # 中心性指標
-            if len(G_metrics.nodes()) > 1:
-                degree_centrality_metrics = nx.degree_centrality(G_metrics)
-                betweenness_centrality_metrics = nx.betweenness_centrality(G_metrics)
+    network_metrics = []
+    for gname_metrics, result_metrics in group_metrics.items():
+        if result_metrics.nodes == 0 or result_metrics.edges == 0:
+            continue
 
-                # 最も中心的な感情
-                top_degree_metrics = max(degree_centrality_metrics, key=degree_centrality_metrics.get)
-                top_betweenness_metrics = max(betweenness_centrality_metrics, key=betweenness_centrality_metrics.get)
+        # 基本指標
+        metrics_dict = {
+            'グループ': gname_metrics,
+            'ノード数': result_metrics.nodes,
+            'エッジ数': result_metrics.edges,
+            '密度': result_metrics.density,
+            '平均次数': result_metrics.average_degree,
+        }
 
-                metrics_dict['最高次数中心性'] = f"{top_degree_metrics} ({degree_centrality_metrics[top_degree_metrics]:.3f})"
-                metrics_dict['最高媒介中心性'] = f"{top_betweenness_metrics} ({betweenness_centrality_metrics[top_betweenness_metrics]:.3f})"
+        # 中心性指標（最も中心的な感情）
+        if result_metrics.nodes > 1:
+            top_degree_metrics, top_degree_value = result_metrics.top('degree_centrality')
+            top_betweenness_metrics, top_betweenness_value = result_metrics.top('betweenness')
+            metrics_dict['最高次数中心性'] = f"{top_degree_metrics} ({top_degree_value:.3f})"
+            metrics_dict['最高媒介中心性'] = f"{top_betweenness_metrics} ({top_betweenness_value:.3f})"
+            if not result_metrics.exact:
+                metrics_dict['最高媒介中心性'] += f" ±{result_metrics.betweenness_error:.3f}"
 
-            # クラスタリング係数
-            if len(G_metrics.edges()) > 0:
-                metrics_dict['クラスタリング係数'] = nx.average_clustering(G_metrics)
+        # クラスタリング係数
+        metrics_dict['クラスタリング係数'] = result_metrics.average_clustering
 
-            network_metrics.append(metrics_dict)
+        network_metrics.append(metrics_dict)
 
     df_metrics = pd.DataFrame(network_metrics)
 
@@ -783,7 +791,7 @@ def _(group_networks, mo, nx, pd):
     - **密度**: ネットワークの結合度（0-1、高いほど密）
     - **平均次数**: 各感情が平均何個の他の感情と共起するか
     - **次数中心性**: 多くの感情と共起する中心的な感情
-    - **媒介中心性**: 感情間の橋渡し役となる感情
+    - **媒介中心性**: 感情間の橋渡し役となる感情（ノード数が多い場合はサンプリング推定値 ± 誤差上限）
     - **クラスタリング係数**: 感情の局所的なまとまり度
     """)
 
@@ -814,35 +822,16 @@ def _(Counter, WordCloud, df_emotions, plt, project_root, tokenizer):
         '感じ', '気持ち', '気', '所', '辺', 'とこ', 'ところ', '的', '系', '風',
     }
     
-    def extract_nouns_wc(text_wc):
-        """テキストから名詞を抽出"""
-        if not text_wc or not isinstance(text_wc, str):
-            return []
-        nouns_wc = []
-        for token_wc in tokenizer.tokenize(text_wc):
-            # 名詞のみ抽出（固有名詞、一般名詞）
-            if token_wc.part_of_speech.startswith('名詞'):
-                word_wc = token_wc.surface
-                # 1文字、ストップワード、数字のみは除外
-                if len(word_wc) > 1 and word_wc not in stopwords_wc and not word_wc.isdigit():
-                    nouns_wc.append(word_wc)
-        return nouns_wc
+    # グループごとのトピック抽出（evidence 全件を一括でトークナイズ）
+    df_evidence_wc = df_emotions[['idol_name', 'evidence']].dropna(subset=['evidence'])
     
-    # グループごとのトピック抽出
-    group_topics = {}
+    # 名詞のみ抽出（1文字、ストップワード、数字のみは除外）
+    noun_lists_wc = tokenizer.nouns(df_evidence_wc['evidence'].astype(str).tolist(), stopwords=stopwords_wc, min_length=2)
     
-    for group_wc in df_emotions['idol_name'].unique():
-        # 該当グループのevidenceテキストを取得
-        group_evidences = df_emotions[df_emotions['idol_name'] == group_wc]['evidence'].dropna().tolist()
-        
-        # 全テキストから名詞を抽出
-        all_nouns_wc = []
-        for evidence_wc in group_evidences:
-            all_nouns_wc.extend(extract_nouns_wc(str(evidence_wc)))
-        
-        # 頻度カウント
-        noun_counts_wc = Counter(all_nouns_wc)
-        group_topics[group_wc] = noun_counts_wc
+    # 頻度カウント
+    group_topics = {group_wc: Counter() for group_wc in df_emotions['idol_name'].unique()}
+    for group_wc, nouns_wc in zip(df_evidence_wc['idol_name'], noun_lists_wc):
+        group_topics[group_wc].update(nouns_wc)
     
     # ワードクラウド描画
     fig_wc, axes_wc = plt.subplots(2, 3, figsize=(18, 12))
@@ -62,10 +62,21 @@ def _():
         sys.path.insert(0, str(root_dir / "src"))
 
     from ai_data_lab.connectors.bigquery import BigQueryConnector
+    from ai_data_lab.text.search import FullTextIndex
 
     # ScrapingDog API Key
     SCRAPINGDOG_API_KEY = os.getenv("SCRAPINGDOG_API_KEY")
-    return BigQueryConnector, SCRAPINGDOG_API_KEY, mo, pd, requests, time, tqdm
+    return (
+        BigQueryConnector,
+        FullTextIndex,
+        SCRAPINGDOG_API_KEY,
+        mo,
+        pd,
+        requests,
+        root_dir,
+        time,
+        tqdm,
+    )
 
 
 @app.cell
@@ -692,6 +703,32 @@ def _(mo):
     return
 
 
+@app.cell
+def _(FullTextIndex, df_irc, result_count, root_dir):
+    """ユニークユーザー一覧を作成し、ローカル全文検索インデックスに反映（変更行のみ更新）"""
+    user_search_index = FullTextIndex(root_dir / "data" / "search" / "fulltext.sqlite")
+    if result_count == 0:
+        user_lookup_df = None
+    else:
+        # ユニークユーザー一覧を作成（重複除去）
+        user_lookup_df = (
+            df_irc[["account_id", "user_handle", "user_name"]]
+            .drop_duplicates()
+            .reset_index(drop=True)
+        )
+
+        # カラム名をリネーム
+        user_lookup_df.columns = ["AccountID", "UserHandle", "ユーザネーム"]
+
+        user_search_index.add_documents(
+            "irc_users",
+            user_lookup_df,  # 同一 AccountID の複数ハンドルは1文書にまとめて索引
+            id_col="AccountID",
+            text_cols=["AccountID", "UserHandle", "ユーザネーム"],
+        )
+    return user_lookup_df, user_search_index
+
+
 @app.cell
 def _(mo):
     """ユーザーID検索用の入力フィールド"""
@@ -706,31 +743,21 @@ def _(mo):
 
 
 @app.cell
-def _(df_irc, mo, result_count, user_search_input):
+def _(mo, user_lookup_df, user_search_index, user_search_input):
     """ユニークユーザー一覧を検索可能なテーブルで表示"""
-    if result_count == 0:
+    if user_lookup_df is None:
         user_lookup_output = mo.md("⚠️ 抽出データがありません。")
-        user_lookup_df = None
     else:
-        # ユニークユーザー一覧を作成（重複除去）
-        user_lookup_df = (
-            df_irc[["account_id", "user_handle", "user_name"]]
-            .drop_duplicates()
-            .reset_index(drop=True)
-        )
-
-        # カラム名をリネーム
-        user_lookup_df.columns = ["AccountID", "UserHandle", "ユーザネーム"]
-
-        # 検索フィルタ適用
-        search_term = user_search_input.value.strip().lower()
+        # 検索フィルタ適用（全文検索インデックスで候補を絞り、各カラムの部分一致で再確認）
+        search_term = user_search_input.value.strip()
         if search_term:
-            mask = (
-                user_lookup_df["AccountID"].astype(str).str.lower().str.contains(search_term, na=False) |
-                user_lookup_df["UserHandle"].astype(str).str.lower().str.contains(search_term, na=False) |
-                user_lookup_df["ユーザネーム"].astype(str).str.lower().str.contains(search_term, na=False)
+            filtered_df = user_search_index.filter_contains(
+                "irc_users",
+                user_lookup_df,
+                search_term,
+                id_col="AccountID",
+                columns=["AccountID", "UserHandle", "ユーザネーム"],
             )
-            filtered_df = user_lookup_df[mask]
         else:
             filtered_df = user_lookup_df
 
@@ -740,7 +767,7 @@ def _(df_irc, mo, result_count, user_search_input):
         ])
 
     user_lookup_output
-    return (user_lookup_df,)
+    return
 
 
 @app.cell
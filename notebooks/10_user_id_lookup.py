@@ -54,7 +54,8 @@ def _():
         sys.path.insert(0, str(root_dir / "src"))
 
     from ai_data_lab.connectors.bigquery import BigQueryConnector
-    return BigQueryConnector, mo
+    from ai_data_lab.text.search import FullTextIndex
+    return BigQueryConnector, FullTextIndex, mo, root_dir
 
 
 @app.cell
@@ -201,6 +202,20 @@ def _(mo):
     return
 
 
+@app.cell
+def _(FullTextIndex, df_users, root_dir, user_count):
+    """ユーザー一覧をローカル全文検索インデックスに反映（変更行のみ更新）"""
+    user_search_index = FullTextIndex(root_dir / "data" / "search" / "fulltext.sqlite")
+    if user_count > 0:
+        user_search_index.add_documents(
+            "prod_users",
+            df_users,
+            id_col="AccountID",
+            text_cols=["HandleName", "AccountID", "PrivyID", "UserName"],
+        )
+    return (user_search_index,)
+
+
 @app.cell
 def _(mo):
     """ユーザーID検索用の入力フィールド"""
@@ -215,22 +230,22 @@ def _(mo):
 
 
 @app.cell
-def _(df_users, mo, user_count, user_search_input):
+def _(df_users, mo, user_count, user_search_index, user_search_input):
     """ユーザー一覧を検索可能なテーブルで表示"""
     if user_count == 0:
         user_lookup_output = mo.md("⚠️ ユーザーデータがありません。")
         filtered_df = None
     else:
-        # 検索フィルタ適用
-        search_term = user_search_input.value.strip().lower()
+        # 検索フィルタ適用（全文検索インデックスで候補を絞り、各カラムの部分一致で再確認）
+        search_term = user_search_input.value.strip()
         if search_term:
-            mask = (
-                df_users["HandleName"].astype(str).str.lower().str.contains(search_term, na=False) |
-                df_users["AccountID"].astype(str).str.lower().str.contains(search_term, na=False) |
-                df_users["PrivyID"].astype(str).str.lower().str.contains(search_term, na=False) |
-                df_users["UserName"].astype(str).str.lower().str.contains(search_term, na=False)
+            filtered_df = user_search_index.filter_contains(
+                "prod_users",
+                df_users,
+                search_term,
+                id_col="AccountID",
+                columns=["HandleName", "AccountID", "PrivyID", "UserName"],
             )
-            filtered_df = df_users[mask]
         else:
             filtered_df = df_users
 
@@ -35,12 +35,10 @@ def _():
     import marimo as mo
     import pandas as pd
     import numpy as np
-    import re
     import sys
     import os
     from pathlib import Path
     from datetime import datetime, timedelta
-    from collections import Counter
     from dotenv import load_dotenv
 
     # .env ファイルを読み込み
@@ -72,8 +70,43 @@ def _():
     if str(root_dir / "src") not in sys.path:
         sys.path.insert(0, str(root_dir / "src"))
 
+    from ai_data_lab.cache import ResultCache, today_version
     from ai_data_lab.connectors.bigquery import BigQueryConnector
-    return BigQueryConnector, Counter, mo, np, os, pd, re
+    from ai_data_lab.impact import (
+        BaselineEvent,
+        BeforeAfterPanel,
+        UserPeriodPanel,
+        bootstrap,
+        build_baselines,
+        compare_groups,
+        matched_group_sample,
+    )
+    from ai_data_lab.text.hashtags import HashtagIndex
+    return (
+        BaselineEvent,
+        BeforeAfterPanel,
+        BigQueryConnector,
+        HashtagIndex,
+        ResultCache,
+        UserPeriodPanel,
+        bootstrap,
+        build_baselines,
+        compare_groups,
+        matched_group_sample,
+        mo,
+        np,
+        os,
+        pd,
+        root_dir,
+        today_version,
+    )
+
+
+@app.cell
+def _(ResultCache, root_dir):
+    # 重いクエリ結果をディスクにキャッシュ（カーネル再起動後も日付が変わるまで再利用）
+    result_cache = ResultCache(root_dir / "data" / "cache" / "cell_results")
+    return (result_cache,)
 
 
 @app.cell
@@ -210,10 +243,11 @@ def _(DATASET_ID, PROJECT_ID, mo, table_names):
 
 
 @app.cell
-def _(connector, final_all_posts_query, mo):
-    """全投稿データを取得"""
+def _(connector, final_all_posts_query, mo, result_cache, today_version):
+    """全投稿データを取得（当日中はキャッシュから読み込み）"""
     try:
-        df_all_posts = connector.query(final_all_posts_query)
+        query_all_posts = result_cache.cached(name="irc_all_posts", versions=today_version)(connector.query)
+        df_all_posts = query_all_posts(final_all_posts_query)
         total_posts = len(df_all_posts)
         unique_users = df_all_posts["account_id"].nunique()
         mo.md(f"✅ 全投稿取得完了: **{total_posts:,}** 件、**{unique_users:,}** ユニークユーザー")
@@ -235,33 +269,18 @@ def _(mo):
 
 
 @app.cell
-def _(Counter, df_all_posts, mo, pd, re):
+def _(HashtagIndex, df_all_posts, mo):
     """投稿本文からハッシュタグを抽出"""
 
-    def extract_hashtags(text):
-        """テキストからハッシュタグを抽出"""
-        if pd.isna(text):
-            return []
-        # 日本語・英数字を含むハッシュタグを抽出
-        pattern = r'#[^\s#\u3000]+'
-        return re.findall(pattern, str(text))
-
-    # 全投稿からハッシュタグを抽出
-    df_all_posts["hashtags"] = df_all_posts["content"].apply(extract_hashtags)
-
-    # 全ハッシュタグをフラット化してカウント
-    all_hashtags = []
-    for tags in df_all_posts["hashtags"]:
-        all_hashtags.extend(tags)
+    # 全投稿から一括でハッシュタグを抽出し、タグ→投稿の転置インデックスを構築
+    # （以降のタグ判定は行ごとの list 走査ではなく整数IDのポスティング参照）
+    hashtag_index = HashtagIndex.from_texts(df_all_posts["post_id"], df_all_posts["content"])
 
-    hashtag_counts = Counter(all_hashtags)
-    top_hashtags = hashtag_counts.most_common(100)
+    # 出現回数 Top100
+    df_hashtag_freq = hashtag_index.tag_counts(top=100)
 
-    # DataFrameに変換
-    df_hashtag_freq = pd.DataFrame(top_hashtags, columns=["hashtag", "count"])
-
-    mo.md(f"✅ ハッシュタグ抽出完了: **{len(hashtag_counts):,}** 種類のユニークタグ")
-    return (df_hashtag_freq,)
+    mo.md(f"✅ ハッシュタグ抽出完了: **{len(hashtag_index.tags):,}** 種類のユニークタグ")
+    return df_hashtag_freq, hashtag_index
 
 
 @app.cell
@@ -317,7 +336,7 @@ def _(mo):
 
 
 @app.cell
-def _(IRC_CHALLENGE_TAG, df_all_posts, member_tags, mo, pd):
+def _(IRC_CHALLENGE_TAG, df_all_posts, hashtag_index, member_tags, mo, pd):
     """ユーザーをTreatment群とControl群に分類"""
 
     if not member_tags:
@@ -328,14 +347,10 @@ def _(IRC_CHALLENGE_TAG, df_all_posts, member_tags, mo, pd):
         control_users = set()
     else:
         # 各投稿がIRCチャレンジタグを含むか判定
-        df_all_posts["has_irc"] = df_all_posts["hashtags"].apply(
-            lambda tags: IRC_CHALLENGE_TAG in tags
-        )
+        df_all_posts["has_irc"] = hashtag_index.mask(IRC_CHALLENGE_TAG)
 
         # 各投稿がメンバー名タグを含むか判定
-        df_all_posts["has_member_tag"] = df_all_posts["hashtags"].apply(
-            lambda tags: any(tag in tags for tag in member_tags)
-        )
+        df_all_posts["has_member_tag"] = hashtag_index.mask(member_tags)
 
         # IRCチャレンジを投稿したことがあるユーザー（Treatment群）
         treatment_users = set(
@@ -381,10 +396,13 @@ def _(mo):
 
 @app.cell
 def _(
+    BaselineEvent,
     CONTROL_BASELINE_DATE,
     IRC_CHALLENGE_TAG,
+    build_baselines,
     control_users,
     df_all_posts,
+    hashtag_index,
     mo,
     pd,
     treatment_users,
@@ -395,31 +413,16 @@ def _(
         baseline_result = mo.md("⚠️ グループ分けが完了していません。")
         df_user_baseline = pd.DataFrame()
     else:
-        baseline_records = []
-
-        # Treatment群: 初回IRCチャレンジ投稿日
-        for uid_bl in treatment_users:
-            posts_bl = df_all_posts[df_all_posts["account_id"] == uid_bl]
-            irc_posts_bl = posts_bl[posts_bl["hashtags"].apply(
-                lambda tags: IRC_CHALLENGE_TAG in tags
-            )]
-            if len(irc_posts_bl) > 0:
-                first_irc_date = irc_posts_bl["created_at"].min()
-                baseline_records.append({
-                    "account_id": uid_bl,
-                    "group": "Treatment",
-                    "baseline_date": first_irc_date,
-                })
-
+        # Treatment群: 初回IRCチャレンジ投稿日（IRCタグのポスティングから一括集計）
         # Control群: 固定日（11/28）
-        for uid_ctrl in control_users:
-            baseline_records.append({
-                "account_id": uid_ctrl,
-                "group": "Control",
-                "baseline_date": CONTROL_BASELINE_DATE,
-            })
-
-        df_user_baseline = pd.DataFrame(baseline_records)
+        df_user_baseline = build_baselines(
+            df_all_posts,
+            treatment_event=BaselineEvent(tags=(IRC_CHALLENGE_TAG,)),
+            treatment_users=treatment_users,
+            control_users=control_users,
+            control_date=CONTROL_BASELINE_DATE,
+            hashtag_index=hashtag_index,
+        )
 
         baseline_result = mo.md(f"""
         ### 基準日設定完了
@@ -434,6 +437,28 @@ def _(
     return (df_user_baseline,)
 
 
+@app.cell
+def _(
+    BeforeAfterPanel,
+    DATA_END_DATE,
+    DATA_START_DATE,
+    df_all_posts,
+    df_user_baseline,
+    member_tags,
+):
+    """メンバー名タグ投稿を基準日と一度だけ結合し、前後ラベルを付与（以降の分析で共有）"""
+    member_panel = None
+    if not df_user_baseline.empty and member_tags:
+        member_panel = BeforeAfterPanel(
+            df_all_posts,
+            df_user_baseline,
+            start=DATA_START_DATE,
+            end=DATA_END_DATE,
+            mask="has_member_tag",
+        )
+    return (member_panel,)
+
+
 @app.cell
 def _(mo):
     mo.md("""
@@ -450,80 +475,23 @@ def _(
     CONTROL_BASELINE_DATE,
     DATA_END_DATE,
     DATA_START_DATE,
-    df_all_posts,
-    df_user_baseline,
-    member_tags,
+    member_panel,
     mo,
     pd,
 ):
     """前後のメンバー名タグ投稿数を集計（固定期間で計算）"""
 
-    if df_user_baseline.empty or not member_tags:
+    if member_panel is None:
         analysis_result = mo.md("⚠️ 分析に必要なデータが揃っていません。")
         df_user_analysis = pd.DataFrame()
         df_user_analysis_filtered = pd.DataFrame()
     else:
-        analysis_records = []
-
-        for _, row_an in df_user_baseline.iterrows():
-            uid_an = row_an["account_id"]
-            group_an = row_an["group"]
-            baseline_an = row_an["baseline_date"]
-
-            # ユーザーの全投稿を取得
-            posts_an = df_all_posts[df_all_posts["account_id"] == uid_an].copy()
-
-            # メンバー名タグを含む投稿のみ
-            member_posts_an = posts_an[posts_an["has_member_tag"]]
-
-            # データ期間内の投稿のみにフィルタ
-            member_posts_an = member_posts_an[
-                (member_posts_an["created_at"] >= DATA_START_DATE) &
-                (member_posts_an["created_at"] <= DATA_END_DATE)
-            ]
-
-            # 基準日より前と後に分割
-            posts_before_an = member_posts_an[member_posts_an["created_at"] < baseline_an]
-            posts_after_an = member_posts_an[member_posts_an["created_at"] >= baseline_an]
-
-            count_before = len(posts_before_an)
-            count_after = len(posts_after_an)
-            change = count_after - count_before
-
-            # 期間（日数）を計算 - 固定期間を使用
-            # 前の期間: DATA_START_DATE 〜 baseline_an
-            # 後の期間: baseline_an 〜 DATA_END_DATE
-            days_before = max((baseline_an - DATA_START_DATE).days, 1)
-            days_after = max((DATA_END_DATE - baseline_an).days, 1)
-
-            # 1日あたりの投稿数（正規化）
-            rate_before = count_before / days_before if days_before > 0 else 0
-            rate_after = count_after / days_after if days_after > 0 else 0
-            rate_change = rate_after - rate_before
-
-            # 比率（後/前）を計算
-            ratio = rate_after / rate_before if rate_before > 0 else None
-
-            # ユーザーの主なアイドル（最も多く投稿しているsource_table）
-            main_idol = member_posts_an["source_table"].mode().iloc[0] if len(member_posts_an) > 0 else "N/A"
-
-            analysis_records.append({
-                "account_id": uid_an,
-                "group": group_an,
-                "baseline_date": baseline_an,
-                "main_idol": main_idol,  # 主なアイドル
-                "count_before": count_before,
-                "count_after": count_after,
-                "change": change,
-                "days_before": days_before,
-                "days_after": days_after,
-                "rate_before": rate_before,
-                "rate_after": rate_after,
-                "rate_change": rate_change,
-                "ratio": ratio,  # 後/前の比率
-            })
-
-        df_user_analysis = pd.DataFrame(analysis_records)
+        # 投稿数・期間（前: DATA_START_DATE〜基準日、後: 基準日〜DATA_END_DATE）・1日あたり投稿数・比率（後/前）を一括集計
+        # main_idol: ユーザーの主なアイドル（最も多く投稿しているsource_table）
+        df_user_analysis = member_panel.frame(
+            member_panel.mode("source_table", "main_idol"),
+            member_panel.rates("count"),
+        )
 
         # ⭐ 前後両方に1回以上投稿があるユーザーのみに絞る
         df_user_analysis_filtered = df_user_analysis[
@@ -595,36 +563,35 @@ def _(mo):
 
 
 @app.cell
-def _(df_user_analysis_filtered, mo, pd):
+def _(bootstrap, df_user_analysis_filtered, mo, pd):
     """アイドル×グループのクロス集計テーブル"""
 
     if df_user_analysis_filtered.empty:
         idol_table = mo.md("⚠️ 分析データがありません。")
         df_idol_stats = pd.DataFrame()
     else:
-        # アイドル×グループごとに集計
-        idol_group_stats = []
-
-        for idol_name_cross in df_user_analysis_filtered["main_idol"].unique():
-            idol_data_cross = df_user_analysis_filtered[df_user_analysis_filtered["main_idol"] == idol_name_cross]
-
-            for group_name_cross in ["Treatment", "Control"]:
-                group_data_cross = idol_data_cross[idol_data_cross["group"] == group_name_cross]
-
-                if len(group_data_cross) > 0:
-                    idol_group_stats.append({
-                        "アイドル": idol_name_cross,
-                        "グループ": group_name_cross,
-                        "ユーザー数": len(group_data_cross),
-                        "平均投稿数(前)": group_data_cross["count_before"].mean(),
-                        "平均投稿数(後)": group_data_cross["count_after"].mean(),
-                        "1日あたり(前)": group_data_cross["rate_before"].mean(),
-                        "1日あたり(後)": group_data_cross["rate_after"].mean(),
-                        "比率(後/前)平均": group_data_cross["ratio"].mean(),
-                        "比率(後/前)中央値": group_data_cross["ratio"].median(),
-                    })
-
-        df_idol_stats = pd.DataFrame(idol_group_stats)
+        # アイドル×グループごとに一括集計
+        df_idol_stats = (
+            df_user_analysis_filtered.groupby(["main_idol", "group"])
+            .agg(
+                **{
+                    "ユーザー数": ("account_id", "size"),
+                    "平均投稿数(前)": ("count_before", "mean"),
+                    "平均投稿数(後)": ("count_after", "mean"),
+                    "1日あたり(前)": ("rate_before", "mean"),
+                    "1日あたり(後)": ("rate_after", "mean"),
+                    "比率(後/前)平均": ("ratio", "mean"),
+                    "比率(後/前)中央値": ("ratio", "median"),
+                }
+            )
+            .reset_index()
+        )
+
+        # 比率平均の95%ブートストラップ信頼区間（全セルを一括リサンプリング）
+        df_idol_ci = bootstrap(df_user_analysis_filtered, "ratio", ["main_idol", "group"], n_resamples=2000, seed=42)
+        df_idol_stats = df_idol_stats.merge(
+            df_idol_ci[["main_idol", "group", "ci_low", "ci_high"]], on=["main_idol", "group"], how="left"
+        ).rename(columns={"main_idol": "アイドル", "group": "グループ"})
 
         # 比率でソート
         df_idol_stats = df_idol_stats.sort_values(
@@ -640,6 +607,10 @@ def _(df_user_analysis_filtered, mo, pd):
         df_idol_display["1日あたり(後)"] = df_idol_display["1日あたり(後)"].apply(lambda x: f"{x:.4f}")
         df_idol_display["比率(後/前)平均"] = df_idol_display["比率(後/前)平均"].apply(lambda x: f"{x:.2f}x" if pd.notna(x) else "N/A")
         df_idol_display["比率(後/前)中央値"] = df_idol_display["比率(後/前)中央値"].apply(lambda x: f"{x:.2f}x" if pd.notna(x) else "N/A")
+        df_idol_display["比率平均 95%CI"] = [
+            f"[{low:.2f}, {high:.2f}]" if pd.notna(low) else "N/A"
+            for low, high in zip(df_idol_display.pop("ci_low"), df_idol_display.pop("ci_high"))
+        ]
 
         idol_table = mo.vstack([
             mo.md("### アイドル × グループ別 比率一覧"),
@@ -652,38 +623,27 @@ def _(df_user_analysis_filtered, mo, pd):
 
 
 @app.cell
-def _(df_user_analysis_filtered, mo, pd):
+def _(compare_groups, df_user_analysis_filtered, mo, pd):
     """アイドル別サマリー（Treatment vs Control比較）"""
 
     if df_user_analysis_filtered.empty:
         idol_summary = mo.md("⚠️ 分析データがありません。")
         df_idol_summary = pd.DataFrame()
     else:
-        # アイドルごとにTreatment/Controlの比率を比較
-        idol_summary_list = []
-
-        for idol_name_sum in df_user_analysis_filtered["main_idol"].unique():
-            idol_data_sum = df_user_analysis_filtered[df_user_analysis_filtered["main_idol"] == idol_name_sum]
-
-            treatment_data_sum = idol_data_sum[idol_data_sum["group"] == "Treatment"]
-            control_data_sum = idol_data_sum[idol_data_sum["group"] == "Control"]
-
-            treatment_ratio_sum = treatment_data_sum["ratio"].mean() if len(treatment_data_sum) > 0 else None
-            control_ratio_sum = control_data_sum["ratio"].mean() if len(control_data_sum) > 0 else None
-
-            # Treatment - Control の差分
-            diff_sum = (treatment_ratio_sum - control_ratio_sum) if (treatment_ratio_sum is not None and control_ratio_sum is not None) else None
-
-            idol_summary_list.append({
-                "アイドル": idol_name_sum,
-                "Treatment人数": len(treatment_data_sum),
-                "Control人数": len(control_data_sum),
-                "Treatment比率": treatment_ratio_sum,
-                "Control比率": control_ratio_sum,
-                "差分(T-C)": diff_sum,
-            })
-
-        df_idol_summary = pd.DataFrame(idol_summary_list)
+        # アイドルごとにTreatment/Controlの比率平均を比較（差分の95%ブートストラップCIと並べ替え検定のp値）
+        df_idol_summary = compare_groups(
+            df_user_analysis_filtered, "ratio", by="main_idol", n_resamples=2000, seed=42
+        ).rename(
+            columns={
+                "main_idol": "アイドル",
+                "n_treatment": "Treatment人数",
+                "n_control": "Control人数",
+                "treatment": "Treatment比率",
+                "control": "Control比率",
+                "diff": "差分(T-C)",
+                "p_value": "p値",
+            }
+        )
 
         # 差分でソート（大きい順）
         df_idol_summary = df_idol_summary.sort_values(by=["差分(T-C)"], ascending=False, na_position='last')
@@ -699,10 +659,17 @@ def _(df_user_analysis_filtered, mo, pd):
         df_idol_summary_display["差分(T-C)"] = df_idol_summary_display["差分(T-C)"].apply(
             lambda x: f"{x:+.2f}" if pd.notna(x) else "N/A"
         )
+        df_idol_summary_display["差分 95%CI"] = [
+            f"[{low:+.2f}, {high:+.2f}]" if pd.notna(low) else "N/A"
+            for low, high in zip(df_idol_summary_display.pop("ci_low"), df_idol_summary_display.pop("ci_high"))
+        ]
+        df_idol_summary_display["p値"] = df_idol_summary_display["p値"].apply(
+            lambda x: f"{x:.4f}" if pd.notna(x) else "N/A"
+        )
 
         idol_summary = mo.vstack([
             mo.md("### アイドル別 Treatment vs Control 比較"),
-            mo.md("差分(T-C)が大きいほど、IRCチャレンジ参加の効果が大きいことを示唆します。"),
+            mo.md("差分(T-C)が大きいほど、IRCチャレンジ参加の効果が大きいことを示唆します。95%CIが0をまたがず p値が小さいアイドルほど差が偶然では説明しにくくなります。"),
             mo.ui.table(df_idol_summary_display, selection=None, pagination=True)
         ])
 
@@ -722,7 +689,7 @@ def _(mo):
 
 
 @app.cell
-def _(df_user_analysis_filtered, mo, pd):
+def _(compare_groups, df_user_analysis_filtered, mo, pd):
     """元々の投稿数による層別分析"""
 
     if df_user_analysis_filtered.empty:
@@ -735,27 +702,58 @@ def _(df_user_analysis_filtered, mo, pd):
         df_low_activity = df_user_analysis_filtered[df_user_analysis_filtered["count_before"] <= THRESHOLD]
         df_high_activity = df_user_analysis_filtered[df_user_analysis_filtered["count_before"] > THRESHOLD]
 
-        # 各層×グループの統計を計算
-        stratified_stats = []
-
-        for activity_level, df_activity in [("低活動（≤5件）", df_low_activity), ("高活動（>5件）", df_high_activity)]:
-            for group_strat in ["Treatment", "Control"]:
-                group_df_strat = df_activity[df_activity["group"] == group_strat]
-
-                if len(group_df_strat) > 0:
-                    stratified_stats.append({
-                        "活動レベル": activity_level,
-                        "グループ": group_strat,
-                        "ユーザー数": len(group_df_strat),
-                        "平均投稿数(前)": group_df_strat["count_before"].mean(),
-                        "平均投稿数(後)": group_df_strat["count_after"].mean(),
-                        "1日あたり(前)": group_df_strat["rate_before"].mean(),
-                        "1日あたり(後)": group_df_strat["rate_after"].mean(),
-                        "比率(後/前)平均": group_df_strat["ratio"].mean(),
-                        "比率(後/前)中央値": group_df_strat["ratio"].median(),
-                    })
+        # 各層×グループの統計を一括計算
+        df_activity_levels = df_user_analysis_filtered.assign(
+            活動レベル=df_user_analysis_filtered["count_before"]
+            .le(THRESHOLD)
+            .map({True: "低活動（≤5件）", False: "高活動（>5件）"})
+        )
+        df_stratified = (
+            df_activity_levels.groupby(["活動レベル", "group"])
+            .agg(
+                **{
+                    "ユーザー数": ("account_id", "size"),
+                    "平均投稿数(前)": ("count_before", "mean"),
+                    "平均投稿数(後)": ("count_after", "mean"),
+                    "1日あたり(前)": ("rate_before", "mean"),
+                    "1日あたり(後)": ("rate_after", "mean"),
+                    "比率(後/前)平均": ("ratio", "mean"),
+                    "比率(後/前)中央値": ("ratio", "median"),
+                }
+            )
+            .reindex(
+                pd.MultiIndex.from_product(
+                    [["低活動（≤5件）", "高活動（>5件）"], ["Treatment", "Control"]], names=["活動レベル", "group"]
+                )
+            )
+            .dropna(subset=["ユーザー数"])
+            .astype({"ユーザー数": int})
+            .reset_index()
+            .rename(columns={"group": "グループ"})
+        )
 
-        df_stratified = pd.DataFrame(stratified_stats)
+        # 層ごとの Treatment - Control 差（比率平均・比率中央値）の95%CIと並べ替え検定p値
+        df_stratified_tests = pd.concat(
+            [
+                compare_groups(
+                    df_activity_levels, "ratio", by="活動レベル", statistic=stat_strat, n_resamples=2000, seed=42
+                ).assign(指標=f"比率(後/前){label_strat}")
+                for stat_strat, label_strat in [("mean", "平均"), ("median", "中央値")]
+            ],
+            ignore_index=True,
+        )
+        df_stratified_tests_display = pd.DataFrame(
+            {
+                "活動レベル": df_stratified_tests["活動レベル"],
+                "指標": df_stratified_tests["指標"],
+                "差分(T-C)": df_stratified_tests["diff"].map(lambda x: f"{x:+.2f}" if pd.notna(x) else "N/A"),
+                "95%CI": [
+                    f"[{low:+.2f}, {high:+.2f}]" if pd.notna(low) else "N/A"
+                    for low, high in zip(df_stratified_tests["ci_low"], df_stratified_tests["ci_high"])
+                ],
+                "p値": df_stratified_tests["p_value"].map(lambda x: f"{x:.4f}" if pd.notna(x) else "N/A"),
+            }
+        )
 
         # フォーマット
         df_stratified_display = df_stratified.copy()
@@ -793,7 +791,9 @@ def _(df_user_analysis_filtered, mo, pd):
         stratified_table = mo.vstack([
             mo.md(summary_md),
             mo.md("### 詳細テーブル"),
-            mo.ui.table(df_stratified_display, selection=None)
+            mo.ui.table(df_stratified_display, selection=None),
+            mo.md("### Treatment vs Control 差の不確実性（ブートストラップ95%CI・並べ替え検定）"),
+            mo.ui.table(df_stratified_tests_display, selection=None),
         ])
 
     stratified_table
@@ -817,7 +817,7 @@ def _(mo):
 
 
 @app.cell
-def _(df_user_analysis_filtered, mo, pd):
+def _(compare_groups, df_user_analysis_filtered, mo, pd):
     """ロイヤリティ層別分析（四分位分割）"""
 
     if df_user_analysis_filtered.empty:
@@ -839,29 +839,34 @@ def _(df_user_analysis_filtered, mo, pd):
 
         df_user_analysis_filtered["royalty"] = df_user_analysis_filtered["count_before"].apply(classify_royalty)
 
-        # 各層×グループの統計を計算
-        royalty_stats = []
-
-        for royalty_level in ["高ロイヤリティ（上位25%）", "中ロイヤリティ（中間50%）", "低ロイヤリティ（下位25%）"]:
-            royalty_data = df_user_analysis_filtered[df_user_analysis_filtered["royalty"] == royalty_level]
-
-            for group_roy in ["Treatment", "Control"]:
-                group_data_roy = royalty_data[royalty_data["group"] == group_roy]
-
-                if len(group_data_roy) > 0:
-                    royalty_stats.append({
-                        "ロイヤリティ": royalty_level,
-                        "グループ": group_roy,
-                        "ユーザー数": len(group_data_roy),
-                        "投稿数(前)平均": group_data_roy["count_before"].mean(),
-                        "投稿数(後)平均": group_data_roy["count_after"].mean(),
-                        "比率(後/前)平均": group_data_roy["ratio"].mean(),
-                        "比率(後/前)中央値": group_data_roy["ratio"].median(),
-                        "1日あたり(前)": group_data_roy["rate_before"].mean(),
-                        "1日あたり(後)": group_data_roy["rate_after"].mean(),
-                    })
+        # 各層×グループの統計を一括計算
+        _royalty_levels = ["高ロイヤリティ（上位25%）", "中ロイヤリティ（中間50%）", "低ロイヤリティ（下位25%）"]
+        df_royalty_stats = (
+            df_user_analysis_filtered.groupby(["royalty", "group"])
+            .agg(
+                **{
+                    "ユーザー数": ("account_id", "size"),
+                    "投稿数(前)平均": ("count_before", "mean"),
+                    "投稿数(後)平均": ("count_after", "mean"),
+                    "比率(後/前)平均": ("ratio", "mean"),
+                    "比率(後/前)中央値": ("ratio", "median"),
+                    "1日あたり(前)": ("rate_before", "mean"),
+                    "1日あたり(後)": ("rate_after", "mean"),
+                }
+            )
+            .reindex(pd.MultiIndex.from_product([_royalty_levels, ["Treatment", "Control"]], names=["royalty", "group"]))
+            .dropna(subset=["ユーザー数"])
+            .astype({"ユーザー数": int})
+            .reset_index()
+            .rename(columns={"royalty": "ロイヤリティ", "group": "グループ"})
+        )
 
-        df_royalty_stats = pd.DataFrame(royalty_stats)
+        # 層ごとの変化量（後-前）の Treatment - Control 差：95%ブートストラップCIと並べ替え検定p値
+        df_royalty_tests = (
+            compare_groups(df_user_analysis_filtered, "change", by="royalty", n_resamples=2000, seed=42)
+            .set_index("royalty")
+            .reindex(_royalty_levels)
+        )
 
         # 表示用にフォーマット
         df_royalty_display = df_royalty_stats.copy()
@@ -927,6 +932,7 @@ def _(df_user_analysis_filtered, mo, pd):
         | 1日あたり変化 | {high_t_rate_after - high_t_rate_before:+.3f} | {high_c_rate_after - high_c_rate_before:+.3f} |
 
         **Treatment vs Control 差分**: 変化量で **{high_t_change - high_c_change:+.1f} 件** の差
+        （95%CI [{df_royalty_tests.loc["高ロイヤリティ（上位25%）", "ci_low"]:+.1f}, {df_royalty_tests.loc["高ロイヤリティ（上位25%）", "ci_high"]:+.1f}]、p = {df_royalty_tests.loc["高ロイヤリティ（上位25%）", "p_value"]:.4f}）
 
         ---
 
@@ -942,6 +948,7 @@ def _(df_user_analysis_filtered, mo, pd):
         | 1日あたり変化 | {low_t_rate_after - low_t_rate_before:+.3f} | {low_c_rate_after - low_c_rate_before:+.3f} |
 
         **Treatment vs Control 差分**: 変化量で **{low_t_change - low_c_change:+.1f} 件** の差
+        （95%CI [{df_royalty_tests.loc["低ロイヤリティ（下位25%）", "ci_low"]:+.1f}, {df_royalty_tests.loc["低ロイヤリティ（下位25%）", "ci_high"]:+.1f}]、p = {df_royalty_tests.loc["低ロイヤリティ（下位25%）", "p_value"]:.4f}）
 
         ---
 
@@ -1053,6 +1060,93 @@ def _(df_user_analysis_filtered, mo, np):
     return
 
 
+@app.cell
+def _(mo):
+    mo.md("""
+    ---
+    ## 📐 Step 6.6.2: 差の差（二元固定効果）推定
+
+    ユーザー×日のパネル（メンバー名タグ投稿数）にユーザー固定効果・日固定効果を入れたDiDを推定します。
+    Treatment群は各自の基準日以降を処置期間とし（段階的導入）、標準誤差はユーザー単位でクラスタリングします。
+    アイドル別・活動レベル別・ロイヤリティ別の各層を一括で推定します。
+    """)
+    return
+
+
+@app.cell
+def _(
+    DATA_END_DATE,
+    DATA_START_DATE,
+    UserPeriodPanel,
+    df_all_posts,
+    df_user_analysis_filtered,
+    mo,
+    np,
+    pd,
+):
+    """ユーザー×日パネルのTWFE DiD（層別一括推定）"""
+
+    if df_user_analysis_filtered.empty:
+        did_result = mo.md("⚠️ 分析データがありません。")
+        df_did = pd.DataFrame()
+    else:
+        _q1 = df_user_analysis_filtered["count_before"].quantile(0.25)
+        _q3 = df_user_analysis_filtered["count_before"].quantile(0.75)
+        df_did_users = df_user_analysis_filtered[["account_id", "group", "baseline_date", "main_idol"]].assign(
+            activity=df_user_analysis_filtered["count_before"]
+            .le(5)
+            .map({True: "低活動（≤5件）", False: "高活動（>5件）"}),
+            # Step 6.6.1 と同じ四分位の区切り
+            loyalty=np.select(
+                [df_user_analysis_filtered["count_before"] <= _q1, df_user_analysis_filtered["count_before"] >= _q3],
+                ["低ロイヤリティ（下位25%）", "高ロイヤリティ（上位25%）"],
+                default="中ロイヤリティ（中間50%）",
+            ),
+        )
+        did_panel = UserPeriodPanel.from_posts(
+            df_all_posts,
+            df_did_users,
+            start=DATA_START_DATE,
+            end=DATA_END_DATE,
+            freq="1D",
+            mask="has_member_tag",
+        )
+        df_did = pd.concat(
+            [pd.DataFrame([did_panel.fit()]).assign(層="全体", 区分="全体")]
+            + [
+                did_panel.fit_by(column_did, name="区分").assign(層=label_did)
+                for column_did, label_did in [("main_idol", "アイドル"), ("activity", "活動レベル"), ("loyalty", "ロイヤリティ")]
+            ],
+            ignore_index=True,
+        )
+        df_did_display = pd.DataFrame(
+            {
+                "層": df_did["層"],
+                "区分": df_did["区分"],
+                "ユーザー数": df_did["n_users"],
+                "Treatment数": df_did["n_treated_users"],
+                "効果(件/日)": df_did["estimate"].map(lambda x: f"{x:+.3f}" if pd.notna(x) else "N/A"),
+                "SE": df_did["std_error"].map(lambda x: f"{x:.3f}" if pd.notna(x) else "N/A"),
+                "95%CI": [
+                    f"[{low:+.3f}, {high:+.3f}]" if pd.notna(low) else "N/A"
+                    for low, high in zip(df_did["ci_low"], df_did["ci_high"])
+                ],
+                "p値": df_did["p_value"].map(lambda x: f"{x:.4f}" if pd.notna(x) else "N/A"),
+            }
+        )
+        did_result = mo.vstack([
+            mo.md(f"""
+            ### TWFE DiD 推定結果（{len(did_panel.periods)} 日 × {did_panel.outcome.shape[0]:,} ユーザー）
+            - 効果は「基準日以降の1日あたりメンバー名タグ投稿数」の変化（Treatment − Control、固定効果調整後）
+            - 段階的な基準日のもとでは、TWFE係数は各コホート効果の分散加重平均です
+            """),
+            mo.ui.table(df_did_display, selection=None, pagination=True),
+        ])
+
+    did_result
+    return
+
+
 @app.cell
 def _(mo):
     mo.md("""
@@ -1065,66 +1159,18 @@ def _(mo):
 
 
 @app.cell
-def _(DATA_END_DATE, DATA_START_DATE, df_all_posts, df_user_baseline, mo, pd):
+def _(member_panel, mo, pd):
     """エンゲージメント分析（投稿あたりの平均）"""
 
-    if df_user_baseline.empty:
+    if member_panel is None:
         engagement_result = mo.md("⚠️ 分析に必要なデータが揃っていません。")
         df_engagement = pd.DataFrame()
     else:
-        engagement_records = []
-
-        for _, row_eng in df_user_baseline.iterrows():
-            uid_eng = row_eng["account_id"]
-            group_eng = row_eng["group"]
-            baseline_eng = row_eng["baseline_date"]
-
-            # ユーザーの投稿を取得（メンバー名タグを含む）
-            user_posts_eng = df_all_posts[
-                (df_all_posts["account_id"] == uid_eng) &
-                (df_all_posts["has_member_tag"]) &
-                (df_all_posts["created_at"] >= DATA_START_DATE) &
-                (df_all_posts["created_at"] <= DATA_END_DATE)
-            ]
-
-            # 前後に分割
-            posts_before_eng = user_posts_eng[user_posts_eng["created_at"] < baseline_eng]
-            posts_after_eng = user_posts_eng[user_posts_eng["created_at"] >= baseline_eng]
-
-            # 前の期間のエンゲージメント
-            if len(posts_before_eng) > 0:
-                like_before = posts_before_eng["like_count"].mean()
-                rt_before = posts_before_eng["retweet_count"].mean()
-                reply_before = posts_before_eng["reply_count"].mean()
-            else:
-                like_before = 0
-                rt_before = 0
-                reply_before = 0
-
-            # 後の期間のエンゲージメント
-            if len(posts_after_eng) > 0:
-                like_after = posts_after_eng["like_count"].mean()
-                rt_after = posts_after_eng["retweet_count"].mean()
-                reply_after = posts_after_eng["reply_count"].mean()
-            else:
-                like_after = 0
-                rt_after = 0
-                reply_after = 0
-
-            engagement_records.append({
-                "account_id": uid_eng,
-                "group": group_eng,
-                "posts_before": len(posts_before_eng),
-                "posts_after": len(posts_after_eng),
-                "like_before": like_before,
-                "like_after": like_after,
-                "rt_before": rt_before,
-                "rt_after": rt_after,
-                "reply_before": reply_before,
-                "reply_after": reply_after,
-            })
-
-        df_engagement = pd.DataFrame(engagement_records)
+        # 前後それぞれの投稿数と投稿あたり平均（投稿がない期間は0）
+        df_engagement = member_panel.frame(
+            member_panel.counts("posts"),
+            member_panel.means({"like_count": "like", "retweet_count": "rt", "reply_count": "reply"}),
+        ).drop(columns="baseline_date")
 
         # 前後両方に投稿があるユーザーのみ
         df_engagement_filtered = df_engagement[
@@ -1341,60 +1387,19 @@ def _(mo):
 
 
 @app.cell
-def _(DATA_END_DATE, DATA_START_DATE, df_all_posts, df_user_baseline, mo, pd):
+def _(member_panel, mo, pd):
     """継続率分析（7日間の投稿日数）"""
 
-    if df_user_baseline.empty:
+    if member_panel is None:
         continuity_result = mo.md("⚠️ 分析に必要なデータが揃っていません。")
         df_continuity = pd.DataFrame()
     else:
-        continuity_records = []
-
-        for _, row_cont in df_user_baseline.iterrows():
-            uid_cont = row_cont["account_id"]
-            group_cont = row_cont["group"]
-            baseline_cont = row_cont["baseline_date"]
-
-            # ユーザーの投稿を取得（メンバー名タグを含む）
-            user_posts_cont = df_all_posts[
-                (df_all_posts["account_id"] == uid_cont) &
-                (df_all_posts["has_member_tag"]) &
-                (df_all_posts["created_at"] >= DATA_START_DATE) &
-                (df_all_posts["created_at"] <= DATA_END_DATE)
-            ]
+        # 基準日の前7日間 [基準日-7日, 基準日) と後7日間 [基準日, 基準日+7日) のユニーク投稿日数
+        df_continuity = member_panel.frame(member_panel.active_days("days_posted", window_days=7))
 
-            # 前の7日間: baseline_cont - 7日 〜 baseline_cont
-            start_before_7d = baseline_cont - pd.Timedelta(days=7)
-            posts_before_7d = user_posts_cont[
-                (user_posts_cont["created_at"] >= start_before_7d) &
-                (user_posts_cont["created_at"] < baseline_cont)
-            ]
-
-            # 後の7日間: baseline_cont 〜 baseline_cont + 7日
-            end_after_7d = baseline_cont + pd.Timedelta(days=7)
-            posts_after_7d = user_posts_cont[
-                (user_posts_cont["created_at"] >= baseline_cont) &
-                (user_posts_cont["created_at"] < end_after_7d)
-            ]
-
-            # ユニークな投稿日数をカウント
-            days_posted_before = posts_before_7d["created_at"].dt.date.nunique() if len(posts_before_7d) > 0 else 0
-            days_posted_after = posts_after_7d["created_at"].dt.date.nunique() if len(posts_after_7d) > 0 else 0
-
-            # 7日中7日投稿したかどうか
-            posted_7_of_7_before = (days_posted_before == 7)
-            posted_7_of_7_after = (days_posted_after == 7)
-
-            continuity_records.append({
-                "account_id": uid_cont,
-                "group": group_cont,
-                "days_posted_before": days_posted_before,
-                "days_posted_after": days_posted_after,
-                "posted_7_of_7_before": posted_7_of_7_before,
-                "posted_7_of_7_after": posted_7_of_7_after,
-            })
-
-        df_continuity = pd.DataFrame(continuity_records)
+        # 7日中7日投稿したかどうか
+        df_continuity["posted_7_of_7_before"] = df_continuity["days_posted_before"] == 7
+        df_continuity["posted_7_of_7_after"] = df_continuity["days_posted_after"] == 7
 
         # 前後両方に投稿があるユーザーのみ
         df_continuity_filtered = df_continuity[
@@ -1452,124 +1457,22 @@ def _(mo):
 
 
 @app.cell
-def _(DATA_END_DATE, DATA_START_DATE, df_all_posts, df_user_baseline, mo, pd):
+def _(matched_group_sample, member_panel, mo, pd):
     """投稿サンプリング: Treatment群は全件、Control群はTreatment群と同数をサンプリング"""
-    from tqdm import tqdm as tqdm_sample
-
     SAMPLE_PER_USER_PERIOD = 10  # ユーザーあたり前後各10件
 
-    if df_user_baseline.empty:
+    if member_panel is None:
         sampling_result = mo.md("⚠️ ベースラインデータがありません。")
         df_sampled_posts = pd.DataFrame()
     else:
-        # Treatment群とControl群を分離
-        treatment_users_df = df_user_baseline[df_user_baseline["group"] == "Treatment"]
-        control_users_df = df_user_baseline[df_user_baseline["group"] == "Control"]
-
-        sampled_records = []
-
-        # Treatment群: 全ユーザーからサンプリング
-        for _, row_sample in tqdm_sample(treatment_users_df.iterrows(), total=len(treatment_users_df), desc="📊 Treatment群サンプリング中"):
-            uid_sample = row_sample["account_id"]
-            group_sample = row_sample["group"]
-            baseline_sample = row_sample["baseline_date"]
-
-            user_posts_sample = df_all_posts[
-                (df_all_posts["account_id"] == uid_sample) &
-                (df_all_posts["has_member_tag"]) &
-                (df_all_posts["created_at"] >= DATA_START_DATE) &
-                (df_all_posts["created_at"] <= DATA_END_DATE)
-            ].copy()
-
-            posts_before_sample = user_posts_sample[user_posts_sample["created_at"] < baseline_sample]
-            posts_after_sample = user_posts_sample[user_posts_sample["created_at"] >= baseline_sample]
-
-            if len(posts_before_sample) > 0:
-                n_sample_before = min(SAMPLE_PER_USER_PERIOD, len(posts_before_sample))
-                sampled_before = posts_before_sample.sample(n=n_sample_before, random_state=42)
-                for _, post_row in sampled_before.iterrows():
-                    sampled_records.append({
-                        "post_id": post_row["post_id"],
-                        "account_id": uid_sample,
-                        "group": group_sample,
-                        "period": "before",
-                        "content": post_row["content"],
-                        "created_at": post_row["created_at"],
-                    })
-
-            if len(posts_after_sample) > 0:
-                n_sample_after = min(SAMPLE_PER_USER_PERIOD, len(posts_after_sample))
-                sampled_after = posts_after_sample.sample(n=n_sample_after, random_state=42)
-                for _, post_row in sampled_after.iterrows():
-                    sampled_records.append({
-                        "post_id": post_row["post_id"],
-                        "account_id": uid_sample,
-                        "group": group_sample,
-                        "period": "after",
-                        "content": post_row["content"],
-                        "created_at": post_row["created_at"],
-                    })
-
-        # Treatment群のサンプル数を記録
-        treatment_sample_count = len(sampled_records)
-
-        # Control群: Treatment群と同数になるようにサンプリング
-        # まずControl群のユーザーをシャッフル
-        control_users_shuffled_df = control_users_df.sample(frac=1, random_state=42)
-        control_sample_count = 0
-
-        for _, row_sample in tqdm_sample(control_users_shuffled_df.iterrows(), total=len(control_users_shuffled_df), desc="📊 Control群サンプリング中"):
-            # Treatment群と同数に達したら終了
-            if control_sample_count >= treatment_sample_count:
-                break
-
-            uid_sample = row_sample["account_id"]
-            group_sample = row_sample["group"]
-            baseline_sample = row_sample["baseline_date"]
-
-            user_posts_sample = df_all_posts[
-                (df_all_posts["account_id"] == uid_sample) &
-                (df_all_posts["has_member_tag"]) &
-                (df_all_posts["created_at"] >= DATA_START_DATE) &
-                (df_all_posts["created_at"] <= DATA_END_DATE)
-            ].copy()
-
-            posts_before_sample = user_posts_sample[user_posts_sample["created_at"] < baseline_sample]
-            posts_after_sample = user_posts_sample[user_posts_sample["created_at"] >= baseline_sample]
-
-            if len(posts_before_sample) > 0:
-                n_sample_before = min(SAMPLE_PER_USER_PERIOD, len(posts_before_sample))
-                sampled_before = posts_before_sample.sample(n=n_sample_before, random_state=42)
-                for _, post_row in sampled_before.iterrows():
-                    if control_sample_count >= treatment_sample_count:
-                        break
-                    sampled_records.append({
-                        "post_id": post_row["post_id"],
-                        "account_id": uid_sample,
-                        "group": group_sample,
-                        "period": "before",
-                        "content": post_row["content"],
-                        "created_at": post_row["created_at"],
-                    })
-                    control_sample_count += 1
-
-            if len(posts_after_sample) > 0:
-                n_sample_after = min(SAMPLE_PER_USER_PERIOD, len(posts_after_sample))
-                sampled_after = posts_after_sample.sample(n=n_sample_after, random_state=42)
-                for _, post_row in sampled_after.iterrows():
-                    if control_sample_count >= treatment_sample_count:
-                        break
-                    sampled_records.append({
-                        "post_id": post_row["post_id"],
-                        "account_id": uid_sample,
-                        "group": group_sample,
-                        "period": "after",
-                        "content": post_row["content"],
-                        "created_at": post_row["created_at"],
-                    })
-                    control_sample_count += 1
-
-        df_sampled_posts = pd.DataFrame(sampled_records)
+        # (ユーザー, 前後) ごとに最大10件を一括抽出（post_id のハッシュを乱数キーにして再実行でも同じサンプル）
+        # Control群はユーザーをランダム順に並べ、Treatment群と同数に達するまで採用
+        df_sampled_posts = matched_group_sample(
+            member_panel.posts,
+            n_per_stratum=SAMPLE_PER_USER_PERIOD,
+            seed=42,
+            id_col="post_id",
+        )[["post_id", "account_id", "group", "period", "content", "created_at"]]
 
         # サマリー
         treatment_before_count = len(df_sampled_posts[(df_sampled_posts["group"] == "Treatment") & (df_sampled_posts["period"] == "before")])
@@ -1595,7 +1498,7 @@ def _(DATA_END_DATE, DATA_START_DATE, df_all_posts, df_user_baseline, mo, pd):
 
 
 @app.cell
-def _(df_sampled_posts, mo, os, pd):
+def _(df_sampled_posts, mo, os, pd, root_dir):
     """Gemini APIでセンチメント分析を実行"""
     import google.generativeai as genai
     import time
@@ -1604,7 +1507,9 @@ def _(df_sampled_posts, mo, os, pd):
 
     # 分析実行フラグ（コストがかかるため手動で有効化）
     RUN_SENTIMENT_ANALYSIS = True
-    BATCH_SIZE = 10  # 1リクエストで処理する投稿数
+    # 1リクエストあたりのトークン予算（投稿数ではなくトークン量でバッチを詰める）
+    BATCH_TOKEN_BUDGET = 4000
+    MAX_POST_TOKENS = 300  # 1投稿あたりの上限（超過分は切り詰め）
 
     if df_sampled_posts.empty:
         sentiment_result = mo.md("⚠️ サンプリングされた投稿がありません。")
@@ -1623,137 +1528,134 @@ def _(df_sampled_posts, mo, os, pd):
             sentiment_result = mo.md("❌ 環境変数 `GOOGLE_API_KEY` または `GEMINI_API_KEY` が設定されていません。")
             df_sentiment = pd.DataFrame()
         else:
+            from ai_data_lab.llm.batching import BatchPacker, MalformedResponseError, run_batches
+            from ai_data_lab.llm.client import is_transient_error
+            from ai_data_lab.llm.dedup import find_near_duplicates
+            from ai_data_lab.llm.prompts import sentiment_batch_prompt
+            from ai_data_lab.llm.schemas import SentimentBatch, SentimentScore
+            from ai_data_lab.llm.structured import ItemLedger, generation_config, parse_batch_response
+            from ai_data_lab.llm.usage import UsageRecorder
+
+            SENTIMENT_MODEL = "gemini-3-flash-preview"
+            usage_recorder = UsageRecorder(root_dir / "data" / "llm_usage" / "usage.jsonl")
+            usage_tags = {"notebook": "11_irc_impact_analysis", "template": "sentiment_batch", "model": SENTIMENT_MODEL}
+
             genai.configure(api_key=api_key)
-            model = genai.GenerativeModel("gemini-3-flash-preview")
-
-            # センチメント判定用プロンプト
-            def create_sentiment_prompt(posts_batch):
-                posts_text = "\n".join([
-                    f"[{idx_prompt+1}] {post[:300]}" for idx_prompt, post in enumerate(posts_batch)
-                ])
-                return f"""以下のSNS投稿について、悪意・誹謗中傷の有無、およびポジティブ度を評価してください。
-
-    ### 【評価基準】：
-    1. **悪意・誹謗中傷の判定**（malice）
-       - "high": 誹謗中傷、名誉毀損、攻撃的・差別的な内容
-       - "low": 批判的だが、誹謗中傷とまではいえない
-       - "none": 問題なし
-
-    2. **ポジティブ度の評価**（positivity: 0-5）
-       - 5: 非常にポジティブ（感謝・応援・励まし・建設的な意見）
-       - 4: ポジティブ（好意的・肯定的な意見が中心）
-       - 3: ややポジティブ（フラットだが前向きな要素あり）
-       - 2: ニュートラル（良くも悪くもなく中立的）
-       - 1: ややネガティブ（批判的なトーンが含まれる）
-       - 0: ネガティブ（強い否定・攻撃的なトーン）
-
-    【投稿内容】：
-    {posts_text}
-
-    【回答フォーマット】（JSONのみ、説明不要）：
-    {{"results": [{{"malice": "none", "positivity": 4}}, {{"malice": "low", "positivity": 1}}, ...]}}
-    """
+            model = genai.GenerativeModel(SENTIMENT_MODEL)
 
-            # バッチ処理
-            all_sentiments = []
-            error_logs = []  # エラーログを収集
-            success_count = 0
-            error_count = 0
-            posts_list = df_sampled_posts["content"].tolist()
-            post_ids = df_sampled_posts["post_id"].tolist()
+            # センチメント判定用プロンプト（各投稿にIDを付与し、回答もIDで対応付ける）
+            create_sentiment_prompt = sentiment_batch_prompt
 
-            total_batches = (len(posts_list) + BATCH_SIZE - 1) // BATCH_SIZE
+            # ポジティブ度から従来のsentimentラベルに変換する関数
+            # 厳しめの判定基準: 5のみpositive、3-4はneutral、0-2はnegative
+            def positivity_to_sentiment(positivity_score):
+                if positivity_score == 5:
+                    return "positive"
+                elif positivity_score >= 3:
+                    return "neutral"
+                else:
+                    return "negative"
 
-            # tqdmでプログレスバーを表示
-            batch_indices = list(range(0, len(posts_list), BATCH_SIZE))
-            for batch_start in tqdm_api(batch_indices, total=total_batches, desc="🤖 Gemini API センチメント分析"):
-                batch_posts = posts_list[batch_start:batch_start+BATCH_SIZE]
-                batch_ids = post_ids[batch_start:batch_start+BATCH_SIZE]
+            # 投稿ごとの成功結果・失敗理由を記録（成功済みの投稿は再実行時にAPIを呼ばない）
+            SENTIMENT_PROMPT_VERSION = "v2"
+            sentiment_ledger = ItemLedger(root_dir / "data" / "llm_ledger" / f"11_sentiment_{SENTIMENT_PROMPT_VERSION}.jsonl")
 
-                try:
-                    prompt = create_sentiment_prompt(batch_posts)
-                    response = model.generate_content(prompt)
-                    response_text = response.text.strip()
-
-                    # JSONパース
-                    # ```json ... ``` の形式を処理
-                    json_text = response_text
-                    if "```json" in json_text:
-                        json_text = json_text.split("```json")[1].split("```")[0].strip()
-                    elif "```" in json_text:
-                        parts = json_text.split("```")
-                        if len(parts) >= 2:
-                            json_text = parts[1].strip()
-
-                    # JSON部分のみを抽出（{から}まで）
-                    import re as re_json
-                    json_match = re_json.search(r'\{.*\}', json_text, re_json.DOTALL)
-                    if json_match:
-                        json_text = json_match.group()
-
-                    result = json.loads(json_text)
-                    batch_sentiments = result.get("results", [])
-
-                    # ポジティブ度から従来のsentimentラベルに変換する関数
-                    # 厳しめの判定基準: 5のみpositive、3-4はneutral、0-2はnegative
-                    def positivity_to_sentiment(positivity_score):
-                        if positivity_score == 5:
-                            return "positive"
-                        elif positivity_score >= 3:
-                            return "neutral"
-                        else:
-                            return "negative"
-
-                    # 結果を追加
-                    if len(batch_sentiments) == len(batch_ids):
-                        for idx_sent, (pid, eval_result) in enumerate(zip(batch_ids, batch_sentiments)):
-                            if isinstance(eval_result, dict):
-                                malice = eval_result.get("malice", "none")
-                                positivity = eval_result.get("positivity", 2)
-                                sentiment = positivity_to_sentiment(positivity)
-                            else:
-                                # 旧形式への後方互換性
-                                malice = "none"
-                                positivity = 2
-                                sentiment = eval_result.lower() if isinstance(eval_result, str) else "neutral"
-
-                            all_sentiments.append({
-                                "post_id": pid,
-                                "malice": malice,
-                                "positivity": positivity,
-                                "sentiment": sentiment
-                            })
-                        success_count += 1
-                    else:
-                        # 結果数が一致しない場合
-                        error_logs.append(f"バッチ{batch_start}: 結果数不一致 (期待={len(batch_ids)}, 実際={len(batch_sentiments)})")
-                        for pid in batch_ids:
-                            all_sentiments.append({
-                                "post_id": pid,
-                                "malice": "none",
-                                "positivity": 2,
-                                "sentiment": "neutral"
-                            })
-                        error_count += 1
-
-                except Exception as e:
-                    # エラー時はneutralとして処理し、エラーログに記録
-                    error_logs.append(f"バッチ{batch_start}: {type(e).__name__}: {str(e)[:100]}")
-                    for pid in batch_ids:
-                        all_sentiments.append({
-                            "post_id": pid,
-                            "malice": "none",
-                            "positivity": 2,
-                            "sentiment": "neutral"
-                        })
-                    error_count += 1
+            SENTIMENT_MAX_RETRIES = 3
 
+            def score_batch(posts_batch):
+                """1バッチ分をAPIに投げ、投稿ID→評価結果の辞書を返す（JSONスキーマ指定＋投稿単位の検証）
+
+                レート制限・5xx などの一時的エラーはここで指数バックオフして再送する。
+                それ以外のエラーと不正な応答だけが run_batches に届き、バッチが二分割される。
+                """
+                with usage_recorder.track(items=len(posts_batch), **usage_tags) as usage_call:
+                    _attempt = 0
+                    while True:
+                        try:
+                            response = model.generate_content(
+                                create_sentiment_prompt(posts_batch),
+                                generation_config=generation_config(SentimentBatch),
+                                stream=True,
+                            )
+                            parsed = parse_batch_response(
+                                (chunk.text for chunk in response), SentimentScore, expected_ids=posts_batch.ids
+                            )
+                            break
+                        except Exception as _api_err:
+                            if _attempt >= SENTIMENT_MAX_RETRIES or not is_transient_error(_api_err):
+                                raise
+                            _attempt += 1
+                            usage_call.add_retry()
+                            time.sleep(2.0 * 2 ** (_attempt - 1))
+                    usage_call.set_usage(response)
                 # レート制限対策
                 time.sleep(0.5)
+                if not parsed.items:
+                    raise MalformedResponseError(next(iter(parsed.failures.values()), "empty response"))
+                sentiment_ledger.record_success(parsed.items)
+                return {
+                    pid: {
+                        "malice": score.malice,
+                        "positivity": score.positivity,
+                        "sentiment": positivity_to_sentiment(score.positivity),
+                    }
+                    for pid, score in parsed.items.items()
+                }
+
+            # 成功済みの投稿はキャッシュから復元し、未処理・失敗した投稿だけをAPIに投げる
+            post_keys = df_sampled_posts["post_id"].astype(str)
+            todo_ids = set(sentiment_ledger.todo(post_keys))
+            cached_results = {
+                pid: {
+                    "malice": cached["malice"],
+                    "positivity": cached["positivity"],
+                    "sentiment": positivity_to_sentiment(cached["positivity"]),
+                }
+                for pid, cached in sentiment_ledger.results().items()
+            }
+            df_todo_posts = df_sampled_posts[post_keys.isin(todo_ids)]
+            usage_recorder.record_cache_hits(len(df_sampled_posts) - len(df_todo_posts), **usage_tags)
+
+            # ほぼ同一の投稿（テンプレ投稿・RT的な投稿）は代表1件だけを採点し、結果を全メンバーに展開する
+            todo_post_ids = df_todo_posts["post_id"].astype(str).tolist()
+            dedup_result = find_near_duplicates(df_todo_posts["content"].astype(str).tolist(), threshold=0.85)
+            df_todo_unique = df_todo_posts.iloc[dedup_result.representatives]
+            usage_recorder.record_cache_hits(len(df_todo_posts) - len(df_todo_unique), **usage_tags)
+
+            # トークン予算でバッチを詰める（投稿IDを保持）
+            packer = BatchPacker(token_budget=BATCH_TOKEN_BUDGET, max_item_tokens=MAX_POST_TOKENS)
+            batches = packer.pack(
+                zip(df_todo_unique["post_id"].astype(str), df_todo_unique["content"].astype(str))
+            )
+            total_batches = len(batches)
+
+            # 失敗したバッチは二分割して、失敗した投稿だけを再試行する
+            progress_api = tqdm_api(total=len(df_todo_unique), desc="🤖 Gemini API センチメント分析")
+            run_outcome = run_batches(batches, score_batch, on_batch=lambda _batch, n_done: progress_api.update(n_done))
+            progress_api.close()
+
+            fanned_results = dedup_result.fan_out(todo_post_ids, run_outcome.results)
+            fanned_failures = dedup_result.fan_out(todo_post_ids, run_outcome.failures)
+            sentiment_ledger.record_success({
+                pid: {"id": pid, "malice": scores["malice"], "positivity": scores["positivity"]}
+                for pid, scores in fanned_results.items()
+                if pid not in run_outcome.results
+            })
+            sentiment_ledger.record_failures(fanned_failures)
+
+            merged_results = {pid: cached_results[pid] for pid in post_keys if pid in cached_results}
+            merged_results.update(fanned_results)
+            all_sentiments = [{"post_id": pid, **scores} for pid, scores in merged_results.items()]
+            error_logs = [f"投稿 {pid}: {reason}" for pid, reason in run_outcome.failures.items()]
+            success_count = len(merged_results)
+            error_count = len(fanned_failures)
+            dedup_summary = dedup_result.summary()
 
             # 結果をDataFrameにマージ
-            df_sentiment_results = pd.DataFrame(all_sentiments)
-            df_sentiment = df_sampled_posts.merge(df_sentiment_results, on="post_id", how="left")
+            df_sentiment_results = pd.DataFrame(all_sentiments, columns=["post_id", "malice", "positivity", "sentiment"])
+            df_sentiment = df_sampled_posts.assign(_post_key=df_sampled_posts["post_id"].astype(str)).merge(
+                df_sentiment_results.rename(columns={"post_id": "_post_key"}), on="_post_key", how="left"
+            ).drop(columns="_post_key")
             df_sentiment["sentiment"] = df_sentiment["sentiment"].fillna("neutral")
             df_sentiment["malice"] = df_sentiment["malice"].fillna("none")
             df_sentiment["positivity"] = df_sentiment["positivity"].fillna(2)
@@ -1772,7 +1674,7 @@ def _(df_sampled_posts, mo, os, pd):
             if error_logs:
                 error_display = f"""
 
-                ⚠️ **エラー発生バッチ数**: {error_count} / {total_batches}
+                ⚠️ **判定できなかった投稿数**: {error_count} / {len(df_sampled_posts):,}（neutral扱い）
 
                 <details>
                 <summary>エラー詳細（クリックで展開）</summary>
@@ -1789,8 +1691,9 @@ def _(df_sampled_posts, mo, os, pd):
                 mo.md(f"""
                 ### ✅ センチメント分析完了
 
-                **処理件数**: {len(df_sentiment):,} 件（{total_batches} バッチ）
-                **成功**: {success_count} バッチ / **エラー**: {error_count} バッチ
+                **処理件数**: {len(df_sentiment):,} 件（キャッシュ利用 {len(df_sentiment) - len(df_todo_posts):,} 件 / {total_batches} バッチ / API呼び出し {run_outcome.calls} 回、うち再試行 {run_outcome.retry_calls} 回）
+                **成功**: {success_count:,} 件 / **エラー**: {error_count:,} 件
+                **重複集約**: {dedup_summary["items"]:,} 件 → {dedup_summary["clusters"]:,} 件を採点（削減率 {dedup_summary["dedup_ratio"]:.1%}、最大クラスタ {dedup_summary["largest_cluster"]:,} 件）
                 {error_display}
                 """),
                 mo.md("### センチメント分布（positive/neutral/negative）"),
@@ -65,6 +65,7 @@ def _():
         default_backend,
         os,
         pd,
+        root_dir,
         serialization,
         snowflake,
         snowflake_error,
@@ -276,30 +277,119 @@ def _(df_weekday_dist, mo):
 
 @app.cell
 def _(mo):
-    mo.md("## 2. アクションキーワード出現率")
+    mo.md(
+        """
+        ## 2. アクションキーワード出現率
+
+        MEMO の `ID / COMPANYID / CREATEDAT / CONTENT` をローカル Parquet に複製し、
+        Aho–Corasick 法で全キーワードを1パス照合して分類します（大文字小文字は区別しない＝ILIKE 相当）。
+        キーワードを編集しても Snowflake を再スキャンしません。
+        """
+    )
     return
 
 
 @app.cell
-def _(run_query, schema):
-    keyword_sql = f"""
-    SELECT
-      SUM(IFF(CONTENT ILIKE '%電話%' OR CONTENT ILIKE '%架電%' OR CONTENT ILIKE '%TEL%', 1, 0)) AS phone,
-      SUM(IFF(CONTENT ILIKE '%メール%' OR CONTENT ILIKE '%Mail%' OR CONTENT ILIKE '%mail%', 1, 0)) AS email,
-      SUM(IFF(CONTENT ILIKE '%訪問%' OR CONTENT ILIKE '%来社%', 1, 0)) AS visit,
-      SUM(IFF(CONTENT ILIKE '%商談%' OR CONTENT ILIKE '%MTG%' OR CONTENT ILIKE '%打合せ%', 1, 0)) AS meeting,
-      SUM(IFF(CONTENT ILIKE '%資料%' OR CONTENT ILIKE '%提案書%', 1, 0)) AS document
-    FROM {schema}.MEMO
-    """
-    df_keyword_stats = run_query(keyword_sql)
-    return df_keyword_stats, keyword_sql
+def _(mo):
+    from ai_data_lab.text.keywords import format_keyword_spec
+
+    memo_refresh_button = mo.ui.run_button(label="MEMO をローカルに複製（更新）")
+    action_keywords_text = mo.ui.text_area(
+        value=format_keyword_spec(),
+        label="カテゴリ: キーワード（カンマ区切り）",
+        rows=6,
+        full_width=True,
+    )
+    memo_refresh_button, action_keywords_text
+    return action_keywords_text, memo_refresh_button
 
 
 @app.cell
-def _(df_keyword_stats, mo):
+def _(get_snowflake_connection, memo_refresh_button, mo, pd, root_dir, schema):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    memo_replica_path = root_dir / "data" / "snowflake" / "memo.parquet"
+
+    def replicate_memo(path):
+        """MEMO をバッチ取得しながら Parquet へ書き出す（一時ファイル経由で置き換え）"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        conn = get_snowflake_connection()
+        writer = None
+        try:
+            cur = conn.cursor()
+            cur.execute(f"SELECT ID, COMPANYID, CREATEDAT, CONTENT, USERORGRELATIONID FROM {schema}.MEMO")
+            for df_part in cur.fetch_pandas_batches():
+                table = pa.Table.from_pandas(df_part.astype({"ID": "string", "COMPANYID": "string", "USERORGRELATIONID": "string"}), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+            conn.close()
+        tmp_path.replace(path)
+
+    memo_replica_error = None
+    if memo_refresh_button.value or not memo_replica_path.exists():
+        try:
+            replicate_memo(memo_replica_path)
+        except Exception as exc:
+            memo_replica_error = exc
+
+    df_memo_local = (
+        pd.read_parquet(memo_replica_path)
+        if memo_replica_path.exists()
+        else pd.DataFrame(columns=["ID", "COMPANYID", "CREATEDAT", "CONTENT", "USERORGRELATIONID"])
+    )
+    _output = mo.md(f"ローカル MEMO: **{len(df_memo_local):,}** 件（`{memo_replica_path}`）")
+    if memo_replica_error is not None:
+        _output = mo.md(f"**MEMO 複製エラー**:\n```\n{memo_replica_error}\n```")
+    _output
+    return df_memo_local, memo_replica_path
+
+
+@app.cell
+def _(memo_replica_path, root_dir):
+    from ai_data_lab.text.search import FullTextIndex
+
+    # ローカル MEMO を全文検索インデックスに反映（変更行のみ更新）
+    memo_search_index = FullTextIndex(root_dir / "data" / "search" / "fulltext.sqlite")
+    if memo_replica_path.exists():
+        memo_search_index.add_parquet(
+            "memo",
+            memo_replica_path,
+            id_col="ID",
+            text_cols="CONTENT",
+            group_col="COMPANYID",
+            time_col="CREATEDAT",
+        )
+    return (memo_search_index,)
+
+
+@app.cell
+def _(action_keywords_text, df_memo_local, pd):
+    from ai_data_lab.text.keywords import KeywordClassifier, parse_keyword_spec
+
+    action_classifier = KeywordClassifier(parse_keyword_spec(action_keywords_text.value))
+    df_memo_flags = action_classifier.flags(df_memo_local["CONTENT"])
+    df_keyword_stats = pd.DataFrame([df_memo_flags.sum().astype(int)])
+    df_company_actions = action_classifier.aggregate(df_memo_local, text_col="CONTENT", group_col="COMPANYID")
+    return df_company_actions, df_keyword_stats, df_memo_flags
+
+
+@app.cell
+def _(df_company_actions, df_keyword_stats, mo):
     _output = mo.md("*データがありません*")
     if len(df_keyword_stats) > 0:
-        _output = mo.ui.table(df_keyword_stats, pagination=False)
+        _output = mo.vstack(
+            [
+                mo.ui.table(df_keyword_stats, pagination=False),
+                mo.md("### 企業別アクション件数"),
+                mo.ui.table(df_company_actions, pagination=True),
+            ]
+        )
     _output
     return
 
@@ -322,8 +412,9 @@ def _(mo):
 
 @app.cell
 def _(
-    escape_like,
+    df_memo_local,
     keyword_filter,
+    memo_search_index,
     min_length,
     run_query,
     sample_button,
@@ -331,18 +422,26 @@ def _(
     schema,
 ):
     df_samples = None
-    if sample_button.value:
-        keyword_clause = ""
-        if keyword_filter.value:
-            keyword_value = escape_like(keyword_filter.value)
-            keyword_clause = f"AND CONTENT ILIKE '%{keyword_value}%'"
-
+    if sample_button.value and keyword_filter.value.strip():
+        # キーワード指定時はローカル全文検索インデックスで絞り込んでからサンプリング
+        memo_hits = memo_search_index.search(
+            keyword_filter.value,
+            {"corpus": "memo", "min_length": int(min_length.value)},
+            limit=None,
+        )
+        df_matched = df_memo_local[df_memo_local["ID"].astype(str).isin(memo_hits["doc_id"])]
+        # SQL 経路と同じ列構成（USERORGRELATIONID が無い旧複製では欠損値）
+        df_samples = (
+            df_matched.sample(n=min(int(sample_size.value), len(df_matched)))
+            .reindex(columns=["ID", "CONTENT", "CREATEDAT", "COMPANYID", "USERORGRELATIONID"])
+            .reset_index(drop=True)
+        )
+    elif sample_button.value:
         memo_sample_sql = f"""
         SELECT ID, CONTENT, CREATEDAT, COMPANYID, USERORGRELATIONID
         FROM {schema}.MEMO
         WHERE CONTENT IS NOT NULL
           AND LENGTH(CONTENT) >= {int(min_length.value)}
-          {keyword_clause}
         SAMPLE ({int(sample_size.value)} ROWS)
         """
         df_samples = run_query(memo_sample_sql)
@@ -365,25 +464,21 @@ def _(mo):
 
 
 @app.cell
-def _(run_query, schema):
-    keyword_expression = (
-        "CONTENT ILIKE '%電話%' OR CONTENT ILIKE '%架電%' OR CONTENT ILIKE '%TEL%' "
-        "OR CONTENT ILIKE '%メール%' OR CONTENT ILIKE '%Mail%' OR CONTENT ILIKE '%mail%' "
-        "OR CONTENT ILIKE '%訪問%' OR CONTENT ILIKE '%来社%' "
-        "OR CONTENT ILIKE '%商談%' OR CONTENT ILIKE '%MTG%' OR CONTENT ILIKE '%打合せ%' "
-        "OR CONTENT ILIKE '%資料%' OR CONTENT ILIKE '%提案書%'"
+def _(df_memo_flags, df_memo_local, pd):
+    # キーワード判定はローカル分類結果（セクション2）を再利用
+    memo_lengths = df_memo_local["CONTENT"].fillna("").str.len()
+    is_long_memo = memo_lengths >= 50
+    df_parse_score = pd.DataFrame(
+        [
+            {
+                "total": len(df_memo_local),
+                "high_count": int((df_memo_flags["any_action"] & is_long_memo).sum()),
+                "medium_count": int((~df_memo_flags["any_action"] & is_long_memo).sum()),
+                "low_count": int((~is_long_memo).sum()),
+            }
+        ]
     )
-
-    parse_score_sql = f"""
-    SELECT
-      COUNT(*) AS total,
-      SUM(IFF(({keyword_expression}) AND LENGTH(COALESCE(CONTENT, '')) >= 50, 1, 0)) AS high_count,
-      SUM(IFF(NOT ({keyword_expression}) AND LENGTH(COALESCE(CONTENT, '')) >= 50, 1, 0)) AS medium_count,
-      SUM(IFF(LENGTH(COALESCE(CONTENT, '')) < 50, 1, 0)) AS low_count
-    FROM {schema}.MEMO
-    """
-    df_parse_score = run_query(parse_score_sql)
-    return df_parse_score, parse_score_sql
+    return (df_parse_score,)
 
 
 @app.cell
@@ -413,7 +508,7 @@ def _(mo):
 
 
 @app.cell
-def _(llm_button, llm_enabled, llm_sample_size, mo, os, run_query, schema):
+def _(llm_button, llm_enabled, llm_sample_size, mo, os, root_dir, run_query, schema):
     df_llm = None
     api_key = (
         os.getenv("GOOGLE_API_KEY")
@@ -436,7 +531,15 @@ def _(llm_button, llm_enabled, llm_sample_size, mo, os, run_query, schema):
             from google import genai
             from google.genai import types
 
-            client = genai.Client(api_key=api_key)
+            from ai_data_lab.llm.client import InstrumentedGenAIClient
+            from ai_data_lab.llm.usage import UsageRecorder
+
+            client = InstrumentedGenAIClient(
+                genai.Client(api_key=api_key),
+                notebook="18_memo_analysis",
+                template="memo_action_label",
+                recorder=UsageRecorder(root_dir / "data" / "llm_usage" / "usage.jsonl"),
+            )
             labels = []
             for content in df_llm["CONTENT"].tolist():
                 prompt = f"""
@@ -19,7 +19,8 @@ def _(mo):
         解約/継続企業のデータ期間を揃えた上で、チャーンに効くアクション（量・種類）を特定します。
 
         ## 分析設計
-        - **比較期間**: 解約企業の解約日までに合わせ、継続企業も同期間で打ち切り
+        - **比較期間**: 特徴量ストアの月次スナップショットから、各社の基準日の前月までの直近3ヶ月平均を使用
+          （解約企業は GA 最終利用日、継続企業は当日が基準日。解約後のデータは混入しない）
         - **基準日（t=0）**: 契約開始日（後から更新可能なパラメータ）
         - **ID接続**: COMPNO → COMPANYID → ORGID → GA org_id
         """
@@ -86,6 +87,7 @@ def _():
         os,
         pd,
         re,
+        root_dir,
         serialization,
         service_account,
         snowflake,
@@ -410,47 +412,40 @@ def _(df_id_mapping, mo):
 
 
 # =============================================================================
-# 3. GA4データ取得（org_id単位 + ページ群別）
+# 3. GA4利用期間（org_id単位）
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 3. GA4データ取得")
+    mo.md(
+        """
+        ## 3. GA4利用期間
+
+        利用量の指標は 6 の時点整合特徴量から取るため、ここでは基準日と最小イベント数フィルタに使う
+        初回/最終利用日とイベント数だけを取得します。
+        """
+    )
     return
 
 
 @app.cell
 def _(GA_DATASET_ID, get_bq_client, mo, pd):
-    # GA4 org_id単位の基本指標
+    # GA4 org_id単位の利用期間
     df_ga_metrics = pd.DataFrame()
     try:
         client = get_bq_client()
         ga_metrics_sql = f"""
-        WITH base AS (
-            SELECT
-                user_pseudo_id,
-                (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS ga_session_id,
-                (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
-                event_name,
-                event_date
-            FROM `{GA_DATASET_ID}.events_*`
-            WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
-        )
         SELECT
-            org_id,
-            COUNT(DISTINCT user_pseudo_id) AS users,
-            COUNT(DISTINCT CONCAT(user_pseudo_id, '-', CAST(ga_session_id AS STRING))) AS sessions,
-            COUNTIF(event_name = 'page_view') AS page_views,
-            COUNTIF(event_name = 'first_visit') AS new_users,
+            (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
             MIN(event_date) AS first_date,
             MAX(event_date) AS last_date,
             COUNT(*) AS total_events
-        FROM base
-        WHERE org_id IS NOT NULL
+        FROM `{GA_DATASET_ID}.events_*`
+        WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
         GROUP BY org_id
-        ORDER BY users DESC
+        HAVING org_id IS NOT NULL
         """
         df_ga_metrics = client.query(ga_metrics_sql).to_dataframe()
-        mo.md(f"**GA4 org_id単位指標**: {len(df_ga_metrics):,} 件")
+        mo.md(f"**GA4 org_id単位の利用期間**: {len(df_ga_metrics):,} 件")
     except Exception as e:
         mo.md(f"**GA4取得エラー**: `{e}`")
     return (df_ga_metrics,)
@@ -464,105 +459,11 @@ def _(df_ga_metrics, mo):
 
 
 # =============================================================================
-# 4. ページ群別閲覧量（GA4）
+# 4. Snowflake org_id → COMPNO マッピング
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 4. ページ群別閲覧量")
-    return
-
-
-@app.cell
-def _(mo):
-    mo.md(
-        """
-        **ページ群の定義**:
-        | ページ群 | パス正規表現 | 意味 |
-        | --- | --- | --- |
-        | list | `^/list` | リスト一覧/詳細 |
-        | company | `^/company` | 企業詳細 |
-        | download | `^/download` または `csv` を含む | CSVダウンロード関連 |
-        | search | `^/search` | 検索機能 |
-        | settings | `^/settings` | 設定画面 |
-        | other | 上記以外 | その他 |
-        """
-    )
-    return
-
-
-@app.cell
-def _(GA_DATASET_ID, get_bq_client, mo, pd):
-    # ページ群別閲覧量（org_id単位）
-    df_page_groups = pd.DataFrame()
-    try:
-        client = get_bq_client()
-        page_groups_sql = f"""
-        WITH base AS (
-            SELECT
-                (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
-                (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
-            FROM `{GA_DATASET_ID}.events_*`
-            WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
-              AND event_name = 'page_view'
-        ),
-        classified AS (
-            SELECT
-                org_id,
-                page_location,
-                CASE
-                    WHEN REGEXP_CONTAINS(page_location, r'/list') THEN 'list'
-                    WHEN REGEXP_CONTAINS(page_location, r'/company') THEN 'company'
-                    WHEN REGEXP_CONTAINS(page_location, r'/download|csv') THEN 'download'
-                    WHEN REGEXP_CONTAINS(page_location, r'/search') THEN 'search'
-                    WHEN REGEXP_CONTAINS(page_location, r'/settings') THEN 'settings'
-                    ELSE 'other'
-                END AS page_group
-            FROM base
-            WHERE org_id IS NOT NULL
-        )
-        SELECT
-            org_id,
-            page_group,
-            COUNT(*) AS page_views
-        FROM classified
-        GROUP BY org_id, page_group
-        """
-        df_page_groups = client.query(page_groups_sql).to_dataframe()
-        mo.md(f"**ページ群別閲覧量**: {len(df_page_groups):,} 件")
-    except Exception as e:
-        mo.md(f"**ページ群取得エラー**: `{e}`")
-    return (df_page_groups,)
-
-
-@app.cell
-def _(df_page_groups, mo, pd):
-    # ページ群をピボットして org_id 単位の特徴量に変換
-    df_page_pivot = pd.DataFrame()
-    if len(df_page_groups) > 0:
-        df_page_pivot = df_page_groups.pivot_table(
-            index="org_id",
-            columns="page_group",
-            values="page_views",
-            fill_value=0,
-        ).reset_index()
-        df_page_pivot.columns = ["org_id"] + [f"pv_{c}" for c in df_page_pivot.columns[1:]]
-        mo.md(f"**ページ群ピボット**: {len(df_page_pivot):,} 件")
-    return (df_page_pivot,)
-
-
-@app.cell
-def _(df_page_pivot, mo):
-    if len(df_page_pivot) > 0:
-        mo.ui.table(df_page_pivot.head(20), pagination=True)
-    return
-
-
-# =============================================================================
-# 5. Snowflake org_id → COMPNO マッピング
-# =============================================================================
-@app.cell
-def _(mo):
-    mo.md("## 5. Snowflake org_id → COMPNO マッピング")
+    mo.md("## 4. Snowflake org_id → COMPNO マッピング")
     return
 
 
@@ -624,11 +525,11 @@ def _(df_sf_mapping, mo):
 
 
 # =============================================================================
-# 6. データ統合（Churn + GA + Snowflake）
+# 5. データ統合（Churn + GA + Snowflake）
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 6. データ統合")
+    mo.md("## 5. データ統合")
     return
 
 
@@ -637,11 +538,9 @@ def _(
     contract_start_source,
     df_churn,
     df_ga_metrics,
-    df_page_pivot,
     df_sf_mapping,
     min_ga_events,
     mo,
-    np,
     pd,
 ):
     df_merged = pd.DataFrame()
@@ -657,7 +556,7 @@ def _(
             how="left",
         )
 
-        # 3. GA指標を結合
+        # 3. GA利用期間を結合（利用量の指標は 6 の時点整合特徴量を使う）
         df_merged = df_merged.merge(
             df_ga_metrics,
             left_on="ORGID",
@@ -665,24 +564,11 @@ def _(
             how="left",
         )
 
-        # 4. ページ群指標を結合
-        if len(df_page_pivot) > 0:
-            df_merged = df_merged.merge(
-                df_page_pivot,
-                on="org_id",
-                how="left",
-            )
-
-        # 5. 派生指標を計算
-        df_merged["sessions_per_user"] = df_merged["sessions"] / df_merged["users"].replace(0, np.nan)
-        df_merged["page_views_per_user"] = df_merged["page_views"] / df_merged["users"].replace(0, np.nan)
-        df_merged["page_views_per_session"] = df_merged["page_views"] / df_merged["sessions"].replace(0, np.nan)
-
-        # 6. 契約開始日の設定
+        # 4. 契約開始日の設定
         if contract_start_source.value == "ga_first_date":
             df_merged["contract_start_date"] = pd.to_datetime(df_merged["first_date"], format="%Y%m%d", errors="coerce")
 
-        # 7. GAイベント最小件数フィルタ
+        # 5. GAイベント最小件数フィルタ
         df_merged = df_merged[
             (df_merged["total_events"] >= min_ga_events.value) | (df_merged["total_events"].isna())
         ]
@@ -709,83 +595,124 @@ def _(df_merged, mo):
 
 
 # =============================================================================
-# 7. 期間整合（Apple-to-Apple）
+# 6. 時点整合特徴量（特徴量ストア）
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 7. 期間整合（Apple-to-Apple）")
+    mo.md(
+        """
+        ## 6. 時点整合特徴量（特徴量ストア）
+
+        月次スナップショット（`data/churn_features.duckdb`）から、各社の基準日の**前月までの直近3ヶ月**の月平均を取得します。
+        - 解約企業: GA最終利用日（解約日の代替）を基準日とする
+        - 継続企業: 当日を基準日とする（直近の完了月まで）
+
+        観測窓の長さが全社で同じため、期間を手動で揃える必要はありません。7・8 の EDA と機械学習はこの特徴量を使います。
+
+        スナップショットは未保存の完了月のみ取得するため、通常の再実行では最新月だけを問い合わせます。
+        """
+    )
     return
 
 
 @app.cell
-def _(df_merged, mo, np, pd):
-    df_aligned = pd.DataFrame()
-
-    if len(df_merged) > 0 and "first_date" in df_merged.columns and "last_date" in df_merged.columns:
-        df_aligned = df_merged.copy()
+def _(mo):
+    refresh_features_button = mo.ui.run_button(label="特徴量ストアを更新（未保存の月のみ取得）")
+    refresh_features_button
+    return (refresh_features_button,)
 
-        # 観測期間を計算
-        df_aligned["first_date_dt"] = pd.to_datetime(df_aligned["first_date"], format="%Y%m%d", errors="coerce")
-        df_aligned["last_date_dt"] = pd.to_datetime(df_aligned["last_date"], format="%Y%m%d", errors="coerce")
-        df_aligned["observation_days"] = (df_aligned["last_date_dt"] - df_aligned["first_date_dt"]).dt.days
 
-        # 解約企業の観測期間の中央値を計算
-        churn_obs_days = df_aligned[df_aligned["is_churned"] == 1]["observation_days"].dropna()
-        if len(churn_obs_days) > 0:
-            cutoff_days = int(churn_obs_days.median())
-            mo.md(f"**解約企業の観測期間中央値**: {cutoff_days} 日")
+@app.cell
+def _(
+    GA_DATASET_ID,
+    SF_SCHEMA,
+    df_merged,
+    get_bq_client,
+    get_snowflake_connection,
+    mo,
+    pd,
+    refresh_features_button,
+    root_dir,
+):
+    from ai_data_lab.churn.features import ChurnFeatureStore, add_ratio_features, monthly_feature_queries
+
+    feature_store = ChurnFeatureStore(root_dir / "data" / "churn_features.duckdb")
+    df_asof_features = pd.DataFrame()
+    asof_feature_cols = []
+
+    if refresh_features_button.value:
+        def _run_feature_query(_source, _sql):
+            if _source == "bq":
+                return get_bq_client().query(_sql).to_dataframe()
+            _conn = get_snowflake_connection()
+            try:
+                _cur = _conn.cursor()
+                _cur.execute(_sql)
+                return _cur.fetch_pandas_all()
+            finally:
+                _conn.close()
 
-            # 継続企業も同じ期間で打ち切り（指標は調整が必要な場合がある）
-            # ここでは期間情報のみ付与し、実際の指標調整は分析段階で行う
-            df_aligned["cutoff_days"] = cutoff_days
-            df_aligned["is_within_cutoff"] = df_aligned["observation_days"] <= cutoff_days
-        else:
-            df_aligned["cutoff_days"] = np.nan
-            df_aligned["is_within_cutoff"] = True
-            mo.md("*解約企業の観測期間データがありません*")
+        try:
+            _written = feature_store.refresh(
+                lambda _month: {
+                    _name: _run_feature_query(_source, _sql)
+                    for _name, (_source, _sql) in monthly_feature_queries(GA_DATASET_ID, SF_SCHEMA, _month).items()
+                },
+                start=pd.Timestamp.today() - pd.DateOffset(months=24),
+            )
+            mo.md(f"**追加した月**: {len(_written)} ヶ月")
+        except Exception as e:
+            mo.md(f"**特徴量ストア更新エラー**: `{e}`")
 
-        mo.md(
-            f"""
-            **期間整合結果**:
-            - 打ち切り期間内企業: {df_aligned['is_within_cutoff'].sum():,}
-            - 打ち切り期間外企業: {(~df_aligned['is_within_cutoff']).sum():,}
-            """
+    if feature_store.months() and len(df_merged) > 0:
+        # 解約企業は GA 最終利用日、継続企業は当日（NaT）を基準日とする
+        _as_of_date = pd.to_datetime(df_merged["last_date"], format="%Y%m%d", errors="coerce").where(
+            df_merged["is_churned"] == 1
         )
+        df_asof_features = add_ratio_features(pd.concat(
+            [
+                df_merged[["ORGID", "is_churned"]],
+                feature_store.as_of(df_merged.assign(as_of_date=_as_of_date), date_col="as_of_date", months=3),
+            ],
+            axis=1,
+        ))
+        asof_feature_cols = [
+            c for c in df_asof_features.columns if c not in ("ORGID", "is_churned", "as_of_month", "months_observed")
+        ]
+        mo.md(f"**時点整合特徴量**: {len(df_asof_features):,} 社 × {len(asof_feature_cols)} 特徴量")
     else:
-        mo.md("*期間情報がありません*")
+        mo.md("*特徴量スナップショットがありません（ボタンから更新してください）*")
 
-    return (df_aligned,)
+    return asof_feature_cols, df_asof_features
+
+
+@app.cell
+def _(df_asof_features, mo):
+    if len(df_asof_features) > 0:
+        mo.ui.table(df_asof_features.head(20), pagination=True)
+    return
 
 
 # =============================================================================
-# 8. EDA（Churn vs 継続の差分）
+# 7. EDA（Churn vs 継続の差分）
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 8. EDA（Churn vs 継続の差分）")
+    mo.md("## 7. EDA（Churn vs 継続の差分）")
     return
 
 
 @app.cell
-def _(df_aligned, mo, pd):
-    # 主要指標のChurn vs 継続比較
+def _(asof_feature_cols, df_asof_features, mo, pd):
+    # 主要指標のChurn vs 継続比較（基準日前3ヶ月の月平均）
     df_comparison = pd.DataFrame()
 
-    if len(df_aligned) > 0:
-        metrics = [
-            "users", "sessions", "page_views", "new_users",
-            "sessions_per_user", "page_views_per_user", "page_views_per_session",
-            "observation_days",
-        ]
-        # ページ群指標を追加
-        pv_cols = [c for c in df_aligned.columns if c.startswith("pv_")]
-        metrics.extend(pv_cols)
-
+    if len(df_asof_features) > 0:
         comparison_data = []
-        for metric in metrics:
-            if metric in df_aligned.columns:
-                churn_vals = df_aligned[df_aligned["is_churned"] == 1][metric].dropna()
-                active_vals = df_aligned[df_aligned["is_churned"] == 0][metric].dropna()
+        for metric in asof_feature_cols:
+            if metric in df_asof_features.columns:
+                churn_vals = df_asof_features[df_asof_features["is_churned"] == 1][metric].dropna()
+                active_vals = df_asof_features[df_asof_features["is_churned"] == 0][metric].dropna()
 
                 comparison_data.append({
                     "指標": metric,
@@ -810,11 +737,11 @@ def _(df_comparison, mo):
 
 
 # =============================================================================
-# 9. 機械学習（ロジスティック回帰 + 決定木）
+# 8. 機械学習（ロジスティック回帰 + 決定木）
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 9. 機械学習（閾値抽出 + 寄与度推定）")
+    mo.md("## 8. 機械学習（閾値抽出 + 寄与度推定）")
     return
 
 
@@ -826,30 +753,24 @@ def _(mo):
 
 
 @app.cell
-def _(df_aligned, mo, np, pd, run_ml_button):
+def _(asof_feature_cols, df_asof_features, mo, pd, run_ml_button):
     df_importance = pd.DataFrame()
     df_tree_rules = pd.DataFrame()
     model_logit = None
     model_tree = None
 
-    if run_ml_button.value and len(df_aligned) > 0:
+    if run_ml_button.value and len(df_asof_features) > 0:
         try:
             from sklearn.linear_model import LogisticRegression
             from sklearn.tree import DecisionTreeClassifier, export_text
             from sklearn.preprocessing import StandardScaler
             from sklearn.model_selection import train_test_split
 
-            # 特徴量選択
-            feature_cols = [
-                "users", "sessions", "page_views", "new_users",
-                "sessions_per_user", "page_views_per_user", "page_views_per_session",
-            ]
-            # ページ群指標を追加
-            pv_cols = [c for c in df_aligned.columns if c.startswith("pv_")]
-            feature_cols.extend(pv_cols)
+            # 特徴量選択（時点整合特徴量のみ）
+            feature_cols = list(asof_feature_cols)
 
-            # 欠損値を除外
-            df_ml = df_aligned[["is_churned"] + feature_cols].dropna()
+            # 観測月のない企業（欠損値）を除外
+            df_ml = df_asof_features[["is_churned"] + feature_cols].dropna()
 
             if len(df_ml) > 10:
                 X = df_ml[feature_cols]
@@ -911,11 +832,11 @@ def _(df_tree_rules, mo):
 
 
 # =============================================================================
-# 10. サマリー
+# 9. サマリー
 # =============================================================================
 @app.cell
 def _(mo):
-    mo.md("## 10. サマリー")
+    mo.md("## 9. サマリー")
     return
 
 
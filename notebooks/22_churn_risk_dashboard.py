@@ -114,6 +114,7 @@ def _():
         os,
         pd,
         re,
+        root_dir,
         serialization,
         service_account,
         snowflake,
@@ -147,39 +148,13 @@ def _(bq_error, genai_error, gemini_key_status, loaded_env_path, mo, snowflake_e
 
 
 @app.cell
-def _(re):
-    def normalize_company_name(name: str | None) -> str | None:
-        if name is None:
-            return None
-        value = str(name)
-        if not value.strip():
-            return None
-        value = re.sub(r"\s+", "", value)
-        value = re.sub(
-            r"(株式会社|有限会社|合同会社|一般社団法人|一般財団法人|公益社団法人|公益財団法人)",
-            "",
-            value,
-        )
-        value = re.sub(r"[（）()]", "", value)
-        value = value.replace("様", "")
-        return value or None
-
-    def extract_company_name_from_deal(deal_name: str | None) -> str | None:
-        if deal_name is None:
-            return None
-        raw = str(deal_name)
-        if not raw.strip():
-            return None
-        patterns = [
-            r"(?P<name>.+?)様向け",
-            r"(?P<name>.+?)向け",
-            r"(?P<name>.+?)様",
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, raw)
-            if match:
-                return match.group("name")
-        return raw
+def _():
+    # 会社名の正規化・商談名からの会社名抽出・あいまい一致（正規表現はプリコンパイル＋メモ化済み）
+    from ai_data_lab.text.company_names import (
+        CompanyNameIndex,
+        extract_company_names_from_deals,
+        normalize_company_names,
+    )
 
     def extract_json_block(text: str) -> str:
         if not text:
@@ -190,14 +165,24 @@ def _(re):
             return ""
         return text[start : end + 1]
     return (
-        extract_company_name_from_deal,
+        CompanyNameIndex,
+        extract_company_names_from_deals,
         extract_json_block,
-        normalize_company_name,
+        normalize_company_names,
     )
 
 
 @app.cell
-def _(Path, bigquery, os, pd, service_account):
+def _(root_dir):
+    # BigQuery/Snowflakeの結果をディスクにキャッシュ（カーネル再起動後も日付が変わるまで再利用）
+    from ai_data_lab.cache import ResultCache, today_version
+
+    result_cache = ResultCache(root_dir / "data" / "cache" / "cell_results")
+    return result_cache, today_version
+
+
+@app.cell
+def _(Path, bigquery, os, pd, result_cache, service_account, today_version):
     # BigQuery接続（gree-dionysus-infobox）
     BQ_PROJECT_ID = "gree-dionysus-infobox"
     BQ_DATASET_INTENT = "production_infobox"
@@ -210,8 +195,9 @@ def _(Path, bigquery, os, pd, service_account):
             return bigquery.Client(project=BQ_PROJECT_ID, credentials=credentials)
         return bigquery.Client(project=BQ_PROJECT_ID)
 
+    @result_cache.cached(name="churn_query_bq", versions=today_version)
     def query_bq(sql):
-        """BigQueryクエリ実行"""
+        """BigQueryクエリ実行（当日中はキャッシュから読み込み）"""
         client = get_bq_client()
         job = client.query(sql)
         results = job.result()
@@ -225,9 +211,11 @@ def _(
     Path,
     default_backend,
     os,
+    result_cache,
     serialization,
     snowflake,
     snowflake_error,
+    today_version,
     tomllib,
 ):
     SF_SCHEMA = "ETL_S3_TRANSALES_DB.TRANSALES_DAILY_SCHEMA"
@@ -284,8 +272,9 @@ def _(
 
         return snowflake.connector.connect(**connect_params)
 
+    @result_cache.cached(name="churn_query_sf", versions=today_version)
     def query_sf(sql):
-        """Snowflakeクエリ実行"""
+        """Snowflakeクエリ実行（当日中はキャッシュから読み込み）"""
         conn = get_snowflake_connection()
         cur = conn.cursor()
         try:
@@ -306,7 +295,7 @@ def _(mo):
 
 
 @app.cell
-def _(Path, normalize_company_name, pd):
+def _(Path, normalize_company_names, pd):
     tsv_path = Path("/Users/kou1904/githubactions_fordata/work/aieda_agent/docs/assets/infobox_data.tsv")
     df_churn_raw = pd.read_csv(tsv_path, sep="\t")
 
@@ -341,7 +330,7 @@ def _(Path, normalize_company_name, pd):
         rename_map[active_rate_col[0]] = "active_rate"
     df_churn.rename(columns={k: v for k, v in rename_map.items() if k in df_churn.columns}, inplace=True)
     if "CompanyName" in df_churn.columns:
-        df_churn["company_name_norm"] = df_churn["CompanyName"].apply(normalize_company_name)
+        df_churn["company_name_norm"] = normalize_company_names(df_churn["CompanyName"])
     else:
         df_churn["company_name_norm"] = None
     return df_churn, df_churn_raw
@@ -368,7 +357,7 @@ def _(mo):
 
 
 @app.cell
-def _(Path, extract_company_name_from_deal, normalize_company_name, pd):
+def _(Path, extract_company_names_from_deals, normalize_company_names, pd):
     churn_reason_path = Path(
         "/Users/kou1904/githubactions_fordata/work/aieda_agent/docs/assets/【CS】解約顧客一覧_25年1月〜 - シート1.csv"
     )
@@ -380,15 +369,11 @@ def _(Path, extract_company_name_from_deal, normalize_company_name, pd):
         df_churn_reason = df_churn_reason_raw.copy()
 
         if "商談名" in df_churn_reason.columns:
-            df_churn_reason["deal_company_name"] = df_churn_reason["商談名"].apply(
-                extract_company_name_from_deal
-            )
+            df_churn_reason["deal_company_name"] = extract_company_names_from_deals(df_churn_reason["商談名"])
         else:
             df_churn_reason["deal_company_name"] = None
 
-        df_churn_reason["company_name_norm"] = df_churn_reason["deal_company_name"].apply(
-            normalize_company_name
-        )
+        df_churn_reason["company_name_norm"] = normalize_company_names(df_churn_reason["deal_company_name"])
 
         loss_date_col = "現契約終了日" if "現契約終了日" in df_churn_reason.columns else None
         if loss_date_col is None and "完了予定日" in df_churn_reason.columns:
@@ -1048,134 +1033,56 @@ def _(mo):
 
 
 @app.cell
-def _(GA_DATASET_ID, query_bq):
-    # --- ユーザー単位: 月別 × カテゴリ別 UU数 + 率 ---
-    # 実際のURL構造:
-    #   /companies(?:[?#]|$) → 企業検索(一覧)
-    #   /companies/[a-z0-9]  → 企業詳細
-    #   /company-lists|/people-lists|/leads-lists → リスト系
-    #   -lists/import        → インポート
-    #   /analysis/trends     → トレンド分析
-    #   /analysis/intent-settings → 1stPartyスコア設定
-    #   /analysis/crm-integration → CRM連携
-    #   /people              → 人物
-    _user_query = f"""
-    WITH base AS (
-        SELECT
-            FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
-            user_pseudo_id,
-            (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
-        FROM `{GA_DATASET_ID}.events_*`
-        WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
-          AND _TABLE_SUFFIX >= FORMAT_DATE('%Y%m%d', DATE_SUB(CURRENT_DATE(), INTERVAL 6 MONTH))
-          AND event_name = 'page_view'
-    ),
-    monthly_total AS (
-        SELECT month, COUNT(DISTINCT user_pseudo_id) AS total_uu
-        FROM base GROUP BY month
-    ),
-    monthly_page AS (
-        SELECT month,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/companies(?:[?#]|$)') THEN user_pseudo_id END) AS uu_search,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/companies/[a-z0-9]') THEN user_pseudo_id END) AS uu_company_detail,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/company-lists|/people-lists|/leads-lists') THEN user_pseudo_id END) AS uu_lists,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'-lists/import') THEN user_pseudo_id END) AS uu_import,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/trends') THEN user_pseudo_id END) AS uu_trends,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/intent-settings') THEN user_pseudo_id END) AS uu_intent,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/crm-integration') THEN user_pseudo_id END) AS uu_crm,
-            COUNT(DISTINCT CASE WHEN REGEXP_CONTAINS(page_location, r'/people') THEN user_pseudo_id END) AS uu_people
-        FROM base GROUP BY month
-    )
-    SELECT p.month, t.total_uu,
-           p.uu_search,          ROUND(SAFE_DIVIDE(p.uu_search, t.total_uu) * 100, 1)          AS rate_search,
-           p.uu_company_detail,  ROUND(SAFE_DIVIDE(p.uu_company_detail, t.total_uu) * 100, 1)  AS rate_company_detail,
-           p.uu_lists,           ROUND(SAFE_DIVIDE(p.uu_lists, t.total_uu) * 100, 1)           AS rate_lists,
-           p.uu_import,          ROUND(SAFE_DIVIDE(p.uu_import, t.total_uu) * 100, 1)          AS rate_import,
-           p.uu_trends,          ROUND(SAFE_DIVIDE(p.uu_trends, t.total_uu) * 100, 1)          AS rate_trends,
-           p.uu_intent,          ROUND(SAFE_DIVIDE(p.uu_intent, t.total_uu) * 100, 1)          AS rate_intent,
-           p.uu_crm,             ROUND(SAFE_DIVIDE(p.uu_crm, t.total_uu) * 100, 1)             AS rate_crm,
-           p.uu_people,          ROUND(SAFE_DIVIDE(p.uu_people, t.total_uu) * 100, 1)          AS rate_people
-    FROM monthly_page p JOIN monthly_total t ON p.month = t.month
-    ORDER BY p.month
-    """
-    df_ga_page_rate_user = query_bq(_user_query)
-    return (df_ga_page_rate_user,)
+def _(GA_DATASET_ID, mo, query_bq):
+    # --- ユーザー単位 / 企業(org_id)単位: 月別 × カテゴリ別 数 + 率 ---
+    # BigQuery上の日次ロールアップ（月×カテゴリ集計済みの小さなテーブル）から取得する。
+    # ロールアップの更新は定期ジョブで実行:
+    #   python -m ai_data_lab.churn.ga_rollup refresh --ga-dataset analytics_400693944
+    # カテゴリ（URL正規表現）の定義は ai_data_lab.churn.ga_rollup.PAGE_CATEGORIES
+    from ai_data_lab.churn.ga_rollup import GaPageRollup, rollup_is_fresh
+
+    # 鮮度チェックは結果キャッシュを通さない（当日中に更新ジョブが走った場合も反映）
+    _rollup_error = None
+    try:
+        _refreshed_on = GaPageRollup(query_bq.__wrapped__, GA_DATASET_ID).last_refreshed()
+    except Exception as _e:
+        _refreshed_on, _rollup_error = None, _e
+    # ロールアップが無い・古い場合は GA エクスポートから直接集計（スキャン量が大きい）
+    ga_page_use_raw = not rollup_is_fresh(_refreshed_on)
+
+    ga_page_rollup = GaPageRollup(query_bq, GA_DATASET_ID)
+    df_ga_page_rate_user = ga_page_rollup.user_rates(raw=ga_page_use_raw)
+    df_ga_page_rate_org = ga_page_rollup.org_rates(raw=ga_page_use_raw)
+
+    _output = mo.md(f"ロールアップ最終更新: **{_refreshed_on}**")
+    if _rollup_error is not None:
+        _output = mo.md(f"⚠️ GAロールアップを読み込めないため、GAエクスポートから直接集計しました: `{_rollup_error}`")
+    elif ga_page_use_raw:
+        _output = mo.md(
+            f"⚠️ GAロールアップが古いため（最終更新: {_refreshed_on or '未実行'}）、GAエクスポートから直接集計しました。"
+            "定期ジョブ `python -m ai_data_lab.churn.ga_rollup refresh` の実行状況を確認してください。"
+        )
+    _output
+    return df_ga_page_rate_org, df_ga_page_rate_user, ga_page_rollup, ga_page_use_raw
 
 
 @app.cell
-def _(GA_DATASET_ID, query_bq):
-    # --- 企業(org_id)単位: 月×org_id ごとの各カテゴリ利用有無 (0/1) ---
-    _org_raw_query = f"""
-    SELECT
-        month,
-        org_id,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/companies(?:[?#]|$)') THEN 1 ELSE 0 END) AS has_search,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/companies/[a-z0-9]') THEN 1 ELSE 0 END) AS has_company_detail,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/company-lists|/people-lists|/leads-lists') THEN 1 ELSE 0 END) AS has_lists,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'-lists/import') THEN 1 ELSE 0 END) AS has_import,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/trends') THEN 1 ELSE 0 END) AS has_trends,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/intent-settings') THEN 1 ELSE 0 END) AS has_intent,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/analysis/crm-integration') THEN 1 ELSE 0 END) AS has_crm,
-        MAX(CASE WHEN REGEXP_CONTAINS(page_location, r'/people') THEN 1 ELSE 0 END) AS has_people
-    FROM (
-        SELECT
-            FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
-            (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
-            (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
-        FROM `{GA_DATASET_ID}.events_*`
-        WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
-          AND _TABLE_SUFFIX >= FORMAT_DATE('%Y%m%d', DATE_SUB(CURRENT_DATE(), INTERVAL 6 MONTH))
-          AND event_name = 'page_view'
-    )
-    WHERE org_id IS NOT NULL
-    GROUP BY month, org_id
-    """
-    df_ga_page_org_raw = query_bq(_org_raw_query)
-    return (df_ga_page_org_raw,)
-
-
-@app.cell
-def _(df_churn, df_ga_page_org_raw, df_id_mapping, pd):
-    # --- 企業単位の月次集約 + 解約/契約中の紐づけ ---
-    df_ga_page_rate_org = pd.DataFrame()
-    df_ga_page_rate_churn = pd.DataFrame()
-
-    _has_cols = [c for c in df_ga_page_org_raw.columns if c.startswith("has_")]
-
-    if len(df_ga_page_org_raw) > 0 and _has_cols:
-        # 全体集約: 月別に各カテゴリの企業数と総アクティブ企業数
-        _total_org = df_ga_page_org_raw.groupby("month")["org_id"].nunique().reset_index(name="total_orgs")
-        _page_org = df_ga_page_org_raw.groupby("month")[_has_cols].sum().astype(int).reset_index()
-        df_ga_page_rate_org = _page_org.merge(_total_org, on="month")
-        for _hc in _has_cols:
-            _rc = _hc.replace("has_", "rate_")
-            _oc = _hc.replace("has_", "org_")
-            df_ga_page_rate_org[_oc] = df_ga_page_rate_org[_hc]
-            df_ga_page_rate_org[_rc] = (df_ga_page_rate_org[_hc] / df_ga_page_rate_org["total_orgs"] * 100).round(1)
-
-        # 解約/契約中の紐づけ
-        _org_churn = df_ga_page_org_raw.copy()
-        if len(df_id_mapping) > 0 and "ORGID" in df_id_mapping.columns:
-            _map = df_id_mapping[["ORGID", "COMPNO"]].drop_duplicates(subset=["ORGID"])
-            _org_churn = _org_churn.merge(_map, left_on="org_id", right_on="ORGID", how="left")
-        if len(df_churn) > 0 and "COMPNO" in _org_churn.columns and "COMPNO" in df_churn.columns:
-            _churn_map = df_churn[["COMPNO", "status"]].drop_duplicates(subset=["COMPNO"])
-            _org_churn = _org_churn.merge(_churn_map, on="COMPNO", how="left")
-        if "status" not in _org_churn.columns:
-            _org_churn["status"] = "不明"
-        _org_churn["status"] = _org_churn["status"].fillna("不明")
-
-        # 解約/契約中別の月次集約
-        _churn_total = _org_churn.groupby(["month", "status"])["org_id"].nunique().reset_index(name="total_orgs")
-        _churn_page = _org_churn.groupby(["month", "status"])[_has_cols].sum().astype(int).reset_index()
-        df_ga_page_rate_churn = _churn_page.merge(_churn_total, on=["month", "status"])
-        for _hc in _has_cols:
-            _rc = _hc.replace("has_", "rate_")
-            _oc = _hc.replace("has_", "org_")
-            df_ga_page_rate_churn[_oc] = df_ga_page_rate_churn[_hc]
-            df_ga_page_rate_churn[_rc] = (df_ga_page_rate_churn[_hc] / df_ga_page_rate_churn["total_orgs"] * 100).round(1)
-
-    return df_ga_page_rate_churn, df_ga_page_rate_org
+def _(df_churn, df_id_mapping, ga_page_rollup, ga_page_use_raw):
+    # --- 解約/契約中別の月次集約: ORGID → status の対応表だけを渡し、集計はBigQuery側で実行 ---
+    _org_status = {}
+    if (
+        len(df_id_mapping) > 0
+        and {"ORGID", "COMPNO"} <= set(df_id_mapping.columns)
+        and len(df_churn) > 0
+        and {"COMPNO", "status"} <= set(df_churn.columns)
+    ):
+        _map = df_id_mapping[["ORGID", "COMPNO"]].dropna().drop_duplicates(subset=["ORGID"])
+        _churn_map = df_churn[["COMPNO", "status"]].dropna().drop_duplicates(subset=["COMPNO"])
+        _org_status_df = _map.merge(_churn_map, on="COMPNO")
+        _org_status = dict(zip(_org_status_df["ORGID"].astype(str), _org_status_df["status"].astype(str)))
+
+    df_ga_page_rate_churn = ga_page_rollup.status_rates(_org_status, raw=ga_page_use_raw)
+    return (df_ga_page_rate_churn,)
 
 
 @app.cell
@@ -2003,26 +1910,19 @@ def _(SF_SCHEMA, df_id_mapping, mo, pd, query_sf):
 @app.cell
 def _(mo):
     mo.md("""
-    ## 6. データ統合（チャーン + GA + インテント）
+    ## 6. データ統合（チャーン + 企業マスタ + 解約理由）
+
+    利用指標は全期間集計を結合せず、6-b の時点整合特徴量（解約前のデータのみ）を EDA とモデルに使います。
     """)
     return
 
 
 @app.cell
-def _(
-    df_churn,
-    df_churn_reason_latest,
-    df_ga,
-    df_id_mapping,
-    df_list_summary,
-    mo,
-    np,
-    pd,
-    query_bq,
-):
+def _(CompanyNameIndex, df_churn, df_churn_reason_latest, df_id_mapping, mo, pd):
+    # 利用指標（GA・List・メモ・インテント）はここでは結合せず、6-b の時点整合特徴量を使う
     df_merged = pd.DataFrame()
 
-    if len(df_id_mapping) > 0 and len(df_ga) > 0:
+    if len(df_id_mapping) > 0:
         # 1. チャーン（TSV）+ BeegleCompany + USERORGANIZATION（COMPNO で紐づけ）
         bq_cols = [
             "COMPNO", "COMPANYID", "ORGID", "ORG_NAME", "BQ_COMPANY_NAME", "BQ_COMPANY_KANA",
@@ -2038,175 +1938,30 @@ def _(
         )
 
         # 2. 解約理由（CSV）を結合
+        #    会社名のあいまい一致（n-gram ブロッキング＋類似度）。TSV の会社名と BeegleCompany の商号の
+        #    うちスコアが高い方を採用し、表記ゆれで完全一致しない会社も拾う
         if len(df_churn_reason_latest) > 0 and "company_name_norm" in df_merged.columns:
-            df_merged = df_merged.merge(
-                df_churn_reason_latest,
-                on="company_name_norm",
-                how="left",
-                suffixes=("", "_reason"),
-            )
-
-        # 3. GA指標を結合
-        df_merged = df_merged.merge(
-            df_ga,
-            left_on="ORGID",
-            right_on="org_id",
-            how="left",
-        )
-
-        # 4. List分析（Snowflake）
-        if len(df_list_summary) > 0:
-            df_merged = df_merged.merge(
-                df_list_summary,
-                on="ORGID",
-                how="left",
-                suffixes=("", "_list"),
-            )
-
-        # 5. 派生指標
-        df_merged["sessions_per_user"] = df_merged["sessions"] / df_merged["users"].replace(0, np.nan)
-        df_merged["page_views_per_user"] = df_merged["page_views"] / df_merged["users"].replace(0, np.nan)
-
-        # 6. ページ利用率
-        total_pv = df_merged["page_views"].replace(0, np.nan)
-        df_merged["list_rate"] = df_merged["pv_list"] / total_pv * 100
-        df_merged["company_rate"] = df_merged["pv_company"] / total_pv * 100
-        df_merged["download_rate"] = df_merged["pv_download"] / total_pv * 100
-        # pv_search は除外（InfoBoxドメインに該当ページなし）
-
-        # 7. インテントスコア取得（BigQuery first_party_score）
-        # ORGIDをcorporate_idとして使用（要確認）
-        orgids = df_merged["ORGID"].dropna().unique().tolist()
-        if orgids:
-            orgids_sql = ",".join([f"'{o}'" for o in orgids[:500]])  # 上限500
-            intent_query = f"""
-            SELECT 
-                CAST(first_party_corporate_id AS STRING) AS org_id,
-                AVG(CASE WHEN intent_level = 3 THEN 1 ELSE 0 END) * 100 AS high_intent_rate,
-                AVG(CASE WHEN intent_level = 2 THEN 1 ELSE 0 END) * 100 AS middle_intent_rate,
-                COUNT(DISTINCT corporate_id) AS intent_company_count,
-                MAX(change_date) AS latest_intent_change_date,
-                MAX(CASE WHEN intent_level = 3 THEN 1 ELSE 0 END) AS intent_activation_flag,
-                MAX(
-                    CASE
-                        WHEN change_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-                        THEN 1
-                        ELSE 0
-                    END
-                ) AS intent_recent_change_flag
-            FROM `gree-dionysus-infobox.production_infobox.first_party_score_company_latest`
-            WHERE CAST(first_party_corporate_id AS STRING) IN ({orgids_sql})
-            GROUP BY 1
-            """
-            try:
-                df_intent = query_bq(intent_query)
-                if len(df_intent) > 0:
-                    df_merged = df_merged.merge(
-                        df_intent,
-                        left_on="ORGID",
-                        right_on="org_id",
-                        how="left",
-                        suffixes=("", "_intent"),
-                    )
-            except Exception:
-                pass
-
-            sfa_intent_query = f"""
-            SELECT 
-                CAST(s.first_party_corporate_id AS STRING) AS org_id,
-                MAX(
-                    CASE
-                        WHEN REGEXP_CONTAINS(c.original_category_name, r'(SFA|営業支援|CRM|セールス)') THEN 1
-                        ELSE 0
-                    END
-                ) AS sfa_intent_flag,
-                COUNT(DISTINCT CASE
-                    WHEN REGEXP_CONTAINS(c.original_category_name, r'(SFA|営業支援|CRM|セールス)')
-                    THEN s.corporate_id
-                    ELSE NULL
-                END) AS sfa_intent_company_count
-            FROM `gree-dionysus-infobox.production_infobox.company_category_daily_v3` c
-            JOIN `gree-dionysus-infobox.production_infobox.first_party_score_company_latest` s
-              ON CAST(c.corporate_id AS INT64) = s.corporate_id
-            WHERE c.view_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-              AND s.change_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-              AND s.intent_level IN (2, 3)
-              AND CAST(s.first_party_corporate_id AS STRING) IN ({orgids_sql})
-            GROUP BY 1
-            """
-            try:
-                df_sfa_intent = query_bq(sfa_intent_query)
-                if len(df_sfa_intent) > 0:
-                    df_merged = df_merged.merge(
-                        df_sfa_intent,
-                        left_on="ORGID",
-                        right_on="org_id",
-                        how="left",
-                        suffixes=("", "_sfa"),
-                    )
-            except Exception:
-                pass
-
-        if "sfa_intent_flag" in df_merged.columns:
-            df_merged["sfa_intent_flag"] = (
-                df_merged["sfa_intent_flag"].fillna(0).astype(int)
+            reason_index = CompanyNameIndex(df_churn_reason_latest["company_name_norm"])
+            reason_match = reason_index.match(df_merged["company_name_norm"], threshold=0.85)
+            if "BQ_COMPANY_NAME" in df_merged.columns:
+                bq_reason_match = reason_index.match(df_merged["BQ_COMPANY_NAME"], threshold=0.85)
+                use_bq_name = bq_reason_match["score"] > reason_match["score"]
+                reason_match.loc[use_bq_name] = bq_reason_match.loc[use_bq_name]
+
+            df_reason_aligned = (
+                df_churn_reason_latest.drop(columns=["company_name_norm"])
+                .reset_index(drop=True)
+                .reindex(reason_match["match_index"].to_numpy())
+                .set_axis(df_merged.index)
             )
-        else:
-            df_merged["sfa_intent_flag"] = 0
-
-        if "sfa_intent_company_count" in df_merged.columns:
-            df_merged["sfa_intent_company_count"] = (
-                df_merged["sfa_intent_company_count"].fillna(0).astype(int)
-            )
-        else:
-            df_merged["sfa_intent_company_count"] = 0
-
-        if "intent_activation_flag" in df_merged.columns:
-            df_merged["intent_activation_flag"] = (
-                df_merged["intent_activation_flag"].fillna(0).astype(int)
-            )
-        else:
-            df_merged["intent_activation_flag"] = 0
-
-        if "intent_recent_change_flag" in df_merged.columns:
-            df_merged["intent_recent_change_flag"] = (
-                df_merged["intent_recent_change_flag"].fillna(0).astype(int)
-            )
-        else:
-            df_merged["intent_recent_change_flag"] = 0
-
-        high_series = (
-            df_merged["high_intent_rate"]
-            if "high_intent_rate" in df_merged.columns
-            else pd.Series(0, index=df_merged.index)
-        )
-        middle_series = (
-            df_merged["middle_intent_rate"]
-            if "middle_intent_rate" in df_merged.columns
-            else pd.Series(0, index=df_merged.index)
-        )
-        sfa_series = (
-            df_merged["sfa_intent_flag"]
-            if "sfa_intent_flag" in df_merged.columns
-            else pd.Series(0, index=df_merged.index)
-        )
-        df_merged["intent_interest_flag"] = (
-            (high_series.fillna(0) > 0)
-            | (middle_series.fillna(0) > 0)
-            | (sfa_series.fillna(0) > 0)
-        ).astype(int)
-
-        df_merged["intent_recent_change_activation_flag"] = (
-            (df_merged["intent_recent_change_flag"] > 0)
-            & (df_merged["intent_activation_flag"] > 0)
-        ).astype(int)
+            df_merged = df_merged.join(df_reason_aligned, rsuffix="_reason")
+            df_merged["reason_match_score"] = reason_match["score"].where(reason_match["match_index"] >= 0)
 
         mo.md(
             f"""
             **統合結果**:
             - 統合後行数: {len(df_merged):,}
             - ORGID結合成功: {df_merged['ORGID'].notna().sum():,}
-            - GA結合成功: {df_merged['sessions'].notna().sum():,}
             """
         )
     else:
@@ -2220,18 +1975,8 @@ def _(df_merged, mo):
     company_col = next((c for c in ["BQ_COMPANY_NAME", "CompanyName", "COMPANY_NAME"] if c in df_merged.columns), None) if len(df_merged) > 0 else None
     display_cols = [
         company_col, "INDUSTRY_ID", "EMPLOYEE_COUNT", "ADDRESS",
-        "status", "is_churned", "ORGID",
-        "sessions", "page_views", "users",
-        "list_rate", "download_rate",
-        "sfa_intent_flag", "sfa_intent_company_count", "intent_interest_flag",
-        "intent_activation_flag",
-        "intent_recent_change_flag",
-        "intent_recent_change_activation_flag",
-        "latest_intent_change_date",
-        "companylist_count", "peoplelist_count",
-        "companylist_company_count", "peoplelist_keyman_count",
-        "companylist_top_companies", "peoplelist_top_keymen",
-        "loss_type", "loss_reason", "loss_detail",
+        "status", "is_churned", "ORGID", "current_contract_end_date",
+        "loss_type", "loss_reason", "loss_detail", "reason_match_score",
     ]
     cols_exist = [c for c in display_cols if c and c in df_merged.columns] if len(df_merged) > 0 else []
     df_display = df_merged[cols_exist].head(30) if cols_exist else df_merged.head(30)
@@ -2242,75 +1987,182 @@ def _(df_merged, mo):
 @app.cell
 def _(mo):
     mo.md("""
-    ## 7. ロジスティック回帰（チャーン寄与度）
+    ## 6-b. 時点整合特徴量（特徴量ストア）
+
+    GA・CompanyList/PeopleList・メモ・インテントの月次スナップショットを `data/churn_features.duckdb` に保存し、
+    未保存の完了月だけを取得します（通常は最新月のみ）。解約企業は現契約終了日の前月まで、
+    契約中企業は当月の前月までの直近3ヶ月の月平均を特徴量として使うため、解約後のデータは混入しません。
     """)
     return
 
 
 @app.cell
-def _(df_merged, mo, pd):
-    df_importance = pd.DataFrame()
+def _(mo):
+    refresh_features_button = mo.ui.run_button(label="特徴量ストアを更新（未保存の月のみ取得）")
+    refresh_features_button
+    return (refresh_features_button,)
 
-    if len(df_merged) > 0:
-        try:
-            from sklearn.linear_model import LogisticRegression
-            from sklearn.preprocessing import StandardScaler
-
-            # 特徴量選択
-            feature_cols = [
-                "sessions", "page_views", "users",
-                "sessions_per_user", "page_views_per_user",
-                "pv_list", "pv_company", "pv_download",
-                "list_rate", "download_rate",
-            ]
-            # インテント指標があれば追加
-            if "high_intent_rate" in df_merged.columns:
-                feature_cols.extend(["high_intent_rate", "middle_intent_rate", "intent_company_count"])
-
-            feature_cols = [c for c in feature_cols if c in df_merged.columns]
-
-            # 欠損値を除外
-            df_ml = df_merged[["is_churned"] + feature_cols].dropna()
-
-            if len(df_ml) > 10:
-                X = df_ml[feature_cols]
-                y = df_ml["is_churned"]
-
-                # 標準化
-                scaler = StandardScaler()
-                X_scaled = scaler.fit_transform(X)
-
-                # ロジスティック回帰
-                model_logit = LogisticRegression(max_iter=1000, random_state=42)
-                model_logit.fit(X_scaled, y)
-
-                importance_data = []
-                for feat_col, coef in zip(feature_cols, model_logit.coef_[0]):
-                    importance_data.append({
-                        "特徴量": feat_col,
-                        "係数": round(coef, 4),
-                        "効果方向": "解約促進" if coef > 0 else "継続促進",
-                        "重要度": round(abs(coef), 4),
-                    })
-                df_importance = pd.DataFrame(importance_data).sort_values("重要度", ascending=False)
 
-                mo.md(f"**学習完了**: サンプル数 {len(df_ml)}, 特徴量数 {len(feature_cols)}")
-            else:
-                mo.md("*サンプル数が不足しています（10件以上必要）*")
+@app.cell
+def _(
+    GA_DATASET_ID,
+    SF_SCHEMA,
+    df_merged,
+    mo,
+    pd,
+    query_bq,
+    query_sf,
+    refresh_features_button,
+    root_dir,
+):
+    from ai_data_lab.churn.features import ChurnFeatureStore, add_ratio_features, monthly_feature_queries
+
+    feature_store = ChurnFeatureStore(root_dir / "data" / "churn_features.duckdb")
+    _feature_outputs = []
+
+    if refresh_features_button.value:
+        def _fetch_feature_month(_month):
+            return {
+                _name: (query_bq(_sql) if _source == "bq" else query_sf(_sql))
+                for _name, (_source, _sql) in monthly_feature_queries(GA_DATASET_ID, SF_SCHEMA, _month).items()
+            }
+
+        with mo.status.spinner(title="未保存の月の特徴量を取得中..."):
+            try:
+                _written = feature_store.refresh(
+                    _fetch_feature_month,
+                    start=pd.Timestamp.today() - pd.DateOffset(months=12),
+                )
+                _feature_outputs.append(mo.md(
+                    f"✅ **追加した月**: {', '.join(f'{_m:%Y-%m}' for _m in _written) or 'なし（最新）'}"
+                ))
+            except Exception as _feature_err:
+                _feature_outputs.append(mo.md(f"**特徴量ストア更新エラー**: `{_feature_err}`"))
+
+    df_asof_features = pd.DataFrame()
+    asof_feature_cols = []
+    if feature_store.months() and len(df_merged) > 0:
+        # 解約企業は現契約終了日、契約中企業は当日を基準日（as-of）とする
+        _as_of_date = (
+            pd.to_datetime(df_merged["current_contract_end_date"], errors="coerce").where(df_merged["is_churned"] == 1)
+            if "current_contract_end_date" in df_merged.columns
+            else pd.Series(pd.NaT, index=df_merged.index)
+        )
+        df_asof_features = add_ratio_features(pd.concat(
+            [
+                df_merged[["ORGID", "is_churned"]],
+                feature_store.as_of(df_merged.assign(as_of_date=_as_of_date), date_col="as_of_date", months=3),
+            ],
+            axis=1,
+        ))
+        asof_feature_cols = [
+            c for c in df_asof_features.columns if c not in ("ORGID", "is_churned", "as_of_month", "months_observed")
+        ]
+        _stored_months = feature_store.months()
+        _feature_outputs.append(mo.md(
+            f"**保存済みスナップショット**: {_stored_months[0]:%Y-%m} 〜 {_stored_months[-1]:%Y-%m}（{len(_stored_months)} ヶ月）"
+        ))
+    else:
+        _feature_outputs.append(mo.md("*特徴量スナップショットがありません。ボタンから更新してください*"))
+
+    mo.vstack(_feature_outputs)
+    return asof_feature_cols, df_asof_features
+
+
+@app.cell
+def _(mo):
+    mo.md("""
+    ## 6-c. 解約企業 vs 契約中企業（時点整合特徴量）
+
+    各企業の基準日より前の3ヶ月平均で比較します。観測月のない企業は比較・学習から除外されます。
+    """)
+    return
+
 
-        except ImportError as e:
-            mo.md(f"**scikit-learn未インストール**: `{e}`")
-        except Exception as e:
-            mo.md(f"**ML実行エラー**: `{e}`")
+@app.cell
+def _(asof_feature_cols, df_asof_features, mo):
+    if len(df_asof_features) > 0:
+        _grouped = df_asof_features.groupby("is_churned")[asof_feature_cols]
+        df_asof_comparison = (
+            _grouped.median().T.rename(columns={0: "契約中_中央値", 1: "解約_中央値"})
+            .join(_grouped.mean().T.rename(columns={0: "契約中_平均", 1: "解約_平均"}))
+            .reset_index(names="特徴量")
+        )
+        if {"契約中_平均", "解約_平均"} <= set(df_asof_comparison.columns):
+            df_asof_comparison["差（解約-契約中）"] = df_asof_comparison["解約_平均"] - df_asof_comparison["契約中_平均"]
+        _comparison_output = mo.vstack([
+            mo.md(f"**観測月のある企業**: {int(df_asof_features['months_observed'].gt(0).sum()):,} / {len(df_asof_features):,} 社"),
+            mo.ui.table(df_asof_comparison.round(3), selection=None, pagination=False),
+        ])
     else:
-        mo.md("*データ統合が完了するまでお待ちください*")
-    return (df_importance,)
+        _comparison_output = mo.md("*時点整合特徴量がありません*")
+    _comparison_output
+    return
+
+
+@app.cell
+def _(mo):
+    mo.md("""
+    ## 7. ロジスティック回帰（チャーン寄与度）
+    """)
+    return
 
 
 @app.cell
-def _(df_importance, mo):
-    mo.md("### ロジスティック回帰 寄与度")
-    mo.ui.table(df_importance, pagination=False)
+def _(df_asof_features, mo, pd, root_dir):
+    # 時点整合特徴量で学習する。交差検証＋ハイパーパラメータ探索を並列実行し、学習済みモデルを保存（特徴量・データが変わった時だけ再学習）
+    from ai_data_lab.churn import class_counts, load_or_fit
+    from ai_data_lab.churn.model import DEFAULT_FEATURES, MIN_CLASS_ROWS
+
+    df_importance = pd.DataFrame()
+    df_churn_scores = pd.DataFrame()
+    _ml_status = mo.md("*時点整合特徴量（6-b）が揃うまでお待ちください*")
+    feature_cols = [c for c in DEFAULT_FEATURES if c in df_asof_features.columns]
+    _retained, _churned = class_counts(df_asof_features, feature_cols) if len(df_asof_features) > 0 else (0, 0)
+
+    if len(df_asof_features) > 0 and min(_retained, _churned) < MIN_CLASS_ROWS:
+        _ml_status = mo.md(
+            f"*学習データが不足しています*: 解約 {_churned} 社 / 継続 {_retained} 社"
+            f"（各 {MIN_CLASS_ROWS} 社以上が必要）"
+        )
+    elif len(df_asof_features) > 0:
+        churn_model, churn_model_refit = load_or_fit(
+            df_asof_features,
+            feature_cols,
+            path=root_dir / "data" / "models" / "churn_logit.joblib",
+            n_jobs=-1,
+        )
+
+        df_importance = churn_model.coefficients().rename(
+            columns={"feature": "特徴量", "coefficient": "係数", "importance": "重要度"}
+        )
+        df_importance["係数"] = df_importance["係数"].round(4)
+        df_importance["重要度"] = df_importance["重要度"].round(4)
+        df_importance.insert(2, "効果方向", df_importance["係数"].map(lambda c: "解約促進" if c > 0 else "継続促進"))
+
+        # ポートフォリオ全体を一括スコアリング
+        df_churn_scores = df_asof_features[["ORGID"]].assign(churn_probability=churn_model.score(df_asof_features))
+        df_churn_scores = df_churn_scores.sort_values("churn_probability", ascending=False, ignore_index=True)
+
+        _ml_status = mo.md(
+            f"**{'学習完了' if churn_model_refit else '保存済みモデルを使用'}**: "
+            f"サンプル数 {churn_model.n_samples}, 特徴量数 {len(feature_cols)}, "
+            f"CV ROC-AUC {churn_model.cv_score:.3f}, 最適パラメータ `{churn_model.best_params}`"
+        )
+    _ml_status
+    return df_churn_scores, df_importance
+
+
+@app.cell
+def _(df_churn_scores, df_importance, mo):
+    mo.vstack(
+        [
+            mo.md("### ロジスティック回帰 寄与度"),
+            mo.ui.table(df_importance, pagination=False),
+            mo.md("### 解約確率（全社一括スコア）"),
+            mo.ui.table(df_churn_scores, pagination=True),
+        ]
+    )
     return
 
 
@@ -2348,7 +2200,7 @@ def _(df_merged, mo):
 
 
 @app.cell
-def _(company_selector, df_merged, pd):
+def _(asof_feature_cols, company_selector, df_asof_features, df_merged, pd):
     df_company_detail = pd.DataFrame()
 
     # company_selector.value は既にORGID（dropdown の dict では .value が値を直接返す）
@@ -2358,6 +2210,9 @@ def _(company_selector, df_merged, pd):
         df_company_detail = df_merged[
             df_merged["ORGID"] == selected_company_orgid
         ].copy()
+        # 利用・List・メモ・インテント指標は時点整合特徴量から付与（LLM判定の会社基本データにも使う）
+        if len(df_asof_features) > 0:
+            df_company_detail = df_company_detail.join(df_asof_features[asof_feature_cols])
     return (df_company_detail,)
 
 
@@ -2396,6 +2251,7 @@ def _(
     os,
     query_bq,
     query_sf,
+    root_dir,
     run_llm_button,
 ):
     _llm_outputs = []
@@ -2579,7 +2435,15 @@ def _(
                         raise ValueError("GEMINI_API_KEY または GOOGLE_API_KEY が設定されていません")
                     
                     _status.update("Geminiクライアント初期化中...")
-                    client = genai.Client(api_key=api_key)
+                    from ai_data_lab.llm.client import InstrumentedGenAIClient
+                    from ai_data_lab.llm.usage import UsageRecorder
+
+                    client = InstrumentedGenAIClient(
+                        genai.Client(api_key=api_key),
+                        notebook="22_churn_risk_dashboard",
+                        template="churn_risk_single",
+                        recorder=UsageRecorder(root_dir / "data" / "llm_usage" / "usage.jsonl"),
+                    )
 
                     # 会社データを整形
                     company_data = sample_company.iloc[0].to_dict()
@@ -2711,6 +2575,106 @@ def _(
     return
 
 
+@app.cell
+def _(mo):
+    mo.md("""
+    ### 8-2. ポートフォリオ一括リスク判定（増分）
+    会社データ・GA推移・CompanyList/PeopleList/メモ推移のフィンガープリントが変わった企業だけをLLMで再判定し、
+    `risk_level` / `risk_score` を `data/churn_risk_scores.duckdb` に保存します。ダッシュボードは保存済みの結果を即座に表示します。
+
+    夜間バッチとして実行する場合: `CHURN_RISK_BATCH=1 python notebooks/22_churn_risk_dashboard.py`
+    """)
+    return
+
+
+@app.cell
+def _(mo):
+    run_portfolio_risk_button = mo.ui.run_button(label="全社リスク判定を実行（変更のあった企業のみ）")
+    run_portfolio_risk_button
+    return (run_portfolio_risk_button,)
+
+
+@app.cell
+def _(
+    GA_DATASET_ID,
+    SF_SCHEMA,
+    asof_feature_cols,
+    df_asof_features,
+    df_merged,
+    genai,
+    mo,
+    os,
+    query_bq,
+    query_sf,
+    root_dir,
+    run_portfolio_risk_button,
+):
+    from ai_data_lab.churn.risk_assessment import (
+        RiskScoreStore,
+        build_risk_inputs,
+        gemini_assessor,
+        portfolio_trend_queries,
+        run_risk_assessment,
+    )
+    from ai_data_lab.llm.client import InstrumentedGenAIClient as InstrumentedRiskClient
+    from ai_data_lab.llm.usage import UsageRecorder as RiskUsageRecorder
+
+    risk_store = RiskScoreStore(root_dir / "data" / "churn_risk_scores.duckdb")
+    _risk_outputs = []
+    _run_batch = run_portfolio_risk_button.value or os.getenv("CHURN_RISK_BATCH") == "1"
+
+    if _run_batch and genai is not None and len(df_merged) > 0:
+        _api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if not _api_key:
+            _risk_outputs.append(mo.md("❌ `GEMINI_API_KEY` または `GOOGLE_API_KEY` が設定されていません"))
+        else:
+            with mo.status.spinner(title="全社の推移データを取得中（4クエリ）...") as _status:
+                _trends = {}
+                _trend_errors = []
+                for _key, (_source, _sql) in portfolio_trend_queries(GA_DATASET_ID, SF_SCHEMA).items():
+                    try:
+                        _trends[_key] = query_bq(_sql) if _source == "bq" else query_sf(_sql)
+                    except Exception as _trend_err:
+                        _trend_errors.append(f"{_key}: {_trend_err}")
+
+                if _trend_errors:
+                    # 欠損データで全社のフィンガープリントが変わらないよう、取得失敗時は判定しない
+                    _risk_outputs.append(mo.md("⚠️ 推移データの取得に失敗したため判定をスキップしました:\n\n" + "\n".join(f"- `{e}`" for e in _trend_errors)))
+                else:
+                    _status.update("変更のあった企業をLLMで判定中...")
+                    # 時点整合特徴量はフィンガープリント対象外のプロンプト文脈として渡す
+                    _risk_companies = (
+                        df_merged.join(df_asof_features[asof_feature_cols]) if len(df_asof_features) > 0 else df_merged
+                    )
+                    _risk_summary = run_risk_assessment(
+                        build_risk_inputs(_risk_companies, _trends),
+                        gemini_assessor(InstrumentedRiskClient(
+                            genai.Client(api_key=_api_key),
+                            notebook="22_churn_risk_dashboard",
+                            template="churn_risk_batch",
+                            recorder=RiskUsageRecorder(root_dir / "data" / "llm_usage" / "usage.jsonl"),
+                        )),
+                        risk_store,
+                        max_workers=4,
+                    )
+                    _risk_outputs.append(mo.md(
+                        f"✅ **再判定**: {len(_risk_summary.scored):,} 社 / **変更なし（スキップ）**: {len(_risk_summary.unchanged):,} 社 / **失敗**: {len(_risk_summary.failures):,} 社"
+                    ))
+
+    df_risk_scores = risk_store.read()
+    if len(df_risk_scores) > 0:
+        _risk_outputs.append(mo.md(f"**保存済みリスク判定**: {len(df_risk_scores):,} 社（最終判定: {df_risk_scores['scored_at'].max()}）"))
+        _risk_outputs.append(mo.ui.table(
+            df_risk_scores[["orgid", "risk_level", "risk_score", "reason", "trend_analysis", "scored_at"]],
+            pagination=True,
+        ))
+    else:
+        _risk_outputs.append(mo.md("*保存済みのリスク判定はありません。ボタンから一括判定を実行してください*"))
+
+    mo.vstack(_risk_outputs)
+    return (df_risk_scores,)
+
+
 @app.cell
 def _(mo):
     mo.md("""
@@ -2720,7 +2684,7 @@ def _(mo):
 
 
 @app.cell
-def _(df_competitor_intent, df_importance, df_merged, mo):
+def _(df_asof_features, df_competitor_intent, df_importance, df_merged, mo):
     summary_parts = []
 
     if len(df_merged) > 0:
@@ -2728,10 +2692,10 @@ def _(df_competitor_intent, df_importance, df_merged, mo):
         active = len(df_merged) - churned
         summary_parts.append(f"- **企業数**: 解約 {churned}, 契約中 {active}")
 
-        if "sessions" in df_merged.columns:
-            avg_sessions = df_merged[df_merged["is_churned"] == 0]["sessions"].mean()
-            avg_sessions_churned = df_merged[df_merged["is_churned"] == 1]["sessions"].mean()
-            summary_parts.append(f"- **平均セッション**: 契約中 {avg_sessions:.1f}, 解約 {avg_sessions_churned:.1f}")
+        if "sessions" in df_asof_features.columns:
+            avg_sessions = df_asof_features[df_asof_features["is_churned"] == 0]["sessions"].mean()
+            avg_sessions_churned = df_asof_features[df_asof_features["is_churned"] == 1]["sessions"].mean()
+            summary_parts.append(f"- **平均月間セッション（基準日前3ヶ月）**: 契約中 {avg_sessions:.1f}, 解約 {avg_sessions_churned:.1f}")
 
     if len(df_importance) > 0:
         top_factors = df_importance.head(3)["特徴量"].tolist()
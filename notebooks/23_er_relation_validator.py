@@ -31,25 +31,37 @@ def _():
     if str(root_dir / "src") not in sys.path:
         sys.path.insert(0, str(root_dir / "src"))
 
+    from ai_data_lab.cache import ResultCache, today_version
     from ai_data_lab.connectors.bigquery import BigQueryConnector
+    from ai_data_lab.relations import profile_relations
 
     return (
         BigQueryConnector,
         Path,
+        ResultCache,
         default_backend,
         load_dotenv,
         mo,
         os,
         pd,
+        profile_relations,
         root_dir,
         serialization,
         snowflake,
         snowflake_error,
         sys,
+        today_version,
         tomllib,
     )
 
 
+@app.cell
+def _(ResultCache, root_dir):
+    # 検証クエリの結果をディスクにキャッシュ（カーネル再起動後も日付が変わるまで再利用）
+    result_cache = ResultCache(root_dir / "data" / "cache" / "cell_results")
+    return (result_cache,)
+
+
 @app.cell
 def _(mo):
     mo.md(
@@ -717,109 +729,34 @@ def _(build_relation_note, pd):
 
 
 @app.cell
-def _(get_snowflake_connection, pd):
+def _(get_snowflake_connection, profile_relations, result_cache, today_version):
+    @result_cache.cached(name="er_sf_relations", versions=today_version)
     def run_sf_relations(relations, sf_db_name, sf_schema_name):
-        results = []
+        # 子テーブルごとに1クエリ（LEFT JOIN 1回 + 条件付き集計）で全指標を計算
         conn = get_snowflake_connection()
+
+        def query(sql):
+            cur = conn.cursor()
+            try:
+                cur.execute(sql)
+                return cur.fetch_pandas_all()
+            finally:
+                cur.close()
+
         try:
-            for rel in relations:
-                parent_full = f"{sf_db_name}.{sf_schema_name}.{rel['parent_table']}"
-                child_full = f"{sf_db_name}.{sf_schema_name}.{rel['child_table']}"
-                child_key = rel["child_key"]
-                parent_key = rel["parent_key"]
-                query = f"""
-                SELECT
-                    (SELECT COUNT(*) FROM {parent_full}) AS parent_count,
-                    (SELECT COUNT(*) FROM {child_full}) AS child_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {parent_full} p
-                        JOIN {child_full} c
-                          ON p.{parent_key} = c.{child_key}
-                    ) AS join_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        LEFT JOIN {parent_full} p
-                          ON p.{parent_key} = c.{child_key}
-                        WHERE c.{child_key} IS NOT NULL
-                          AND p.{parent_key} IS NULL
-                    ) AS orphan_fk_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NULL
-                    ) AS null_fk_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NOT NULL
-                          AND TRIM(TO_VARCHAR(c.{child_key})) != TO_VARCHAR(c.{child_key})
-                    ) AS trim_mismatch_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NOT NULL
-                          AND UPPER(TO_VARCHAR(c.{child_key})) != TO_VARCHAR(c.{child_key})
-                    ) AS uppercase_mismatch_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NOT NULL
-                          AND REGEXP_LIKE(TO_VARCHAR(c.{child_key}), '[a-z]')
-                    ) AS lowercase_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NOT NULL
-                          AND REGEXP_LIKE(TO_VARCHAR(c.{child_key}), '[^\\x00-\\x7F]')
-                    ) AS non_ascii_count,
-                    (
-                        SELECT COUNT(*)
-                        FROM {child_full} c
-                        WHERE c.{child_key} IS NOT NULL
-                          AND REGEXP_LIKE(TO_VARCHAR(c.{child_key}), '[\\x00-\\x1F\\x7F]')
-                    ) AS control_char_count
-                """
-                row_dict = {}
-                try:
-                    cur = conn.cursor()
-                    cur.execute(query)
-                    row_df = cur.fetch_pandas_all()
-                    if len(row_df) > 0:
-                        row_dict = row_df.iloc[0].to_dict()
-                except Exception as exc:
-                    row_dict = {"error": str(exc)}
-                finally:
-                    try:
-                        cur.close()
-                    except Exception:
-                        pass
-                row_dict.update(
-                    {
-                        "relation_id": rel["relation_id"],
-                        "parent_table": rel["parent_table"],
-                        "parent_key": rel["parent_key"],
-                        "child_table": rel["child_table"],
-                        "child_key": rel["child_key"],
-                        "relation_group": rel["relation_group"],
-                        "parent_table_full": parent_full,
-                        "child_table_full": child_full,
-                    }
-                )
-                results.append(row_dict)
+            return profile_relations(relations, query, f"{sf_db_name}.{sf_schema_name}")
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
-        return pd.DataFrame(results)
 
     return (run_sf_relations,)
 
 
 @app.cell
-def _(BigQueryConnector, pd):
+def _(BigQueryConnector, pd, result_cache, today_version):
+    @result_cache.cached(name="er_bq_relations", versions=today_version)
     def run_bq_relations(relations, bq_project_id, bq_dataset_name):
         results = []
         connector = BigQueryConnector(project_id=bq_project_id)
@@ -912,7 +849,7 @@ def _(BigQueryConnector, pd):
 
 
 @app.cell
-def _(BigQueryConnector, get_snowflake_connection, pd):
+def _(BigQueryConnector, get_snowflake_connection, pd, result_cache, today_version):
     def format_in_list(values):
         cleaned = []
         for value in values:
@@ -922,6 +859,7 @@ def _(BigQueryConnector, get_snowflake_connection, pd):
             cleaned.append(f"'{value_str}'")
         return ", ".join(cleaned)
 
+    @result_cache.cached(name="er_cross_relations", versions=today_version)
     def run_cross_relations(relations, sf_db_name, sf_schema_name, bq_project_id, bq_dataset_name, sample_size):
         results = []
         connector = BigQueryConnector(project_id=bq_project_id)
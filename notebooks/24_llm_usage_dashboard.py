@@ -0,0 +1,75 @@
+import marimo
+
+__generated_with = "0.17.8"
+app = marimo.App(width="full")
+
+
+@app.cell
+def _():
+    import marimo as mo
+    return (mo,)
+
+
+@app.cell
+def _(mo):
+    mo.md(
+        """
+        # LLM利用量・レイテンシ ダッシュボード
+
+        各notebookの共有LLMクライアントが `data/llm_usage/usage.jsonl` に記録した
+        トークン数・レイテンシ・リトライ・キャッシュヒット率・エラー種別を集計します。
+        同じ集計は CLI でも確認できます: `python -m ai_data_lab.llm.usage`
+        """
+    )
+    return
+
+
+@app.cell
+def _():
+    import sys
+    from pathlib import Path
+
+    project_root = Path.cwd().parent if Path.cwd().name == "notebooks" else Path.cwd()
+    if str(project_root / "src") not in sys.path:
+        sys.path.insert(0, str(project_root / "src"))
+
+    from ai_data_lab.llm.usage import SUMMARY_KEYS, UsageRecorder, summarize_usage
+
+    usage_recorder = UsageRecorder(project_root / "data" / "llm_usage" / "usage.jsonl")
+    df_usage_events = usage_recorder.load()
+    return SUMMARY_KEYS, df_usage_events, summarize_usage, usage_recorder
+
+
+@app.cell
+def _(SUMMARY_KEYS, mo):
+    usage_group_by = mo.ui.multiselect(
+        options=list(SUMMARY_KEYS),
+        value=list(SUMMARY_KEYS),
+        label="集計キー: ",
+    )
+    usage_group_by
+    return (usage_group_by,)
+
+
+@app.cell
+def _(df_usage_events, mo, summarize_usage, usage_group_by, usage_recorder):
+    if df_usage_events.empty:
+        _usage_view = mo.md(f"*利用記録がありません: `{usage_recorder.path}`*")
+    else:
+        df_usage_summary = summarize_usage(df_usage_events, by=usage_group_by.value or ["notebook"])
+        _api_events = df_usage_events[~df_usage_events["cache_hit"].astype(bool)]
+        _usage_view = mo.vstack([
+            mo.md(f"""
+            **API呼び出し**: {len(_api_events):,} 回 /
+            **入力トークン**: {int(_api_events["tokens_in"].sum()):,} /
+            **出力トークン**: {int(_api_events["tokens_out"].sum()):,} /
+            **エラー**: {int(_api_events["error_class"].notna().sum()):,} 回
+            """),
+            mo.ui.table(df_usage_summary, selection=None),
+        ])
+    _usage_view
+    return
+
+
+if __name__ == "__main__":
+    app.run()
@@ -30,6 +30,11 @@ def __():
     REPORTS_DIR = Path(os.getenv("REPORTS_DIR", "reports/comprehensive_analysis"))
     AGENT_PORT = os.getenv("AGENT_PORT", "unknown")
 
+    # プロジェクトルートをパスに追加
+    project_root = Path.cwd().parent if Path.cwd().name == "notebooks" else Path.cwd()
+    if str(project_root / "src") not in sys.path:
+        sys.path.insert(0, str(project_root / "src"))
+
     # ディレクトリ作成
     VIZ_DIR = REPORTS_DIR / "visualizations" / "phase3"
     VIZ_DIR.mkdir(parents=True, exist_ok=True)
@@ -68,6 +73,7 @@ def __():
         os,
         pd,
         plt,
+        project_root,
         sns,
         sys,
     )
@@ -204,6 +210,122 @@ def __(Counter, VIZ_DIR, all_data, mo, plt, sns, text_col, text_columns):
     )
 
 
+@app.cell
+def __(Counter, VIZ_DIR, all_data, mo, plt, project_root, sns, text_col, text_columns):
+    # 頻出キーワード（名詞）抽出
+    # Janome をプロセス並列で実行し、トークン列はテキストハッシュ単位でキャッシュ（再実行時は再解析しない）
+    from ai_data_lab.text import TokenizerService
+
+    keyword_stopwords = {
+        "こと", "もの", "ため", "よう", "さん", "ちゃん", "くん", "これ", "それ", "あれ",
+        "ここ", "そこ", "今日", "明日", "昨日", "自分", "感じ", "気持ち", "ところ",
+        "RT", "http", "https", "co", "amp", "ww", "www",
+    }
+
+    if text_columns and not all_data.empty:
+        keyword_tokenizer = TokenizerService(project_root / "data" / "cache" / "janome_tokens.duckdb")
+        keyword_lists = keyword_tokenizer.nouns(
+            all_data[text_col].dropna().astype(str).tolist(), stopwords=keyword_stopwords
+        )
+        keyword_counts = Counter(word for words in keyword_lists for word in words).most_common(20)
+
+        if keyword_counts:
+            fig6, ax6 = plt.subplots(figsize=(12, 8), dpi=300)
+            keywords = [word for word, _ in keyword_counts]
+            keyword_freqs = [count for _, count in keyword_counts]
+
+            ax6.barh(range(len(keywords)), keyword_freqs, color=sns.color_palette("viridis", len(keywords)))
+            ax6.set_yticks(range(len(keywords)))
+            ax6.set_yticklabels(keywords)
+            ax6.invert_yaxis()
+            ax6.set_xlabel("出現回数", fontsize=12)
+            ax6.set_title("頻出キーワード（名詞） TOP 20", fontsize=14, fontweight="bold")
+
+            plt.tight_layout()
+            img_path_6 = VIZ_DIR / "06_top_keywords.png"
+            plt.savefig(img_path_6, dpi=300, bbox_inches="tight")
+            plt.close()
+
+            mo.md(
+                f"![頻出キーワード]({img_path_6})\n\n"
+                f"*トークンキャッシュ: {keyword_tokenizer.hits:,} hit / {keyword_tokenizer.misses:,} miss*"
+            )
+        else:
+            img_path_6 = None
+            mo.md("*キーワードが見つかりません*")
+    else:
+        img_path_6 = None
+        keyword_counts = []
+        mo.md("*テキストデータがありません*")
+
+    return keyword_counts, img_path_6
+
+
+@app.cell
+def __(DATA_DIR, mo, pd, project_root, text_col, text_columns):
+    # グループ×期間別 TF-IDF 特徴語（アウトオブコア）
+    # Parquet をバッチで読み、ハッシュ化した疎行列を (グループ, 月) 単位でディスクに追記、IDF はバッチ間で累積
+    # 取り込み済みバッチは batch_id（ファイル名@サイズ-更新時刻#番号）で判定してスキップし、変更されたファイルの古いバッチは削除
+    from ai_data_lab.text import TermFeatureStore, iter_parquet_batches
+    from ai_data_lab.text import TokenizerService as _TokenizerService
+
+    term_store_dir = DATA_DIR / "term_features"
+    term_period_candidates = ["created_at", "tweet_created_at", "posted_at", "timestamp", "date"]
+    group_term_tables = {}
+
+    if text_columns:
+        term_store = TermFeatureStore(
+            term_store_dir,
+            tokenizer=_TokenizerService(project_root / "data" / "cache" / "janome_tokens.duckdb").nouns,
+        )
+        for sample_name in ("group_data_sample.parquet", "individual_data_sample.parquet"):
+            sample_path = DATA_DIR / sample_name
+            if not sample_path.exists():
+                continue
+            _sample_stat = sample_path.stat()
+            _source_version = f"{sample_name}@{_sample_stat.st_size}-{_sample_stat.st_mtime_ns}"
+            for _stale_batch in term_store.batch_ids():
+                if _stale_batch.startswith(f"{sample_name}@") and not _stale_batch.startswith(f"{_source_version}#"):
+                    term_store.drop_batch(_stale_batch)
+
+            for _batch_index, df_term_batch in enumerate(iter_parquet_batches(sample_path, batch_size=20_000)):
+                if text_col not in df_term_batch.columns:
+                    continue
+                _period_col = next((c for c in term_period_candidates if c in df_term_batch.columns), None)
+                if _period_col:
+                    df_term_batch["_period"] = (
+                        pd.to_datetime(df_term_batch[_period_col], errors="coerce", utc=True)
+                        .dt.strftime("%Y-%m")
+                        .fillna("unknown")
+                    )
+                term_store.add_batch(
+                    df_term_batch,
+                    text_col=text_col,
+                    group_col="_source_table" if "_source_table" in df_term_batch.columns else None,
+                    period_col="_period" if _period_col else None,
+                    batch_id=f"{_source_version}#{_batch_index}",
+                )
+
+        for term_key in term_store.keys()[:5]:
+            group_term_tables[" / ".join(term_key)] = term_store.term_weights(term_key, top=15)
+
+    if group_term_tables:
+        term_summary = pd.DataFrame(
+            {
+                term_group: df_terms["term"].reset_index(drop=True)
+                for term_group, df_terms in group_term_tables.items()
+            }
+        )
+        mo.vstack([
+            mo.md("### 🔑 グループ×期間別 TF-IDF 特徴語 TOP 15"),
+            mo.ui.table(term_summary, selection=None),
+        ])
+    else:
+        mo.md("*TF-IDF を計算できるテキストデータがありません*")
+
+    return group_term_tables, term_store_dir
+
+
 @app.cell
 def __(VIZ_DIR, group_data, mo, plt, sns):
     # グループ別の投稿時間分析（仮想データ）
@@ -262,7 +384,7 @@ def __(VIZ_DIR, group_data, mo, plt, sns):
 
 
 @app.cell
-def __(REPORTS_DIR, VIZ_DIR, datetime, img_path_3, img_path_4, img_path_5, mo):
+def __(REPORTS_DIR, VIZ_DIR, datetime, img_path_3, img_path_4, img_path_5, img_path_6, mo):
     # Phase 3完了レポート
     report_md_3 = f"""# Phase 3: テキストマイニング 完了レポート
 
@@ -282,11 +404,15 @@ def __(REPORTS_DIR, VIZ_DIR, datetime, img_path_3, img_path_4, img_path_5, mo):
 
 ![時間帯分布]({img_path_5.relative_to(REPORTS_DIR) if img_path_5 else "N/A"})
 
+### 4. 頻出キーワード（名詞） TOP 20
+
+![頻出キーワード]({img_path_6.relative_to(REPORTS_DIR) if img_path_6 else "N/A"})
+
 ## ✅ 完了ステータス
 
 Phase 3のテキストマイニングが正常に完了しました。
 
-- **生成画像数**: 3 枚
+- **生成画像数**: 4 枚
 - **解像度**: 300 DPI
 - **保存先**: `{VIZ_DIR.relative_to(REPORTS_DIR)}`
 
@@ -0,0 +1,290 @@
+"""Persistent cache of notebook cell results across kernel restarts.
+
+A result (a DataFrame, or a tuple/list/dict of DataFrames) is stored as Arrow
+IPC files under a key hashed from the function's source, fingerprints of its
+arguments and the caller's upstream data versions (e.g. the date the warehouse
+was last loaded). A restarted notebook reads the files back instead of
+re-running the warehouse queries. Entries can be invalidated by name, and the
+least recently used ones are evicted once the cache exceeds ``max_bytes``.
+
+Wrap a function (``ResultCache.cached``) or a block inside a cell
+(``ResultCache.entry``)::
+
+    load_posts = result_cache.cached(name="posts", versions=today_version)(connector.query)
+    df_posts = load_posts(sql)
+
+    with result_cache.entry("ga_pages", inputs=(sql,), versions=today_version) as entry:
+        if not entry.hit:
+            entry.value = query_bq(sql)
+    df_pages = entry.value
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Mapping
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_PATH = Path("data") / "cache" / "cell_results"
+
+Versions = Mapping[str, Any] | Callable[[], Mapping[str, Any]] | None
+
+_META = "meta.json"
+
+
+def today_version() -> dict[str, str]:
+    """Upstream version for sources refreshed once a day: today's date."""
+    return {"date": date.today().isoformat()}
+
+
+def fingerprint(value: Any) -> str:
+    """Stable hash of an argument; DataFrames and arrays are hashed by content."""
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, value)
+    return digest.hexdigest()
+
+
+def _update(digest: "hashlib._Hash", value: Any) -> None:
+    if isinstance(value, pd.DataFrame):
+        digest.update(b"frame")
+        digest.update(repr((list(map(str, value.columns)), list(map(str, value.dtypes)))).encode("utf-8"))
+        digest.update(_frame_bytes(value))
+    elif isinstance(value, (pd.Series, pd.Index)):
+        _update(digest, value.to_frame())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"array{value.dtype}{value.shape}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else pickle.dumps(value))
+    elif isinstance(value, Mapping):
+        digest.update(b"map")
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"seq{len(value)}".encode("utf-8"))
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        _update(digest, sorted(value, key=repr))
+    elif callable(value) and not isinstance(value, type):
+        digest.update(source_fingerprint(value).encode("utf-8"))
+    else:
+        # Scalars, paths, timestamps; objects without a stable repr simply never hit.
+        digest.update(f"{type(value).__qualname__}:{value!r}".encode("utf-8"))
+    digest.update(b"\0")
+
+
+def _frame_bytes(frame: pd.DataFrame) -> bytes:
+    try:
+        return pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes()
+    except TypeError:  # unhashable cells such as lists
+        return pickle.dumps(frame)
+
+
+def source_fingerprint(func: Callable[..., Any]) -> str:
+    """Hash of a function's source (bytecode when the source is unavailable)."""
+    func = inspect.unwrap(getattr(func, "__func__", func))
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        code = getattr(func, "__code__", None)
+        source = repr((getattr(func, "__qualname__", repr(func)), code.co_code if code else None))
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _resolve_versions(versions: Versions) -> dict[str, Any]:
+    if versions is None:
+        return {}
+    return dict(versions() if callable(versions) else versions)
+
+
+def _write_frame(frame: pd.DataFrame, path: Path) -> None:
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_frame(path: Path) -> pd.DataFrame:
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+class CacheEntry:
+    """Result slot of one :meth:`ResultCache.entry` block; stored on exit if set on a miss."""
+
+    def __init__(self, cache: "ResultCache", key: str, name: str) -> None:
+        self._cache = cache
+        self.key = key
+        self.name = name
+        self.hit, self.value = cache.load(key)
+
+    def __enter__(self) -> "CacheEntry":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        if exc_type is None and not self.hit and self.value is not None:
+            self._cache.store(self.key, self.value, name=self.name)
+
+
+class ResultCache:
+    """DataFrame results on disk, one directory of Arrow IPC files per key."""
+
+    def __init__(self, root: Path | str = DEFAULT_RESULT_CACHE_PATH, *, max_bytes: int = 2 * 1024**3) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name: str, source: str, args: tuple = (), kwargs: Mapping[str, Any] | None = None, versions: Versions = None) -> str:
+        payload = json.dumps(
+            {
+                "name": name,
+                "source": source,
+                "args": fingerprint(tuple(args)),
+                "kwargs": fingerprint(dict(kwargs or {})),
+                "versions": fingerprint(_resolve_versions(versions)),
+            },
+            sort_keys=True,
+        )
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def load(self, key: str) -> tuple[bool, Any]:
+        """``(True, value)`` for a stored key, else ``(False, None)``; counts hits and misses."""
+        directory = self.root / key
+        meta_path = directory / _META
+        if not meta_path.exists():
+            self.misses += 1
+            return False, None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        frames = [_read_frame(directory / f"{position}.arrow") for position in range(len(meta["parts"]))]
+        os.utime(meta_path)  # last access, for LRU eviction
+        self.hits += 1
+        kind = meta["kind"]
+        if kind == "frame":
+            return True, frames[0]
+        if kind == "dict":
+            return True, dict(zip(meta["parts"], frames))
+        return True, (tuple(frames) if kind == "tuple" else frames)
+
+    def store(self, key: str, value: Any, *, name: str = "") -> bool:
+        """Persist ``value``; returns False (and stores nothing) when it is not DataFrame-shaped or Arrow rejects it."""
+        if isinstance(value, pd.DataFrame):
+            kind, parts, frames = "frame", ["0"], [value]
+        elif isinstance(value, Mapping) and all(isinstance(item, pd.DataFrame) for item in value.values()):
+            kind, parts, frames = "dict", [str(part) for part in value], list(value.values())
+        elif isinstance(value, (tuple, list)) and all(isinstance(item, pd.DataFrame) for item in value):
+            kind, parts, frames = type(value).__name__, [str(position) for position in range(len(value))], list(value)
+        else:
+            logger.warning("Result of %s is not a DataFrame or a collection of DataFrames; not cached.", name or key)
+            return False
+
+        directory = self.root / key
+        tmp_directory = self.root / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        tmp_directory.mkdir(parents=True)
+        try:
+            for position, frame in enumerate(frames):
+                _write_frame(frame, tmp_directory / f"{position}.arrow")
+        except (pa.ArrowException, ValueError, TypeError) as exc:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            logger.warning("Result of %s could not be written as Arrow (%s); not cached.", name or key, exc)
+            return False
+        size = sum(path.stat().st_size for path in tmp_directory.iterdir())
+        meta = {"name": name, "kind": kind, "parts": parts, "bytes": size, "created_at": datetime.now().isoformat()}
+        (tmp_directory / _META).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_directory, directory)
+        self.evict()
+        return True
+
+    def entries(self) -> pd.DataFrame:
+        """Stored entries with name, size and last access, most recent first."""
+        records = []
+        for meta_path in self.root.glob(f"*/{_META}"):
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            records.append(
+                {
+                    "key": meta_path.parent.name,
+                    "name": meta.get("name", ""),
+                    "bytes": meta.get("bytes", 0),
+                    "created_at": pd.Timestamp(meta.get("created_at")),
+                    "last_access": pd.Timestamp(meta_path.stat().st_mtime, unit="s"),
+                }
+            )
+        columns = ["key", "name", "bytes", "created_at", "last_access"]
+        return pd.DataFrame(records, columns=columns).sort_values("last_access", ascending=False, ignore_index=True)
+
+    def invalidate(self, name: str | None = None) -> int:
+        """Drop every entry (``name=None``) or the entries stored under ``name``; returns how many."""
+        removed = 0
+        for meta_path in list(self.root.glob(f"*/{_META}")):
+            if name is None or json.loads(meta_path.read_text(encoding="utf-8")).get("name") == name:
+                shutil.rmtree(meta_path.parent, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        """Remove least recently used entries until the total size is at most ``max_bytes``."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        df_entries = self.entries()
+        total = int(df_entries["bytes"].sum())
+        removed = 0
+        for row in df_entries.iloc[::-1].itertuples(index=False):
+            if total <= limit:
+                break
+            shutil.rmtree(self.root / row.key, ignore_errors=True)
+            total -= row.bytes
+            removed += 1
+        return removed
+
+    def cached(
+        self,
+        func: Callable[..., Any] | None = None,
+        *,
+        name: str | None = None,
+        versions: Versions = None,
+    ) -> Any:
+        """Decorator persisting ``func``'s result per (source, arguments, ``versions``).
+
+        ``versions`` is a mapping or a zero-argument callable evaluated on
+        every call (e.g. :func:`today_version`), so a new upstream version
+        misses the cache without invalidating older entries by hand.
+        """
+
+        def decorate(inner: Callable[..., Any]) -> Callable[..., Any]:
+            entry_name = name or getattr(inner, "__qualname__", "result")
+            source = source_fingerprint(inner)
+
+            @functools.wraps(inner)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                key = self.key(entry_name, source, args, kwargs, versions)
+                hit, value = self.load(key)
+                if hit:
+                    return value
+                value = inner(*args, **kwargs)
+                self.store(key, value, name=entry_name)
+                return value
+
+            wrapper.invalidate = lambda: self.invalidate(entry_name)  # type: ignore[attr-defined]
+            return wrapper
+
+        return decorate(func) if func is not None else decorate
+
+    def entry(self, name: str, *, inputs: Any = (), versions: Versions = None) -> CacheEntry:
+        """Context manager caching the value a cell block assigns to ``entry.value``."""
+        return CacheEntry(self, self.key(name, "", (inputs,), None, versions), name)
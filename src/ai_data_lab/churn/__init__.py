@@ -0,0 +1,37 @@
+"""Churn-risk analysis helpers shared by the churn notebooks."""
+
+from .features import ChurnFeatureStore, add_ratio_features, complete_months, monthly_feature_queries
+from .ga_rollup import GaPageRollup
+from .model import ChurnModel, class_counts, feature_schema_hash, load_or_fit
+from .risk_assessment import (
+    ChurnRiskAssessment,
+    CompanyRiskInput,
+    RiskRunSummary,
+    RiskScoreStore,
+    build_risk_inputs,
+    build_risk_prompt,
+    gemini_assessor,
+    portfolio_trend_queries,
+    run_risk_assessment,
+)
+
+__all__ = [
+    "ChurnFeatureStore",
+    "ChurnModel",
+    "ChurnRiskAssessment",
+    "CompanyRiskInput",
+    "GaPageRollup",
+    "RiskRunSummary",
+    "RiskScoreStore",
+    "add_ratio_features",
+    "build_risk_inputs",
+    "build_risk_prompt",
+    "class_counts",
+    "complete_months",
+    "feature_schema_hash",
+    "gemini_assessor",
+    "load_or_fit",
+    "monthly_feature_queries",
+    "portfolio_trend_queries",
+    "run_risk_assessment",
+]
@@ -0,0 +1,355 @@
+"""Point-in-time monthly ORGID feature snapshots for the churn notebooks.
+
+Every complete calendar month is materialized once as one row per
+``(orgid, month, feature)`` in a DuckDB table; months already stored are never
+recomputed, so a refresh only queries the newest complete month. A company's
+features are read "as of" a date (for churned companies, the churn date) from
+the months that ended before that date's month started, so nothing observed
+on or after the as-of month leaks into the features.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Mapping
+
+import duckdb
+import pandas as pd
+
+DEFAULT_FEATURE_STORE_PATH = Path("data") / "churn_features.duckdb"
+
+AGGREGATIONS = ("mean", "sum", "last")
+
+MonthFetcher = Callable[[pd.Timestamp], Mapping[str, pd.DataFrame]]
+
+# Ratio features derived from the stored counts: name -> (numerator, denominator).
+RATIO_FEATURES: dict[str, tuple[str, str]] = {
+    "sessions_per_user": ("sessions", "users"),
+    "page_views_per_user": ("page_views", "users"),
+    "page_views_per_session": ("page_views", "sessions"),
+}
+
+
+def month_start(value: pd.Timestamp | str) -> pd.Timestamp:
+    """First day of ``value``'s month, timezone dropped."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return timestamp.to_period("M").to_timestamp()
+
+
+def complete_months(start: pd.Timestamp | str, through: pd.Timestamp | str | None = None) -> list[pd.Timestamp]:
+    """Month starts from ``start``'s month through ``through``'s month (default: last complete month)."""
+    last = month_start(through) if through is not None else month_start(pd.Timestamp.today()) - pd.DateOffset(months=1)
+    return list(pd.date_range(month_start(start), last, freq="MS"))
+
+
+def monthly_feature_queries(ga_dataset_id: str, sf_schema: str, month: pd.Timestamp | str) -> dict[str, tuple[str, str]]:
+    """Return ``{source_name: (source, sql)}`` computing every ORGID's features for one month.
+
+    ``source`` is ``"bq"`` or ``"sf"``; every query returns an ``ORGID`` column
+    plus numeric feature columns covering ``[month, next month)``. Intent
+    features come from the score change history so a past month sees only the
+    changes made in that month.
+    """
+    start = month_start(month)
+    end = start + pd.DateOffset(months=1)
+    ga_start, ga_end = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+    ga_sql = f"""
+    WITH base AS (
+        SELECT
+            (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
+            user_pseudo_id,
+            (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id,
+            event_name,
+            (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
+        FROM `{ga_dataset_id}.events_*`
+        WHERE _TABLE_SUFFIX >= '{ga_start}' AND _TABLE_SUFFIX < '{ga_end}'
+    )
+    SELECT
+        org_id AS ORGID,
+        COUNT(DISTINCT user_pseudo_id) AS users,
+        COUNT(DISTINCT CONCAT(user_pseudo_id, '-', CAST(session_id AS STRING))) AS sessions,
+        COUNTIF(event_name = 'page_view') AS page_views,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/companies/[a-z0-9]') AND event_name = 'page_view') AS pv_company_detail,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/company-lists|/people-lists|/leads-lists') AND event_name = 'page_view') AS pv_list,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/analysis') AND event_name = 'page_view') AS pv_analysis,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/people') AND event_name = 'page_view') AS pv_people,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/settings') AND event_name = 'page_view') AS pv_settings
+    FROM base
+    WHERE org_id IS NOT NULL
+    GROUP BY ORGID
+    """
+
+    def activity_sql(table: str, alias: str, columns: str, joins: str = "") -> str:
+        return f"""
+    SELECT
+        u.ORGID,
+        {columns}
+    FROM {sf_schema}.USERORGANIZATION u
+    JOIN {sf_schema}.USERORGRELATION ur ON u.ORGID = ur.ORGANIZATIONID
+    JOIN {sf_schema}.{table} {alias} ON {alias}.USERORGRELATIONID = ur.ID
+    {joins}
+    WHERE {alias}.CREATEDAT >= '{start:%Y-%m-%d}' AND {alias}.CREATEDAT < '{end:%Y-%m-%d}'
+    GROUP BY u.ORGID
+    """
+
+    intent_sql = f"""
+    SELECT
+        CAST(first_party_corporate_id AS STRING) AS ORGID,
+        COUNT(DISTINCT CASE WHEN intent_level = 3 THEN corporate_id END) AS high_intent_companies,
+        COUNT(DISTINCT CASE WHEN intent_level = 2 THEN corporate_id END) AS middle_intent_companies,
+        COUNT(DISTINCT corporate_id) AS intent_companies
+    FROM `gree-dionysus-infobox.production_infobox.first_party_score_company_all_history`
+    WHERE change_date >= DATE '{start:%Y-%m-%d}' AND change_date < DATE '{end:%Y-%m-%d}'
+    GROUP BY 1
+    """
+    return {
+        "ga": ("bq", ga_sql),
+        "companylist": ("sf", activity_sql("COMPANYLIST", "cl", "COUNT(DISTINCT cl.ID) AS companylist_created")),
+        "peoplelist": (
+            "sf",
+            activity_sql(
+                "PEOPLELIST",
+                "pl",
+                "COUNT(DISTINCT pl.ID) AS peoplelist_created,\n        COUNT(DISTINCT k.ID) AS keyman_registered",
+                f"LEFT JOIN {sf_schema}._KEYMANTOPEOPLELIST rel ON rel.B = pl.ID\n    LEFT JOIN {sf_schema}.KEYMAN k ON rel.A = k.ID",
+            ),
+        ),
+        "memo": ("sf", activity_sql("MEMO", "m", "COUNT(*) AS memo_created")),
+        "intent": ("bq", intent_sql),
+    }
+
+
+def add_ratio_features(
+    frame: pd.DataFrame, ratios: Mapping[str, tuple[str, str]] = RATIO_FEATURES
+) -> pd.DataFrame:
+    """``frame`` plus each ratio whose inputs are present.
+
+    A zero denominator (no activity in an observed window) gives 0; missing
+    inputs (an unobserved window) stay NaN.
+    """
+    frame = frame.copy()
+    for name, (numerator, denominator) in ratios.items():
+        if numerator in frame.columns and denominator in frame.columns:
+            ratio = frame[numerator] / frame[denominator].where(frame[denominator] != 0)
+            frame[name] = ratio.mask(frame[denominator].eq(0), 0.0)
+    return frame
+
+
+class ChurnFeatureStore:
+    """DuckDB tables holding monthly per-ORGID feature values and the months materialized.
+
+    Missing ``(orgid, month, feature)`` rows mean zero activity in a stored
+    month; months never materialized are treated as unobserved.
+    """
+
+    TABLE = "churn_feature_snapshots"
+    MONTHS_TABLE = "churn_feature_months"
+
+    def __init__(self, path: Path | str = DEFAULT_FEATURE_STORE_PATH) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    orgid VARCHAR,
+                    month DATE,
+                    feature VARCHAR,
+                    value DOUBLE,
+                    PRIMARY KEY (orgid, month, feature)
+                )
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.MONTHS_TABLE} (
+                    month DATE PRIMARY KEY,
+                    sources VARCHAR,
+                    materialized_at TIMESTAMP
+                )
+                """
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        return duckdb.connect(str(self._path))
+
+    def months(self) -> list[pd.Timestamp]:
+        """Materialized months, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT month FROM {self.MONTHS_TABLE} ORDER BY month").fetchall()
+        return [pd.Timestamp(month) for (month,) in rows]
+
+    def features(self) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT DISTINCT feature FROM {self.TABLE} ORDER BY feature").fetchall()
+        return [feature for (feature,) in rows]
+
+    def write_month(
+        self,
+        month: pd.Timestamp | str,
+        frames: Mapping[str, pd.DataFrame],
+        *,
+        orgid_col: str = "ORGID",
+    ) -> int:
+        """Replace ``month``'s snapshot with the numeric columns of ``frames`` (one row per ORGID each).
+
+        Feature names are the lower-cased column names and must be unique
+        across frames. Returns the number of non-zero values stored.
+        """
+        month = month_start(month)
+        long_frames = []
+        seen: dict[str, str] = {}
+        for name, frame in frames.items():
+            if frame is None or frame.empty:
+                continue
+            frame = frame.rename(columns=str.lower).rename(columns={orgid_col.lower(): "orgid"})
+            values = frame.drop(columns="orgid").apply(pd.to_numeric, errors="coerce")
+            for feature in values.columns:
+                if feature in seen:
+                    raise ValueError(f"Feature {feature!r} is produced by both {seen[feature]!r} and {name!r}.")
+                seen[feature] = name
+            long_frames.append(
+                values.assign(orgid=frame["orgid"].astype(str))
+                .dropna(subset=["orgid"])
+                .melt(id_vars="orgid", var_name="feature", value_name="value")
+            )
+        df_long = pd.concat(long_frames, ignore_index=True) if long_frames else pd.DataFrame(
+            {"orgid": pd.Series(dtype=str), "feature": pd.Series(dtype=str), "value": pd.Series(dtype=float)}
+        )
+        df_long = df_long[df_long["value"].fillna(0) != 0].groupby(["orgid", "feature"], as_index=False)["value"].sum()
+        df_long.insert(1, "month", month.date())
+
+        with self._connect() as conn:
+            conn.execute("BEGIN TRANSACTION")
+            conn.execute(f"DELETE FROM {self.TABLE} WHERE month = ?", [month.date()])
+            conn.register("new_snapshot", df_long)
+            conn.execute(f"INSERT INTO {self.TABLE} SELECT orgid, month, feature, value FROM new_snapshot")
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.MONTHS_TABLE} VALUES (?, ?, ?)",
+                [month.date(), ",".join(sorted(frames)), datetime.now(tz=timezone.utc).replace(tzinfo=None)],
+            )
+            conn.execute("COMMIT")
+        return len(df_long)
+
+    def refresh(
+        self,
+        fetch: MonthFetcher,
+        *,
+        start: pd.Timestamp | str,
+        through: pd.Timestamp | str | None = None,
+        force: bool = False,
+    ) -> list[pd.Timestamp]:
+        """Materialize the complete months in ``[start, through]`` that are not stored yet.
+
+        ``fetch(month)`` returns the feature frames of one month (e.g. the
+        results of :func:`monthly_feature_queries`). Once the back-fill is done
+        each refresh only fetches the newest month. Returns the months written.
+        """
+        stored = set() if force else set(self.months())
+        written = []
+        for month in complete_months(start, through):
+            if month in stored:
+                continue
+            self.write_month(month, fetch(month))
+            written.append(month)
+        return written
+
+    def snapshot(self, month: pd.Timestamp | str | None = None) -> pd.DataFrame:
+        """One stored month (default: the newest) as ``orgid`` × feature, zero-filled."""
+        months = self.months()
+        if not months:
+            return pd.DataFrame(columns=["orgid"])
+        month = month_start(month) if month is not None else months[-1]
+        with self._connect() as conn:
+            df_long = conn.execute(
+                f"SELECT orgid, feature, value FROM {self.TABLE} WHERE month = ?", [month.date()]
+            ).df()
+        wide = df_long.pivot_table(index="orgid", columns="feature", values="value", aggfunc="sum", fill_value=0.0)
+        return wide.reindex(columns=self.features(), fill_value=0.0).reset_index().rename_axis(columns=None)
+
+    def as_of(
+        self,
+        entities: pd.DataFrame,
+        *,
+        date_col: str,
+        orgid_col: str = "ORGID",
+        months: int = 3,
+        agg: str = "mean",
+        default_date: pd.Timestamp | str | None = None,
+    ) -> pd.DataFrame:
+        """Features of each ``entities`` row from the ``months`` stored months before its as-of month.
+
+        ``date_col`` is the as-of date (e.g. the churn date); missing dates
+        use ``default_date`` (default: today). ``agg`` is the per-month
+        ``mean``, the ``sum`` or the ``last`` month's value. The result is
+        aligned with ``entities`` and adds ``as_of_month`` and
+        ``months_observed``; features are NaN when no month was observed.
+        """
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"agg must be one of {AGGREGATIONS}")
+        default = month_start(default_date if default_date is not None else pd.Timestamp.today())
+        dates = pd.to_datetime(entities[date_col], errors="coerce")
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_convert(None)
+        cutoff = dates.dt.to_period("M").dt.to_timestamp().fillna(default)
+        df_entities = pd.DataFrame(
+            {
+                "row_id": range(len(entities)),
+                "orgid": entities[orgid_col].astype("string").to_numpy(),
+                "cutoff": cutoff.dt.date.to_numpy(),
+            }
+        )
+
+        stored = pd.Series(self.months(), dtype="datetime64[ns]")
+        window_start = cutoff - pd.DateOffset(months=months)
+        observed = [int(((stored >= low) & (stored < high)).sum()) for low, high in zip(window_start, cutoff)]
+        last_month = (cutoff - pd.DateOffset(months=1)).dt.date.to_numpy()
+        last_observed = pd.Series(last_month).isin(set(stored.dt.date)).to_numpy()
+
+        with self._connect() as conn:
+            conn.register("entities", df_entities)
+            df_long = conn.execute(
+                f"""
+                SELECT
+                    e.row_id,
+                    s.feature,
+                    SUM(s.value) AS total,
+                    arg_max(s.value, s.month) AS latest_value,
+                    MAX(s.month) AS latest_month
+                FROM entities e
+                JOIN {self.TABLE} s
+                  ON s.orgid = e.orgid
+                 AND s.month < e.cutoff
+                 AND s.month >= e.cutoff - INTERVAL ({int(months)}) MONTH
+                GROUP BY e.row_id, s.feature
+                """
+            ).df()
+            features = self.features()
+
+        if agg == "sum":
+            df_long["value"] = df_long["total"]
+        elif agg == "mean":
+            df_long["value"] = df_long["total"] / pd.Series(observed).reindex(df_long["row_id"]).to_numpy()
+        else:
+            latest = pd.to_datetime(df_long["latest_month"]).dt.date.to_numpy()
+            df_long["value"] = df_long["latest_value"].where(latest == last_month[df_long["row_id"].to_numpy()], 0.0)
+
+        wide = (
+            df_long.pivot_table(index="row_id", columns="feature", values="value", aggfunc="sum")
+            .reindex(index=range(len(entities)), columns=features)
+            .fillna(0.0)
+        )
+        observed_array = pd.Series(observed)
+        missing = observed_array.eq(0) if agg != "last" else pd.Series(~last_observed)
+        wide.loc[missing.to_numpy()] = float("nan")
+        wide.insert(0, "months_observed", observed_array.to_numpy())
+        wide.insert(0, "as_of_month", cutoff.to_numpy())
+        wide.index = entities.index
+        return wide.rename_axis(columns=None)
@@ -0,0 +1,400 @@
+"""Daily BigQuery rollup of GA page-usage rates for the churn dashboard.
+
+The GA export is scanned once a day by a BigQuery script that keeps two small
+tables up to date:
+
+* ``ga_page_usage_monthly``: one row per ``(month, unit)`` with the distinct
+  users (``unit = 'user'``) or orgs (``unit = 'org'``) that viewed each page
+  category and the total active in the month.
+* ``ga_page_org_monthly``: one row per ``(month, org_id)`` with 0/1 flags per
+  category, from which the churned vs. active split is aggregated in BigQuery.
+
+Only the current and previous months are recomputed once the tables exist, so
+the daily scan covers at most two months of events. The dashboard reads a few
+kilobytes of monthly rates instead of the org-by-month flags.
+
+The refresh runs as a scheduled job, not from the dashboard::
+
+    python -m ai_data_lab.churn.ga_rollup refresh --ga-dataset analytics_400693944
+
+Readers check :meth:`GaPageRollup.is_fresh` and fall back to the ``raw_*``
+queries, which compute the same frames from the export, when the rollup is
+missing or stale.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Mapping, Sequence
+
+import pandas as pd
+
+QueryRunner = Callable[[str], pd.DataFrame]
+
+DEFAULT_ROLLUP_DATASET = "ga_rollup"
+
+USAGE_TABLE = "ga_page_usage_monthly"
+ORG_TABLE = "ga_page_org_monthly"
+
+# Category -> regex on page_location, in dashboard order.
+PAGE_CATEGORIES: dict[str, str] = {
+    "search": r"/companies(?:[?#]|$)",
+    "company_detail": r"/companies/[a-z0-9]",
+    "lists": r"/company-lists|/people-lists|/leads-lists",
+    "import": r"-lists/import",
+    "trends": r"/analysis/trends",
+    "intent": r"/analysis/intent-settings",
+    "crm": r"/analysis/crm-integration",
+    "people": r"/people",
+}
+
+UNKNOWN_STATUS = "不明"
+
+
+def _sql_string(value: object) -> str:
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _rate_columns(count_prefix: str, total: str, source_prefix: str = "") -> str:
+    return ",\n        ".join(
+        f"{source_prefix}{name} AS {count_prefix}_{name}, "
+        f"ROUND(SAFE_DIVIDE({source_prefix}{name}, {total}) * 100, 1) AS rate_{name}"
+        for name in PAGE_CATEGORIES
+    )
+
+
+def _window_start(months: int) -> str:
+    return f"DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL {int(months)} MONTH)"
+
+
+def _page_flags_select(ga_dataset_id: str, since: str) -> str:
+    """One scan of the GA export: per ``(month, user, org)`` page-category flags from ``since``."""
+    flag_defs = ",\n    ".join(
+        f"MAX(IF(REGEXP_CONTAINS(page_location, r'{pattern}'), 1, 0)) AS has_{name}"
+        for name, pattern in PAGE_CATEGORIES.items()
+    )
+    return f"""SELECT
+    month,
+    user_pseudo_id,
+    org_id,
+    {flag_defs}
+FROM (
+    SELECT
+        FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
+        user_pseudo_id,
+        (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
+        (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
+    FROM `{ga_dataset_id}.events_*`
+    WHERE NOT STARTS_WITH(_TABLE_SUFFIX, 'intraday_')
+      AND _TABLE_SUFFIX >= FORMAT_DATE('%Y%m%d', {since})
+      AND event_name = 'page_view'
+)
+GROUP BY month, user_pseudo_id, org_id"""
+
+
+def _distinct(approximate: bool) -> str:
+    return "APPROX_COUNT_DISTINCT({})" if approximate else "COUNT(DISTINCT {})"
+
+
+def _user_counts(approximate: bool) -> str:
+    return ",\n        ".join(
+        f"{_distinct(approximate).format(f'IF(has_{name} = 1, user_pseudo_id, NULL)')} AS {name}"
+        for name in PAGE_CATEGORIES
+    )
+
+
+def _org_counts() -> str:
+    return ",\n        ".join(f"SUM(has_{name}) AS {name}" for name in PAGE_CATEGORIES)
+
+
+def _org_flags() -> str:
+    return ",\n        ".join(f"MAX(has_{name}) AS has_{name}" for name in PAGE_CATEGORIES)
+
+
+def rollup_refresh_script(
+    ga_dataset_id: str,
+    rollup_dataset: str = DEFAULT_ROLLUP_DATASET,
+    *,
+    months: int = 6,
+    approximate: bool = False,
+    force: bool = False,
+) -> str:
+    """BigQuery script refreshing both rollup tables; a no-op if already refreshed today.
+
+    The first run fills ``months`` whole months plus the current one; later runs
+    replace only the previous and current months (late events land in the
+    previous month's export). ``approximate`` counts distinct users with
+    ``APPROX_COUNT_DISTINCT`` (HyperLogLog++, ~1% error) instead of exact
+    ``COUNT(DISTINCT)``. ``force`` skips the once-a-day guard.
+    """
+    usage_table = f"`{rollup_dataset}.{USAGE_TABLE}`"
+    org_table = f"`{rollup_dataset}.{ORG_TABLE}`"
+    names = list(PAGE_CATEGORIES)
+    distinct = _distinct(approximate)
+    user_counts = _user_counts(approximate)
+    org_counts = _org_counts()
+    org_flags = _org_flags()
+    count_columns = ", ".join(f"{name} INT64" for name in names)
+    flag_columns = ", ".join(f"has_{name} INT64" for name in names)
+    guard = "" if force else f"IF (SELECT MAX(refreshed_on) FROM {usage_table}) = CURRENT_DATE() THEN RETURN; END IF;"
+    return f"""
+DECLARE since DATE DEFAULT {_window_start(months)};
+
+CREATE SCHEMA IF NOT EXISTS `{rollup_dataset}`;
+CREATE TABLE IF NOT EXISTS {usage_table} (month STRING, unit STRING, total INT64, {count_columns}, refreshed_on DATE);
+CREATE TABLE IF NOT EXISTS {org_table} (month STRING, org_id STRING, {flag_columns}, refreshed_on DATE);
+
+{guard}
+IF EXISTS (SELECT 1 FROM {usage_table}) THEN
+    SET since = GREATEST(since, DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL 1 MONTH));
+END IF;
+
+-- One scan of the export: per (month, user, org) page-category flags.
+CREATE TEMP TABLE page_flags AS
+{_page_flags_select(ga_dataset_id, "since")};
+
+DELETE FROM {usage_table}
+WHERE month >= FORMAT_DATE('%Y-%m', since)
+   OR month < FORMAT_DATE('%Y-%m', {_window_start(months)});
+DELETE FROM {org_table}
+WHERE month >= FORMAT_DATE('%Y-%m', since)
+   OR month < FORMAT_DATE('%Y-%m', {_window_start(months)});
+
+INSERT INTO {org_table}
+SELECT
+    month,
+    org_id,
+    {org_flags},
+    CURRENT_DATE() AS refreshed_on
+FROM page_flags
+WHERE org_id IS NOT NULL
+GROUP BY month, org_id;
+
+INSERT INTO {usage_table}
+SELECT
+    month,
+    'user' AS unit,
+    {distinct.format('user_pseudo_id')} AS total,
+    {user_counts},
+    CURRENT_DATE() AS refreshed_on
+FROM page_flags
+GROUP BY month
+UNION ALL
+SELECT
+    month,
+    'org' AS unit,
+    COUNT(*) AS total,
+    {org_counts},
+    CURRENT_DATE() AS refreshed_on
+FROM {org_table}
+WHERE month >= FORMAT_DATE('%Y-%m', since)
+GROUP BY month;
+"""
+
+
+def usage_rates_sql(rollup_dataset: str = DEFAULT_ROLLUP_DATASET, *, unit: str = "user") -> str:
+    """Monthly counts and rates (%) per category for ``unit`` ``'user'`` or ``'org'``.
+
+    Columns match the dashboard frames: ``total_uu``/``uu_*`` for users,
+    ``total_orgs``/``org_*`` for orgs, and ``rate_*`` for both.
+    """
+    _check_unit(unit)
+    return _usage_rates_select(f"`{rollup_dataset}.{USAGE_TABLE}`", unit)
+
+
+def _check_unit(unit: str) -> None:
+    if unit not in ("user", "org"):
+        raise ValueError(f"unit must be 'user' or 'org', got {unit!r}")
+
+
+def _usage_rates_select(source: str, unit: str, ctes: str = "") -> str:
+    prefix, total = ("uu", "total_uu") if unit == "user" else ("org", "total_orgs")
+    return f"""
+    {ctes}
+    SELECT
+        month,
+        total AS {total},
+        {_rate_columns(prefix, "total")}
+    FROM {source}
+    WHERE unit = '{unit}'
+    ORDER BY month
+    """
+
+
+def status_rates_sql(org_status: Mapping[str, str], rollup_dataset: str = DEFAULT_ROLLUP_DATASET) -> str:
+    """Monthly org counts and rates per contract status, aggregated in BigQuery.
+
+    ``org_status`` maps ``org_id`` to a status label (e.g. 解約済み/契約中);
+    orgs missing from it are reported as ``不明``.
+    """
+    return _status_rates_select(f"`{rollup_dataset}.{ORG_TABLE}`", org_status)
+
+
+def _status_rates_select(org_source: str, org_status: Mapping[str, str], ctes: str = "") -> str:
+    rows = ", ".join(
+        f"STRUCT({_sql_string(org_id)} AS org_id, {_sql_string(status)} AS status)"
+        for org_id, status in org_status.items()
+    )
+    statuses = f"UNNEST([{rows}])" if rows else "UNNEST(ARRAY<STRUCT<org_id STRING, status STRING>>[])"
+    sums = ",\n            ".join(f"SUM(f.has_{name}) AS {name}" for name in PAGE_CATEGORIES)
+    return f"""
+    WITH {ctes}by_status AS (
+        SELECT
+            f.month,
+            COALESCE(s.status, '{UNKNOWN_STATUS}') AS status,
+            COUNT(*) AS total,
+            {sums}
+        FROM {org_source} AS f
+        LEFT JOIN {statuses} AS s USING (org_id)
+        GROUP BY month, status
+    )
+    SELECT
+        month,
+        status,
+        total AS total_orgs,
+        {_rate_columns("org", "total")}
+    FROM by_status
+    ORDER BY month, status
+    """
+
+
+def _raw_ctes(ga_dataset_id: str, months: int, approximate: bool, *, usage: bool) -> str:
+    """CTEs computed from the GA export and shaped like the rollup tables (``org_flags``, ``usage``)."""
+    ctes = [
+        f"page_flags AS (\n{_page_flags_select(ga_dataset_id, _window_start(months))}\n    )",
+        f"""org_flags AS (
+        SELECT month, org_id, {_org_flags()}
+        FROM page_flags
+        WHERE org_id IS NOT NULL
+        GROUP BY month, org_id
+    )""",
+    ]
+    if usage:
+        distinct = _distinct(approximate)
+        ctes.append(
+            f"""usage AS (
+        SELECT month, 'user' AS unit, {distinct.format('user_pseudo_id')} AS total, {_user_counts(approximate)}
+        FROM page_flags
+        GROUP BY month
+        UNION ALL
+        SELECT month, 'org' AS unit, COUNT(*) AS total, {_org_counts()}
+        FROM org_flags
+        GROUP BY month
+    )"""
+        )
+    return ",\n    ".join(ctes)
+
+
+def raw_usage_rates_sql(ga_dataset_id: str, *, unit: str = "user", months: int = 6, approximate: bool = False) -> str:
+    """:func:`usage_rates_sql` computed straight from the GA export (scans ``months`` months of events)."""
+    _check_unit(unit)
+    return _usage_rates_select("usage", unit, "WITH " + _raw_ctes(ga_dataset_id, months, approximate, usage=True))
+
+
+def raw_status_rates_sql(ga_dataset_id: str, org_status: Mapping[str, str], *, months: int = 6) -> str:
+    """:func:`status_rates_sql` computed straight from the GA export."""
+    ctes = _raw_ctes(ga_dataset_id, months, False, usage=False) + ",\n    "
+    return _status_rates_select("org_flags", org_status, ctes)
+
+
+def last_refreshed_sql(rollup_dataset: str = DEFAULT_ROLLUP_DATASET) -> str:
+    return f"SELECT MAX(refreshed_on) AS refreshed_on FROM `{rollup_dataset}.{USAGE_TABLE}`"
+
+
+def rollup_is_fresh(refreshed_on: date | None, *, max_age_days: int = 1, today: date | None = None) -> bool:
+    """Whether a rollup refreshed on ``refreshed_on`` is at most ``max_age_days`` old (UTC, like BigQuery)."""
+    today = today or datetime.now(timezone.utc).date()
+    return refreshed_on is not None and refreshed_on >= today - timedelta(days=max_age_days)
+
+
+class GaPageRollup:
+    """Refresh and read the GA page-usage rollup through a ``sql -> DataFrame`` runner.
+
+    ``refresh`` belongs in the scheduled job (see :func:`main`); the reads take
+    ``raw=True`` to bypass a missing or stale rollup.
+    """
+
+    def __init__(
+        self,
+        query: QueryRunner,
+        ga_dataset_id: str,
+        rollup_dataset: str = DEFAULT_ROLLUP_DATASET,
+        *,
+        months: int = 6,
+        approximate: bool = False,
+    ) -> None:
+        self.query = query
+        self.ga_dataset_id = ga_dataset_id
+        self.rollup_dataset = rollup_dataset
+        self.months = months
+        self.approximate = approximate
+
+    def refresh(self, *, force: bool = False) -> None:
+        """Run the daily refresh script (returns immediately if it already ran today)."""
+        self.query(
+            rollup_refresh_script(
+                self.ga_dataset_id,
+                self.rollup_dataset,
+                months=self.months,
+                approximate=self.approximate,
+                force=force,
+            )
+        )
+
+    def last_refreshed(self) -> date | None:
+        """Date of the last refresh, ``None`` if the rollup is empty (raises if it does not exist)."""
+        df_refreshed = self.query(last_refreshed_sql(self.rollup_dataset))
+        if df_refreshed.empty or pd.isna(df_refreshed.iloc[0, 0]):
+            return None
+        return pd.Timestamp(df_refreshed.iloc[0, 0]).date()
+
+    def is_fresh(self, *, max_age_days: int = 1, today: date | None = None) -> bool:
+        return rollup_is_fresh(self.last_refreshed(), max_age_days=max_age_days, today=today)
+
+    def user_rates(self, *, raw: bool = False) -> pd.DataFrame:
+        """Monthly user rates; ``raw`` computes them from the GA export instead of the rollup."""
+        if raw:
+            return self.query(
+                raw_usage_rates_sql(self.ga_dataset_id, unit="user", months=self.months, approximate=self.approximate)
+            )
+        return self.query(usage_rates_sql(self.rollup_dataset, unit="user"))
+
+    def org_rates(self, *, raw: bool = False) -> pd.DataFrame:
+        if raw:
+            return self.query(raw_usage_rates_sql(self.ga_dataset_id, unit="org", months=self.months))
+        return self.query(usage_rates_sql(self.rollup_dataset, unit="org"))
+
+    def status_rates(self, org_status: Mapping[str, str], *, raw: bool = False) -> pd.DataFrame:
+        if raw:
+            return self.query(raw_status_rates_sql(self.ga_dataset_id, org_status, months=self.months))
+        return self.query(status_rates_sql(org_status, self.rollup_dataset))
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh or inspect the GA page-usage rollup in BigQuery.")
+    parser.add_argument("command", choices=("refresh", "status"))
+    parser.add_argument("--ga-dataset", required=True, help="GA4 export dataset, e.g. analytics_400693944")
+    parser.add_argument("--rollup-dataset", default=DEFAULT_ROLLUP_DATASET)
+    parser.add_argument("--project", default=None, help="BigQuery project (default: $BIGQUERY_PROJECT_ID)")
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--approximate", action="store_true", help="APPROX_COUNT_DISTINCT for user counts")
+    parser.add_argument("--force", action="store_true", help="refresh even if it already ran today")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    from ..connectors.bigquery import BigQueryConnector
+
+    connector = BigQueryConnector(project_id=args.project)
+    rollup = GaPageRollup(
+        connector.query, args.ga_dataset, args.rollup_dataset, months=args.months, approximate=args.approximate
+    )
+    if args.command == "refresh":
+        rollup.refresh(force=args.force)
+    refreshed_on = rollup.last_refreshed()
+    print(f"{args.rollup_dataset}: last refreshed {refreshed_on or 'never'}")
+    return 0 if rollup.is_fresh() else 1
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+"""Cross-validated churn classifier persisted with its feature schema.
+
+:func:`load_or_fit` searches the hyperparameters of a ``StandardScaler`` +
+``LogisticRegression`` pipeline with stratified cross-validation, running the
+folds in parallel (``n_jobs`` joblib worker processes), and saves the refit
+pipeline to disk together with a hash of the feature list and a fingerprint of
+the training data. A later run with the same features and data loads the saved
+model instead of refitting, and :meth:`ChurnModel.score` then scores the whole
+portfolio in one vectorized ``predict_proba`` call.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+DEFAULT_MODEL_PATH = Path("data") / "models" / "churn_logit.joblib"
+
+# Point-in-time features of ChurnFeatureStore.as_of plus the add_ratio_features ratios.
+DEFAULT_FEATURES = (
+    "users",
+    "sessions",
+    "page_views",
+    "sessions_per_user",
+    "page_views_per_user",
+    "page_views_per_session",
+    "pv_company_detail",
+    "pv_list",
+    "pv_analysis",
+    "pv_people",
+    "pv_settings",
+    "companylist_created",
+    "peoplelist_created",
+    "keyman_registered",
+    "memo_created",
+    "high_intent_companies",
+    "middle_intent_companies",
+    "intent_companies",
+)
+
+# StratifiedKFold needs at least two splits, and every split needs each class.
+MIN_CLASS_ROWS = 2
+
+DEFAULT_PARAM_GRID: Mapping[str, Sequence[Any]] = {
+    "logit__C": (0.01, 0.1, 1.0, 10.0),
+    "logit__class_weight": (None, "balanced"),
+}
+
+
+def feature_schema_hash(features: Sequence[str]) -> str:
+    """Hash of the ordered feature list a pipeline was trained on."""
+    return hashlib.blake2b(json.dumps(list(features)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def training_fingerprint(frame: pd.DataFrame, features: Sequence[str], target: str) -> str:
+    """Content hash of the training rows; a new value means the model must be refit."""
+    hashed = pd.util.hash_pandas_object(frame[[*features, target]], index=False).to_numpy()
+    return hashlib.blake2b(np.sort(hashed).tobytes(), digest_size=16).hexdigest()
+
+
+def training_frame(frame: pd.DataFrame, features: Sequence[str], target: str = "is_churned") -> pd.DataFrame:
+    """Rows with a target and every feature present, features as floats."""
+    missing = [column for column in (*features, target) if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Columns missing from the training frame: {missing}")
+    df_train = frame[[*features, target]].dropna()
+    return df_train.astype({column: float for column in features}).astype({target: int})
+
+
+def class_counts(frame: pd.DataFrame, features: Sequence[str], target: str = "is_churned") -> tuple[int, int]:
+    """``(retained, churned)`` rows usable for training; both must reach :data:`MIN_CLASS_ROWS`."""
+    retained, churned = np.bincount(training_frame(frame, features, target)[target].to_numpy(), minlength=2)[:2]
+    return int(retained), int(churned)
+
+
+@dataclass
+class ChurnModel:
+    """A fitted churn pipeline and the metadata needed to reuse it safely."""
+
+    pipeline: Pipeline
+    features: tuple[str, ...]
+    target: str = "is_churned"
+    schema_hash: str = ""
+    data_fingerprint: str = ""
+    best_params: dict[str, Any] = field(default_factory=dict)
+    cv_score: float = float("nan")
+    cv_results: pd.DataFrame = field(default_factory=pd.DataFrame)
+    n_samples: int = 0
+    trained_at: str = ""
+
+    @classmethod
+    def fit(
+        cls,
+        frame: pd.DataFrame,
+        features: Sequence[str],
+        *,
+        target: str = "is_churned",
+        param_grid: Mapping[str, Sequence[Any]] | None = None,
+        cv: int = 5,
+        scoring: str = "roc_auc",
+        n_jobs: int | None = -1,
+        random_state: int = 42,
+    ) -> "ChurnModel":
+        """Grid-search ``param_grid`` with stratified ``cv``-fold CV, folds in parallel.
+
+        The number of folds is capped at the size of the minority class; the
+        best parameters are refit on every complete row.
+        """
+        features = tuple(features)
+        df_train = training_frame(frame, features, target)
+        y = df_train[target].to_numpy()
+        counts = np.bincount(y, minlength=2)
+        if counts.min() < MIN_CLASS_ROWS:
+            raise ValueError(f"Need at least two churned and two retained rows, got {counts.tolist()}")
+
+        pipeline = Pipeline(
+            [
+                ("scale", StandardScaler()),
+                ("logit", LogisticRegression(max_iter=1000, random_state=random_state)),
+            ]
+        )
+        grid = {name: list(values) for name, values in (param_grid or DEFAULT_PARAM_GRID).items()}
+        folds = StratifiedKFold(n_splits=int(min(cv, counts.min())), shuffle=True, random_state=random_state)
+        search = GridSearchCV(pipeline, grid, cv=folds, scoring=scoring, n_jobs=n_jobs, refit=True)
+        search.fit(df_train[list(features)].to_numpy(), y)
+
+        cv_results = pd.DataFrame(search.cv_results_)
+        cv_results = cv_results[
+            ["params", "mean_test_score", "std_test_score", "rank_test_score", "mean_fit_time"]
+        ].sort_values("rank_test_score", ignore_index=True)
+        return cls(
+            pipeline=search.best_estimator_,
+            features=features,
+            target=target,
+            schema_hash=feature_schema_hash(features),
+            data_fingerprint=training_fingerprint(df_train, features, target),
+            best_params=dict(search.best_params_),
+            cv_score=float(search.best_score_),
+            cv_results=cv_results,
+            n_samples=len(df_train),
+            trained_at=datetime.now(timezone.utc).isoformat(),
+        )
+
+    def score(self, companies: pd.DataFrame) -> pd.Series:
+        """Churn probability per row of ``companies``; NaN where a feature is missing."""
+        missing = [column for column in self.features if column not in companies.columns]
+        if missing:
+            raise ValueError(f"Columns missing from the scoring frame: {missing}")
+        X = companies[list(self.features)].astype(float).to_numpy()
+        complete = ~np.isnan(X).any(axis=1)
+        probabilities = np.full(len(companies), np.nan)
+        if complete.any():
+            probabilities[complete] = self.pipeline.predict_proba(X[complete])[:, 1]
+        return pd.Series(probabilities, index=companies.index, name="churn_probability")
+
+    def coefficients(self) -> pd.DataFrame:
+        """Standardized logistic coefficients, largest magnitude first."""
+        coefficients = self.pipeline.named_steps["logit"].coef_[0]
+        df_coef = pd.DataFrame({"feature": self.features, "coefficient": coefficients})
+        df_coef["importance"] = df_coef["coefficient"].abs()
+        return df_coef.sort_values("importance", ascending=False, ignore_index=True)
+
+    def save(self, path: Path | str = DEFAULT_MODEL_PATH) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        joblib.dump(self, tmp_path)
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path | str = DEFAULT_MODEL_PATH, *, features: Sequence[str] | None = None) -> "ChurnModel":
+        """Load a saved model; raises ValueError when ``features`` differ from its schema."""
+        model = joblib.load(Path(path))
+        if not isinstance(model, cls):
+            raise ValueError(f"{path} does not contain a {cls.__name__}")
+        if features is not None and feature_schema_hash(features) != model.schema_hash:
+            raise ValueError(f"Feature schema of {path} does not match: trained on {list(model.features)}")
+        return model
+
+
+def load_or_fit(
+    frame: pd.DataFrame,
+    features: Sequence[str],
+    *,
+    path: Path | str = DEFAULT_MODEL_PATH,
+    target: str = "is_churned",
+    force: bool = False,
+    **fit_kwargs: Any,
+) -> tuple[ChurnModel, bool]:
+    """Return ``(model, refit)``, refitting only when the features or training data changed."""
+    features = tuple(features)
+    path = Path(path)
+    if path.exists() and not force:
+        try:
+            model = ChurnModel.load(path, features=features)
+        except ValueError:
+            model = None
+        if model is not None and model.target == target:
+            fingerprint = training_fingerprint(training_frame(frame, features, target), features, target)
+            if model.data_fingerprint == fingerprint:
+                return model, False
+    model = ChurnModel.fit(frame, features, target=target, **fit_kwargs)
+    model.save(path)
+    return model, True
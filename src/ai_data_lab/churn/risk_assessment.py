@@ -0,0 +1,441 @@
+"""Incremental, fingerprinted LLM churn-risk scoring for the whole portfolio."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Literal, Mapping, Sequence
+
+import duckdb
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from ai_data_lab.llm.structured import generation_config, validate_payload
+
+logger = logging.getLogger(__name__)
+
+RISK_PROMPT_VERSION = "v2"
+DEFAULT_RISK_MODEL = "gemini-3-pro-preview"
+
+TREND_KEYS = ("ga_trend", "companylist_trend", "peoplelist_trend", "memo_trend")
+
+# Company attributes that only change with the contract or master data. Everything
+# else on the company row (rolling 30-day GA/intent metrics, ...) is prompt context
+# only, so a day's activity does not change every fingerprint.
+STABLE_COMPANY_COLUMNS = (
+    "ORGID",
+    "COMPNO",
+    "CompanyName",
+    "ORG_NAME",
+    "BQ_COMPANY_NAME",
+    "status",
+    "is_churned",
+    "account_count",
+    "INDUSTRY_ID",
+    "EMPLOYEE_ID",
+    "EMPLOYEE_COUNT",
+    "REVENUE_ID",
+    "CAPITAL_ID",
+    "ISCLOSED",
+)
+
+
+class ChurnRiskAssessment(BaseModel):
+    """LLM answer for one company."""
+
+    risk_level: Literal["High", "Medium", "Low"]
+    risk_score: int = Field(ge=0, le=100)
+    reason: str = ""
+    key_signals: list[str] = Field(default_factory=list)
+    recommended_actions: list[str] = Field(default_factory=list)
+    trend_analysis: str = ""
+
+
+def _jsonable(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Mapping):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+
+@dataclass
+class CompanyRiskInput:
+    """Everything the risk prompt sees for one ORGID.
+
+    ``context`` is shown to the model but left out of the fingerprint.
+    """
+
+    orgid: str
+    company: dict[str, Any]
+    ga_trend: list[dict[str, Any]] = field(default_factory=list)
+    companylist_trend: list[dict[str, Any]] = field(default_factory=list)
+    peoplelist_trend: list[dict[str, Any]] = field(default_factory=list)
+    memo_trend: list[dict[str, Any]] = field(default_factory=list)
+    context: dict[str, Any] = field(default_factory=dict)
+
+    def payload(self) -> dict[str, Any]:
+        return {
+            "orgid": self.orgid,
+            "company": _jsonable(self.company),
+            **{key: _jsonable(getattr(self, key)) for key in TREND_KEYS},
+            "context": _jsonable(self.context),
+        }
+
+    def fingerprint(self, *, model: str = DEFAULT_RISK_MODEL, prompt_version: str = RISK_PROMPT_VERSION) -> str:
+        """Stable hash of the payload without ``context``, the model and the prompt version."""
+        payload = {key: value for key, value in self.payload().items() if key != "context"}
+        canonical = json.dumps(
+            {"payload": payload, "model": model, "prompt_version": prompt_version},
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_risk_prompt(risk_input: CompanyRiskInput) -> str:
+    """Render the churn-risk prompt used by notebook 22."""
+    payload = risk_input.payload()
+
+    def dump(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, indent=2)
+
+    return f"""
+あなたは営業支援SaaS「InfoBox」のカスタマーサクセス担当です。
+以下の会社データと利用推移を分析し、チャーン（解約）リスクを判定してください。
+
+## 会社基本データ
+{dump(payload["company"])}
+
+## 直近の利用指標（参考）
+{dump(payload["context"])}
+
+## GA利用推移（6ヶ月）
+- users: ログインユーザー数
+- sessions: セッション数
+- page_views: PV数
+- pv_list: リストページアクセス
+- pv_company_detail: 企業詳細アクセス
+{dump(payload["ga_trend"])}
+
+## Snowflakeアクティビティ推移（6ヶ月）
+### CompanyList作成数（企業リスト）
+{dump(payload["companylist_trend"])}
+### PeopleList作成数（キーマンリスト）
+- PEOPLELIST_CREATED: 作成されたPeopleList数
+- KEYMAN_REGISTERED: 登録されたキーマン数
+{dump(payload["peoplelist_trend"])}
+### メモ作成数
+{dump(payload["memo_trend"])}
+
+## 判定基準
+- **High（70-100点）**: 解約リスクが高い
+  - 利用率が減少傾向
+  - CompanyList/PeopleList/メモ作成が停滞
+  - 競合検討の兆候
+- **Medium（40-69点）**: 注意が必要
+  - 利用頻度に波がある
+  - 一部機能のみ活用（例: CompanyListは使うがPeopleListは未使用）
+- **Low（0-39点）**: 安定
+  - 継続的な利用
+  - 複数機能を活用（CompanyList + PeopleList + メモ）
+  - アクティビティが維持/増加
+
+## 出力
+risk_level（High/Medium/Low）、risk_score（0-100）、reason（日本語3文以内）、
+key_signals、recommended_actions、trend_analysis（日本語2文以内）をJSONで返してください。
+"""
+
+
+def portfolio_trend_queries(ga_dataset_id: str, sf_schema: str, *, months: int = 6) -> dict[str, tuple[str, str]]:
+    """Return ``{trend_key: (source, sql)}`` covering every ORGID at once.
+
+    Only complete months are included so that a company's fingerprint changes
+    when its activity changes, not every day while the current month fills up.
+    ``source`` is ``"bq"`` or ``"sf"``; every query returns an ``ORGID`` column.
+    """
+    ga_sql = f"""
+    WITH base AS (
+        SELECT
+            FORMAT_DATE('%Y-%m', PARSE_DATE('%Y%m%d', event_date)) AS month,
+            (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'org_id') AS org_id,
+            user_pseudo_id,
+            (SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'ga_session_id') AS session_id,
+            event_name,
+            (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'page_location') AS page_location
+        FROM `{ga_dataset_id}.events_*`
+        WHERE _TABLE_SUFFIX >= FORMAT_DATE('%Y%m%d', DATE_SUB(DATE_TRUNC(CURRENT_DATE(), MONTH), INTERVAL {months} MONTH))
+          AND _TABLE_SUFFIX < FORMAT_DATE('%Y%m%d', DATE_TRUNC(CURRENT_DATE(), MONTH))
+    )
+    SELECT
+        org_id AS ORGID,
+        month,
+        COUNT(DISTINCT user_pseudo_id) AS users,
+        COUNT(DISTINCT CONCAT(user_pseudo_id, '-', CAST(session_id AS STRING))) AS sessions,
+        COUNTIF(event_name = 'page_view') AS page_views,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/companies/[a-z0-9]') AND event_name = 'page_view') AS pv_company_detail,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/company-lists|/people-lists|/leads-lists') AND event_name = 'page_view') AS pv_list,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/analysis') AND event_name = 'page_view') AS pv_analysis,
+        COUNTIF(REGEXP_CONTAINS(page_location, r'/people') AND event_name = 'page_view') AS pv_people
+    FROM base
+    WHERE org_id IS NOT NULL
+    GROUP BY ORGID, month
+    ORDER BY ORGID, month
+    """
+    window = (
+        f"DATEADD('month', -{months}, DATE_TRUNC('month', CURRENT_DATE()))",
+        "DATE_TRUNC('month', CURRENT_DATE())",
+    )
+    companylist_sql = f"""
+    SELECT
+        u.ORGID,
+        DATE_TRUNC('month', cl.CREATEDAT) AS MONTH,
+        COUNT(DISTINCT cl.ID) AS COMPANYLIST_CREATED
+    FROM {sf_schema}.USERORGANIZATION u
+    JOIN {sf_schema}.USERORGRELATION ur ON u.ORGID = ur.ORGANIZATIONID
+    JOIN {sf_schema}.COMPANYLIST cl ON cl.USERORGRELATIONID = ur.ID
+    WHERE cl.CREATEDAT >= {window[0]} AND cl.CREATEDAT < {window[1]}
+    GROUP BY u.ORGID, MONTH
+    ORDER BY u.ORGID, MONTH
+    """
+    peoplelist_sql = f"""
+    SELECT
+        u.ORGID,
+        DATE_TRUNC('month', pl.CREATEDAT) AS MONTH,
+        COUNT(DISTINCT pl.ID) AS PEOPLELIST_CREATED,
+        COUNT(DISTINCT k.ID) AS KEYMAN_REGISTERED
+    FROM {sf_schema}.USERORGANIZATION u
+    JOIN {sf_schema}.USERORGRELATION ur ON u.ORGID = ur.ORGANIZATIONID
+    JOIN {sf_schema}.PEOPLELIST pl ON pl.USERORGRELATIONID = ur.ID
+    LEFT JOIN {sf_schema}._KEYMANTOPEOPLELIST rel ON rel.B = pl.ID
+    LEFT JOIN {sf_schema}.KEYMAN k ON rel.A = k.ID
+    WHERE pl.CREATEDAT >= {window[0]} AND pl.CREATEDAT < {window[1]}
+    GROUP BY u.ORGID, MONTH
+    ORDER BY u.ORGID, MONTH
+    """
+    memo_sql = f"""
+    SELECT
+        u.ORGID,
+        DATE_TRUNC('month', m.CREATEDAT) AS MONTH,
+        COUNT(*) AS MEMO_CREATED
+    FROM {sf_schema}.USERORGANIZATION u
+    JOIN {sf_schema}.USERORGRELATION ur ON u.ORGID = ur.ORGANIZATIONID
+    JOIN {sf_schema}.MEMO m ON m.USERORGRELATIONID = ur.ID
+    WHERE m.CREATEDAT >= {window[0]} AND m.CREATEDAT < {window[1]}
+    GROUP BY u.ORGID, MONTH
+    ORDER BY u.ORGID, MONTH
+    """
+    return {
+        "ga_trend": ("bq", ga_sql),
+        "companylist_trend": ("sf", companylist_sql),
+        "peoplelist_trend": ("sf", peoplelist_sql),
+        "memo_trend": ("sf", memo_sql),
+    }
+
+
+def build_risk_inputs(
+    df_companies: pd.DataFrame,
+    trends: Mapping[str, pd.DataFrame],
+    *,
+    orgid_col: str = "ORGID",
+    company_cols: Sequence[str] = STABLE_COMPANY_COLUMNS,
+) -> list[CompanyRiskInput]:
+    """Split portfolio-wide frames into one :class:`CompanyRiskInput` per ORGID.
+
+    Only ``company_cols`` of each company row are fingerprinted; the remaining
+    columns are passed as prompt ``context``.
+    """
+    grouped: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for key in TREND_KEYS:
+        frame = trends.get(key)
+        if frame is None or frame.empty or orgid_col not in frame.columns:
+            continue
+        frame = frame.copy()
+        frame[orgid_col] = frame[orgid_col].astype(str)
+        for orgid, rows in frame.groupby(orgid_col, sort=False):
+            records = rows.drop(columns=orgid_col).to_dict(orient="records")
+            grouped.setdefault(orgid, {})[key] = records
+
+    stable = {orgid_col, *company_cols}
+    inputs = []
+    companies = df_companies.dropna(subset=[orgid_col]).drop_duplicates(subset=[orgid_col])
+    for company in companies.to_dict(orient="records"):
+        orgid = str(company[orgid_col])
+        trend_rows = grouped.get(orgid, {})
+        present = {key: value for key, value in company.items() if value is not None}
+        inputs.append(
+            CompanyRiskInput(
+                orgid=orgid,
+                company={key: value for key, value in present.items() if key in stable},
+                **{key: trend_rows.get(key, []) for key in TREND_KEYS},
+                context={key: value for key, value in present.items() if key not in stable},
+            )
+        )
+    return inputs
+
+
+class RiskScoreStore:
+    """DuckDB table holding the latest assessment and input fingerprint per ORGID."""
+
+    TABLE = "churn_risk_scores"
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    orgid VARCHAR PRIMARY KEY,
+                    fingerprint VARCHAR,
+                    risk_level VARCHAR,
+                    risk_score INTEGER,
+                    reason VARCHAR,
+                    key_signals VARCHAR,
+                    recommended_actions VARCHAR,
+                    trend_analysis VARCHAR,
+                    model VARCHAR,
+                    prompt_version VARCHAR,
+                    scored_at TIMESTAMP
+                )
+                """
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        return duckdb.connect(str(self._path))
+
+    def fingerprints(self) -> dict[str, str]:
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT orgid, fingerprint FROM {self.TABLE}").fetchall()
+        return {orgid: fingerprint for orgid, fingerprint in rows}
+
+    def read(self) -> pd.DataFrame:
+        """Return all stored scores, highest risk first."""
+        with self._connect() as conn:
+            return conn.execute(f"SELECT * FROM {self.TABLE} ORDER BY risk_score DESC, orgid").df()
+
+    def upsert(
+        self,
+        results: Mapping[str, tuple[str, ChurnRiskAssessment]],
+        *,
+        model: str,
+        prompt_version: str = RISK_PROMPT_VERSION,
+    ) -> None:
+        """Insert or replace ``{orgid: (fingerprint, assessment)}``."""
+        if not results:
+            return
+        scored_at = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        rows = [
+            (
+                orgid,
+                fingerprint,
+                assessment.risk_level,
+                assessment.risk_score,
+                assessment.reason,
+                json.dumps(assessment.key_signals, ensure_ascii=False),
+                json.dumps(assessment.recommended_actions, ensure_ascii=False),
+                assessment.trend_analysis,
+                model,
+                prompt_version,
+                scored_at,
+            )
+            for orgid, (fingerprint, assessment) in results.items()
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+@dataclass
+class RiskRunSummary:
+    """What an incremental run did."""
+
+    scored: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    failures: dict[str, str] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, int]:
+        return {"scored": len(self.scored), "unchanged": len(self.unchanged), "failed": len(self.failures)}
+
+
+Assessor = Callable[[CompanyRiskInput], ChurnRiskAssessment]
+
+
+def gemini_assessor(client: Any, *, model: str = DEFAULT_RISK_MODEL, temperature: float = 0.1) -> Assessor:
+    """Build an assessor around a ``google.genai`` client with schema-constrained output."""
+
+    def assess(risk_input: CompanyRiskInput) -> ChurnRiskAssessment:
+        response = client.models.generate_content(
+            model=model,
+            contents=build_risk_prompt(risk_input),
+            config={**generation_config(ChurnRiskAssessment), "temperature": temperature},
+        )
+        return validate_payload(response.text, ChurnRiskAssessment)
+
+    return assess
+
+
+def run_risk_assessment(
+    inputs: Iterable[CompanyRiskInput],
+    assess: Assessor,
+    store: RiskScoreStore,
+    *,
+    model: str = DEFAULT_RISK_MODEL,
+    prompt_version: str = RISK_PROMPT_VERSION,
+    max_workers: int = 4,
+    force: bool = False,
+) -> RiskRunSummary:
+    """Score only companies whose fingerprint changed, ``max_workers`` at a time.
+
+    Results are upserted as they complete so an interrupted run keeps its
+    progress; failed companies keep their previous row and are retried next run.
+    """
+    known = {} if force else store.fingerprints()
+    summary = RiskRunSummary()
+    todo: list[tuple[CompanyRiskInput, str]] = []
+    for risk_input in inputs:
+        fingerprint = risk_input.fingerprint(model=model, prompt_version=prompt_version)
+        if known.get(risk_input.orgid) == fingerprint:
+            summary.unchanged.append(risk_input.orgid)
+        else:
+            todo.append((risk_input, fingerprint))
+
+    if not todo:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(assess, risk_input): (risk_input.orgid, fingerprint) for risk_input, fingerprint in todo}
+        for future in as_completed(futures):
+            orgid, fingerprint = futures[future]
+            try:
+                assessment = future.result()
+            except Exception as exc:  # noqa: BLE001 - keep scoring the rest of the portfolio
+                logger.warning("Risk assessment failed for %s: %s", orgid, exc)
+                summary.failures[orgid] = f"{type(exc).__name__}: {str(exc)[:200]}"
+                continue
+            store.upsert({orgid: (fingerprint, assessment)}, model=model, prompt_version=prompt_version)
+            summary.scored.append(orgid)
+    return summary
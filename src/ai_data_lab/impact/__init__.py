@@ -0,0 +1,23 @@
+"""Before/after impact-analysis helpers shared by the campaign analysis notebooks."""
+
+from .baseline import BaselineEvent, build_baselines, event_dates
+from .did import UserPeriodPanel, fit_twfe
+from .inference import STATISTICS, bootstrap, compare_groups
+from .panel import PERIODS, BeforeAfterPanel
+from .sampling import matched_group_sample, random_keys, stratified_sample
+
+__all__ = [
+    "BaselineEvent",
+    "BeforeAfterPanel",
+    "PERIODS",
+    "STATISTICS",
+    "UserPeriodPanel",
+    "bootstrap",
+    "build_baselines",
+    "compare_groups",
+    "event_dates",
+    "fit_twfe",
+    "matched_group_sample",
+    "random_keys",
+    "stratified_sample",
+]
@@ -0,0 +1,115 @@
+"""Per-user baseline dates from event definitions over the post table.
+
+A baseline event is "the ``nth`` post of a user that matches the event"; a
+post matches when it carries any of ``tags`` (looked up in the hashtag
+postings, not re-parsed per user) and falls inside ``[after, before)``. All
+users' event dates come out of one grouped ``min`` (or one ``cumcount`` for
+``nth > 1``) over the matching rows.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+import pandas as pd
+
+from ..text.hashtags import HashtagIndex
+
+
+@dataclass(frozen=True)
+class BaselineEvent:
+    """Which post defines a user's baseline date.
+
+    ``BaselineEvent(tags=("#IRCチャレンジ",))`` is the first IRC post,
+    ``BaselineEvent(after=release)`` the first post after a release and
+    ``BaselineEvent(nth=3)`` the third post overall.
+    """
+
+    tags: tuple[str, ...] = ()
+    after: pd.Timestamp | None = None
+    before: pd.Timestamp | None = None
+    nth: int = 1
+
+    def __post_init__(self) -> None:
+        if isinstance(self.tags, str):
+            object.__setattr__(self, "tags", (self.tags,))
+        if self.nth < 1:
+            raise ValueError("nth must be at least 1.")
+
+
+def event_dates(
+    posts: pd.DataFrame,
+    event: BaselineEvent,
+    *,
+    hashtag_index: HashtagIndex | None = None,
+    users: Iterable[Any] | None = None,
+    user_col: str = "account_id",
+    time_col: str = "created_at",
+    text_col: str = "content",
+) -> pd.Series:
+    """Timestamp of ``event`` per user (users without the event are absent).
+
+    ``hashtag_index`` must be built over ``posts`` in row order; it is built
+    from ``text_col`` when the event has tags and no index is given.
+    """
+    selected = posts
+    if event.tags:
+        if hashtag_index is None:
+            hashtag_index = HashtagIndex.from_texts(np.arange(len(posts)), posts[text_col])
+        selected = posts.iloc[hashtag_index.rows_with_any(event.tags)]
+    if users is not None:
+        selected = selected[selected[user_col].isin(set(users))]
+    if event.after is not None:
+        selected = selected[selected[time_col] >= event.after]
+    if event.before is not None:
+        selected = selected[selected[time_col] < event.before]
+
+    if event.nth == 1:
+        return selected.groupby(user_col)[time_col].min().rename(time_col)
+    ordered = selected.sort_values([user_col, time_col], kind="stable")
+    nth_rows = ordered[ordered.groupby(user_col).cumcount() == event.nth - 1]
+    return nth_rows.set_index(user_col)[time_col]
+
+
+def build_baselines(
+    posts: pd.DataFrame,
+    *,
+    treatment_event: BaselineEvent,
+    control_date: pd.Timestamp,
+    treatment_users: Iterable[Any] | None = None,
+    control_users: Iterable[Any] = (),
+    hashtag_index: HashtagIndex | None = None,
+    user_col: str = "account_id",
+    time_col: str = "created_at",
+    text_col: str = "content",
+) -> pd.DataFrame:
+    """``(user_col, group, baseline_date)`` for Treatment users (their event date) and Control users (``control_date``).
+
+    Treatment users without the event are dropped; ``treatment_users=None``
+    treats every user with the event as Treatment.
+    """
+    treatment_dates = event_dates(
+        posts,
+        treatment_event,
+        hashtag_index=hashtag_index,
+        users=treatment_users,
+        user_col=user_col,
+        time_col=time_col,
+        text_col=text_col,
+    )
+    control_users = list(control_users)
+    df_treatment = pd.DataFrame(
+        {user_col: treatment_dates.index.to_numpy(), "group": "Treatment", "baseline_date": treatment_dates.to_numpy()}
+    )
+    df_control = pd.DataFrame(
+        {
+            user_col: control_users,
+            "group": "Control",
+            "baseline_date": pd.Series([control_date] * len(control_users), dtype=object),
+        }
+    )
+    df_baseline = pd.concat([df_treatment, df_control], ignore_index=True)
+    df_baseline["baseline_date"] = pd.to_datetime(df_baseline["baseline_date"])
+    return df_baseline
@@ -0,0 +1,223 @@
+"""Two-way fixed-effects difference-in-differences on a sparse user × period panel.
+
+Post counts per (user, calendar period) and the treated indicator are kept as
+sparse matrices. In a balanced panel the user and period fixed effects are
+removed by two-way demeaning, and every quantity the TWFE estimate and its
+user-clustered standard error need (``Σ D̃·ỹ``, ``Σ D̃²`` and each user's score
+``Σ_t D̃·ε̂``) expands into row sums over the non-zero cells plus per-period
+means, so the demeaned ``users × periods`` matrices are never materialized.
+Period means are taken per stratum, which fits every stratum in the same pass.
+
+With staggered baselines, users become treated in different periods and the
+TWFE coefficient is a variance-weighted average of the per-cohort effects,
+not a single ATT; compare strata estimated with the same design.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+RESULT_COLUMNS = (
+    "n_users",
+    "n_treated_users",
+    "n_periods",
+    "estimate",
+    "std_error",
+    "t_stat",
+    "p_value",
+    "ci_low",
+    "ci_high",
+)
+
+
+def _stratum_weighted_row_sums(matrix: sparse.csr_matrix, weights: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Per-row ``Σ_t matrix_it · weights[stratum(i), t]`` over the non-zero cells only."""
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    values = matrix.data * weights[codes[rows], matrix.indices]
+    return np.bincount(rows, weights=values, minlength=matrix.shape[0])
+
+
+def fit_twfe(
+    outcome: sparse.spmatrix,
+    treated: sparse.spmatrix,
+    codes: np.ndarray | None = None,
+    *,
+    confidence: float = 0.95,
+) -> pd.DataFrame:
+    """TWFE estimate of ``treated`` on ``outcome`` (both ``users × periods``) for every stratum at once.
+
+    ``codes`` assigns each user row a stratum ``0..S-1`` (all one stratum when
+    omitted; negative codes are left out). Standard errors are clustered by
+    user with the ``G / (G - 1)`` small-sample factor and the p-value and CI use
+    the normal approximation. Strata without treatment variation get NaN.
+    """
+    outcome = sparse.csr_matrix(outcome, dtype=np.float64)
+    treated = sparse.csr_matrix(treated, dtype=np.float64)
+    n_periods = outcome.shape[1]
+    codes = np.zeros(outcome.shape[0], dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+    keep = codes >= 0
+    if not keep.all():
+        outcome, treated, codes = outcome[keep], treated[keep], codes[keep]
+    n_strata = int(codes.max()) + 1 if len(codes) else 0
+
+    membership = sparse.csr_matrix(
+        (np.ones(len(codes)), (codes, np.arange(len(codes)))), shape=(n_strata, len(codes))
+    )
+    n_users = np.bincount(codes, minlength=n_strata).astype(np.float64)
+    safe_users = np.maximum(n_users, 1)[:, np.newaxis]
+    d_rows = np.asarray(treated.sum(axis=1)).ravel()
+    y_rows = np.asarray(outcome.sum(axis=1)).ravel()
+    # Per-stratum period means of D and y, and the stratum-wide mean of D.
+    d_period = np.asarray((membership @ treated).todense()) / safe_users
+    y_period = np.asarray((membership @ outcome).todense()) / safe_users
+    d_user = d_rows / n_periods
+    d_grand = d_period.mean(axis=1)
+
+    def tilde_dot_sparse(matrix: sparse.csr_matrix, matrix_rows: np.ndarray) -> np.ndarray:
+        # Σ_t D̃_it W_it with D̃ = D - d̄_i - d̄_t + d̄ and W sparse.
+        return (
+            np.asarray(treated.multiply(matrix).sum(axis=1)).ravel()
+            - (d_user - d_grand[codes]) * matrix_rows
+            - _stratum_weighted_row_sums(matrix, d_period, codes)
+        )
+
+    def tilde_dot_period(vector: np.ndarray) -> np.ndarray:
+        # Σ_t D̃_it v_t for a per-stratum period vector v.
+        totals = vector.sum(axis=1)
+        return (
+            _stratum_weighted_row_sums(treated, vector, codes)
+            - (d_user - d_grand[codes]) * totals[codes]
+            - (d_period * vector).sum(axis=1)[codes]
+        )
+
+    # D̃ rows sum to zero, so the user and grand means of y (and of D) drop out.
+    dy_rows = tilde_dot_sparse(outcome, y_rows) - tilde_dot_period(y_period)
+    dd_rows = tilde_dot_sparse(treated, d_rows) - tilde_dot_period(d_period)
+    sxy = np.bincount(codes, weights=dy_rows, minlength=n_strata)
+    sxx = np.bincount(codes, weights=dd_rows, minlength=n_strata)
+
+    valid = (sxx > 1e-12) & (n_users >= 2) & (n_periods >= 2)
+    safe_sxx = np.where(valid, sxx, 1.0)
+    estimate = np.where(valid, sxy / safe_sxx, np.nan)
+    scores = dy_rows - np.nan_to_num(estimate)[codes] * dd_rows
+    correction = n_users / np.maximum(n_users - 1, 1)
+    variance = correction * np.bincount(codes, weights=scores**2, minlength=n_strata) / safe_sxx**2
+    std_error = np.where(valid, np.sqrt(variance), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = np.where(std_error > 0, estimate / std_error, np.nan)
+
+    normal = NormalDist()
+    p_value = np.array([2 * normal.cdf(-abs(value)) if np.isfinite(value) else np.nan for value in t_stat])
+    z = normal.inv_cdf(1 - (1 - confidence) / 2)
+    return pd.DataFrame(
+        {
+            "n_users": n_users.astype(np.int64),
+            "n_treated_users": np.bincount(codes, weights=d_rows > 0, minlength=n_strata).astype(np.int64),
+            "n_periods": n_periods,
+            "estimate": estimate,
+            "std_error": std_error,
+            "t_stat": t_stat,
+            "p_value": p_value,
+            "ci_low": estimate - z * std_error,
+            "ci_high": estimate + z * std_error,
+        },
+        columns=list(RESULT_COLUMNS),
+    )
+
+
+@dataclass
+class UserPeriodPanel:
+    """Balanced ``users × periods`` panel of post counts with a staggered treatment indicator.
+
+    ``users`` is the baseline table (one row per user, in matrix row order)
+    with a ``baseline_period`` column; ``outcome[i, t]`` counts user ``i``'s
+    posts in period ``t`` and ``treated[i, t]`` is 1 for Treatment users from
+    the period containing their baseline onwards.
+    """
+
+    users: pd.DataFrame
+    periods: pd.DatetimeIndex
+    outcome: sparse.csr_matrix
+    treated: sparse.csr_matrix
+
+    @classmethod
+    def from_posts(
+        cls,
+        posts: pd.DataFrame,
+        baselines: pd.DataFrame,
+        *,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        freq: str = "1D",
+        user_col: str = "account_id",
+        time_col: str = "created_at",
+        baseline_col: str = "baseline_date",
+        group_col: str = "group",
+        treatment: Any = "Treatment",
+        mask: str | Sequence[bool] | pd.Series | None = None,
+    ) -> "UserPeriodPanel":
+        """Bin ``posts`` inside ``[start, end]`` into ``freq``-long periods for the ``baselines`` users.
+
+        Users without posts still get an all-zero row. ``mask`` works as in
+        :class:`~ai_data_lab.impact.panel.BeforeAfterPanel`.
+        """
+        step = pd.Timedelta(freq)
+        n_periods = int((end - start) // step) + 1
+        periods = pd.DatetimeIndex([start + step * position for position in range(n_periods)])
+        users = baselines.drop_duplicates(user_col).reset_index(drop=True)
+        n_users = len(users)
+
+        if mask is not None:
+            posts = posts[posts[mask] if isinstance(mask, str) else np.asarray(mask, dtype=bool)]
+        posts = posts[(posts[time_col] >= start) & (posts[time_col] <= end)]
+        rows = pd.Index(users[user_col]).get_indexer(posts[user_col])
+        found = rows >= 0
+        columns = ((posts[time_col] - start) // step).to_numpy()[found].astype(np.int64)
+        outcome = sparse.csr_matrix(
+            (np.ones(int(found.sum())), (rows[found], columns)), shape=(n_users, n_periods)
+        )
+        outcome.sum_duplicates()
+
+        baseline_period = ((pd.to_datetime(users[baseline_col]) - start) // step).clip(lower=0).to_numpy()
+        users = users.assign(baseline_period=baseline_period.astype(np.int64))
+        treated_rows = np.flatnonzero((users[group_col] == treatment).to_numpy() & (baseline_period < n_periods))
+        first = users["baseline_period"].to_numpy()[treated_rows]
+        lengths = n_periods - first
+        # Column of each treated cell: first period + offset within the user's run.
+        offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        treated = sparse.csr_matrix(
+            (np.ones(len(offsets)), (np.repeat(treated_rows, lengths), np.repeat(first, lengths) + offsets)),
+            shape=(n_users, n_periods),
+        )
+        return cls(users=users, periods=periods, outcome=outcome, treated=treated)
+
+    def fit(self, *, confidence: float = 0.95) -> pd.Series:
+        """TWFE estimate over all users."""
+        return fit_twfe(self.outcome, self.treated, confidence=confidence).iloc[0]
+
+    def fit_by(
+        self,
+        strata: str | pd.Series | Sequence[Any],
+        *,
+        name: str | None = None,
+        confidence: float = 0.95,
+    ) -> pd.DataFrame:
+        """One TWFE estimate per stratum, all strata in a single pass.
+
+        ``strata`` is a ``users`` column or values in ``users`` row order.
+        Users with a missing stratum are left out.
+        """
+        if isinstance(strata, str):
+            labels, name = self.users[strata], name or strata
+        else:
+            labels, name = pd.Series(np.asarray(strata, dtype=object)), name or "stratum"
+        codes, values = pd.factorize(labels, sort=True)
+        df_fit = fit_twfe(self.outcome, self.treated, codes, confidence=confidence)
+        df_fit.insert(0, name, values[: len(df_fit)])
+        return df_fit.reset_index(drop=True)
@@ -0,0 +1,201 @@
+"""Bootstrap confidence intervals and permutation tests for many strata at once.
+
+Values are laid out contiguously per stratum, and a chunk of resamples is one
+``(resamples, n_values)`` index matrix covering every stratum: bootstrap
+indices are ``start + floor(u · size)`` and within-stratum permutations are an
+``argsort`` of ``stratum_id + u``. Means reduce each stratum's slice with
+``np.add.reduceat``; medians are taken per slice. Chunks are sized so a matrix
+never exceeds ``max_elements`` entries.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterator, Sequence
+
+import numpy as np
+import pandas as pd
+
+STATISTICS = ("mean", "median")
+
+
+def _chunks(n_resamples: int, width: int, max_elements: int) -> Iterator[int]:
+    size = max(1, max_elements // max(width, 1))
+    for start in range(0, n_resamples, size):
+        yield min(size, n_resamples - start)
+
+
+def _segment_stat(matrix: np.ndarray, starts: np.ndarray, sizes: np.ndarray, statistic: str) -> np.ndarray:
+    """``statistic`` of every contiguous column segment, shape ``(rows, segments)``."""
+    if statistic == "mean":
+        return np.add.reduceat(matrix, starts, axis=1) / sizes
+    return np.column_stack([np.median(matrix[:, start : start + size], axis=1) for start, size in zip(starts, sizes)])
+
+
+def _layout(df: pd.DataFrame, value_col: str, by: list[str]) -> tuple[pd.DataFrame, np.ndarray, np.ndarray, np.ndarray]:
+    """Values sorted by stratum, with each stratum's key, start offset and size."""
+    df = df[df[value_col].notna()]
+    if by:
+        df = df.sort_values(by, kind="stable")
+        sizes_frame = df.groupby(by, sort=False).size().reset_index(name="n")
+    else:
+        sizes_frame = pd.DataFrame({"n": [len(df)]})
+    sizes = sizes_frame["n"].to_numpy()
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    return sizes_frame, df[value_col].to_numpy(dtype=np.float64), starts, sizes
+
+
+def _bootstrap_distribution(
+    values: np.ndarray,
+    starts: np.ndarray,
+    sizes: np.ndarray,
+    *,
+    statistic: str,
+    n_resamples: int,
+    rng: np.random.Generator,
+    max_elements: int,
+) -> np.ndarray:
+    """Bootstrap replicates of every stratum's statistic, shape ``(n_resamples, strata)``."""
+    offsets = np.repeat(starts, sizes)
+    widths = np.repeat(sizes, sizes)
+    replicates = []
+    for size in _chunks(n_resamples, len(values), max_elements):
+        index = offsets + (rng.random((size, len(values))) * widths).astype(np.int64)
+        replicates.append(_segment_stat(values[index], starts, sizes, statistic))
+    return np.vstack(replicates)
+
+
+def bootstrap(
+    df: pd.DataFrame,
+    value_col: str,
+    by: str | Sequence[str] = (),
+    *,
+    statistic: str = "mean",
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    max_elements: int = 5_000_000,
+) -> pd.DataFrame:
+    """Percentile bootstrap CI of ``statistic(value_col)`` for every ``by`` stratum (NaNs dropped)."""
+    if statistic not in STATISTICS:
+        raise ValueError(f"statistic must be one of {STATISTICS}")
+    by = [by] if isinstance(by, str) else list(by)
+    df_strata, values, starts, sizes = _layout(df, value_col, by)
+    if len(values) == 0:
+        return df_strata.assign(estimate=np.nan, ci_low=np.nan, ci_high=np.nan).iloc[0:0]
+
+    estimate = _segment_stat(values[np.newaxis, :], starts, sizes, statistic)[0]
+    replicates = _bootstrap_distribution(
+        values,
+        starts,
+        sizes,
+        statistic=statistic,
+        n_resamples=n_resamples,
+        rng=np.random.default_rng(seed),
+        max_elements=max_elements,
+    )
+    alpha = (1 - confidence) / 2
+    return df_strata.assign(
+        estimate=estimate,
+        ci_low=np.quantile(replicates, alpha, axis=0),
+        ci_high=np.quantile(replicates, 1 - alpha, axis=0),
+    )
+
+
+def compare_groups(
+    df: pd.DataFrame,
+    value_col: str,
+    *,
+    by: str | Sequence[str] = (),
+    group_col: str = "group",
+    treatment: Any = "Treatment",
+    control: Any = "Control",
+    statistic: str = "mean",
+    n_resamples: int = 2000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    max_elements: int = 5_000_000,
+) -> pd.DataFrame:
+    """Treatment minus Control ``statistic`` per ``by`` stratum with a bootstrap CI and permutation p-value.
+
+    The CI resamples each group independently; the two-sided p-value comes
+    from shuffling group labels within the stratum. Strata missing either
+    group get NaN for the comparison columns.
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"statistic must be one of {STATISTICS}")
+    by = [by] if isinstance(by, str) else list(by)
+    df = df[df[group_col].isin([treatment, control]) & df[value_col].notna()]
+    # Treatment rows first within each stratum, so a stratum's pooled slice is [treatment | control].
+    df = df.assign(_is_control=(df[group_col] == control).astype(np.int8))
+    df_cells, values, starts, sizes = _layout(df, value_col, [*by, "_is_control"])
+    rng = np.random.default_rng(seed)
+
+    df_cells["estimate"] = (
+        _segment_stat(values[np.newaxis, :], starts, sizes, statistic)[0] if len(values) else np.array([])
+    )
+    df_cells["start"] = starts
+    keys = list(df_cells[by].drop_duplicates().itertuples(index=False, name=None)) if by else [()]
+    cells = df_cells.set_index([*by, "_is_control"]) if by else df_cells.set_index("_is_control")
+
+    def cell(key: tuple, is_control: int) -> pd.Series | None:
+        index = (*key, is_control) if by else is_control
+        return cells.loc[index] if index in cells.index else None
+
+    rows = []
+    complete: list[tuple[int, int, int]] = []
+    for key in keys:
+        treated, untreated = cell(key, 0), cell(key, 1)
+        n_t = int(treated["n"]) if treated is not None else 0
+        n_c = int(untreated["n"]) if untreated is not None else 0
+        row = dict(zip(by, key))
+        row.update(
+            n_treatment=n_t,
+            n_control=n_c,
+            treatment=treated["estimate"] if treated is not None else np.nan,
+            control=untreated["estimate"] if untreated is not None else np.nan,
+        )
+        row["diff"] = row["treatment"] - row["control"]
+        rows.append(row)
+        if n_t and n_c:
+            complete.append((len(rows) - 1, int(treated["start"]), n_t + n_c))
+
+    df_result = pd.DataFrame(rows)
+    for column in ("ci_low", "ci_high", "p_value"):
+        df_result[column] = np.nan
+    if not complete:
+        return df_result
+
+    positions = [position for position, _, _ in complete]
+    pooled_starts = np.array([start for _, start, _ in complete], dtype=np.int64)
+    pooled_sizes = np.array([size for _, _, size in complete], dtype=np.int64)
+    n_treatment = df_result.loc[positions, "n_treatment"].to_numpy()
+    pooled = np.concatenate([values[start : start + size] for start, size in zip(pooled_starts, pooled_sizes)])
+    starts = np.concatenate([[0], np.cumsum(pooled_sizes)[:-1]]).astype(np.int64)
+    # Each pooled stratum splits into a treatment and a control segment.
+    split_starts = np.column_stack([starts, starts + n_treatment]).ravel()
+    split_sizes = np.column_stack([n_treatment, pooled_sizes - n_treatment]).ravel()
+
+    replicates = _bootstrap_distribution(
+        pooled,
+        split_starts,
+        split_sizes,
+        statistic=statistic,
+        n_resamples=n_resamples,
+        rng=rng,
+        max_elements=max_elements,
+    )
+    differences = replicates[:, 0::2] - replicates[:, 1::2]
+    alpha = (1 - confidence) / 2
+    df_result.loc[positions, "ci_low"] = np.quantile(differences, alpha, axis=0)
+    df_result.loc[positions, "ci_high"] = np.quantile(differences, 1 - alpha, axis=0)
+
+    observed = np.abs(df_result.loc[positions, "diff"].to_numpy())
+    stratum_ids = np.repeat(np.arange(len(pooled_sizes)), pooled_sizes).astype(np.float64)
+    extreme = np.zeros(len(positions), dtype=np.int64)
+    for size in _chunks(n_resamples, len(pooled), max_elements):
+        order = np.argsort(stratum_ids + rng.random((size, len(pooled))), axis=1)
+        permuted = _segment_stat(pooled[order], split_starts, split_sizes, statistic)
+        permuted_diff = np.abs(permuted[:, 0::2] - permuted[:, 1::2])
+        extreme += (permuted_diff >= observed - 1e-12).sum(axis=0)
+    df_result.loc[positions, "p_value"] = (extreme + 1) / (n_resamples + 1)
+    return df_result
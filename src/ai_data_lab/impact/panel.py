@@ -0,0 +1,155 @@
+"""Per-user before/after panels around a baseline date.
+
+The IRC impact notebook compares each user's posting behaviour before and after
+a per-user baseline date. Filtering the whole post table once per user is
+``O(users × posts)``; :class:`BeforeAfterPanel` instead joins the posts to the
+baseline table once, labels every post ``before``/``after`` and answers each
+metric with a single ``groupby`` over ``(user, period)``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+PERIODS = ("before", "after")
+
+
+class BeforeAfterPanel:
+    """Posts inside ``[start, end]`` joined to their user's group and baseline and labelled by period.
+
+    ``baselines`` has one row per user (``user_col``, ``group_col``,
+    ``baseline_col``); its order is the row order of every result. ``mask``
+    (a boolean column name or array aligned with ``posts``) restricts the posts
+    considered, e.g. ``"has_member_tag"``.
+    """
+
+    def __init__(
+        self,
+        posts: pd.DataFrame,
+        baselines: pd.DataFrame,
+        *,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        user_col: str = "account_id",
+        time_col: str = "created_at",
+        baseline_col: str = "baseline_date",
+        group_col: str = "group",
+        mask: str | Sequence[bool] | pd.Series | None = None,
+    ) -> None:
+        self.start = start
+        self.end = end
+        self.user_col = user_col
+        self.time_col = time_col
+        self.baseline_col = baseline_col
+        self.group_col = group_col
+
+        self.users = (
+            baselines[[user_col, group_col, baseline_col]].drop_duplicates(user_col).reset_index(drop=True)
+        )
+        self.users[baseline_col] = pd.to_datetime(self.users[baseline_col])
+
+        if mask is not None:
+            posts = posts[posts[mask] if isinstance(mask, str) else np.asarray(mask, dtype=bool)]
+        posts = posts[(posts[time_col] >= start) & (posts[time_col] <= end)]
+        labelled = posts.drop(columns=[group_col, baseline_col], errors="ignore").merge(
+            self.users, on=user_col, how="inner"
+        )
+        labelled["period"] = np.where(labelled[time_col] >= labelled[baseline_col], "after", "before")
+        self.posts = labelled
+
+    def _posts(self, window_days: float | None) -> pd.DataFrame:
+        """Labelled posts, optionally only ``[baseline - window, baseline + window)``."""
+        if window_days is None:
+            return self.posts
+        window = pd.Timedelta(days=window_days)
+        offset = self.posts[self.time_col] - self.posts[self.baseline_col]
+        return self.posts[(offset >= -window) & (offset < window)]
+
+    def _by_period(self, values: pd.Series, name: str, fill: Any) -> pd.DataFrame:
+        """``(user, period)`` indexed ``values`` as ``{name}_before`` / ``{name}_after`` columns in user order."""
+        wide = values.unstack("period").reindex(columns=list(PERIODS))
+        wide = wide.reindex(self.users[self.user_col]).fillna(fill)
+        wide.columns = [f"{name}_{period}" for period in PERIODS]
+        return wide.reset_index(drop=True)
+
+    def counts(self, name: str = "count", *, window_days: float | None = None) -> pd.DataFrame:
+        """Posts per user and period."""
+        posts = self._posts(window_days)
+        sizes = posts.groupby([self.user_col, "period"]).size()
+        return self._by_period(sizes, name, 0).astype(np.int64)
+
+    def means(
+        self,
+        columns: Sequence[str] | Mapping[str, str],
+        *,
+        window_days: float | None = None,
+        fill: float = 0.0,
+    ) -> pd.DataFrame:
+        """Per-post mean of each column per user and period (``fill`` when a period has no posts).
+
+        ``columns`` may map source columns to output prefixes, e.g.
+        ``{"like_count": "like"}`` gives ``like_before`` / ``like_after``.
+        """
+        names = dict(columns) if isinstance(columns, Mapping) else {column: column for column in columns}
+        posts = self._posts(window_days)
+        grouped = posts.groupby([self.user_col, "period"])[list(names)].mean()
+        return pd.concat([self._by_period(grouped[column], name, fill) for column, name in names.items()], axis=1)
+
+    def active_days(self, name: str = "days_posted", *, window_days: float | None = None) -> pd.DataFrame:
+        """Distinct calendar days with at least one post, per user and period."""
+        posts = self._posts(window_days)
+        days = posts.assign(_day=posts[self.time_col].dt.date).groupby([self.user_col, "period"])["_day"].nunique()
+        return self._by_period(days, name, 0).astype(np.int64)
+
+    def mode(self, column: str, name: str | None = None, *, default: Any = "N/A") -> pd.DataFrame:
+        """Most frequent ``column`` value per user over both periods (ties go to the smallest value)."""
+        sizes = self.posts.groupby([self.user_col, column]).size().rename("_n").reset_index()
+        top = (
+            sizes.sort_values([self.user_col, "_n", column], ascending=[True, False, True])
+            .drop_duplicates(self.user_col)
+            .set_index(self.user_col)[column]
+        )
+        values = top.reindex(self.users[self.user_col]).to_numpy(dtype=object)
+        values[pd.isna(values)] = default
+        return pd.DataFrame({name or column: values})
+
+    def observation_days(self) -> pd.DataFrame:
+        """Days from ``start`` to the baseline and from the baseline to ``end`` (at least 1)."""
+        baseline = self.users[self.baseline_col]
+        return pd.DataFrame(
+            {
+                "days_before": (baseline - self.start).dt.days.clip(lower=1),
+                "days_after": (self.end - baseline).dt.days.clip(lower=1),
+            }
+        )
+
+    def rates(self, name: str = "count") -> pd.DataFrame:
+        """Counts, per-day rates, their change and the after/before rate ratio per user."""
+        counts = self.counts(name)
+        days = self.observation_days()
+        rate_before = counts[f"{name}_before"] / days["days_before"]
+        rate_after = counts[f"{name}_after"] / days["days_after"]
+        return pd.concat(
+            [
+                counts,
+                pd.DataFrame(
+                    {
+                        "change": counts[f"{name}_after"] - counts[f"{name}_before"],
+                        "days_before": days["days_before"],
+                        "days_after": days["days_after"],
+                        "rate_before": rate_before,
+                        "rate_after": rate_after,
+                        "rate_change": rate_after - rate_before,
+                        "ratio": (rate_after / rate_before).where(rate_before > 0),
+                    }
+                ),
+            ],
+            axis=1,
+        )
+
+    def frame(self, *parts: pd.DataFrame) -> pd.DataFrame:
+        """``users`` (id, group, baseline) with the given per-user result frames alongside."""
+        return pd.concat([self.users, *parts], axis=1)
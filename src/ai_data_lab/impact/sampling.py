@@ -0,0 +1,75 @@
+"""Vectorized stratified sampling of posts.
+
+Every row gets a random key; keeping the rows whose key ranks within the
+first ``n`` of their stratum draws ``min(n, size)`` rows per stratum without
+replacement, for all strata in one grouped rank. Keys derived from a row ID
+make the sample identical for a given seed regardless of row order.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .panel import PERIODS
+
+
+def random_keys(df: pd.DataFrame, *, seed: int = 0, id_col: str | None = None) -> np.ndarray:
+    """Uniform keys in ``[0, 1)``; hashed from ``id_col`` (order independent) when given."""
+    if id_col is None:
+        return np.random.default_rng(seed).random(len(df))
+    hashed = pd.util.hash_pandas_object(df[id_col].astype(str), index=False, hash_key=f"{seed:016d}"[-16:])
+    return (hashed.to_numpy() >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def stratified_sample(
+    df: pd.DataFrame,
+    by: str | Sequence[str],
+    n: int,
+    *,
+    seed: int = 0,
+    id_col: str | None = None,
+) -> pd.DataFrame:
+    """Up to ``n`` rows drawn without replacement from every ``by`` stratum."""
+    by = [by] if isinstance(by, str) else list(by)
+    keyed = df.assign(_key=random_keys(df, seed=seed, id_col=id_col))
+    rank = keyed.groupby(by, sort=False)["_key"].rank(method="first")
+    return keyed[rank <= n].sort_values([*by, "_key"], kind="stable").drop(columns="_key")
+
+
+def matched_group_sample(
+    df: pd.DataFrame,
+    *,
+    n_per_stratum: int,
+    user_col: str = "account_id",
+    period_col: str = "period",
+    group_col: str = "group",
+    treatment: Any = "Treatment",
+    control: Any = "Control",
+    seed: int = 0,
+    id_col: str | None = None,
+) -> pd.DataFrame:
+    """Up to ``n_per_stratum`` rows per (user, period); Control capped at the Treatment total.
+
+    Control users are visited in random order (each user's ``before`` rows
+    first, then ``after``) and their sampled rows are kept until the Control
+    sample is as large as the Treatment sample.
+    """
+    strata = [user_col, period_col]
+    sampled = stratified_sample(df[df[group_col].isin([treatment, control])], strata, n_per_stratum, seed=seed, id_col=id_col)
+    period_order = {period: position for position, period in enumerate(PERIODS)}
+    sampled = sampled.assign(_period_order=sampled[period_col].map(period_order))
+
+    df_treatment = sampled[sampled[group_col] == treatment].sort_values([user_col, "_period_order"], kind="stable")
+    df_control = sampled[sampled[group_col] == control]
+    users = pd.Series(df_control[user_col].unique())
+    user_keys = pd.Series(random_keys(users.to_frame(user_col), seed=seed + 1, id_col=user_col), index=users)
+    df_control = (
+        df_control.assign(_user_key=df_control[user_col].map(user_keys))
+        .sort_values(["_user_key", "_period_order"], kind="stable")
+        .head(len(df_treatment))
+        .drop(columns="_user_key")
+    )
+    return pd.concat([df_treatment, df_control]).drop(columns="_period_order").reset_index(drop=True)
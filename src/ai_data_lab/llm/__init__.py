@@ -0,0 +1,51 @@
+"""Helpers for batching and executing LLM scoring workloads."""
+
+from .batching import (
+    BatchItem,
+    BatchPacker,
+    BatchRunResult,
+    MalformedResponseError,
+    PromptBatch,
+    estimate_tokens,
+    run_batches,
+    truncate_to_tokens,
+)
+from .client import InstrumentedGenAIClient
+from .dedup import DedupResult, find_near_duplicates, normalize_text
+from .structured import (
+    ItemLedger,
+    ParseOutcome,
+    extract_json,
+    gemini_response_schema,
+    generation_config,
+    iter_array_items,
+    parse_batch_response,
+    validate_payload,
+)
+from .usage import UsageEvent, UsageRecorder, summarize_usage
+
+__all__ = [
+    "BatchItem",
+    "BatchPacker",
+    "BatchRunResult",
+    "DedupResult",
+    "InstrumentedGenAIClient",
+    "ItemLedger",
+    "MalformedResponseError",
+    "ParseOutcome",
+    "PromptBatch",
+    "UsageEvent",
+    "UsageRecorder",
+    "estimate_tokens",
+    "extract_json",
+    "find_near_duplicates",
+    "gemini_response_schema",
+    "generation_config",
+    "iter_array_items",
+    "normalize_text",
+    "parse_batch_response",
+    "run_batches",
+    "summarize_usage",
+    "truncate_to_tokens",
+    "validate_payload",
+]
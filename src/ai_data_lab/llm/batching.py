@@ -0,0 +1,193 @@
+"""Token-aware packing of many small items into multi-item LLM prompts."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterable, Mapping, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Return a fast, slightly pessimistic token estimate for ``text``.
+
+    Gemini/GPT style tokenizers spend roughly one token per Japanese character and
+    one token per ~4 ASCII characters, which is close enough for budgeting without
+    a round trip to ``count_tokens``.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return other_chars + (ascii_chars + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of ``text`` whose estimate fits in ``max_tokens``."""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+@dataclass(frozen=True, slots=True)
+class BatchItem:
+    """Single prompt item with its caller-supplied identifier."""
+
+    item_id: str
+    text: str
+    tokens: int
+
+
+@dataclass(slots=True)
+class PromptBatch:
+    """Group of items that are sent together in one request."""
+
+    items: list[BatchItem]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def ids(self) -> list[str]:
+        return [item.item_id for item in self.items]
+
+    @property
+    def tokens(self) -> int:
+        return sum(item.tokens for item in self.items)
+
+    def subset(self, ids: Iterable[str]) -> "PromptBatch":
+        wanted = set(ids)
+        return PromptBatch([item for item in self.items if item.item_id in wanted])
+
+    def split(self) -> tuple["PromptBatch", "PromptBatch"]:
+        middle = len(self.items) // 2
+        return PromptBatch(self.items[:middle]), PromptBatch(self.items[middle:])
+
+
+@dataclass
+class BatchPacker:
+    """Greedily fills prompts up to ``token_budget`` while preserving input order.
+
+    ``prompt_overhead`` reserves room for the fixed instructions of the template and
+    ``item_overhead`` accounts for the per-item ID prefix and the item's share of the
+    JSON answer. Items longer than ``max_item_tokens`` are truncated instead of
+    blowing up a whole request.
+    """
+
+    token_budget: int = 4000
+    prompt_overhead: int = 600
+    item_overhead: int = 12
+    max_item_tokens: int = 400
+    max_items: int = 100
+
+    def __post_init__(self) -> None:
+        if self.token_budget <= self.prompt_overhead:
+            raise ValueError("token_budget must be larger than prompt_overhead.")
+        if self.max_items < 1:
+            raise ValueError("max_items must be at least 1.")
+
+    def make_item(self, item_id: Hashable, text: str | None) -> BatchItem:
+        text = text or ""
+        available = min(self.max_item_tokens, self.token_budget - self.prompt_overhead - self.item_overhead)
+        text = truncate_to_tokens(text, available)
+        key = str(item_id)
+        return BatchItem(key, text, estimate_tokens(text) + estimate_tokens(key) + self.item_overhead)
+
+    def pack(self, items: Iterable[tuple[Hashable, str | None]]) -> list[PromptBatch]:
+        """Pack ``(item_id, text)`` pairs into prompt batches."""
+        capacity = self.token_budget - self.prompt_overhead
+        batches: list[PromptBatch] = []
+        current: list[BatchItem] = []
+        used = 0
+        for item_id, text in items:
+            item = self.make_item(item_id, text)
+            if current and (used + item.tokens > capacity or len(current) >= self.max_items):
+                batches.append(PromptBatch(current))
+                current, used = [], 0
+            current.append(item)
+            used += item.tokens
+        if current:
+            batches.append(PromptBatch(current))
+        return batches
+
+
+class MalformedResponseError(ValueError):
+    """Raised by batch callables when a response cannot be mapped back to items."""
+
+
+BatchCall = Callable[[PromptBatch], Mapping[str, Any]]
+
+
+@dataclass
+class BatchRunResult:
+    """Outcome of :func:`run_batches`."""
+
+    results: dict[str, Any] = field(default_factory=dict)
+    failures: dict[str, str] = field(default_factory=dict)
+    calls: int = 0
+    retry_calls: int = 0
+
+    @property
+    def failed_ids(self) -> list[str]:
+        return list(self.failures)
+
+
+def run_batches(
+    batches: Sequence[PromptBatch],
+    call: BatchCall,
+    *,
+    on_batch: Callable[[PromptBatch, int], None] | None = None,
+) -> BatchRunResult:
+    """Execute ``call`` for every batch, retrying only the items that failed.
+
+    ``call`` must return a mapping of item ID to parsed result. Items that are
+    missing from the mapping are retried as a smaller batch; when the call raises
+    (e.g. :class:`MalformedResponseError`) or returns nothing usable, the batch is
+    bisected and each half retried, so a single bad item ends up isolated and
+    recorded in ``failures`` instead of failing its neighbours. ``call`` should
+    handle its own transient-API retries; every exception here triggers bisection.
+    ``on_batch`` receives each batch and the number of items resolved by it.
+    """
+    outcome = BatchRunResult()
+    pending: list[tuple[PromptBatch, bool]] = [(batch, False) for batch in reversed(batches) if len(batch)]
+
+    while pending:
+        batch, is_retry = pending.pop()
+        outcome.calls += 1
+        if is_retry:
+            outcome.retry_calls += 1
+
+        error = ""
+        try:
+            response = call(batch)
+        except Exception as exc:  # noqa: BLE001 - any failure is isolated by bisection
+            response = {}
+            error = f"{type(exc).__name__}: {str(exc)[:200]}"
+
+        wanted = set(batch.ids)
+        resolved = {key: value for key, value in (response or {}).items() if key in wanted}
+        outcome.results.update(resolved)
+        if on_batch is not None:
+            on_batch(batch, len(resolved))
+
+        missing = [item_id for item_id in batch.ids if item_id not in resolved]
+        if not missing:
+            continue
+        if resolved:
+            # Partially answered: resend only the unanswered items.
+            pending.append((batch.subset(missing), True))
+        elif len(batch) > 1:
+            first, second = batch.split()
+            pending.append((second, True))
+            pending.append((first, True))
+        else:
+            outcome.failures[batch.ids[0]] = error or "missing from response"
+
+    return outcome
@@ -0,0 +1,391 @@
+"""Resumable offline LLM scoring jobs over a Parquet corpus.
+
+A job reads ``(id, text)`` rows from a Parquet file in fixed-size shards and
+writes one output Parquet file per shard next to a ``manifest.json``
+checkpoint. Items finished inside an unfinished shard are kept in a per-shard
+ledger, so a killed job resumes at the last completed batch rather than at
+zero. A shard that finished with failed items keeps its ledger and is re-run
+on the next resume, retrying only those items; until then the job status is
+``partial`` and the CLI exits non-zero. Jobs normally run detached from marimo::
+
+    python -m ai_data_lab.llm.bulk run --task sentiment \\
+        --input data/posts.parquet --output data/bulk/sentiment --detach
+    python -m ai_data_lab.llm.bulk status --output data/bulk/sentiment
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Mapping, Sequence
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+
+from .batching import BatchCall, BatchPacker, BatchRunResult, MalformedResponseError, PromptBatch, run_batches
+from .dedup import find_near_duplicates
+from .prompts import emotion_batch_prompt, sentiment_batch_prompt
+from .schemas import EmotionBatch, PostEmotions, SentimentBatch, SentimentScore
+from .structured import ItemLedger, generation_config, parse_batch_response
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _now_iso() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+@dataclass(frozen=True)
+class BulkTask:
+    """Prompt, response schema and output columns for one scoring task."""
+
+    name: str
+    item_model: type[BaseModel]
+    batch_model: type[BaseModel]
+    build_prompt: Callable[[PromptBatch], str]
+    to_row: Callable[[Mapping[str, Any]], dict[str, Any]]
+
+
+def _sentiment_row(result: Mapping[str, Any]) -> dict[str, Any]:
+    return {"malice": result.get("malice"), "positivity": result.get("positivity")}
+
+
+def _emotion_row(result: Mapping[str, Any]) -> dict[str, Any]:
+    return {"emotions": json.dumps(result.get("emotions", []), ensure_ascii=False)}
+
+
+TASKS: dict[str, BulkTask] = {
+    "sentiment": BulkTask("sentiment", SentimentScore, SentimentBatch, sentiment_batch_prompt, _sentiment_row),
+    "emotion": BulkTask("emotion", PostEmotions, EmotionBatch, emotion_batch_prompt, _emotion_row),
+}
+
+
+class RateLimiter:
+    """Spaces requests so that at most ``requests_per_minute`` start per minute."""
+
+    def __init__(self, requests_per_minute: float | None) -> None:
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def gemini_scorer(client: Any, task: BulkTask, *, model: str) -> BatchCall:
+    """Return a batch call that sends ``task`` prompts through a google-genai client."""
+    config = generation_config(task.batch_model)
+
+    def call(batch: PromptBatch) -> Mapping[str, BaseModel]:
+        response = client.models.generate_content(model=model, contents=task.build_prompt(batch), config=config)
+        parsed = parse_batch_response(response.text, task.item_model, expected_ids=batch.ids)
+        if not parsed.items:
+            raise MalformedResponseError(next(iter(parsed.failures.values()), "empty response"))
+        return parsed.items
+
+    return call
+
+
+@dataclass
+class BulkJobConfig:
+    """Parameters of a bulk job; persisted in the manifest to detect mismatched resumes."""
+
+    task: str
+    input_path: str
+    output_dir: str
+    id_col: str = "post_id"
+    text_col: str = "content"
+    model: str = "gemini-2.5-flash"
+    shard_size: int = 1000
+    token_budget: int = 4000
+    max_item_tokens: int = 300
+    workers: int = 4
+    requests_per_minute: float | None = None
+    dedup_threshold: float | None = 0.9
+
+    def identity(self) -> dict[str, Any]:
+        """Fields that must not change between a run and its resume."""
+        source = Path(self.input_path)
+        stat = source.stat()
+        return {
+            "task": self.task,
+            "input_path": str(source.resolve()),
+            "input_size": stat.st_size,
+            "input_mtime_ns": stat.st_mtime_ns,
+            "id_col": self.id_col,
+            "text_col": self.text_col,
+            "model": self.model,
+            "shard_size": self.shard_size,
+        }
+
+
+@dataclass
+class ShardResult:
+    rows: int
+    ok: int
+    failed: int
+    api_calls: int
+    path: str
+    finished_at: str = field(default_factory=_now_iso)
+
+
+class BulkJob:
+    """Runs a :class:`BulkJobConfig` shard by shard, checkpointing after each one."""
+
+    def __init__(self, config: BulkJobConfig, scorer: BatchCall) -> None:
+        if config.task not in TASKS:
+            raise ValueError(f"Unknown task: {config.task}. Choose from {sorted(TASKS)}.")
+        self.config = config
+        self.task = TASKS[config.task]
+        self._scorer = scorer
+        self._limiter = RateLimiter(config.requests_per_minute)
+        self.output_dir = Path(config.output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+        self._packer = BatchPacker(token_budget=config.token_budget, max_item_tokens=config.max_item_tokens)
+
+    # Manifest -----------------------------------------------------------------------
+    def load_manifest(self) -> dict[str, Any]:
+        identity = self.config.identity()
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            if manifest.get("identity") != identity:
+                raise RuntimeError(
+                    f"{self.manifest_path} belongs to a different input/task; use a new output directory."
+                )
+            return manifest
+        return {
+            "identity": identity,
+            "config": asdict(self.config),
+            "total_rows": pq.ParquetFile(self.config.input_path).metadata.num_rows,
+            "shards": {},
+            "status": "pending",
+            "created_at": _now_iso(),
+        }
+
+    def _write_manifest(self, manifest: dict[str, Any]) -> None:
+        manifest["updated_at"] = _now_iso()
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+        os.replace(tmp_path, self.manifest_path)
+
+    # Execution ----------------------------------------------------------------------
+    def run(self) -> dict[str, Any]:
+        manifest = self.load_manifest()
+        manifest.update(status="running", pid=os.getpid())
+        self._write_manifest(manifest)
+
+        parquet_file = pq.ParquetFile(self.config.input_path)
+        columns = [self.config.id_col, self.config.text_col]
+        batches = parquet_file.iter_batches(batch_size=self.config.shard_size, columns=columns)
+        for shard_index, record_batch in enumerate(batches):
+            key = f"{shard_index:05d}"
+            # Shards with failed items are re-run; their ledger skips the items already scored.
+            if key in manifest["shards"] and not manifest["shards"][key]["failed"]:
+                continue
+            ids = [str(value) for value in record_batch.column(self.config.id_col).to_pylist()]
+            texts = [value or "" for value in record_batch.column(self.config.text_col).to_pylist()]
+            manifest["shards"][key] = asdict(self._run_shard(key, ids, texts))
+            self._write_manifest(manifest)
+            logger.info("Shard %s done (%s rows)", key, len(ids))
+
+        failed = sum(shard["failed"] for shard in manifest["shards"].values())
+        manifest["status"] = "partial" if failed else "completed"
+        self._write_manifest(manifest)
+        return manifest
+
+    def _run_shard(self, key: str, ids: Sequence[str], texts: Sequence[str]) -> ShardResult:
+        ledger = ItemLedger(self.output_dir / "_ledger" / f"shard-{key}.jsonl")
+        todo_ids = set(ledger.todo(ids))
+        todo_rows = [index for index, item_id in enumerate(ids) if item_id in todo_ids]
+
+        # Collapse near-duplicates inside the shard; only representatives are sent.
+        if self.config.dedup_threshold and todo_rows:
+            dedup = find_near_duplicates([texts[index] for index in todo_rows], threshold=self.config.dedup_threshold)
+            representative_of = [todo_rows[rep] for rep in dedup.representative_of.tolist()]
+        else:
+            representative_of = list(todo_rows)
+        reps = sorted(set(representative_of))
+
+        outcome = self._score(self._packer.pack((ids[index], texts[index]) for index in reps), ledger)
+
+        member_results = {}
+        for index, rep in zip(todo_rows, representative_of):
+            if index != rep and ids[rep] in outcome.results:
+                member_results[ids[index]] = outcome.results[ids[rep]]
+        ledger.record_success(member_results)
+
+        done = ledger.results()
+        rows = []
+        for index, item_id in enumerate(ids):
+            result = done.get(item_id)
+            row = {self.config.id_col: item_id, "status": "ok" if result is not None else "failed"}
+            row["error"] = None if result is not None else outcome.failures.get(item_id, "not scored")
+            row.update(self.task.to_row(result or {}))
+            rows.append(row)
+
+        path = self.output_dir / f"part-{key}.parquet"
+        tmp_path = path.with_suffix(".parquet.tmp")
+        pd.DataFrame(rows).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        ok = sum(1 for row in rows if row["status"] == "ok")
+        if ok == len(rows):
+            ledger.path.unlink(missing_ok=True)
+        return ShardResult(rows=len(rows), ok=ok, failed=len(rows) - ok, api_calls=outcome.calls, path=path.name)
+
+    def _score(self, batches: list[PromptBatch], ledger: ItemLedger) -> BatchRunResult:
+        def limited(batch: PromptBatch) -> Mapping[str, Any]:
+            self._limiter.acquire()
+            return self._scorer(batch)
+
+        total = BatchRunResult()
+        with ThreadPoolExecutor(max_workers=max(1, self.config.workers)) as executor:
+            futures = [executor.submit(run_batches, [batch], limited) for batch in batches]
+            for future in as_completed(futures):
+                outcome = future.result()
+                results = {
+                    item_id: value.model_dump(mode="json") if isinstance(value, BaseModel) else value
+                    for item_id, value in outcome.results.items()
+                }
+                ledger.record_success(results)
+                total.results.update(results)
+                total.failures.update(outcome.failures)
+                total.calls += outcome.calls
+                total.retry_calls += outcome.retry_calls
+        return total
+
+
+def read_job_status(output_dir: Path | str) -> dict[str, Any]:
+    """Summarise progress from a job's manifest."""
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {"status": "missing", "output_dir": str(output_dir)}
+    manifest = json.loads(manifest_path.read_text())
+    shards = manifest.get("shards", {})
+    done_rows = sum(shard["rows"] for shard in shards.values())
+    total_rows = manifest.get("total_rows") or 0
+    return {
+        "status": manifest.get("status"),
+        "pid": manifest.get("pid"),
+        "shards_done": len(shards),
+        "rows_done": done_rows,
+        "rows_total": total_rows,
+        "progress": round(done_rows / total_rows, 4) if total_rows else 0.0,
+        "failed_items": sum(shard["failed"] for shard in shards.values()),
+        "api_calls": sum(shard["api_calls"] for shard in shards.values()),
+        "updated_at": manifest.get("updated_at"),
+    }
+
+
+def read_job_output(output_dir: Path | str) -> pd.DataFrame:
+    """Concatenate all finished shard outputs."""
+    paths = sorted(Path(output_dir).glob("part-*.parquet"))
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+
+def launch_background(argv: Sequence[str], output_dir: Path | str) -> int:
+    """Start ``python -m ai_data_lab.llm.bulk run <argv>`` detached; returns its PID."""
+    log_dir = Path(output_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_file = (log_dir / "job.log").open("a")
+    process = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "ai_data_lab.llm.bulk", "run", *argv],
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+        env=os.environ.copy(),
+    )
+    return process.pid
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Resumable bulk LLM scoring over a Parquet corpus.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run (or resume) a job")
+    run.add_argument("--task", required=True, choices=sorted(TASKS))
+    run.add_argument("--input", required=True, help="input Parquet file")
+    run.add_argument("--output", required=True, help="output directory (shards + manifest)")
+    run.add_argument("--id-col", default="post_id")
+    run.add_argument("--text-col", default="content")
+    run.add_argument("--model", default="gemini-2.5-flash")
+    run.add_argument("--shard-size", type=int, default=1000)
+    run.add_argument("--token-budget", type=int, default=4000)
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--rpm", type=float, default=None, help="max requests per minute")
+    run.add_argument("--dedup-threshold", type=float, default=0.9, help="0 disables near-duplicate collapsing")
+    run.add_argument("--detach", action="store_true", help="run in a background process")
+
+    status = sub.add_parser("status", help="show job progress")
+    status.add_argument("--output", required=True)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = _build_parser().parse_args(argv)
+
+    if args.command == "status":
+        print(json.dumps(read_job_status(args.output), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.detach:
+        child_argv = [arg for arg in argv[1:] if arg != "--detach"]
+        pid = launch_background(child_argv, args.output)
+        print(f"Started bulk job (pid={pid}); log: {Path(args.output) / 'job.log'}")
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        print("GEMINI_API_KEY or GOOGLE_API_KEY must be set.", file=sys.stderr)
+        return 1
+
+    from google import genai
+
+    from .client import InstrumentedGenAIClient
+
+    config = BulkJobConfig(
+        task=args.task,
+        input_path=args.input,
+        output_dir=args.output,
+        id_col=args.id_col,
+        text_col=args.text_col,
+        model=args.model,
+        shard_size=args.shard_size,
+        token_budget=args.token_budget,
+        workers=args.workers,
+        requests_per_minute=args.rpm,
+        dedup_threshold=args.dedup_threshold or None,
+    )
+    client = InstrumentedGenAIClient(genai.Client(api_key=api_key), notebook="bulk", template=f"{args.task}_batch")
+    manifest = BulkJob(config, gemini_scorer(client, TASKS[args.task], model=args.model)).run()
+    print(json.dumps(read_job_status(args.output), ensure_ascii=False, indent=2))
+    return 0 if manifest["status"] == "completed" else 1
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    raise SystemExit(main())
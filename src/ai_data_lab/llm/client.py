@@ -0,0 +1,87 @@
+"""Instrumented wrapper around ``google.genai`` clients shared by the notebooks."""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from .usage import UsageRecorder
+
+# HTTP statuses worth retrying: request timeout, rate limit and server errors.
+_TRANSIENT_STATUSES = frozenset({408, 429})
+# Transport-level failures of httpx / requests, matched by name so neither is imported.
+_TRANSIENT_CLASS_NAMES = frozenset({"TransportError", "TimeoutException", "ConnectionError", "Timeout"})
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """True for rate limits, 5xx responses, timeouts and connection failures."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(exc, "code", None)
+    if not isinstance(status, int):
+        status = getattr(exc, "status_code", None)
+    if isinstance(status, int) and not isinstance(status, bool):
+        return status in _TRANSIENT_STATUSES or 500 <= status < 600
+    return any(cls.__name__ in _TRANSIENT_CLASS_NAMES for cls in type(exc).__mro__)
+
+
+class InstrumentedGenAIClient:
+    """Drop-in replacement for ``genai.Client`` that records usage and retries.
+
+    Only ``client.models.generate_content(...)`` is wrapped, which is the one
+    call the notebooks make. Every request is recorded under ``notebook`` and
+    ``template`` with latency, token counts, retries and the final error class.
+    Transient failures (see :func:`is_transient_error`) are retried
+    ``max_retries`` times with exponential backoff; anything else (auth,
+    invalid request, programming errors) is raised immediately.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        notebook: str,
+        template: str = "default",
+        recorder: UsageRecorder | None = None,
+        max_retries: int = 2,
+        backoff_seconds: float = 1.0,
+    ) -> None:
+        self._client = client
+        self.notebook = notebook
+        self.template = template
+        self.recorder = recorder or UsageRecorder()
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    @property
+    def models(self) -> "InstrumentedGenAIClient":
+        return self
+
+    def with_template(self, template: str) -> "InstrumentedGenAIClient":
+        """Return a client sharing the same recorder but tagging calls with ``template``."""
+        return InstrumentedGenAIClient(
+            self._client,
+            notebook=self.notebook,
+            template=template,
+            recorder=self.recorder,
+            max_retries=self.max_retries,
+            backoff_seconds=self.backoff_seconds,
+        )
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None, **kwargs: Any) -> Any:
+        with self.recorder.track(notebook=self.notebook, template=self.template, model=model) as call:
+            attempt = 0
+            while True:
+                try:
+                    response = self._client.models.generate_content(
+                        model=model, contents=contents, config=config, **kwargs
+                    )
+                    break
+                except Exception as exc:
+                    if attempt >= self.max_retries or not is_transient_error(exc):
+                        raise
+                    attempt += 1
+                    call.add_retry()
+                    time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            call.set_usage(response)
+            return response
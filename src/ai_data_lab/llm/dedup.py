@@ -0,0 +1,173 @@
+"""Near-duplicate collapsing (MinHash + LSH) so each distinct post is scored once."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_URL_PATTERN = re.compile(r"https?://\S+")
+_MENTION_PATTERN = re.compile(r"@\w+")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_text(text: str | None) -> str:
+    """Normalise a post for duplicate detection (NFKC, lowercase, no URLs/mentions)."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _URL_PATTERN.sub(" ", text)
+    text = _MENTION_PATTERN.sub(" ", text)
+    return _SPACE_PATTERN.sub(" ", text).strip()
+
+
+def shingle_hashes(text: str, size: int = 3) -> np.ndarray:
+    """Return the unique 32-bit hashes of the character ``size``-grams of ``text``."""
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i : i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def _choose_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    """Pick (bands, rows) whose S-curve inflection ``(1/b)^(1/r)`` is closest to ``threshold``."""
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+@dataclass
+class DedupResult:
+    """Cluster assignment for a list of texts.
+
+    ``representative_of[i]`` is the row index whose LLM result row ``i`` reuses;
+    representatives point at themselves.
+    """
+
+    representative_of: np.ndarray
+
+    @property
+    def representatives(self) -> np.ndarray:
+        return np.flatnonzero(self.representative_of == np.arange(len(self.representative_of)))
+
+    @property
+    def n_items(self) -> int:
+        return len(self.representative_of)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.representatives)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Share of items that do not need their own LLM call."""
+        if not self.n_items:
+            return 0.0
+        return 1.0 - self.n_clusters / self.n_items
+
+    def cluster_sizes(self) -> dict[int, int]:
+        reps, counts = np.unique(self.representative_of, return_counts=True)
+        return dict(zip(reps.tolist(), counts.tolist()))
+
+    def summary(self) -> dict[str, Any]:
+        sizes = self.cluster_sizes()
+        return {
+            "items": self.n_items,
+            "clusters": self.n_clusters,
+            "collapsed": self.n_items - self.n_clusters,
+            "dedup_ratio": round(self.dedup_ratio, 4),
+            "largest_cluster": max(sizes.values(), default=0),
+        }
+
+    def fan_out(self, ids: Sequence[Any], results: Mapping[Any, Any]) -> dict[Any, Any]:
+        """Map results keyed by representative ID back onto every member ID."""
+        fanned: dict[Any, Any] = {}
+        for index, rep in enumerate(self.representative_of.tolist()):
+            rep_id = ids[rep]
+            if rep_id in results:
+                fanned[ids[index]] = results[rep_id]
+        return fanned
+
+
+def find_near_duplicates(
+    texts: Sequence[str | None],
+    *,
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    shingle_size: int = 3,
+    seed: int = 0,
+) -> DedupResult:
+    """Cluster texts whose estimated Jaccard similarity is at least ``threshold``.
+
+    Exact duplicates (after :func:`normalize_text`) are merged first. The remaining
+    distinct texts get MinHash signatures; LSH banding proposes candidates and a
+    candidate only joins a cluster when its signature agreement with the bucket's
+    first member reaches ``threshold``, so very large template buckets stay linear.
+    The lowest row index of each cluster is its representative.
+    """
+    if not 0.0 < threshold <= 1.0:
+        raise ValueError("threshold must be in (0, 1].")
+
+    normalized = [normalize_text(text) for text in texts]
+    parent = list(range(len(normalized)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(left: int, right: int) -> None:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            low, high = sorted((root_left, root_right))
+            parent[high] = low
+
+    first_seen: dict[str, int] = {}
+    for index, text in enumerate(normalized):
+        if text in first_seen:
+            union(first_seen[text], index)
+        else:
+            first_seen[text] = index
+
+    unique_rows = [index for index in first_seen.values() if normalized[index]]
+    if threshold < 1.0 and len(unique_rows) > 1:
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        signatures = np.empty((len(unique_rows), num_perm), dtype=np.uint64)
+        for position, index in enumerate(unique_rows):
+            hashes = shingle_hashes(normalized[index], shingle_size)
+            permuted = (np.outer(hashes, a) + b) % _MERSENNE_PRIME & _MAX_HASH
+            signatures[position] = permuted.min(axis=0)
+
+        bands, rows = _choose_bands(threshold, num_perm)
+        for band in range(bands):
+            block = signatures[:, band * rows : (band + 1) * rows]
+            buckets: dict[bytes, int] = {}
+            for position in range(len(unique_rows)):
+                key = block[position].tobytes()
+                anchor = buckets.setdefault(key, position)
+                if anchor == position:
+                    continue
+                agreement = float(np.mean(signatures[anchor] == signatures[position]))
+                if agreement >= threshold:
+                    union(unique_rows[anchor], unique_rows[position])
+
+    representative_of = np.fromiter((find(index) for index in range(len(parent))), dtype=np.int64, count=len(parent))
+    return DedupResult(representative_of)
@@ -0,0 +1,58 @@
+"""Multi-item prompt templates for the post scoring tasks."""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+from .batching import PromptBatch
+
+EMOTION_CATEGORIES = [
+    "希望", "不安", "愛情", "喜び", "悲しみ",
+    "決意", "連帯感", "孤独", "自己肯定", "感謝",
+    "応援", "憧れ", "切なさ", "興奮", "平穏",
+]
+
+
+def _render_items(batch: PromptBatch) -> str:
+    return "\n".join(f"[{item.item_id}] {item.text}" for item in batch.items)
+
+
+def sentiment_batch_prompt(batch: PromptBatch) -> str:
+    """Malice / positivity prompt used by notebook 11 and the bulk sentiment job."""
+    return f"""以下のSNS投稿について、悪意・誹謗中傷の有無、およびポジティブ度を評価してください。
+
+### 【評価基準】：
+1. **悪意・誹謗中傷の判定**（malice）
+   - "high": 誹謗中傷、名誉毀損、攻撃的・差別的な内容
+   - "low": 批判的だが、誹謗中傷とまではいえない
+   - "none": 問題なし
+
+2. **ポジティブ度の評価**（positivity: 0-5）
+   - 5: 非常にポジティブ（感謝・応援・励まし・建設的な意見）
+   - 4: ポジティブ（好意的・肯定的な意見が中心）
+   - 3: ややポジティブ（フラットだが前向きな要素あり）
+   - 2: ニュートラル（良くも悪くもなく中立的）
+   - 1: ややネガティブ（批判的なトーンが含まれる）
+   - 0: ネガティブ（強い否定・攻撃的なトーン）
+
+【投稿内容】（[ ] 内は投稿ID）：
+{_render_items(batch)}
+
+【回答フォーマット】（JSONのみ、説明不要。全投稿についてIDをそのまま返すこと）：
+{{"results": [{{"id": "投稿ID", "malice": "none", "positivity": 4}}, {{"id": "投稿ID", "malice": "low", "positivity": 1}}, ...]}}
+"""
+
+
+def emotion_batch_prompt(batch: PromptBatch, categories: Sequence[str] = EMOTION_CATEGORIES) -> str:
+    """Emotion extraction prompt (notebook 08) for several posts at once."""
+    emotions_str = ", ".join(f'"{emotion}"' for emotion in categories)
+    return f"""以下の各投稿から感情を最大3つまで抽出し、その強度(1-5)を判定してください。
+感情は以下のリストから選んでください: {emotions_str}
+
+【投稿内容】（[ ] 内は投稿ID）：
+{_render_items(batch)}
+
+【回答フォーマット】（JSONのみ。全投稿についてIDをそのまま返すこと）：
+{{"results": [{{"id": "投稿ID", "emotions": [{{"emotion": "感情名", "strength": 強度, "evidence": "根拠となる部分"}}]}}, ...]}}
+投稿が短すぎる場合や感情が読み取れない場合は "emotions" を空のリスト[]にしてください。
+"""
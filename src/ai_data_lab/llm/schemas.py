@@ -0,0 +1,41 @@
+"""Pydantic response models shared by the sentiment and emotion prompts."""
+
+from __future__ import annotations
+
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, BeforeValidator, Field
+
+# Models echo numeric IDs back as JSON numbers; callers key results by str(id).
+RecordId = Annotated[str, BeforeValidator(lambda value: str(value) if isinstance(value, int) and not isinstance(value, bool) else value)]
+
+
+class SentimentScore(BaseModel):
+    """Malice / positivity judgement for one post (notebook 11)."""
+
+    id: RecordId
+    malice: Literal["high", "low", "none"] = "none"
+    positivity: int = Field(ge=0, le=5)
+
+
+class SentimentBatch(BaseModel):
+    results: list[SentimentScore]
+
+
+class EmotionMention(BaseModel):
+    """One emotion extracted from a post (notebook 08)."""
+
+    emotion: str
+    strength: int = Field(ge=1, le=5)
+    evidence: str = ""
+
+
+class PostEmotions(BaseModel):
+    """Up to three emotions for one post; an empty list is a valid answer."""
+
+    id: RecordId
+    emotions: list[EmotionMention] = Field(default_factory=list, max_length=3)
+
+
+class EmotionBatch(BaseModel):
+    results: list[PostEmotions]
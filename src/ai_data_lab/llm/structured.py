@@ -0,0 +1,270 @@
+"""Schema-constrained LLM output: JSON-schema requests, pydantic validation, failure ledger."""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Generic, Iterable, Iterator, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from .batching import MalformedResponseError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Keys understood by Gemini's OpenAPI-subset ``response_schema``.
+_GEMINI_SCHEMA_KEYS = {
+    "type",
+    "format",
+    "description",
+    "nullable",
+    "enum",
+    "properties",
+    "required",
+    "items",
+    "minimum",
+    "maximum",
+    "minItems",
+    "maxItems",
+}
+
+
+def gemini_response_schema(model: type[BaseModel]) -> dict[str, Any]:
+    """Convert a pydantic model into the schema dialect accepted by Gemini.
+
+    ``$ref`` definitions are inlined, ``Optional`` unions become ``nullable`` and
+    keys Gemini rejects (``title``, ``default``, ...) are dropped.
+    """
+    schema = model.model_json_schema()
+    definitions = schema.get("$defs", {})
+
+    def convert(node: Any) -> Any:
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return convert(definitions[node["$ref"].rsplit("/", 1)[-1]])
+        if "anyOf" in node:
+            options = [option for option in node["anyOf"] if option.get("type") != "null"]
+            converted = convert(options[0]) if len(options) == 1 else {"type": "string"}
+            if len(options) < len(node["anyOf"]):
+                converted["nullable"] = True
+            return converted
+        if "const" in node:
+            node = {**node, "enum": [node["const"]]}
+        result: dict[str, Any] = {}
+        for key, value in node.items():
+            if key not in _GEMINI_SCHEMA_KEYS:
+                continue
+            if key == "properties":
+                result[key] = {name: convert(prop) for name, prop in value.items()}
+            elif key == "items":
+                result[key] = convert(value)
+            else:
+                result[key] = value
+        return result
+
+    return convert(schema)
+
+
+def generation_config(model: type[BaseModel]) -> dict[str, Any]:
+    """Return a ``generation_config``/``config`` mapping that requests JSON for ``model``."""
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": gemini_response_schema(model),
+    }
+
+
+def extract_json(text: str) -> Any:
+    """Decode the first JSON value in ``text``, tolerating code fences and chatter."""
+    decoder = json.JSONDecoder()
+    for index, char in enumerate(text):
+        if char in "{[":
+            try:
+                value, _ = decoder.raw_decode(text, index)
+            except json.JSONDecodeError:
+                continue
+            return value
+    raise MalformedResponseError(f"No JSON value found in response: {text[:100]!r}")
+
+
+def validate_payload(text: str, model: type[ModelT]) -> ModelT:
+    """Parse and validate a whole response as ``model``."""
+    try:
+        return model.model_validate(extract_json(text))
+    except ValidationError as exc:
+        raise MalformedResponseError(str(exc)) from exc
+
+
+def iter_array_items(chunks: Iterable[str], *, key: str | None = "results") -> Iterator[Any]:
+    """Yield the elements of a JSON array as soon as each one is complete.
+
+    ``chunks`` may be a streamed response. The array is located after ``key`` (or
+    at the first ``[`` when ``key`` is None). A truncated or corrupt element stops
+    decoding only for itself: the parser resynchronises at the next object, so
+    earlier and later elements are still yielded. Elements should be objects or
+    arrays; bare scalars can be cut off mid-stream.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position: int | None = None
+    source = iter(chunks)
+    exhausted = False
+
+    while True:
+        if position is None:
+            anchor = buffer.find(f'"{key}"') if key else 0
+            if anchor < 0 and exhausted:
+                # The model answered with a bare array instead of the wrapper object.
+                anchor = 0
+            start = buffer.find("[", anchor) if anchor >= 0 else -1
+            if start >= 0:
+                position = start + 1
+        if position is not None:
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position >= len(buffer):
+                    break
+                if buffer[position] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if not exhausted:
+                        break
+                    resync = buffer.find("{", position + 1)
+                    if resync < 0:
+                        return
+                    position = resync
+                    continue
+                position = end
+                yield value
+        if exhausted:
+            return
+        try:
+            buffer += next(source)
+        except StopIteration:
+            exhausted = True
+
+
+@dataclass
+class ParseOutcome(Generic[ModelT]):
+    """Validated items keyed by ID plus a reason for each item that failed."""
+
+    items: dict[str, ModelT] = field(default_factory=dict)
+    failures: dict[str, str] = field(default_factory=dict)
+
+
+def parse_batch_response(
+    source: str | Iterable[str],
+    model: type[ModelT],
+    *,
+    expected_ids: Iterable[str],
+    id_field: str = "id",
+    key: str | None = "results",
+) -> ParseOutcome[ModelT]:
+    """Validate every element of a multi-item response independently.
+
+    Elements that fail validation or carry an unknown ID never poison the rest
+    of the batch; every expected ID without a valid element is reported in
+    ``failures`` so that it alone can be retried.
+    """
+    chunks = [source] if isinstance(source, str) else source
+    expected = [str(item_id) for item_id in expected_ids]
+    wanted = set(expected)
+    outcome: ParseOutcome[ModelT] = ParseOutcome()
+
+    for element in iter_array_items(chunks, key=key):
+        raw_id = element.get(id_field) if isinstance(element, dict) else None
+        item_id = str(raw_id) if raw_id is not None else None
+        if item_id not in wanted:
+            continue
+        try:
+            outcome.items[item_id] = model.model_validate(element)
+        except ValidationError as exc:
+            outcome.failures[item_id] = f"ValidationError: {exc.errors()[0].get('msg', str(exc))}"
+        else:
+            outcome.failures.pop(item_id, None)
+
+    for item_id in expected:
+        if item_id not in outcome.items:
+            outcome.failures.setdefault(item_id, "missing from response")
+    return outcome
+
+
+def _now_iso() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+class ItemLedger:
+    """Append-only JSONL record of per-item LLM outcomes for one task.
+
+    Successful items keep their validated payload so re-runs can skip them;
+    failed items keep the reason so a later run retries exactly those IDs. The
+    last record for an ID wins.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._state: dict[str, dict[str, Any]] = {}
+        self._load()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def record_success(self, results: dict[str, Any]) -> None:
+        records = []
+        for item_id, payload in results.items():
+            if isinstance(payload, BaseModel):
+                payload = payload.model_dump(mode="json")
+            records.append({"item_id": str(item_id), "status": "ok", "result": payload, "at": _now_iso()})
+        self._append(records)
+
+    def record_failures(self, failures: dict[str, str]) -> None:
+        records = [
+            {"item_id": str(item_id), "status": "failed", "reason": reason, "at": _now_iso()}
+            for item_id, reason in failures.items()
+        ]
+        self._append(records)
+
+    def results(self) -> dict[str, Any]:
+        return {item_id: entry["result"] for item_id, entry in self._state.items() if entry["status"] == "ok"}
+
+    def failures(self) -> dict[str, str]:
+        return {item_id: entry.get("reason", "") for item_id, entry in self._state.items() if entry["status"] == "failed"}
+
+    def todo(self, item_ids: Iterable[Any]) -> list[str]:
+        """Return the IDs from ``item_ids`` that have not succeeded yet."""
+        return [
+            str(item_id)
+            for item_id in item_ids
+            if self._state.get(str(item_id), {}).get("status") != "ok"
+        ]
+
+    def compact(self) -> None:
+        """Rewrite the file keeping only the latest record per item."""
+        lines = [json.dumps(entry, ensure_ascii=False) for entry in self._state.values()]
+        self._path.write_text("\n".join(lines) + ("\n" if lines else ""))
+
+    def _append(self, records: list[dict[str, Any]]) -> None:
+        if not records:
+            return
+        with self._path.open("a") as handle:
+            for record in records:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._state[record["item_id"]] = record
+
+    def _load(self) -> None:
+        if not self._path.exists():
+            return
+        for line in self._path.read_text().splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "item_id" in record:
+                self._state[str(record["item_id"])] = record
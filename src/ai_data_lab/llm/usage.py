@@ -0,0 +1,186 @@
+"""Per-call LLM usage and latency records with a summary CLI.
+
+Run ``python -m ai_data_lab.llm.usage`` to print the summary grouped by
+notebook, prompt template and model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+import pandas as pd
+
+DEFAULT_USAGE_PATH = Path("data") / "llm_usage" / "usage.jsonl"
+SUMMARY_KEYS = ("notebook", "template", "model")
+
+
+def default_usage_path() -> Path:
+    return Path(os.getenv("AI_DATA_LAB_LLM_USAGE_PATH", str(DEFAULT_USAGE_PATH)))
+
+
+def _now_iso() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+@dataclass(slots=True)
+class UsageEvent:
+    """One LLM request (or one batch of cache hits)."""
+
+    notebook: str
+    template: str
+    model: str
+    latency_ms: float = 0.0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    retries: int = 0
+    cache_hit: bool = False
+    items: int = 1
+    error_class: str | None = None
+    at: str = field(default_factory=_now_iso)
+
+
+@dataclass
+class TrackedCall:
+    """Mutable handle yielded by :meth:`UsageRecorder.track`."""
+
+    event: UsageEvent
+
+    def set_usage(self, response: Any) -> None:
+        """Copy token counts from a Gemini response's ``usage_metadata`` if present."""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None:
+            return
+        self.event.tokens_in = int(getattr(metadata, "prompt_token_count", 0) or 0)
+        self.event.tokens_out = int(getattr(metadata, "candidates_token_count", 0) or 0)
+
+    def add_retry(self) -> None:
+        self.event.retries += 1
+
+
+class UsageRecorder:
+    """Thread-safe JSONL sink for :class:`UsageEvent` records."""
+
+    def __init__(self, path: Path | str | None = None) -> None:
+        self._path = Path(path) if path else default_usage_path()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def record(self, event: UsageEvent) -> None:
+        line = json.dumps(asdict(event), ensure_ascii=False)
+        with self._lock, self._path.open("a") as handle:
+            handle.write(line + "\n")
+
+    @contextmanager
+    def track(self, *, notebook: str, template: str, model: str, items: int = 1) -> Iterator[TrackedCall]:
+        """Time the enclosed request and record it, including the error class on failure."""
+        call = TrackedCall(UsageEvent(notebook=notebook, template=template, model=model, items=items))
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException as exc:
+            call.event.error_class = type(exc).__name__
+            raise
+        finally:
+            call.event.latency_ms = (time.perf_counter() - started) * 1000
+            self.record(call.event)
+
+    def record_cache_hits(self, count: int, *, notebook: str, template: str, model: str) -> None:
+        """Record ``count`` items that were served from a local cache instead of the API."""
+        if count > 0:
+            self.record(UsageEvent(notebook=notebook, template=template, model=model, cache_hit=True, items=count))
+
+    def load(self) -> pd.DataFrame:
+        if not self._path.exists():
+            return pd.DataFrame(columns=list(UsageEvent.__slots__))
+        rows = []
+        for line in self._path.read_text().splitlines():
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return pd.DataFrame(rows, columns=list(UsageEvent.__slots__))
+
+
+def summarize_usage(df_events: pd.DataFrame, *, by: Sequence[str] = SUMMARY_KEYS) -> pd.DataFrame:
+    """Aggregate events into calls, tokens, latency percentiles, retries, cache hit rate and errors."""
+    columns = [
+        *by,
+        "calls",
+        "errors",
+        "retries",
+        "tokens_in",
+        "tokens_out",
+        "latency_p50_ms",
+        "latency_p90_ms",
+        "latency_p99_ms",
+        "cache_hit_rate",
+        "error_classes",
+    ]
+    if df_events.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = df_events.copy()
+    df["cache_hit"] = df["cache_hit"].fillna(False).astype(bool)
+    df["items"] = df["items"].fillna(1).astype(int)
+    api = df[~df["cache_hit"]]
+
+    def percentile(q: float) -> pd.Series:
+        return api.groupby(list(by))["latency_ms"].quantile(q)
+
+    summary = pd.DataFrame(
+        {
+            "calls": api.groupby(list(by)).size(),
+            "errors": api.groupby(list(by))["error_class"].count(),
+            "retries": api.groupby(list(by))["retries"].sum(),
+            "tokens_in": api.groupby(list(by))["tokens_in"].sum(),
+            "tokens_out": api.groupby(list(by))["tokens_out"].sum(),
+            "latency_p50_ms": percentile(0.5),
+            "latency_p90_ms": percentile(0.9),
+            "latency_p99_ms": percentile(0.99),
+        }
+    )
+    items_total = df.groupby(list(by))["items"].sum()
+    items_cached = df[df["cache_hit"]].groupby(list(by))["items"].sum()
+    summary = summary.reindex(items_total.index)
+    summary["cache_hit_rate"] = (items_cached.reindex(items_total.index).fillna(0) / items_total).round(4)
+    summary["error_classes"] = (
+        api.dropna(subset=["error_class"])
+        .groupby(list(by))["error_class"]
+        .agg(lambda values: ", ".join(f"{name}×{count}" for name, count in values.value_counts().items()))
+    )
+    summary["error_classes"] = summary["error_classes"].fillna("")
+    for column in ("calls", "errors", "retries", "tokens_in", "tokens_out"):
+        summary[column] = summary[column].fillna(0).astype(int)
+    return summary.reset_index()[columns]
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarise recorded LLM usage.")
+    parser.add_argument("--path", default=None, help="usage JSONL file (default: $AI_DATA_LAB_LLM_USAGE_PATH or data/llm_usage/usage.jsonl)")
+    parser.add_argument("--by", default=",".join(SUMMARY_KEYS), help="comma separated grouping columns")
+    args = parser.parse_args(argv)
+
+    recorder = UsageRecorder(args.path)
+    summary = summarize_usage(recorder.load(), by=[key.strip() for key in args.by.split(",") if key.strip()])
+    if summary.empty:
+        print(f"No usage recorded in {recorder.path}")
+        return 0
+    print(summary.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entry point
+    raise SystemExit(main())
@@ -0,0 +1,31 @@
+"""Graph construction and analysis helpers shared by the network notebooks."""
+
+from .cooccurrence import Cooccurrence, build_cooccurrence, build_group_cooccurrence
+from .layout import DEFAULT_LAYOUT_CACHE_PATH, LayoutCache, apply_pyvis_positions
+from .metrics import (
+    DEFAULT_METRICS_CACHE_PATH,
+    MetricsCache,
+    NetworkMetrics,
+    betweenness_error_bound,
+    compute_group_metrics,
+    compute_network_metrics,
+    graph_digest,
+    metrics_frame,
+)
+
+__all__ = [
+    "Cooccurrence",
+    "DEFAULT_LAYOUT_CACHE_PATH",
+    "DEFAULT_METRICS_CACHE_PATH",
+    "LayoutCache",
+    "MetricsCache",
+    "NetworkMetrics",
+    "apply_pyvis_positions",
+    "betweenness_error_bound",
+    "build_cooccurrence",
+    "build_group_cooccurrence",
+    "compute_group_metrics",
+    "compute_network_metrics",
+    "graph_digest",
+    "metrics_frame",
+]
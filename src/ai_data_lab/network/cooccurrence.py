@@ -0,0 +1,131 @@
+"""Label co-occurrence counting through a sparse incidence matrix.
+
+Items (posts) and labels (emotions) are factorized to integer codes and put
+into a sparse ``items × labels`` count matrix ``A``; ``Aᵀ·A`` then holds, for
+every pair of labels, the number of within-item pairs — the same counts as a
+per-item ``i < j`` loop, computed for every item (and every group) at once.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+@dataclass
+class Cooccurrence:
+    """Symmetric label co-occurrence counts.
+
+    ``matrix[i, j]`` (``i != j``) counts pairs of rows of one item labelled
+    ``labels[i]`` and ``labels[j]``; the diagonal counts pairs of rows sharing
+    a label within one item. ``counts[i]`` is the number of rows with
+    ``labels[i]``.
+    """
+
+    labels: np.ndarray
+    counts: np.ndarray
+    matrix: sparse.csr_matrix
+
+    def label_counts(self) -> dict[Any, int]:
+        """Rows per label, for labels that occur at least once."""
+        return {label: int(count) for label, count in zip(self.labels, self.counts) if count}
+
+    def edges(self, min_weight: int = 1) -> pd.DataFrame:
+        """Edge list (``source``, ``target``, ``weight``) with ``source <= target``, heaviest first."""
+        upper = sparse.triu(self.matrix, format="coo")
+        keep = upper.data >= min_weight
+        df_edges = pd.DataFrame(
+            {
+                "source": self.labels[upper.row[keep]],
+                "target": self.labels[upper.col[keep]],
+                "weight": upper.data[keep].astype(np.int64),
+            }
+        )
+        return df_edges.sort_values(["weight", "source", "target"], ascending=[False, True, True], ignore_index=True)
+
+    def pairs(self) -> dict[tuple[Any, Any], int]:
+        """``{(a, b): weight}`` with ``a <= b``, like the former dict-of-pairs output."""
+        return {
+            tuple(sorted((source, target))): weight
+            for source, target, weight in self.edges().itertuples(index=False)
+        }
+
+    def to_graph(
+        self,
+        *,
+        min_weight: int = 2,
+        node_attrs: Callable[[Any, int], Mapping[str, Any]] | None = None,
+    ) -> nx.Graph:
+        """NetworkX graph of occurring labels (node ``size`` = count) and edges with ``weight >= min_weight``."""
+        graph = nx.Graph()
+        for label, count in self.label_counts().items():
+            graph.add_node(label, size=count, **(node_attrs(label, count) if node_attrs else {}))
+        graph.add_weighted_edges_from(self.edges(min_weight).itertuples(index=False, name=None))
+        return graph
+
+
+def _incidence(item_codes: np.ndarray, column_codes: np.ndarray, shape: tuple[int, int]) -> sparse.csr_matrix:
+    data = np.ones(len(item_codes), dtype=np.int64)
+    return sparse.csr_matrix((data, (item_codes, column_codes)), shape=shape)
+
+
+def _gram(incidence: sparse.csr_matrix) -> sparse.csr_matrix:
+    """``AᵀA`` with the diagonal turned into within-item same-label pair counts."""
+    gram = (incidence.T @ incidence).tocsr()
+    column_squares = np.asarray(incidence.multiply(incidence).sum(axis=0)).ravel()
+    column_sums = np.asarray(incidence.sum(axis=0)).ravel()
+    gram.setdiag((column_squares - column_sums) // 2)
+    gram.eliminate_zeros()
+    return gram
+
+
+def build_cooccurrence(df: pd.DataFrame, *, item_col: str, label_col: str) -> Cooccurrence:
+    """Co-occurrence of ``label_col`` values among rows sharing ``item_col``."""
+    df = df[[item_col, label_col]].dropna()
+    item_codes, _ = pd.factorize(df[item_col], sort=False)
+    label_codes, labels = pd.factorize(df[label_col], sort=True)
+    incidence = _incidence(item_codes, label_codes, (item_codes.max(initial=-1) + 1, len(labels)))
+    return Cooccurrence(
+        labels=np.asarray(labels, dtype=object),
+        counts=np.bincount(label_codes, minlength=len(labels)),
+        matrix=_gram(incidence),
+    )
+
+
+def build_group_cooccurrence(
+    df: pd.DataFrame,
+    *,
+    item_col: str,
+    label_col: str,
+    group_col: str,
+) -> dict[Any, Cooccurrence]:
+    """:func:`build_cooccurrence` for every ``group_col`` value from a single sparse product.
+
+    Columns of the incidence matrix are ``(group, label)`` pairs, so ``AᵀA`` is
+    block diagonal and each group's block is its co-occurrence matrix. Groups
+    come back in order of first appearance.
+    """
+    df = df[[group_col, item_col, label_col]].dropna()
+    group_codes, groups = pd.factorize(df[group_col], sort=False)
+    item_codes, _ = pd.factorize(pd.MultiIndex.from_arrays([group_codes, df[item_col].to_numpy()]), sort=False)
+    label_codes, labels = pd.factorize(df[label_col], sort=True)
+    n_labels = len(labels)
+    incidence = _incidence(
+        item_codes,
+        group_codes * n_labels + label_codes,
+        (item_codes.max(initial=-1) + 1, len(groups) * n_labels),
+    )
+    gram = _gram(incidence)
+    counts = np.bincount(group_codes * n_labels + label_codes, minlength=len(groups) * n_labels)
+    labels = np.asarray(labels, dtype=object)
+
+    results = {}
+    for position, group in enumerate(groups):
+        block = slice(position * n_labels, (position + 1) * n_labels)
+        results[group] = Cooccurrence(labels=labels, counts=counts[block], matrix=gram[block, block])
+    return results
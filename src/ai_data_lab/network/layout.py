@@ -0,0 +1,135 @@
+"""Cached, warm-started graph layouts shared by matplotlib and pyvis views.
+
+Force-directed layouts are the slowest part of drawing a network and are not
+stable between runs. :class:`LayoutCache` stores node positions per layout
+name together with the graph's structural hash: an unchanged graph reuses its
+positions, and a graph with a few edges changed is re-laid out for a handful of
+iterations starting from the previous positions, so nodes stay where they were.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Mapping
+
+import networkx as nx
+import numpy as np
+
+from .metrics import graph_digest
+
+DEFAULT_LAYOUT_CACHE_PATH = Path("data") / "cache" / "network_layouts"
+
+
+class LayoutCache:
+    """Spring-layout positions stored as one JSON file per layout name.
+
+    ``min_overlap`` is the share of current nodes that must already have a
+    position for a warm start; below it the layout is computed from scratch.
+    """
+
+    def __init__(
+        self,
+        root: Path | str = DEFAULT_LAYOUT_CACHE_PATH,
+        *,
+        k: float | None = 1.0,
+        iterations: int = 50,
+        warm_iterations: int = 15,
+        min_overlap: float = 0.5,
+        seed: int = 0,
+    ) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.k = k
+        self.iterations = iterations
+        self.warm_iterations = warm_iterations
+        self.min_overlap = min_overlap
+        self.seed = seed
+        self.hits = 0
+        self.warm_starts = 0
+        self.misses = 0
+
+    def _path(self, name: str) -> Path:
+        return self.root / f"{hashlib.blake2b(name.encode('utf-8'), digest_size=16).hexdigest()}.json"
+
+    def _key(self, graph: nx.Graph) -> str:
+        params = json.dumps({"k": self.k, "iterations": self.iterations, "seed": self.seed})
+        return f"{graph_digest(graph)}:{params}"
+
+    def _load(self, name: str) -> dict[str, Any] | None:
+        path = self._path(name)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _store(self, name: str, key: str, positions: Mapping[Any, np.ndarray]) -> None:
+        path = self._path(name)
+        record = {
+            "name": name,
+            "key": key,
+            "positions": [[repr(node), float(x), float(y)] for node, (x, y) in positions.items()],
+        }
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def layout(self, graph: nx.Graph, name: str | None = None) -> dict[Any, np.ndarray]:
+        """Positions for ``graph``, cached under ``name`` (defaults to the graph's hash)."""
+        key = self._key(graph)
+        name = name or key
+        record = self._load(name)
+        previous: dict[str, np.ndarray] = {}
+        if record is not None:
+            previous = {node: np.array([x, y]) for node, x, y in record["positions"]}
+            if record["key"] == key and all(repr(node) in previous for node in graph):
+                self.hits += 1
+                return {node: previous[repr(node)] for node in graph}
+
+        if graph.number_of_nodes() == 0:
+            return {}
+        initial = {node: previous[repr(node)] for node in graph if repr(node) in previous}
+        if previous and len(initial) >= self.min_overlap * graph.number_of_nodes():
+            self.warm_starts += 1
+            positions = nx.spring_layout(
+                graph,
+                k=self.k,
+                pos=_place_new_nodes(graph, initial, self.seed),
+                iterations=self.warm_iterations,
+                seed=self.seed,
+            )
+        else:
+            self.misses += 1
+            positions = nx.spring_layout(graph, k=self.k, iterations=self.iterations, seed=self.seed)
+        self._store(name, key, positions)
+        return positions
+
+
+def _place_new_nodes(graph: nx.Graph, known: Mapping[Any, np.ndarray], seed: int) -> dict[Any, np.ndarray]:
+    """Start positions: known nodes keep theirs, new ones sit at their placed neighbours' centroid."""
+    rng = np.random.default_rng(seed)
+    positions = dict(known)
+    for node in graph:
+        if node in positions:
+            continue
+        neighbours = [positions[other] for other in graph.neighbors(node) if other in positions]
+        centre = np.mean(neighbours, axis=0) if neighbours else np.zeros(2)
+        positions[node] = centre + rng.normal(scale=0.05, size=2)
+    return positions
+
+
+def apply_pyvis_positions(net: Any, positions: Mapping[Any, np.ndarray], *, scale: float = 300.0) -> None:
+    """Pin pyvis nodes to ``positions`` and turn physics off so the browser draws them as-is.
+
+    Call after ``net.from_nx``; a later ``net.set_options`` must keep
+    ``"physics": {"enabled": false}``.
+    """
+    for node in net.nodes:
+        position = positions.get(node["id"])
+        if position is None:
+            continue
+        node["x"] = float(position[0]) * scale
+        node["y"] = float(position[1]) * scale
+        node["physics"] = False
+    net.toggle_physics(False)
@@ -0,0 +1,234 @@
+"""Network summary metrics with sampled betweenness, a result cache and a process pool.
+
+Exact betweenness is ``O(n·m)``; above ``pivots`` nodes it is estimated from
+``pivots`` random source nodes (Brandes–Pich) and reported with a Hoeffding
+error bound. Results are cached on disk under a hash of the graph's edges and
+the metric parameters, and groups that miss the cache are computed in parallel
+when the graphs are large enough to pay for process start-up.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Mapping
+
+import networkx as nx
+import pandas as pd
+
+DEFAULT_METRICS_CACHE_PATH = Path("data") / "cache" / "network_metrics"
+
+
+@dataclass
+class NetworkMetrics:
+    """Summary metrics of one graph.
+
+    ``betweenness_error`` bounds ``|estimate - exact|`` for every node with
+    probability ``1 - delta`` (0.0 when betweenness is exact).
+    """
+
+    nodes: int
+    edges: int
+    density: float
+    average_degree: float
+    average_clustering: float
+    degree_centrality: dict[Any, float]
+    betweenness: dict[Any, float]
+    betweenness_pivots: int
+    betweenness_error: float
+
+    @property
+    def exact(self) -> bool:
+        return self.betweenness_error == 0.0
+
+    def top(self, metric: str = "degree_centrality") -> tuple[Any, float] | None:
+        """Node with the highest ``degree_centrality`` or ``betweenness``."""
+        values = getattr(self, metric)
+        if not values:
+            return None
+        node = max(values, key=values.get)
+        return node, values[node]
+
+    def to_dict(self) -> dict[str, Any]:
+        record = asdict(self)
+        record["degree_centrality"] = [[node, value] for node, value in self.degree_centrality.items()]
+        record["betweenness"] = [[node, value] for node, value in self.betweenness.items()]
+        return record
+
+    @classmethod
+    def from_dict(cls, record: Mapping[str, Any]) -> "NetworkMetrics":
+        record = dict(record)
+        record["degree_centrality"] = {node: value for node, value in record["degree_centrality"]}
+        record["betweenness"] = {node: value for node, value in record["betweenness"]}
+        return cls(**record)
+
+
+def graph_digest(graph: nx.Graph) -> str:
+    """Hash of the node set and the (weighted) edge set, independent of insertion order."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(b"directed" if graph.is_directed() else b"undirected")
+    for node in sorted(map(repr, graph.nodes)):
+        digest.update(node.encode("utf-8") + b"\0")
+    digest.update(b"\1")
+    edges = []
+    for source, target, weight in graph.edges(data="weight"):
+        pair = (repr(source), repr(target))
+        if not graph.is_directed():
+            pair = tuple(sorted(pair))
+        edges.append(f"{pair[0]}\0{pair[1]}\0{weight!r}")
+    for edge in sorted(edges):
+        digest.update(edge.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def betweenness_error_bound(n_nodes: int, pivots: int, delta: float = 0.05) -> float:
+    """Hoeffding bound on the normalized betweenness error from ``pivots`` sampled sources.
+
+    Each sampled source contributes ``n·δ_s(v) / ((n-1)(n-2))`` with
+    ``δ_s(v) <= n-2``, so contributions lie in ``[0, n/(n-1)]``.
+    """
+    if pivots >= n_nodes or n_nodes <= 2:
+        return 0.0
+    value_range = n_nodes / (n_nodes - 1)
+    return value_range * math.sqrt(math.log(2 / delta) / (2 * pivots))
+
+
+def compute_network_metrics(
+    graph: nx.Graph,
+    *,
+    pivots: int | None = 256,
+    seed: int = 0,
+    delta: float = 0.05,
+    clustering_trials: int | None = None,
+) -> NetworkMetrics:
+    """Metrics of ``graph``; betweenness is sampled from ``pivots`` sources when the graph is larger.
+
+    ``pivots=None`` always computes exact betweenness. ``clustering_trials``
+    switches average clustering to the randomized approximation.
+    """
+    n_nodes = graph.number_of_nodes()
+    n_edges = graph.number_of_edges()
+    if n_nodes == 0:
+        return NetworkMetrics(0, 0, 0.0, 0.0, 0.0, {}, {}, 0, 0.0)
+
+    sampled = pivots is not None and pivots < n_nodes
+    k = pivots if sampled else None
+    betweenness = nx.betweenness_centrality(graph, k=k, seed=seed) if n_nodes > 1 else {}
+    if clustering_trials and n_nodes > clustering_trials:
+        clustering = nx.approximation.average_clustering(graph, trials=clustering_trials, seed=seed)
+    else:
+        clustering = nx.average_clustering(graph) if n_edges else 0.0
+    return NetworkMetrics(
+        nodes=n_nodes,
+        edges=n_edges,
+        density=nx.density(graph),
+        average_degree=sum(degree for _, degree in graph.degree()) / n_nodes,
+        average_clustering=float(clustering),
+        degree_centrality=nx.degree_centrality(graph) if n_nodes > 1 else {},
+        betweenness=betweenness,
+        betweenness_pivots=k or n_nodes,
+        betweenness_error=betweenness_error_bound(n_nodes, k, delta) if sampled else 0.0,
+    )
+
+
+class MetricsCache:
+    """One JSON file per (graph digest, parameters) key."""
+
+    def __init__(self, root: Path | str = DEFAULT_METRICS_CACHE_PATH) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(graph: nx.Graph, params: Mapping[str, Any]) -> str:
+        payload = json.dumps(dict(params), sort_keys=True)
+        return hashlib.blake2b(f"{graph_digest(graph)}\0{payload}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> NetworkMetrics | None:
+        path = self.root / f"{key}.json"
+        if not path.exists():
+            return None
+        return NetworkMetrics.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+    def put(self, key: str, metrics: NetworkMetrics) -> None:
+        path = self.root / f"{key}.json"
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(metrics.to_dict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+def _compute(args: tuple[nx.Graph, dict[str, Any]]) -> NetworkMetrics:
+    graph, params = args
+    return compute_network_metrics(graph, **params)
+
+
+def compute_group_metrics(
+    graphs: Mapping[Any, nx.Graph],
+    *,
+    pivots: int | None = 256,
+    seed: int = 0,
+    delta: float = 0.05,
+    clustering_trials: int | None = None,
+    cache: MetricsCache | None = None,
+    workers: int | None = None,
+    min_parallel_edges: int = 20_000,
+) -> dict[Any, NetworkMetrics]:
+    """:func:`compute_network_metrics` for every graph, reusing cached results.
+
+    Cache misses run in a process pool when there are several of them and
+    they hold at least ``min_parallel_edges`` edges in total; otherwise they
+    run in-process.
+    """
+    params = {"pivots": pivots, "seed": seed, "delta": delta, "clustering_trials": clustering_trials}
+    results: dict[Any, NetworkMetrics] = {}
+    pending: dict[Any, str | None] = {}
+    for name, graph in graphs.items():
+        key = MetricsCache.key(graph, params) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[name] = cached
+        else:
+            pending[name] = key
+
+    workers = workers or os.cpu_count() or 1
+    total_edges = sum(graphs[name].number_of_edges() for name in pending)
+    jobs = [(graphs[name], params) for name in pending]
+    if workers > 1 and len(jobs) > 1 and total_edges >= min_parallel_edges:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            computed = list(executor.map(_compute, jobs))
+    else:
+        computed = [_compute(job) for job in jobs]
+
+    for (name, key), metrics in zip(pending.items(), computed):
+        if cache is not None:
+            cache.put(key, metrics)
+        results[name] = metrics
+    return {name: results[name] for name in graphs}
+
+
+def metrics_frame(results: Mapping[Any, NetworkMetrics], *, group_col: str = "group") -> pd.DataFrame:
+    """One row of scalar metrics per group, with the top degree / betweenness node."""
+    rows = []
+    for name, metrics in results.items():
+        top_degree = metrics.top("degree_centrality")
+        top_betweenness = metrics.top("betweenness")
+        rows.append(
+            {
+                group_col: name,
+                "nodes": metrics.nodes,
+                "edges": metrics.edges,
+                "density": metrics.density,
+                "average_degree": metrics.average_degree,
+                "average_clustering": metrics.average_clustering,
+                "top_degree_node": top_degree[0] if top_degree else None,
+                "top_degree": top_degree[1] if top_degree else None,
+                "top_betweenness_node": top_betweenness[0] if top_betweenness else None,
+                "top_betweenness": top_betweenness[1] if top_betweenness else None,
+                "betweenness_error": metrics.betweenness_error,
+            }
+        )
+    return pd.DataFrame(rows)
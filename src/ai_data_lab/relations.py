@@ -0,0 +1,142 @@
+"""Single-scan foreign-key profiling for the ER relation validator.
+
+Relations are grouped by child table and each group is profiled with one
+query: every parent is pre-aggregated to ``(key, rows)`` so a LEFT JOIN can
+never fan out, and all metrics (join count, orphan/NULL FKs, whitespace, case,
+non-ASCII and control characters) are conditional aggregates over that one
+join. A child table is scanned once however many relations point from it,
+instead of once per metric per relation. If that query fails, the group's
+relations are retried one query each so a single broken relation does not
+hide the others.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, Mapping, Sequence
+
+import pandas as pd
+
+QueryRunner = Callable[[str], pd.DataFrame]
+
+RELATION_FIELDS = ("relation_id", "parent_table", "parent_key", "child_table", "child_key", "relation_group")
+
+RELATION_METRICS = (
+    "parent_count",
+    "child_count",
+    "join_count",
+    "orphan_fk_count",
+    "null_fk_count",
+    "trim_mismatch_count",
+    "uppercase_mismatch_count",
+    "lowercase_count",
+    "non_ascii_count",
+    "control_char_count",
+)
+
+# Checks on the child key alone; ``{key}`` is the qualified child column.
+_KEY_CHECKS = {
+    "null_fk_count": "{key} IS NULL",
+    "trim_mismatch_count": "{key} IS NOT NULL AND TRIM(TO_VARCHAR({key})) != TO_VARCHAR({key})",
+    "uppercase_mismatch_count": "{key} IS NOT NULL AND UPPER(TO_VARCHAR({key})) != TO_VARCHAR({key})",
+    "lowercase_count": "{key} IS NOT NULL AND REGEXP_LIKE(TO_VARCHAR({key}), '[a-z]')",
+    "non_ascii_count": "{key} IS NOT NULL AND REGEXP_LIKE(TO_VARCHAR({key}), '[^\\x00-\\x7F]')",
+    "control_char_count": "{key} IS NOT NULL AND REGEXP_LIKE(TO_VARCHAR({key}), '[\\x00-\\x1F\\x7F]')",
+}
+
+
+def group_by_child(relations: Iterable[Mapping[str, Any]]) -> dict[str, list[Mapping[str, Any]]]:
+    """Relations keyed by child table, in first-seen order."""
+    groups: dict[str, list[Mapping[str, Any]]] = {}
+    for relation in relations:
+        groups.setdefault(relation["child_table"], []).append(relation)
+    return groups
+
+
+def child_profile_sql(relations: Sequence[Mapping[str, Any]], table_prefix: str) -> str:
+    """One Snowflake query profiling every relation of a single child table.
+
+    Returns one row with ``<metric>__<position>`` columns (``position`` is the
+    relation's index in ``relations``) plus a shared ``child_count``.
+    """
+    child_tables = {relation["child_table"] for relation in relations}
+    if len(child_tables) != 1:
+        raise ValueError(f"Relations must share one child table, got {sorted(child_tables)}")
+    child_full = f"{table_prefix}.{relations[0]['child_table']}"
+
+    # One pre-aggregated CTE per distinct (parent table, parent key, child key).
+    parents: dict[tuple[str, str, str], str] = {}
+    for relation in relations:
+        parents.setdefault(_join_key(relation), f"p{len(parents)}")
+    ctes = ",\n".join(
+        f"{alias} AS (\n    SELECT {parent_key} AS k, COUNT(*) AS n\n    FROM {table_prefix}.{parent_table}\n    GROUP BY {parent_key}\n)"
+        for (parent_table, parent_key, _), alias in parents.items()
+    )
+    joins = "\n".join(f"LEFT JOIN {alias} ON {alias}.k = c.{child_key}" for (_, _, child_key), alias in parents.items())
+
+    columns = ['COUNT(*) AS "child_count"']
+    for position, relation in enumerate(relations):
+        alias = parents[_join_key(relation)]
+        key = f"c.{relation['child_key']}"
+        columns.append(f'(SELECT COALESCE(SUM(n), 0) FROM {alias}) AS "parent_count__{position}"')
+        columns.append(f'COALESCE(SUM({alias}.n), 0) AS "join_count__{position}"')
+        columns.append(f'COUNT_IF({key} IS NOT NULL AND {alias}.k IS NULL) AS "orphan_fk_count__{position}"')
+        columns.extend(
+            f'COUNT_IF({check.format(key=key)}) AS "{metric}__{position}"' for metric, check in _KEY_CHECKS.items()
+        )
+    select = ",\n    ".join(columns)
+    return f"WITH {ctes}\nSELECT\n    {select}\nFROM {child_full} c\n{joins}"
+
+
+def _join_key(relation: Mapping[str, Any]) -> tuple[str, str, str]:
+    return relation["parent_table"], relation["parent_key"], relation["child_key"]
+
+
+def _relation_row(relation: Mapping[str, Any], table_prefix: str) -> dict[str, Any]:
+    row = {field: relation.get(field) for field in RELATION_FIELDS}
+    row["parent_table_full"] = f"{table_prefix}.{relation['parent_table']}"
+    row["child_table_full"] = f"{table_prefix}.{relation['child_table']}"
+    return row
+
+
+def _profile_group(group: Sequence[Mapping[str, Any]], query: QueryRunner, table_prefix: str) -> list[dict[str, Any]]:
+    result = query(child_profile_sql(group, table_prefix))
+    values = {str(column).lower(): value for column, value in result.iloc[0].items()}
+    return [
+        {
+            metric: values["child_count"] if metric == "child_count" else values[f"{metric}__{position}"]
+            for metric in RELATION_METRICS
+        }
+        for position in range(len(group))
+    ]
+
+
+def _profile_one(relation: Mapping[str, Any], query: QueryRunner, table_prefix: str) -> dict[str, Any]:
+    try:
+        return _profile_group([relation], query, table_prefix)[0]
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
+def profile_relations(relations: Iterable[Mapping[str, Any]], query: QueryRunner, table_prefix: str) -> pd.DataFrame:
+    """Profile every relation with one query per child table, in input order.
+
+    ``query`` runs SQL and returns a DataFrame; ``table_prefix`` is
+    ``DATABASE.SCHEMA``. When a child table's query fails, its relations are
+    retried one query each, so only the relations that still fail (a missing
+    parent table or key column, no access …) are marked with ``error`` and
+    the run is never aborted.
+    """
+    relations = list(relations)
+    rows: dict[int, dict[str, Any]] = {}
+    positions = {id(relation): position for position, relation in enumerate(relations)}
+    for group in group_by_child(relations).values():
+        try:
+            metrics = _profile_group(group, query, table_prefix)
+        except Exception as exc:
+            if len(group) == 1:
+                metrics = [{"error": str(exc)}]
+            else:
+                metrics = [_profile_one(relation, query, table_prefix) for relation in group]
+        for relation, metric_values in zip(group, metrics):
+            rows[positions[id(relation)]] = {**metric_values, **_relation_row(relation, table_prefix)}
+    return pd.DataFrame([rows[position] for position in range(len(relations))])
@@ -0,0 +1,51 @@
+"""Text processing helpers shared by the text-mining notebooks."""
+
+from .company_names import (
+    CompanyNameIndex,
+    NameCandidate,
+    extract_company_name_from_deal,
+    extract_company_names_from_deals,
+    match_company_names,
+    normalize_company_name,
+    normalize_company_names,
+)
+from .features import TermFeatureStore, iter_parquet_batches
+from .hashtags import HASHTAG_PATTERN, HashtagIndex, extract_hashtag_lists
+from .keywords import (
+    MEMO_ACTION_KEYWORDS,
+    AhoCorasick,
+    KeywordClassifier,
+    format_keyword_spec,
+    parse_keyword_spec,
+)
+from .search import DEFAULT_SEARCH_INDEX_PATH, FullTextIndex, bigram_query, bigram_tokens
+from .tokenization import DEFAULT_TOKEN_CACHE_PATH, Token, TokenCache, TokenizerService, text_key
+
+__all__ = [
+    "AhoCorasick",
+    "CompanyNameIndex",
+    "DEFAULT_SEARCH_INDEX_PATH",
+    "DEFAULT_TOKEN_CACHE_PATH",
+    "FullTextIndex",
+    "HASHTAG_PATTERN",
+    "HashtagIndex",
+    "KeywordClassifier",
+    "MEMO_ACTION_KEYWORDS",
+    "NameCandidate",
+    "TermFeatureStore",
+    "Token",
+    "TokenCache",
+    "TokenizerService",
+    "bigram_query",
+    "bigram_tokens",
+    "extract_company_name_from_deal",
+    "extract_company_names_from_deals",
+    "extract_hashtag_lists",
+    "format_keyword_spec",
+    "iter_parquet_batches",
+    "match_company_names",
+    "normalize_company_name",
+    "normalize_company_names",
+    "parse_keyword_spec",
+    "text_key",
+]
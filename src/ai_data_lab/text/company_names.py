@@ -0,0 +1,215 @@
+"""Company-name normalization and fuzzy matching with an n-gram blocking index.
+
+Normalization rules are compiled once and memoized per distinct input, and the
+bulk helpers normalize each distinct value only once. :class:`CompanyNameIndex`
+proposes candidates through character n-gram postings (blocking) and scores
+only those with ``difflib``'s ratio, so matching one list of names against
+another stays far below the cost of all pairwise comparisons.
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Sequence
+
+import pandas as pd
+
+_LEGAL_FORMS = re.compile(
+    r"株式会社|有限会社|合同会社|合資会社|合名会社"
+    r"|一般社団法人|一般財団法人|公益社団法人|公益財団法人|特定非営利活動法人|npo法人"
+    r"|医療法人(?:社団|財団)?|社会福祉法人|学校法人"
+    r"|\((?:株|有|合|社|財)\)"
+    r"|\b(?:co\.?,?\s*ltd\.?|inc\.?|corp(?:oration)?\.?|llc|k\.?k\.?)(?=\W|$)"
+)
+_BRACKETS = re.compile(r"[()\[\]「」『』【】〔〕]")
+_SEPARATORS = re.compile(r"[\s・･.,、。'\"`_/\-‐‑–—―]+")
+_HONORIFIC = re.compile(r"様|御中")
+
+_DEAL_NAME_PATTERNS = (
+    re.compile(r"(?P<name>.+?)様向け"),
+    re.compile(r"(?P<name>.+?)向け"),
+    re.compile(r"(?P<name>.+?)様"),
+)
+
+
+@lru_cache(maxsize=200_000)
+def normalize_company_name(name: str | None) -> str | None:
+    """Canonical form of a company name for joining.
+
+    NFKC (full-width → half-width, ``㈱`` → ``(株)``), lowercase, legal forms
+    (株式会社, (株), Co., Ltd. …), brackets, honorifics and separators removed.
+    Returns ``None`` for empty input.
+    """
+    if name is None or (isinstance(name, float) and name != name):
+        return None
+    value = unicodedata.normalize("NFKC", str(name)).lower()
+    value = _LEGAL_FORMS.sub("", value)
+    value = _BRACKETS.sub("", value)
+    value = _HONORIFIC.sub("", value)
+    value = _SEPARATORS.sub("", value)
+    return value or None
+
+
+@lru_cache(maxsize=200_000)
+def extract_company_name_from_deal(deal_name: str | None) -> str | None:
+    """Company part of a deal name such as ``"ABC株式会社様向け 年間契約"``."""
+    if deal_name is None or (isinstance(deal_name, float) and deal_name != deal_name):
+        return None
+    raw = str(deal_name)
+    if not raw.strip():
+        return None
+    for pattern in _DEAL_NAME_PATTERNS:
+        match = pattern.search(raw)
+        if match:
+            return match.group("name")
+    return raw
+
+
+def _map_unique(values: Iterable[str | None] | pd.Series, func) -> pd.Series:
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    mapped = pd.Series([func(value) for value in uniques] + [None], dtype=object)
+    return pd.Series(mapped.to_numpy()[codes], index=series.index, dtype=object)
+
+
+def normalize_company_names(names: Iterable[str | None] | pd.Series) -> pd.Series:
+    """Vectorized :func:`normalize_company_name` (each distinct value normalized once)."""
+    return _map_unique(names, normalize_company_name)
+
+
+def extract_company_names_from_deals(deal_names: Iterable[str | None] | pd.Series) -> pd.Series:
+    """Vectorized :func:`extract_company_name_from_deal`."""
+    return _map_unique(deal_names, extract_company_name_from_deal)
+
+
+def _ngrams(text: str, size: int) -> set[str]:
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+class NameCandidate(NamedTuple):
+    index: int
+    name: str
+    score: float
+
+
+class CompanyNameIndex:
+    """Blocking index over a list of company names.
+
+    Names are normalized and split into character ``ngram``-grams; a query only
+    scores names that share at least one n-gram with it. N-grams whose postings
+    cover more than ``max_posting_ratio`` of the index (``株``-like noise) are
+    used only when nothing rarer matches.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str | None] | pd.Series,
+        *,
+        ngram: int = 2,
+        max_posting_ratio: float = 0.05,
+    ) -> None:
+        self.names = list(names)
+        self.normalized = normalize_company_names(self.names).tolist()
+        self.ngram = ngram
+        self._exact: dict[str, list[int]] = defaultdict(list)
+        postings: dict[str, list[int]] = defaultdict(list)
+        for index, normalized in enumerate(self.normalized):
+            if not normalized:
+                continue
+            self._exact[normalized].append(index)
+            for gram in _ngrams(normalized, ngram):
+                postings[gram].append(index)
+        self._postings = dict(postings)
+        self._posting_cap = max(50, int(max_posting_ratio * len(self.names)))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def candidates(
+        self,
+        name: str | None,
+        *,
+        k: int = 5,
+        min_score: float = 0.0,
+        max_candidates: int = 200,
+    ) -> list[NameCandidate]:
+        """Top ``k`` indexed names for ``name`` with similarity scores in [0, 1]."""
+        return self._candidates(
+            normalize_company_name(name), k=k, min_score=min_score, max_candidates=max_candidates
+        )
+
+    def _candidates(
+        self,
+        query: str | None,
+        *,
+        k: int,
+        min_score: float,
+        max_candidates: int = 200,
+    ) -> list[NameCandidate]:
+        # ``query`` is already normalized.
+        if not query:
+            return []
+        exact = self._exact.get(query, [])
+        if exact:
+            return [NameCandidate(index, self.names[index], 1.0) for index in exact[:k]]
+
+        grams = sorted(
+            (gram for gram in _ngrams(query, self.ngram) if gram in self._postings),
+            key=lambda gram: len(self._postings[gram]),
+        )
+        overlap: Counter[int] = Counter()
+        for gram in grams:
+            if len(self._postings[gram]) > self._posting_cap and overlap:
+                break
+            overlap.update(self._postings[gram])
+
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(query)
+        scored = []
+        for index, _ in overlap.most_common(max_candidates):
+            matcher.set_seq1(self.normalized[index])
+            score = matcher.ratio()
+            if score >= min_score:
+                scored.append(NameCandidate(index, self.names[index], round(score, 4)))
+        scored.sort(key=lambda candidate: (-candidate.score, candidate.index))
+        return scored[:k]
+
+    def match(self, names: Sequence[str | None] | pd.Series, *, threshold: float = 0.85) -> pd.DataFrame:
+        """Best indexed name for each of ``names`` (``match_index`` is -1 below ``threshold``)."""
+        series = names if isinstance(names, pd.Series) else pd.Series(list(names), dtype=object)
+        normalized = normalize_company_names(series)
+        best: dict[str | None, NameCandidate | None] = {}
+        for query in normalized.dropna().unique():
+            found = self._candidates(query, k=1, min_score=threshold)
+            best[query] = found[0] if found else None
+
+        rows = []
+        for position, query in enumerate(normalized.tolist()):
+            candidate = best.get(query)
+            rows.append(
+                {
+                    "left_position": position,
+                    "left_name": series.iloc[position],
+                    "match_index": candidate.index if candidate else -1,
+                    "match_name": candidate.name if candidate else None,
+                    "score": candidate.score if candidate else 0.0,
+                    "exact": candidate is not None and self.normalized[candidate.index] == query,
+                }
+            )
+        return pd.DataFrame(rows, index=series.index)
+
+
+def match_company_names(
+    left: Sequence[str | None] | pd.Series,
+    right: Sequence[str | None] | pd.Series,
+    *,
+    threshold: float = 0.85,
+) -> pd.DataFrame:
+    """Bulk fuzzy match of every ``left`` name against ``right`` (see :meth:`CompanyNameIndex.match`)."""
+    return CompanyNameIndex(right).match(left, threshold=threshold)
@@ -0,0 +1,224 @@
+"""Out-of-core term weighting for post text (hashing vectorizer + incremental IDF).
+
+:class:`TermFeatureStore` consumes DataFrame batches of posts, hashes their
+tokens into a fixed feature space, and appends the sparse count matrices to
+disk under a ``(group, period)`` key. Document frequencies are accumulated
+across batches, so TF-IDF weights and group/period comparisons are available
+without ever holding the corpus in memory.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from .tokenization import TokenizerService
+
+DEFAULT_N_FEATURES = 2**20
+
+FeatureKey = tuple[str, str]
+
+
+def _identity_analyzer(tokens: Sequence[str]) -> Sequence[str]:
+    return tokens
+
+
+def iter_parquet_batches(path: Path | str, *, batch_size: int = 50_000, columns: Sequence[str] | None = None) -> Iterator[pd.DataFrame]:
+    """Yield a Parquet file as pandas DataFrames of at most ``batch_size`` rows."""
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=list(columns) if columns else None):
+        yield record_batch.to_pandas()
+
+
+class TermFeatureStore:
+    """Sparse term-count matrices on disk, keyed by ``(group, period)``.
+
+    Layout under ``root``::
+
+        state.json                      n_features, n_docs, part counter, ingested batch IDs
+        document_frequency.npy          documents containing each hashed feature
+        terms.parquet                   feature index -> first term seen there
+        matrices/<group>/<period>/part-00000.npz
+
+    ``tokenizer`` defaults to noun extraction with :class:`TokenizerService`;
+    any callable mapping a list of texts to a list of token lists works.
+    """
+
+    def __init__(
+        self,
+        root: Path | str,
+        *,
+        n_features: int = DEFAULT_N_FEATURES,
+        tokenizer: Any = None,
+    ) -> None:
+        self.root = Path(root)
+        (self.root / "matrices").mkdir(parents=True, exist_ok=True)
+        state_path = self.root / "state.json"
+        if state_path.exists():
+            state = json.loads(state_path.read_text())
+            if state["n_features"] != n_features:
+                raise ValueError(f"{self.root} was built with n_features={state['n_features']}.")
+            self.n_docs = int(state["n_docs"])
+            self._next_part = int(state["next_part"])
+            self._batches: dict[str, dict[str, int]] = state.get("batches", {})
+            self.document_frequency = np.load(self.root / "document_frequency.npy")
+            terms = pd.read_parquet(self.root / "terms.parquet")
+            self._terms = dict(zip(terms["feature"].tolist(), terms["term"].tolist()))
+        else:
+            self.n_docs = 0
+            self._next_part = 0
+            self._batches = {}
+            self.document_frequency = np.zeros(n_features, dtype=np.int64)
+            self._terms: dict[int, str] = {}
+        self.n_features = n_features
+        self._known_terms = set(self._terms.values())
+        self._vectorizer = HashingVectorizer(
+            n_features=n_features, analyzer=_identity_analyzer, alternate_sign=False, norm=None
+        )
+        self._tokenize = tokenizer or TokenizerService().nouns
+
+    # Building -----------------------------------------------------------------------
+    def add_batch(
+        self,
+        df_batch: pd.DataFrame,
+        *,
+        text_col: str = "content",
+        group_col: str | None = None,
+        period_col: str | None = None,
+        group: str = "all",
+        period: str = "all",
+        batch_id: str | None = None,
+    ) -> int:
+        """Hash one batch of posts and append it to the store; returns the rows added.
+
+        The key of each row comes from ``group_col``/``period_col`` when given,
+        otherwise from the constant ``group``/``period``. A batch with a
+        ``batch_id`` that was already ingested is skipped, so re-running an
+        ingestion over the same source only adds what is new.
+        """
+        if df_batch.empty or (batch_id is not None and batch_id in self._batches):
+            return 0
+        token_lists = self._tokenize(df_batch[text_col].astype("string").fillna("").tolist())
+        counts = self._vectorizer.transform(token_lists).tocsr().astype(np.int32)
+        self._remember_terms(token_lists)
+        self.document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+        self.n_docs += counts.shape[0]
+
+        groups = df_batch[group_col].astype(str).to_numpy() if group_col else np.full(len(df_batch), group)
+        periods = df_batch[period_col].astype(str).to_numpy() if period_col else np.full(len(df_batch), period)
+        keys = pd.DataFrame({"group": groups, "period": periods})
+        for (key_group, key_period), rows in keys.groupby(["group", "period"], sort=False).indices.items():
+            part_dir = self._key_dir((key_group, key_period))
+            part_dir.mkdir(parents=True, exist_ok=True)
+            sparse.save_npz(part_dir / f"part-{self._next_part:05d}.npz", counts[rows], compressed=True)
+        if batch_id is not None:
+            self._batches[batch_id] = {"part": self._next_part, "rows": len(df_batch)}
+        self._next_part += 1
+        self._save_state()
+        return len(df_batch)
+
+    def add_batches(self, batches: Iterable[pd.DataFrame], **kwargs: Any) -> int:
+        return sum(self.add_batch(df_batch, **kwargs) for df_batch in batches)
+
+    def batch_ids(self) -> list[str]:
+        """IDs of the batches ingested with a ``batch_id``."""
+        return sorted(self._batches)
+
+    def drop_batch(self, batch_id: str) -> int:
+        """Remove an ingested batch (e.g. from a source file that changed); returns its rows."""
+        batch = self._batches.pop(batch_id, None)
+        if batch is None:
+            return 0
+        for path in (self.root / "matrices").glob(f"*/*/part-{batch['part']:05d}.npz"):
+            self.document_frequency -= np.bincount(sparse.load_npz(path).indices, minlength=self.n_features)
+            path.unlink()
+        self.n_docs -= batch["rows"]
+        self._save_state()
+        return batch["rows"]
+
+    def _remember_terms(self, token_lists: Sequence[Sequence[str]]) -> None:
+        new_terms = sorted({token for tokens in token_lists for token in tokens} - self._known_terms)
+        if not new_terms:
+            return
+        self._known_terms.update(new_terms)
+        features = self._vectorizer.transform([[term] for term in new_terms]).tocsr().indices
+        for feature, term in zip(features.tolist(), new_terms):
+            self._terms.setdefault(feature, term)
+
+    def _save_state(self) -> None:
+        np.save(self.root / "document_frequency.npy", self.document_frequency)
+        pd.DataFrame({"feature": list(self._terms), "term": list(self._terms.values())}).to_parquet(
+            self.root / "terms.parquet", index=False
+        )
+        state = {
+            "n_features": self.n_features,
+            "n_docs": self.n_docs,
+            "next_part": self._next_part,
+            "batches": self._batches,
+        }
+        (self.root / "state.json").write_text(json.dumps(state))
+
+    # Reading ------------------------------------------------------------------------
+    def _key_dir(self, key: FeatureKey) -> Path:
+        group, period = key
+        return self.root / "matrices" / quote(str(group), safe="") / quote(str(period), safe="")
+
+    def keys(self) -> list[FeatureKey]:
+        return sorted(
+            (unquote(group_dir.name), unquote(period_dir.name))
+            for group_dir in (self.root / "matrices").iterdir()
+            for period_dir in group_dir.iterdir()
+            if any(period_dir.glob("part-*.npz"))
+        )
+
+    def counts(self, key: FeatureKey) -> sparse.csr_matrix:
+        """Raw term counts (documents × features) stored under ``key``."""
+        parts = [sparse.load_npz(path) for path in sorted(self._key_dir(key).glob("part-*.npz"))]
+        if not parts:
+            return sparse.csr_matrix((0, self.n_features), dtype=np.int32)
+        return sparse.vstack(parts, format="csr")
+
+    def idf(self) -> np.ndarray:
+        """Smoothed IDF (scikit-learn's ``smooth_idf=True`` formula) over all documents seen."""
+        return np.log((1 + self.n_docs) / (1 + self.document_frequency)) + 1.0
+
+    def tfidf(self, key: FeatureKey) -> sparse.csr_matrix:
+        """L2-normalised TF-IDF rows for the documents under ``key``."""
+        weighted = self.counts(key).astype(np.float64) @ sparse.diags(self.idf())
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ weighted
+
+    def term_weights(self, key: FeatureKey, *, top: int | None = 50) -> pd.DataFrame:
+        """Mean TF-IDF weight and document frequency of each term under ``key``."""
+        matrix = self.tfidf(key).tocsc()
+        n_docs = max(matrix.shape[0], 1)
+        weights = np.asarray(matrix.sum(axis=0)).ravel() / n_docs
+        doc_counts = np.diff(matrix.indptr)
+        features = np.flatnonzero(weights)
+        order = features[np.argsort(-weights[features], kind="stable")]
+        if top is not None:
+            order = order[:top]
+        return pd.DataFrame(
+            {
+                "term": [self._terms.get(int(feature), f"#{feature}") for feature in order],
+                "weight": weights[order],
+                "docs": doc_counts[order],
+            }
+        )
+
+    def compare(self, key_a: FeatureKey, key_b: FeatureKey, *, top: int = 20) -> pd.DataFrame:
+        """Terms whose mean TF-IDF weight differs most between two keys (positive = ``key_a``)."""
+        weights_a = self.term_weights(key_a, top=None).set_index("term")["weight"]
+        weights_b = self.term_weights(key_b, top=None).set_index("term")["weight"]
+        df_compare = pd.concat([weights_a.rename("weight_a"), weights_b.rename("weight_b")], axis=1).fillna(0.0)
+        df_compare["diff"] = df_compare["weight_a"] - df_compare["weight_b"]
+        order = df_compare["diff"].abs().sort_values(ascending=False, kind="stable").index[:top]
+        return df_compare.loc[order].reset_index(names="term")
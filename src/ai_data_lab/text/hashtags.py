@@ -0,0 +1,125 @@
+"""Hashtag extraction into an integer inverted index.
+
+Tags are extracted from every post in one vectorized Polars pass and stored as
+``(row, tag_id)`` postings sorted by tag, so "posts containing any of these
+tags" is a slice lookup over integer arrays rather than a per-row scan of
+Python lists.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+# Same definition the notebooks used with ``re.findall``: '#' up to whitespace,
+# another '#' or an ideographic space.
+HASHTAG_PATTERN = r"#[^\s#　]+"
+
+
+def _content_series(texts: Sequence[Any] | pd.Series) -> pl.Series:
+    """Texts as a Utf8 Series: missing values (None, NaN, NA) become null, anything else ``str``."""
+    return pl.Series("content", [None if pd.isna(text) else str(text) for text in texts], dtype=pl.Utf8)
+
+
+def extract_hashtag_lists(texts: Sequence[str | None] | pd.Series) -> list[list[str]]:
+    """Return the hashtags of every text (duplicates kept, empty list for missing)."""
+    series = _content_series(texts)
+    return [tags or [] for tags in series.str.extract_all(HASHTAG_PATTERN).to_list()]
+
+
+@dataclass
+class HashtagIndex:
+    """Inverted index from tag to the rows (posts) that contain it.
+
+    ``post_ids[row]`` is the post at ``row``; ``tags[tag_id]`` is the tag text.
+    ``rows``/``offsets`` form CSR postings: the rows containing ``tag_id`` are
+    ``rows[offsets[tag_id]:offsets[tag_id + 1]]``, each row at most once.
+    ``occurrences[tag_id]`` counts every use, including repeats within a post.
+    """
+
+    post_ids: np.ndarray
+    tags: np.ndarray
+    rows: np.ndarray
+    offsets: np.ndarray
+    occurrences: np.ndarray
+    _tag_lookup: dict[str, int] | None = field(default=None, init=False, repr=False)
+
+    @classmethod
+    def from_texts(cls, post_ids: Sequence[Any] | pd.Series, texts: Sequence[str | None] | pd.Series) -> "HashtagIndex":
+        post_ids = np.asarray(post_ids)
+        if len(post_ids) != len(texts):
+            raise ValueError("post_ids and texts must have the same length.")
+
+        exploded = (
+            pl.DataFrame({"row": np.arange(len(post_ids), dtype=np.int64), "content": _content_series(texts)})
+            .select("row", pl.col("content").str.extract_all(HASHTAG_PATTERN).alias("tag"))
+            .explode("tag")
+            .drop_nulls("tag")
+        )
+        vocabulary = exploded.group_by("tag").len().sort(["len", "tag"], descending=[True, False])
+        tags = vocabulary["tag"].to_numpy().astype(object)
+        occurrences = vocabulary["len"].to_numpy().astype(np.int64)
+
+        postings = (
+            exploded.join(vocabulary.with_row_index("tag_id").select("tag", "tag_id"), on="tag")
+            .select("tag_id", "row")
+            .unique()
+            .sort(["tag_id", "row"])
+        )
+        tag_ids = postings["tag_id"].to_numpy().astype(np.int64)
+        offsets = np.zeros(len(tags) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tag_ids, minlength=len(tags)), out=offsets[1:])
+        return cls(
+            post_ids=post_ids,
+            tags=tags,
+            rows=postings["row"].to_numpy().astype(np.int64),
+            offsets=offsets,
+            occurrences=occurrences,
+        )
+
+    @property
+    def n_posts(self) -> int:
+        return len(self.post_ids)
+
+    def tag_ids(self, tags: Iterable[str]) -> np.ndarray:
+        """Integer IDs of the given tags; unknown tags are dropped."""
+        lookup = self._lookup()
+        return np.array(sorted({lookup[tag] for tag in tags if tag in lookup}), dtype=np.int64)
+
+    def rows_with_any(self, tags: Iterable[str] | str) -> np.ndarray:
+        """Sorted row positions of posts containing at least one of ``tags``."""
+        if isinstance(tags, str):
+            tags = [tags]
+        slices = [self.rows[self.offsets[tag_id] : self.offsets[tag_id + 1]] for tag_id in self.tag_ids(tags)]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(slices))
+
+    def mask(self, tags: Iterable[str] | str) -> np.ndarray:
+        """Boolean array over rows: does the post contain any of ``tags``?"""
+        result = np.zeros(self.n_posts, dtype=bool)
+        result[self.rows_with_any(tags)] = True
+        return result
+
+    def posts_with_any(self, tags: Iterable[str] | str) -> np.ndarray:
+        """Post IDs of posts containing at least one of ``tags``."""
+        return self.post_ids[self.rows_with_any(tags)]
+
+    def tag_counts(self, top: int | None = None) -> pd.DataFrame:
+        """``(hashtag, count)`` by total occurrences, most frequent first."""
+        limit = len(self.tags) if top is None else top
+        return pd.DataFrame({"hashtag": self.tags[:limit], "count": self.occurrences[:limit]})
+
+    def to_frame(self) -> pd.DataFrame:
+        """The exploded ``(post_id, tag_id)`` postings table."""
+        tag_ids = np.repeat(np.arange(len(self.tags), dtype=np.int64), np.diff(self.offsets))
+        return pd.DataFrame({"post_id": self.post_ids[self.rows], "tag_id": tag_ids})
+
+    def _lookup(self) -> dict[str, int]:
+        if self._tag_lookup is None:
+            self._tag_lookup = {tag: tag_id for tag_id, tag in enumerate(self.tags.tolist())}
+        return self._tag_lookup
@@ -0,0 +1,160 @@
+"""Multi-pattern keyword classification with an Aho–Corasick automaton.
+
+All keywords of all categories are compiled into one automaton, so each text
+is classified in a single left-to-right pass regardless of how many keywords
+there are. Matching is case-insensitive, mirroring Snowflake ``ILIKE '%kw%'``.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Action keywords for CRM MEMO content (previously an ILIKE chain in notebook 18).
+MEMO_ACTION_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "call": ("電話", "架電", "TEL"),
+    "mail": ("メール", "Mail"),
+    "visit": ("訪問", "来社"),
+    "meeting": ("商談", "MTG", "打合せ"),
+    "material": ("資料", "提案書"),
+}
+
+
+class AhoCorasick:
+    """Aho–Corasick automaton whose states carry a bitmask of matched labels.
+
+    ``patterns`` maps each pattern to an integer label bitmask; a state's mask
+    is the OR of every pattern ending there, including via failure links.
+    """
+
+    def __init__(self, patterns: Mapping[str, int]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._mask: list[int] = [0]
+        for pattern, mask in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._mask.append(0)
+                state = next_state
+            self._mask[state] |= mask
+        self._build_failure_links()
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._mask[next_state] |= self._mask[self._fail[next_state]]
+
+    @property
+    def n_states(self) -> int:
+        return len(self._goto)
+
+    def match_mask(self, text: str, stop_mask: int = 0) -> int:
+        """OR of the masks of all patterns occurring in ``text``.
+
+        Scanning stops early once every bit of ``stop_mask`` has been found.
+        """
+        goto, fail, masks = self._goto, self._fail, self._mask
+        state = 0
+        found = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if masks[state]:
+                found |= masks[state]
+                if stop_mask and found & stop_mask == stop_mask:
+                    break
+        return found
+
+
+class KeywordClassifier:
+    """Flags which categories' keywords occur in each text (multi-label)."""
+
+    def __init__(self, categories: Mapping[str, Sequence[str]] = MEMO_ACTION_KEYWORDS) -> None:
+        self.categories = list(categories)
+        if len(self.categories) > 62:
+            raise ValueError("At most 62 categories are supported.")
+        patterns: dict[str, int] = {}
+        for position, category in enumerate(self.categories):
+            for keyword in categories[category]:
+                key = keyword.lower()
+                if key:
+                    patterns[key] = patterns.get(key, 0) | (1 << position)
+        self._automaton = AhoCorasick(patterns)
+        self._all_mask = (1 << len(self.categories)) - 1
+
+    def classify(self, text: str | None) -> list[str]:
+        """Categories whose keywords occur in ``text``."""
+        mask = self._mask(text)
+        return [category for position, category in enumerate(self.categories) if mask >> position & 1]
+
+    def _mask(self, text: str | None) -> int:
+        if not text or not isinstance(text, str):
+            return 0
+        return self._automaton.match_mask(text.lower(), self._all_mask)
+
+    def masks(self, texts: Iterable[str | None]) -> np.ndarray:
+        return np.fromiter((self._mask(text) for text in texts), dtype=np.int64)
+
+    def flags(self, texts: Iterable[str | None] | pd.Series) -> pd.DataFrame:
+        """Boolean frame (one column per category) aligned with ``texts``."""
+        index = texts.index if isinstance(texts, pd.Series) else None
+        masks = self.masks(texts)
+        data = {category: (masks >> position & 1).astype(bool) for position, category in enumerate(self.categories)}
+        df_flags = pd.DataFrame(data, index=index)
+        df_flags["any_action"] = masks != 0
+        return df_flags
+
+    def category_counts(self, texts: Iterable[str | None] | pd.Series) -> pd.Series:
+        """Number of texts that match each category (plus ``any_action`` and ``total``)."""
+        df_flags = self.flags(texts)
+        counts = df_flags.sum().astype(int)
+        counts["total"] = len(df_flags)
+        return counts
+
+    def aggregate(self, df: pd.DataFrame, *, text_col: str, group_col: str) -> pd.DataFrame:
+        """Per-group memo totals and per-category match counts, most active group first."""
+        df_flags = self.flags(df[text_col])
+        df_flags[group_col] = df[group_col].to_numpy()
+        grouped = df_flags.groupby(group_col, dropna=False)
+        df_groups = grouped[[*self.categories, "any_action"]].sum().astype(int)
+        df_groups.insert(0, "memos", grouped.size())
+        return df_groups.sort_values(["any_action", "memos"], ascending=False).reset_index()
+
+
+def parse_keyword_spec(spec: str) -> dict[str, tuple[str, ...]]:
+    """Parse ``category: kw1, kw2`` lines (blank lines and ``#`` comments ignored)."""
+    categories: dict[str, tuple[str, ...]] = {}
+    for line in spec.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or ":" not in line:
+            continue
+        category, keywords = line.split(":", 1)
+        categories[category.strip()] = tuple(
+            keyword.strip() for keyword in keywords.replace("、", ",").split(",") if keyword.strip()
+        )
+    return categories
+
+
+def format_keyword_spec(categories: Mapping[str, Sequence[str]] = MEMO_ACTION_KEYWORDS) -> str:
+    """Inverse of :func:`parse_keyword_spec`, for editing keywords in a text box."""
+    return "\n".join(f"{category}: {', '.join(keywords)}" for category, keywords in categories.items())
@@ -0,0 +1,302 @@
+"""Local full-text search over posts, users and MEMO extracts (SQLite FTS5).
+
+Japanese has no spaces, so documents are indexed as overlapping character
+bigrams (plus a trailing unigram per run) and a query becomes an FTS5 phrase
+of its bigrams, so a single run matches like ``ILIKE '%q%'`` while the lookup
+goes through the inverted index instead of scanning every row. Runs split by
+spaces, ``_`` or symbols are only ANDed anywhere in the document, so for such
+queries the index is a candidate filter; :meth:`FullTextIndex.filter_contains`
+re-checks the candidates with a literal per-column substring test.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import unicodedata
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Sequence
+
+import pandas as pd
+
+from .features import iter_parquet_batches
+
+DEFAULT_SEARCH_INDEX_PATH = Path("data") / "search" / "fulltext.sqlite"
+
+_RUN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def _runs(text: str) -> list[str]:
+    return _RUN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def bigram_tokens(text: str | None) -> str:
+    """Space separated bigrams of every alphanumeric run, each run ending in its last character."""
+    if not text:
+        return ""
+    tokens: list[str] = []
+    for run in _runs(str(text)):
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
+def bigram_query(query: str) -> str | None:
+    """FTS5 MATCH expression requiring every run of ``query`` as a substring."""
+    clauses = []
+    for run in _runs(query):
+        if len(run) == 1:
+            clauses.append(f'"{run}"*')
+        else:
+            clauses.append('"' + " ".join(run[i : i + 2] for i in range(len(run) - 1)) + '"')
+    return " AND ".join(clauses) or None
+
+
+class FullTextIndex:
+    """Incrementally maintained FTS5 index with structured filters.
+
+    Each document belongs to a ``corpus`` (``"posts"``, ``"memo"`` …) and has a
+    ``doc_id`` unique within it, optional ``group_key`` (account, company) and
+    ``ts`` (ISO timestamp), plus arbitrary JSON ``attrs``. Re-adding a document
+    with unchanged text and metadata is a no-op.
+    """
+
+    def __init__(self, path: Path | str = DEFAULT_SEARCH_INDEX_PATH) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    rowid INTEGER PRIMARY KEY,
+                    corpus TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    group_key TEXT,
+                    ts TEXT,
+                    text TEXT,
+                    attrs TEXT,
+                    digest TEXT,
+                    UNIQUE (corpus, doc_id)
+                );
+                CREATE INDEX IF NOT EXISTS documents_group ON documents (corpus, group_key);
+                CREATE INDEX IF NOT EXISTS documents_ts ON documents (corpus, ts);
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts
+                    USING fts5(grams, tokenize = 'unicode61 remove_diacritics 0');
+                """
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Building -----------------------------------------------------------------------
+    def add_documents(
+        self,
+        corpus: str,
+        df: pd.DataFrame,
+        *,
+        id_col: str,
+        text_cols: str | Sequence[str],
+        group_col: str | None = None,
+        time_col: str | None = None,
+        attr_cols: Sequence[str] = (),
+    ) -> int:
+        """Insert or update documents from ``df``; returns how many changed.
+
+        Several ``text_cols`` are indexed together (separated by newlines).
+        Rows sharing an ``id_col`` value become one document: their distinct
+        texts are concatenated in row order and the last row's group, time and
+        attributes are kept.
+        """
+        if df.empty:
+            return 0
+        text_cols = [text_cols] if isinstance(text_cols, str) else list(text_cols)
+        texts = df[text_cols[0]].astype("string").fillna("")
+        for column in text_cols[1:]:
+            texts = texts + "\n" + df[column].astype("string").fillna("")
+        doc_ids = df[id_col].astype(str).tolist()
+        groups = df[group_col].astype("string").tolist() if group_col else [None] * len(df)
+        times = [None] * len(df)
+        if time_col:
+            timestamps = pd.to_datetime(df[time_col], errors="coerce", utc=True)
+            times = [None if pd.isna(value) else value.isoformat() for value in timestamps]
+        attrs = (
+            [json.dumps(record, ensure_ascii=False, default=str) for record in df[list(attr_cols)].to_dict("records")]
+            if attr_cols
+            else [None] * len(df)
+        )
+
+        documents: dict[str, tuple[str | None, str | None, str | None, list[str]]] = {}
+        for doc_id, group, ts, text, attr in zip(doc_ids, groups, times, texts.tolist(), attrs):
+            group = None if group is None or pd.isna(group) else str(group)
+            doc_texts = documents[doc_id][3] if doc_id in documents else []
+            if text not in doc_texts:
+                doc_texts.append(text)
+            documents[doc_id] = (group, ts, attr, doc_texts)
+
+        rows = []
+        for doc_id, (group, ts, attr, doc_texts) in documents.items():
+            text = "\n".join(doc_texts)
+            digest = hashlib.blake2b(f"{group}\0{ts}\0{attr}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+            rows.append((corpus, doc_id, group, ts, text, attr, digest))
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TEMP TABLE staging (corpus, doc_id, group_key, ts, text, attrs, digest)")
+            conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            changed = conn.execute(
+                """
+                SELECT s.corpus, s.doc_id, s.group_key, s.ts, s.text, s.attrs, s.digest, d.rowid
+                FROM staging s
+                LEFT JOIN documents d ON d.corpus = s.corpus AND d.doc_id = s.doc_id
+                WHERE d.rowid IS NULL OR d.digest != s.digest
+                """
+            ).fetchall()
+            for corpus_, doc_id, group, ts, text, attr, digest, rowid in changed:
+                if rowid is None:
+                    cursor = conn.execute(
+                        "INSERT INTO documents (corpus, doc_id, group_key, ts, text, attrs, digest) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (corpus_, doc_id, group, ts, text, attr, digest),
+                    )
+                    rowid = cursor.lastrowid
+                else:
+                    conn.execute(
+                        "UPDATE documents SET group_key = ?, ts = ?, text = ?, attrs = ?, digest = ? WHERE rowid = ?",
+                        (group, ts, text, attr, digest, rowid),
+                    )
+                    conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (rowid,))
+                conn.execute("INSERT INTO documents_fts (rowid, grams) VALUES (?, ?)", (rowid, bigram_tokens(text)))
+            conn.execute("DROP TABLE staging")
+        return len(changed)
+
+    def add_parquet(self, corpus: str, path: Path | str, *, batch_size: int = 50_000, **kwargs: Any) -> int:
+        """Stream a Parquet extract into the index batch by batch."""
+        return sum(self.add_documents(corpus, df_batch, **kwargs) for df_batch in iter_parquet_batches(path, batch_size=batch_size))
+
+    def remove(self, corpus: str, doc_ids: Iterable[Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            for doc_id in doc_ids:
+                row = conn.execute(
+                    "SELECT rowid FROM documents WHERE corpus = ? AND doc_id = ?", (corpus, str(doc_id))
+                ).fetchone()
+                if row:
+                    conn.execute("DELETE FROM documents_fts WHERE rowid = ?", row)
+                    conn.execute("DELETE FROM documents WHERE rowid = ?", row)
+
+    def count(self, corpus: str | None = None) -> int:
+        with closing(self._connect()) as conn:
+            if corpus is None:
+                return conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+            return conn.execute("SELECT count(*) FROM documents WHERE corpus = ?", (corpus,)).fetchone()[0]
+
+    # Searching ----------------------------------------------------------------------
+    def search(
+        self,
+        query: str,
+        filters: Mapping[str, Any] | None = None,
+        limit: int | None = 100,
+    ) -> pd.DataFrame:
+        """Documents containing every run of ``query``, best BM25 rank first.
+
+        ``filters`` keys: ``corpus``, ``group`` (value or list), ``since`` /
+        ``until`` (timestamps, inclusive / exclusive), ``min_length`` and
+        ``attrs`` (mapping of attribute equality tests). A blank query returns
+        the filtered documents in index order; a non-blank query without any
+        searchable characters (only punctuation or symbols) matches nothing.
+        """
+        filters = dict(filters or {})
+        match = bigram_query(query or "")
+        if match is None and query and query.strip():
+            limit = 0  # still validate the filters and return the usual columns
+        clauses: list[str] = []
+        params: list[Any] = []
+        if match:
+            source = "documents_fts f JOIN documents d ON d.rowid = f.rowid"
+            clauses.append("documents_fts MATCH ?")
+            params.append(match)
+            order = "ORDER BY bm25(documents_fts)"
+            rank = "bm25(documents_fts)"
+        else:
+            source = "documents d"
+            order = "ORDER BY d.rowid"
+            rank = "NULL"
+
+        if "corpus" in filters:
+            clauses.append("d.corpus = ?")
+            params.append(filters.pop("corpus"))
+        if "group" in filters:
+            groups = filters.pop("group")
+            groups = [groups] if isinstance(groups, str) or not isinstance(groups, Iterable) else list(groups)
+            clauses.append(f"d.group_key IN ({', '.join('?' * len(groups))})")
+            params.extend(str(group) for group in groups)
+        if "since" in filters:
+            clauses.append("d.ts >= ?")
+            params.append(_iso(filters.pop("since")))
+        if "until" in filters:
+            clauses.append("d.ts < ?")
+            params.append(_iso(filters.pop("until")))
+        if "min_length" in filters:
+            clauses.append("length(d.text) >= ?")
+            params.append(int(filters.pop("min_length")))
+        for key, value in dict(filters.pop("attrs", {}) or {}).items():
+            clauses.append("json_extract(d.attrs, ?) = ?")
+            params.extend([f"$.{key}", value])
+        if filters:
+            raise ValueError(f"Unknown search filters: {sorted(filters)}")
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = "LIMIT ?"
+            params.append(int(limit))
+        sql = f"""
+            SELECT d.corpus, d.doc_id, d.group_key, d.ts, d.text, d.attrs, {rank} AS rank
+            FROM {source} {where} {order} {limit_sql}
+        """
+        with closing(self._connect()) as conn:
+            df_hits = pd.read_sql_query(sql, conn, params=params)
+        df_hits["attrs"] = df_hits["attrs"].map(lambda value: json.loads(value) if value else {})
+        return df_hits
+
+
+    def filter_contains(
+        self,
+        corpus: str,
+        df: pd.DataFrame,
+        query: str,
+        *,
+        id_col: str,
+        columns: Sequence[str],
+    ) -> pd.DataFrame:
+        """Rows of ``df`` where some of ``columns`` contains ``query``, case-insensitively.
+
+        The index (``df`` added to ``corpus`` by ``id_col``) only narrows the
+        rows to check; each candidate is then tested column by column with a
+        literal ``str.contains``, so pieces of the query found in different
+        columns never match. A query without searchable characters checks
+        every row.
+        """
+        term = query.lower()
+        candidates = df
+        if bigram_query(query) is not None:
+            hits = self.search(query, {"corpus": corpus}, limit=None)
+            candidates = df[df[id_col].astype(str).isin(hits["doc_id"])]
+        mask = pd.Series(False, index=candidates.index)
+        for column in columns:
+            mask |= candidates[column].astype(str).str.lower().str.contains(term, regex=False, na=False)
+        return candidates[mask]
+
+
+def _iso(value: Any) -> str:
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC").isoformat()
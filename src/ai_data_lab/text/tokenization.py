@@ -0,0 +1,206 @@
+"""Janome tokenization sharded across processes with a persistent token cache.
+
+Janome is pure Python, so a single ``Tokenizer`` is CPU bound on one core.
+:class:`TokenizerService` sends cache misses to a process pool where every
+worker builds one ``Tokenizer`` and streams tokens, and stores the result per
+text hash in a DuckDB table so re-runs over the same corpus do no tokenization.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple, Sequence
+
+import duckdb
+import pyarrow as pa
+
+DEFAULT_TOKEN_CACHE_PATH = Path("data") / "cache" / "janome_tokens.duckdb"
+
+_WORKER_TOKENIZER: Any = None
+
+
+class Token(NamedTuple):
+    surface: str
+    part_of_speech: str
+
+
+def _janome_version() -> str:
+    import janome
+
+    return getattr(janome, "__version__", "unknown")
+
+
+def text_key(text: str, namespace: str = "") -> str:
+    """Hash of ``text`` (salted with ``namespace``) used as the cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(namespace.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _init_worker() -> None:
+    global _WORKER_TOKENIZER
+    from janome.tokenizer import Tokenizer
+
+    _WORKER_TOKENIZER = Tokenizer()
+
+
+def _tokenize_chunk(texts: Sequence[str]) -> list[tuple[list[str], list[str]]]:
+    """Tokenize ``texts`` with this process's tokenizer; returns (surfaces, pos) per text."""
+    if _WORKER_TOKENIZER is None:
+        _init_worker()
+    results = []
+    for text in texts:
+        surfaces: list[str] = []
+        pos: list[str] = []
+        for token in _WORKER_TOKENIZER.tokenize(text):
+            surfaces.append(token.surface)
+            pos.append(token.part_of_speech)
+        results.append((surfaces, pos))
+    return results
+
+
+class TokenCache:
+    """DuckDB table mapping text hash to its surfaces and part-of-speech tags."""
+
+    TABLE = "token_cache"
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    key VARCHAR PRIMARY KEY,
+                    surfaces VARCHAR[],
+                    pos VARCHAR[]
+                )
+                """
+            )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        return duckdb.connect(str(self._path))
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, tuple[list[str], list[str]]]:
+        if not keys:
+            return {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT key, surfaces, pos FROM {self.TABLE} WHERE key IN (SELECT unnest(?))", [list(keys)]
+            ).fetchall()
+        return {key: (surfaces, pos) for key, surfaces, pos in rows}
+
+    def put_many(self, entries: dict[str, tuple[list[str], list[str]]]) -> None:
+        if not entries:
+            return
+        table = pa.table(
+            {
+                "key": pa.array(list(entries), pa.string()),
+                "surfaces": pa.array([value[0] for value in entries.values()], pa.list_(pa.string())),
+                "pos": pa.array([value[1] for value in entries.values()], pa.list_(pa.string())),
+            }
+        )
+        with self._connect() as conn:
+            conn.register("new_tokens", table)
+            conn.execute(f"INSERT OR REPLACE INTO {self.TABLE} SELECT key, surfaces, pos FROM new_tokens")
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute(f"SELECT count(*) FROM {self.TABLE}").fetchone()[0]
+
+
+class TokenizerService:
+    """Cached, multi-process Janome tokenization.
+
+    ``workers=None`` uses every core; batches with fewer than ``min_parallel``
+    uncached texts are tokenized in-process to avoid pool start-up cost.
+    ``cache_path=None`` keeps results in memory only.
+    """
+
+    def __init__(
+        self,
+        cache_path: Path | str | None = DEFAULT_TOKEN_CACHE_PATH,
+        *,
+        workers: int | None = None,
+        chunk_size: int = 256,
+        min_parallel: int = 2000,
+    ) -> None:
+        self.cache = TokenCache(cache_path) if cache_path else None
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        self.namespace = f"janome-{_janome_version()}"
+        self._memory: dict[str, tuple[list[str], list[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def tokenize(self, texts: Iterable[str | None]) -> list[list[Token]]:
+        """Return the tokens of every text (empty list for missing text), in input order."""
+        texts = ["" if text is None else str(text) for text in texts]
+        keys = [text_key(text, self.namespace) for text in texts]
+
+        found = {key: self._memory[key] for key in set(keys) if key in self._memory}
+        if self.cache is not None:
+            found.update(self.cache.get_many([key for key in set(keys) if key not in found]))
+
+        pending: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        # A miss is one text actually tokenized; repeats within the call count as hits.
+        self.hits += len(keys) - len(pending)
+        self.misses += len(pending)
+
+        if pending:
+            computed = dict(zip(pending, self._run(list(pending.values()))))
+            if self.cache is not None:
+                self.cache.put_many(computed)
+            found.update(computed)
+        self._memory.update(found)
+
+        return [[Token(surface, pos) for surface, pos in zip(*found[key])] for key in keys]
+
+    def wakati(self, texts: Iterable[str | None]) -> list[list[str]]:
+        """Return only the surface forms of every text."""
+        return [[token.surface for token in tokens] for tokens in self.tokenize(texts)]
+
+    def nouns(
+        self,
+        texts: Iterable[str | None],
+        *,
+        stopwords: Iterable[str] = (),
+        min_length: int = 2,
+        drop_digits: bool = True,
+    ) -> list[list[str]]:
+        """Return the nouns of every text, excluding stopwords, short words and numbers."""
+        stopwords = set(stopwords)
+        return [
+            [
+                token.surface
+                for token in tokens
+                if token.part_of_speech.startswith("名詞")
+                and len(token.surface) >= min_length
+                and token.surface not in stopwords
+                and not (drop_digits and token.surface.isdigit())
+            ]
+            for tokens in self.tokenize(texts)
+        ]
+
+    def _run(self, texts: list[str]) -> list[tuple[list[str], list[str]]]:
+        if self.workers <= 1 or len(texts) < self.min_parallel:
+            return _tokenize_chunk(texts)
+        chunks = [texts[start : start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+        results: list[tuple[list[str], list[str]]] = []
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as executor:
+            for chunk_result in executor.map(_tokenize_chunk, chunks):
+                results.extend(chunk_result)
+        return results
@@ -0,0 +1,115 @@
+"""Tests for the persistent cell-result cache."""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_data_lab.cache import ResultCache, fingerprint
+
+
+def _frame(n: int = 5, offset: int = 0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "ORGID": [f"org-{i}" for i in range(n)],
+            "value": np.arange(n, dtype=float) + offset,
+            "created_at": pd.date_range("2026-01-01", periods=n, tz="UTC"),
+        },
+        index=pd.Index(range(10, 10 + n), name="row"),
+    )
+
+
+def _loader(calls):
+    def load(sql, *, limit=5):
+        calls.append(sql)
+        return _frame(limit)
+
+    return load
+
+
+def test_cached_function_round_trips_frames_across_instances(tmp_path):
+    calls = []
+
+    expected = ResultCache(tmp_path).cached(name="load")(_loader(calls))("SELECT 1")
+    restarted = ResultCache(tmp_path)
+    again = restarted.cached(name="load")(_loader(calls))
+
+    pd.testing.assert_frame_equal(again("SELECT 1"), expected)
+    assert calls == ["SELECT 1"]
+    assert restarted.hits == 1
+    again("SELECT 2")
+    again("SELECT 1", limit=3)
+    assert calls == ["SELECT 1", "SELECT 2", "SELECT 1"]
+
+
+def test_versions_and_dataframe_arguments_change_the_key(tmp_path):
+    cache = ResultCache(tmp_path)
+    version = {"date": "2026-10-01"}
+    calls = []
+
+    @cache.cached(versions=lambda: version)
+    def summarize(df):
+        calls.append(len(df))
+        return df.describe()
+
+    summarize(_frame())
+    summarize(_frame())
+    summarize(_frame(offset=1))
+    version = {"date": "2026-10-02"}
+    summarize(_frame())
+
+    assert len(calls) == 3
+    assert fingerprint(_frame()) == fingerprint(_frame())
+    assert fingerprint(_frame()) != fingerprint(_frame(offset=1))
+
+
+def test_entry_context_manager_caches_tuples_and_dicts(tmp_path):
+    cache = ResultCache(tmp_path)
+
+    with cache.entry("pair", inputs=("sql",)) as entry:
+        assert not entry.hit
+        entry.value = (_frame(3), _frame(2))
+    with cache.entry("pages", inputs=("sql",)) as entry:
+        entry.value = {"a": _frame(1)}
+
+    with cache.entry("pair", inputs=("sql",)) as entry:
+        assert entry.hit
+        assert isinstance(entry.value, tuple) and [len(frame) for frame in entry.value] == [3, 2]
+    with cache.entry("pages", inputs=("sql",)) as entry:
+        assert list(entry.value) == ["a"]
+
+
+def test_unsupported_results_are_returned_but_not_stored(tmp_path):
+    cache = ResultCache(tmp_path)
+
+    @cache.cached
+    def answer():
+        return 42
+
+    assert answer() == 42
+    assert cache.entries().empty
+
+
+def test_invalidate_and_size_bounded_eviction(tmp_path):
+    cache = ResultCache(tmp_path)
+    for position in range(3):
+        key = ResultCache.key(f"entry-{position}", "src")
+        cache.store(key, _frame(200, offset=position), name=f"entry-{position}")
+        os.utime(tmp_path / key / "meta.json", (1_000 + position, 1_000 + position))
+    # Reading entry-0 makes entry-1 the least recently used.
+    assert cache.load(ResultCache.key("entry-0", "src"))[0]
+
+    size = int(cache.entries()["bytes"].max())
+    assert cache.evict(max_bytes=2 * size) == 1
+    assert sorted(cache.entries()["name"]) == ["entry-0", "entry-2"]
+    assert cache.invalidate("entry-0") == 1
+    assert cache.entries()["name"].tolist() == ["entry-2"]
+    assert cache.invalidate() == 1
+
+
+@pytest.mark.parametrize("value", [[1, 2], {"b": 1, "a": 2}, pd.Timestamp("2026-01-01")])
+def test_fingerprint_is_stable(value):
+    assert fingerprint(value) == fingerprint(value)
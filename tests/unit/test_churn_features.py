@@ -0,0 +1,103 @@
+"""Tests for the point-in-time churn feature store."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_data_lab.churn.features import ChurnFeatureStore, add_ratio_features, complete_months, monthly_feature_queries
+
+
+def _frames(month: pd.Timestamp) -> dict[str, pd.DataFrame]:
+    # org-a grows by one session per month; org-b only writes memos in odd months.
+    frames = {"ga": pd.DataFrame({"ORGID": ["org-a"], "sessions": [float(month.month)], "users": [2]})}
+    if month.month % 2:
+        frames["memo"] = pd.DataFrame({"ORGID": ["org-b"], "MEMO_CREATED": [5]})
+    return frames
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChurnFeatureStore(tmp_path / "features.duckdb")
+    store.refresh(_frames, start="2026-01-01", through="2026-06-30")
+    return store
+
+
+def test_refresh_only_materializes_new_months(store):
+    calls = []
+
+    def fetch(month):
+        calls.append(month)
+        return _frames(month)
+
+    written = store.refresh(fetch, start="2026-01-01", through="2026-07-15")
+
+    assert written == calls == [pd.Timestamp("2026-07-01")]
+    assert len(store.months()) == 7
+    assert store.features() == ["memo_created", "sessions", "users"]
+
+
+def test_as_of_uses_only_months_before_the_as_of_month(store):
+    entities = pd.DataFrame(
+        {
+            "ORGID": ["org-a", "org-a", "org-b", "org-c"],
+            "churn_date": pd.to_datetime(["2026-04-20", None, "2026-04-01", "2026-04-20"]),
+        }
+    )
+
+    df_features = store.as_of(entities, date_col="churn_date", months=3, default_date="2026-07-10")
+
+    # April churn sees Jan-Mar only: sessions 1, 2, 3.
+    assert df_features.loc[0, "sessions"] == pytest.approx(2.0)
+    assert df_features.loc[0, "months_observed"] == 3
+    # No churn date: as of July, so Apr-Jun.
+    assert df_features.loc[1, "sessions"] == pytest.approx(5.0)
+    # Memos in Jan and Mar; the zero month still counts towards the mean.
+    assert df_features.loc[2, "memo_created"] == pytest.approx(10 / 3)
+    # Unknown org with observed months has zero activity.
+    assert df_features.loc[3, ["sessions", "memo_created"]].tolist() == [0.0, 0.0]
+
+
+def test_as_of_last_and_unobserved_windows(store):
+    entities = pd.DataFrame({"ORGID": ["org-b", "org-b", "org-a"], "as_of": ["2026-03-15", "2026-04-15", "2026-01-05"]})
+
+    df_last = store.as_of(entities, date_col="as_of", agg="last")
+
+    assert df_last.loc[0, "memo_created"] == 0.0
+    assert df_last.loc[1, "memo_created"] == 5.0
+    assert np.isnan(df_last.loc[2, "sessions"])
+    assert df_last.loc[2, "months_observed"] == 0
+
+
+def test_write_month_replaces_the_month_and_rejects_duplicate_features(store):
+    store.write_month("2026-06-01", {"ga": pd.DataFrame({"ORGID": ["org-z"], "sessions": [9]})})
+
+    snapshot = store.snapshot("2026-06-01")
+    assert snapshot["orgid"].tolist() == ["org-z"]
+    assert snapshot.loc[0, "sessions"] == 9.0
+    with pytest.raises(ValueError):
+        store.write_month(
+            "2026-06-01",
+            {"ga": pd.DataFrame({"ORGID": ["a"], "users": [1]}), "other": pd.DataFrame({"ORGID": ["a"], "users": [1]})},
+        )
+
+
+def test_monthly_queries_cover_exactly_one_month():
+    queries = monthly_feature_queries("ds", "DB.SCHEMA", "2026-02-17")
+
+    assert set(queries) == {"ga", "companylist", "peoplelist", "memo", "intent"}
+    assert "'20260201'" in queries["ga"][1] and "'20260301'" in queries["ga"][1]
+    assert "m.CREATEDAT >= '2026-02-01' AND m.CREATEDAT < '2026-03-01'" in queries["memo"][1]
+    assert complete_months("2026-01-20", "2026-03-01") == list(pd.date_range("2026-01-01", "2026-03-01", freq="MS"))
+
+
+def test_ratio_features_distinguish_no_activity_from_unobserved():
+    df_features = pd.DataFrame({"users": [2.0, 0.0, np.nan], "sessions": [3.0, 0.0, np.nan], "page_views": [9.0, 0.0, np.nan]})
+
+    df_ratios = add_ratio_features(df_features)
+
+    assert df_ratios["sessions_per_user"].tolist()[:2] == [1.5, 0.0]
+    assert df_ratios["page_views_per_session"].tolist()[:2] == [3.0, 0.0]
+    assert np.isnan(df_ratios.loc[2, "page_views_per_user"])
+    assert "sessions_per_user" not in add_ratio_features(df_features[["users"]]).columns
@@ -0,0 +1,124 @@
+"""Tests for the GA page-usage rollup SQL."""
+
+from __future__ import annotations
+
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from ai_data_lab.churn.ga_rollup import (
+    PAGE_CATEGORIES,
+    GaPageRollup,
+    main,
+    raw_status_rates_sql,
+    raw_usage_rates_sql,
+    rollup_refresh_script,
+    status_rates_sql,
+    usage_rates_sql,
+)
+
+
+def test_refresh_script_scans_once_and_guards_daily_reruns():
+    script = rollup_refresh_script("analytics_1", "rollup", months=3)
+
+    assert script.count("`analytics_1.events_*`") == 1
+    assert "IF (SELECT MAX(refreshed_on) FROM `rollup.ga_page_usage_monthly`) = CURRENT_DATE() THEN RETURN" in script
+    assert "INTERVAL 3 MONTH" in script
+    assert "COUNT(DISTINCT IF(has_people = 1, user_pseudo_id, NULL)) AS people" in script
+    assert "APPROX_COUNT_DISTINCT" not in script
+    for name in PAGE_CATEGORIES:
+        assert f"has_{name}" in script
+
+    forced = rollup_refresh_script("analytics_1", "rollup", approximate=True, force=True)
+    assert "RETURN" not in forced
+    assert "APPROX_COUNT_DISTINCT(user_pseudo_id) AS total" in forced
+
+
+def test_usage_rates_columns_match_dashboard_frames():
+    user_sql = usage_rates_sql("rollup", unit="user")
+    org_sql = usage_rates_sql("rollup", unit="org")
+
+    assert "total AS total_uu" in user_sql and "search AS uu_search" in user_sql
+    assert "total AS total_orgs" in org_sql and "ROUND(SAFE_DIVIDE(crm, total) * 100, 1) AS rate_crm" in org_sql
+    with pytest.raises(ValueError):
+        usage_rates_sql(unit="session")
+
+
+def test_status_rates_inline_statuses_and_unknown_default():
+    sql = status_rates_sql({"org-1": "解約済み", "o'2": "契約中"}, "rollup")
+
+    assert "STRUCT('org-1' AS org_id, '解約済み' AS status)" in sql
+    assert "STRUCT('o\\'2' AS org_id, '契約中' AS status)" in sql
+    assert "COALESCE(s.status, '不明')" in sql
+    assert "ARRAY<STRUCT<org_id STRING, status STRING>>[]" in status_rates_sql({}, "rollup")
+
+
+def test_rollup_routes_every_read_through_the_runner():
+    issued = []
+
+    def query(sql):
+        issued.append(sql)
+        return pd.DataFrame({"month": ["2026-09"]})
+
+    rollup = GaPageRollup(query, "analytics_1", "rollup")
+    rollup.refresh()
+    frames = [rollup.user_rates(), rollup.org_rates(), rollup.status_rates({"org-1": "契約中"})]
+
+    assert len(issued) == 4
+    assert issued[0].lstrip().startswith("DECLARE since DATE")
+    assert all(frame["month"].tolist() == ["2026-09"] for frame in frames)
+
+
+def test_raw_queries_match_the_rollup_frames():
+    user_sql = raw_usage_rates_sql("analytics_1", unit="user", months=3)
+    status_sql = raw_status_rates_sql("analytics_1", {"org-1": "契約中"}, months=3)
+
+    assert user_sql.count("`analytics_1.events_*`") == 1
+    assert "INTERVAL 3 MONTH" in user_sql
+    assert "FROM usage\n    WHERE unit = 'user'" in user_sql
+    assert "total AS total_uu" in user_sql and "search AS uu_search" in user_sql
+    assert "FROM org_flags AS f" in status_sql and "usage AS" not in status_sql
+    assert "STRUCT('org-1' AS org_id, '契約中' AS status)" in status_sql
+
+
+def test_freshness_and_raw_fallback_reads():
+    issued = []
+    refreshed = {"value": date(2026, 10, 17)}
+
+    def query(sql):
+        issued.append(sql)
+        if "MAX(refreshed_on)" in sql:
+            return pd.DataFrame({"refreshed_on": [refreshed["value"]]})
+        return pd.DataFrame({"month": ["2026-09"]})
+
+    rollup = GaPageRollup(query, "analytics_1", "rollup")
+
+    assert rollup.last_refreshed() == date(2026, 10, 17)
+    assert not rollup.is_fresh(today=date(2026, 10, 19))
+    assert rollup.is_fresh(today=date(2026, 10, 18))
+    refreshed["value"] = None
+    assert rollup.last_refreshed() is None and not rollup.is_fresh(today=date(2026, 10, 19))
+
+    issued.clear()
+    rollup.user_rates(raw=True)
+    rollup.status_rates({}, raw=True)
+    assert all("`analytics_1.events_*`" in sql and "rollup." not in sql for sql in issued)
+
+
+def test_cli_refreshes_through_the_connector(monkeypatch, capsys):
+    issued = []
+
+    class _Connector:
+        def __init__(self, project_id=None):
+            self.project_id = project_id
+
+        def query(self, sql):
+            issued.append(sql)
+            return pd.DataFrame({"refreshed_on": [date.today()]})
+
+    monkeypatch.setattr("ai_data_lab.connectors.bigquery.BigQueryConnector", _Connector)
+
+    assert main(["refresh", "--ga-dataset", "analytics_1", "--rollup-dataset", "rollup", "--force"]) == 0
+    assert "RETURN" not in issued[0] and "`analytics_1.events_*`" in issued[0]
+    assert "rollup: last refreshed" in capsys.readouterr().out
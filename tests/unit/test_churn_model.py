@@ -0,0 +1,89 @@
+"""Tests for the cross-validated churn model."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_data_lab.churn.model import ChurnModel, class_counts, feature_schema_hash, load_or_fit
+
+FEATURES = ("sessions", "download_rate")
+GRID = {"logit__C": (0.1, 1.0)}
+
+
+def _portfolio(n: int = 120, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sessions = rng.gamma(2.0, 10.0, n)
+    download_rate = rng.uniform(0, 1, n)
+    logit = 2.0 - 0.15 * sessions - 1.5 * download_rate
+    return pd.DataFrame(
+        {
+            "ORGID": [f"org-{i}" for i in range(n)],
+            "sessions": sessions,
+            "download_rate": download_rate,
+            "is_churned": (rng.uniform(0, 1, n) < 1 / (1 + np.exp(-logit))).astype(int),
+        }
+    )
+
+
+def test_fit_searches_grid_and_scores_in_batch():
+    df_portfolio = _portfolio()
+
+    model = ChurnModel.fit(df_portfolio, FEATURES, param_grid=GRID, cv=3, n_jobs=1)
+
+    assert len(model.cv_results) == 2
+    assert model.best_params["logit__C"] in GRID["logit__C"]
+    assert 0.5 < model.cv_score <= 1.0
+    assert model.coefficients().set_index("feature").loc["sessions", "coefficient"] < 0
+
+    df_score = df_portfolio.copy()
+    df_score.loc[3, "sessions"] = np.nan
+    scores = model.score(df_score)
+    assert scores.index.equals(df_score.index)
+    assert np.isnan(scores[3]) and scores.drop(3).between(0, 1).all()
+    # Low activity scores as riskier than high activity.
+    probe = pd.DataFrame({"sessions": [1.0, 80.0], "download_rate": [0.5, 0.5]})
+    low, high = model.score(probe)
+    assert low > high
+
+
+def test_load_or_fit_refits_only_when_data_or_schema_change(tmp_path):
+    path = tmp_path / "churn.joblib"
+    df_portfolio = _portfolio()
+
+    first, refit = load_or_fit(df_portfolio, FEATURES, path=path, param_grid=GRID, cv=3, n_jobs=1)
+    assert refit
+    reloaded, refit = load_or_fit(df_portfolio.sample(frac=1, random_state=1), FEATURES, path=path, n_jobs=1)
+    assert not refit
+    assert reloaded.schema_hash == feature_schema_hash(FEATURES)
+    pd.testing.assert_series_equal(reloaded.score(df_portfolio), first.score(df_portfolio))
+
+    _, refit = load_or_fit(_portfolio(seed=1), FEATURES, path=path, param_grid=GRID, cv=3, n_jobs=1)
+    assert refit
+    _, refit = load_or_fit(df_portfolio, FEATURES[:1], path=path, param_grid=GRID, cv=3, n_jobs=1)
+    assert refit
+
+
+def test_load_rejects_a_different_feature_schema(tmp_path):
+    path = ChurnModel.fit(_portfolio(), FEATURES, param_grid=GRID, cv=3, n_jobs=1).save(tmp_path / "m.joblib")
+
+    with pytest.raises(ValueError, match="Feature schema"):
+        ChurnModel.load(path, features=FEATURES[::-1])
+
+
+def test_fit_requires_both_classes():
+    df_portfolio = _portfolio().assign(is_churned=0)
+
+    assert class_counts(df_portfolio, FEATURES) == (120, 0)
+
+    with pytest.raises(ValueError, match="two churned"):
+        ChurnModel.fit(df_portfolio, FEATURES, n_jobs=1)
+    with pytest.raises(ValueError, match="missing"):
+        ChurnModel.fit(df_portfolio, ("sessions", "unknown"), n_jobs=1)
+
+
+def test_class_counts_skip_incomplete_rows():
+    df_portfolio = pd.DataFrame({"sessions": [1.0, None, 3.0, 4.0], "download_rate": [0.1, 0.2, 0.3, 0.4], "is_churned": [1, 1, 0, 0]})
+
+    assert class_counts(df_portfolio, FEATURES) == (2, 1)
@@ -0,0 +1,110 @@
+"""Tests for the incremental churn-risk assessment job."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from ai_data_lab.churn.risk_assessment import (
+    ChurnRiskAssessment,
+    CompanyRiskInput,
+    RiskScoreStore,
+    build_risk_inputs,
+    build_risk_prompt,
+    portfolio_trend_queries,
+    run_risk_assessment,
+)
+
+
+def _inputs(memo_count: int = 3) -> list[CompanyRiskInput]:
+    df_companies = pd.DataFrame(
+        {"ORGID": ["org-a", "org-b", None], "ORG_NAME": ["A社", "B社", "不明"], "sessions": [10.0, float("nan"), 1.0]}
+    )
+    trends = {
+        "ga_trend": pd.DataFrame({"ORGID": ["org-a", "org-a"], "month": ["2026-08", "2026-09"], "users": [3, 2]}),
+        "memo_trend": pd.DataFrame(
+            {"ORGID": ["org-b"], "MONTH": [pd.Timestamp("2026-09-01")], "MEMO_CREATED": [memo_count]}
+        ),
+    }
+    return build_risk_inputs(df_companies, trends)
+
+
+def _fake_assess(calls: list[str]):
+    def assess(risk_input: CompanyRiskInput) -> ChurnRiskAssessment:
+        calls.append(risk_input.orgid)
+        if risk_input.orgid == "org-err":
+            raise RuntimeError("boom")
+        return ChurnRiskAssessment(risk_level="Medium", risk_score=50, reason=f"{risk_input.orgid} ok")
+
+    return assess
+
+
+def test_build_risk_inputs_groups_trends_per_org():
+    inputs = _inputs()
+
+    assert [item.orgid for item in inputs] == ["org-a", "org-b"]
+    assert len(inputs[0].ga_trend) == 2
+    assert inputs[0].memo_trend == []
+    assert inputs[1].memo_trend[0]["MEMO_CREATED"] == 3
+    assert "2026-09-01" in build_risk_prompt(inputs[1])
+
+
+def test_fingerprint_changes_only_with_payload_or_model():
+    first, second = _inputs(memo_count=3)[1], _inputs(memo_count=3)[1]
+    changed = _inputs(memo_count=4)[1]
+
+    assert first.fingerprint() == second.fingerprint()
+    assert first.fingerprint() != changed.fingerprint()
+    assert first.fingerprint() != first.fingerprint(model="other-model")
+
+
+def test_volatile_company_columns_are_context_not_fingerprint():
+    df_companies = pd.DataFrame({"ORGID": ["org-a"], "ORG_NAME": ["A社"], "sessions": [10.0]})
+    base = build_risk_inputs(df_companies, {})[0]
+    busier = build_risk_inputs(df_companies.assign(sessions=25.0), {})[0]
+    renamed = build_risk_inputs(df_companies.assign(ORG_NAME="A社2"), {})[0]
+
+    assert base.company == {"ORGID": "org-a", "ORG_NAME": "A社"}
+    assert busier.context == {"sessions": 25.0}
+    assert "25.0" in build_risk_prompt(busier)
+    assert base.fingerprint() == busier.fingerprint()
+    assert base.fingerprint() != renamed.fingerprint()
+
+
+def test_run_risk_assessment_rescores_only_changed_companies(tmp_path):
+    store = RiskScoreStore(tmp_path / "risk.duckdb")
+    calls: list[str] = []
+
+    first = run_risk_assessment(_inputs(), _fake_assess(calls), store, max_workers=2)
+    assert sorted(first.scored) == ["org-a", "org-b"]
+
+    calls.clear()
+    second = run_risk_assessment(_inputs(memo_count=9), _fake_assess(calls), store)
+    assert calls == ["org-b"]
+    assert second.as_dict() == {"scored": 1, "unchanged": 1, "failed": 0}
+
+    df_scores = store.read()
+    assert set(df_scores["orgid"]) == {"org-a", "org-b"}
+    assert (df_scores["risk_level"] == "Medium").all()
+
+
+def test_run_risk_assessment_records_failures_without_storing(tmp_path):
+    store = RiskScoreStore(tmp_path / "risk.duckdb")
+    failing = CompanyRiskInput(orgid="org-err", company={"ORGID": "org-err"})
+
+    summary = run_risk_assessment([failing], _fake_assess([]), store)
+
+    assert "RuntimeError" in summary.failures["org-err"]
+    assert store.read().empty
+
+
+def test_portfolio_trend_queries_cover_all_sources():
+    queries = portfolio_trend_queries("analytics_1", "DB.SCHEMA", months=3)
+    assert {source for source, _ in queries.values()} == {"bq", "sf"}
+    assert all("ORGID" in sql for _, sql in queries.values())
+    assert "INTERVAL 3 MONTH" in queries["ga_trend"][1]
+
+
+def test_assessment_schema_rejects_out_of_range_score():
+    with pytest.raises(ValueError):
+        ChurnRiskAssessment(risk_level="High", risk_score=150)
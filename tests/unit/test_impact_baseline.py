@@ -0,0 +1,64 @@
+"""Tests for the baseline-date builder."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from ai_data_lab.impact import BaselineEvent, build_baselines, event_dates
+from ai_data_lab.text import HashtagIndex
+
+DF_POSTS = pd.DataFrame(
+    {
+        "account_id": ["a", "a", "b", "b", "c", "a"],
+        "created_at": pd.to_datetime(
+            ["2025-11-30", "2025-11-29", "2025-12-02", "2025-11-20", "2025-11-10", "2025-12-05"], utc=True
+        ),
+        "content": ["#IRCチャレンジ #桜井", "#IRCチャレンジ", "#IRCチャレンジ", "#桜井", "#桜井", "#桜井"],
+    }
+)
+CONTROL_DATE = pd.Timestamp("2025-11-28", tz="UTC")
+
+
+def test_first_tag_date_per_user_with_or_without_index():
+    event = BaselineEvent(tags="#IRCチャレンジ")
+    index = HashtagIndex.from_texts(DF_POSTS.index, DF_POSTS["content"])
+
+    with_index = event_dates(DF_POSTS, event, hashtag_index=index)
+    without_index = event_dates(DF_POSTS, event)
+
+    expected = {"a": pd.Timestamp("2025-11-29", tz="UTC"), "b": pd.Timestamp("2025-12-02", tz="UTC")}
+    assert with_index.to_dict() == expected
+    assert without_index.to_dict() == expected
+
+
+def test_after_date_and_nth_post_events():
+    first_after = event_dates(DF_POSTS, BaselineEvent(after=CONTROL_DATE))
+    second_post = event_dates(DF_POSTS, BaselineEvent(nth=2))
+
+    assert first_after.to_dict() == {
+        "a": pd.Timestamp("2025-11-29", tz="UTC"),
+        "b": pd.Timestamp("2025-12-02", tz="UTC"),
+    }
+    assert second_post.to_dict() == {
+        "a": pd.Timestamp("2025-11-30", tz="UTC"),
+        "b": pd.Timestamp("2025-12-02", tz="UTC"),
+    }
+    with pytest.raises(ValueError):
+        BaselineEvent(nth=0)
+
+
+def test_build_baselines_combines_treatment_and_control():
+    df_baseline = build_baselines(
+        DF_POSTS,
+        treatment_event=BaselineEvent(tags=("#IRCチャレンジ",)),
+        treatment_users={"a", "b", "missing"},
+        control_users=["c"],
+        control_date=CONTROL_DATE,
+    )
+
+    assert df_baseline.to_dict("records") == [
+        {"account_id": "a", "group": "Treatment", "baseline_date": pd.Timestamp("2025-11-29", tz="UTC")},
+        {"account_id": "b", "group": "Treatment", "baseline_date": pd.Timestamp("2025-12-02", tz="UTC")},
+        {"account_id": "c", "group": "Control", "baseline_date": CONTROL_DATE},
+    ]
@@ -0,0 +1,118 @@
+"""Tests for the sparse two-way fixed-effects DiD estimator."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from ai_data_lab.impact import UserPeriodPanel, fit_twfe
+
+START = pd.Timestamp("2025-01-01")
+
+
+def _dense_twfe(y, d):
+    """Reference: OLS on the two-way demeaned dense panel with CR1 user-clustered errors."""
+    def demean(matrix):
+        return matrix - matrix.mean(axis=1, keepdims=True) - matrix.mean(axis=0, keepdims=True) + matrix.mean()
+
+    y_tilde, d_tilde = demean(y), demean(d)
+    beta = (d_tilde * y_tilde).sum() / (d_tilde**2).sum()
+    scores = (d_tilde * (y_tilde - beta * d_tilde)).sum(axis=1)
+    n_users = y.shape[0]
+    se = np.sqrt(n_users / (n_users - 1) * (scores**2).sum()) / (d_tilde**2).sum()
+    return beta, se
+
+
+def _simulated_posts(seed=0, n_users=120, n_days=30, effect=2.0):
+    rng = np.random.default_rng(seed)
+    users = pd.DataFrame(
+        {
+            "account_id": [f"u{i}" for i in range(n_users)],
+            "group": np.where(np.arange(n_users) % 2 == 0, "Treatment", "Control"),
+            "main_idol": rng.choice(["idol_a", "idol_b"], n_users),
+        }
+    )
+    # Staggered baselines for Treatment; Control shares one date.
+    users["baseline_date"] = START + pd.to_timedelta(
+        np.where(users["group"] == "Treatment", rng.integers(8, 22, n_users), 15), unit="D"
+    )
+    rows = []
+    for user in users.itertuples():
+        level = rng.poisson(3)
+        for day in range(n_days):
+            timestamp = START + pd.Timedelta(days=day)
+            lift = effect if user.group == "Treatment" and user.main_idol == "idol_a" and timestamp >= user.baseline_date else 0
+            for _ in range(rng.poisson(level + day * 0.05 + lift)):
+                rows.append((user.account_id, timestamp + pd.Timedelta(hours=rng.uniform(0, 23))))
+    posts = pd.DataFrame(rows, columns=["account_id", "created_at"])
+    return posts, users
+
+
+def test_sparse_fit_matches_dense_reference():
+    rng = np.random.default_rng(1)
+    y = rng.poisson(1.5, (40, 12)).astype(float)
+    d = np.zeros_like(y)
+    for row, first in enumerate(rng.integers(3, 15, 40)):
+        if row % 3 == 0:
+            d[row, first:] = 1
+
+    df_fit = fit_twfe(sparse.csr_matrix(y), sparse.csr_matrix(d))
+    beta, se = _dense_twfe(y, d)
+
+    assert df_fit.loc[0, "estimate"] == pytest.approx(beta)
+    assert df_fit.loc[0, "std_error"] == pytest.approx(se)
+    assert df_fit.loc[0, "n_treated_users"] == int((d.sum(axis=1) > 0).sum())
+
+
+def test_strata_fit_in_one_pass_match_separate_fits():
+    rng = np.random.default_rng(2)
+    y = rng.poisson(2.0, (60, 10)).astype(float)
+    d = np.zeros_like(y)
+    d[::2, 5:] = 1
+    d[1::4, 3:] = 1
+    codes = np.arange(60) % 3
+
+    df_fit = fit_twfe(sparse.csr_matrix(y), sparse.csr_matrix(d), codes)
+
+    for code in range(3):
+        beta, se = _dense_twfe(y[codes == code], d[codes == code])
+        assert df_fit.loc[code, "estimate"] == pytest.approx(beta)
+        assert df_fit.loc[code, "std_error"] == pytest.approx(se)
+
+
+def test_panel_recovers_the_simulated_effect_per_stratum():
+    posts, users = _simulated_posts()
+
+    panel = UserPeriodPanel.from_posts(posts, users, start=START, end=START + pd.Timedelta(days=29, hours=23))
+    df_fit = panel.fit_by("main_idol").set_index("main_idol")
+
+    assert panel.outcome.shape == (len(users), 30)
+    assert panel.outcome.sum() == len(posts)
+    assert df_fit.loc["idol_a", "ci_low"] < 2.0 < df_fit.loc["idol_a", "ci_high"]
+    assert df_fit.loc["idol_a", "p_value"] < 0.001
+    assert abs(df_fit.loc["idol_b", "estimate"]) < 3 * df_fit.loc["idol_b", "std_error"]
+
+
+def test_treated_cells_start_at_the_baseline_period():
+    users = pd.DataFrame(
+        {
+            "account_id": ["a", "b", "c"],
+            "group": ["Treatment", "Treatment", "Control"],
+            "baseline_date": pd.to_datetime(["2025-01-03", "2025-01-10", "2025-01-05"]),
+        }
+    )
+    posts = pd.DataFrame({"account_id": ["a", "zz"], "created_at": pd.to_datetime(["2025-01-02", "2025-01-02"])})
+
+    panel = UserPeriodPanel.from_posts(posts, users, start=START, end=pd.Timestamp("2025-01-14"), freq="7D")
+
+    assert panel.treated.toarray().tolist() == [[1, 1], [0, 1], [0, 0]]
+    assert panel.outcome.toarray().tolist() == [[1, 0], [0, 0], [0, 0]]
+
+
+def test_strata_without_treatment_variation_are_nan():
+    y = sparse.csr_matrix(np.ones((4, 3)))
+    d = sparse.csr_matrix(np.zeros((4, 3)))
+
+    assert fit_twfe(y, d)[["estimate", "std_error", "p_value"]].isna().all(axis=None)
@@ -0,0 +1,74 @@
+"""Tests for the batched bootstrap / permutation engine."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_data_lab.impact import bootstrap, compare_groups
+
+
+def _users(seed=0, n=600):
+    rng = np.random.default_rng(seed)
+    df_users = pd.DataFrame(
+        {
+            "main_idol": rng.choice(["idol_a", "idol_b", "idol_c"], n),
+            "group": rng.choice(["Treatment", "Control"], n),
+            "ratio": rng.lognormal(0.0, 0.5, n),
+        }
+    )
+    # Only idol_a has a real Treatment effect.
+    effect = (df_users["main_idol"] == "idol_a") & (df_users["group"] == "Treatment")
+    df_users.loc[effect, "ratio"] += 1.0
+    df_users.loc[::37, "ratio"] = np.nan
+    return df_users
+
+
+@pytest.mark.parametrize("statistic", ["mean", "median"])
+def test_bootstrap_estimates_match_pandas_and_cover_them(statistic):
+    df_users = _users()
+
+    df_ci = bootstrap(df_users, "ratio", ["main_idol", "group"], statistic=statistic, n_resamples=500, seed=1)
+
+    expected = df_users.groupby(["main_idol", "group"])["ratio"].agg(statistic)
+    assert np.allclose(df_ci.set_index(["main_idol", "group"])["estimate"], expected.loc[df_ci.set_index(["main_idol", "group"]).index])
+    assert (df_ci["ci_low"] <= df_ci["estimate"]).all() and (df_ci["estimate"] <= df_ci["ci_high"]).all()
+    assert (df_ci["n"] == df_users.dropna().groupby(["main_idol", "group"]).size().to_numpy()).all()
+
+
+def test_chunking_bounds_memory_without_changing_shape():
+    df_users = _users()
+
+    df_small = bootstrap(df_users, "ratio", "main_idol", n_resamples=300, seed=3, max_elements=1_000)
+    df_large = bootstrap(df_users, "ratio", "main_idol", n_resamples=300, seed=3)
+
+    assert np.allclose(df_small["estimate"], df_large["estimate"])
+    assert np.allclose(df_small[["ci_low", "ci_high"]], df_large[["ci_low", "ci_high"]], atol=0.1)
+
+
+def test_compare_groups_finds_only_the_real_effect():
+    df_users = _users()
+
+    df_compare = compare_groups(df_users, "ratio", by="main_idol", n_resamples=1000, seed=2).set_index("main_idol")
+
+    assert df_compare.loc["idol_a", "p_value"] < 0.01
+    assert df_compare.loc["idol_a", "ci_low"] > 0.5
+    assert df_compare.loc[["idol_b", "idol_c"], "p_value"].min() > 0.01
+    treated = df_users[(df_users["main_idol"] == "idol_b") & (df_users["group"] == "Treatment")]["ratio"]
+    untreated = df_users[(df_users["main_idol"] == "idol_b") & (df_users["group"] == "Control")]["ratio"]
+    assert df_compare.loc["idol_b", "diff"] == pytest.approx(treated.mean() - untreated.mean())
+
+
+def test_strata_missing_a_group_and_overall_comparison():
+    df_users = _users()
+    df_users.loc[(df_users["main_idol"] == "idol_c") & (df_users["group"] == "Control"), "group"] = "Treatment"
+
+    df_compare = compare_groups(df_users, "ratio", by=["main_idol"], statistic="median", n_resamples=200)
+    df_overall = compare_groups(df_users, "ratio", n_resamples=200)
+
+    row_c = df_compare.set_index("main_idol").loc["idol_c"]
+    assert row_c["n_control"] == 0 and np.isnan(row_c["p_value"]) and np.isnan(row_c["control"])
+    assert len(df_overall) == 1 and 0 < df_overall.loc[0, "p_value"] <= 1
+    with pytest.raises(ValueError):
+        bootstrap(df_users, "ratio", statistic="mode")
@@ -0,0 +1,116 @@
+"""Tests for the before/after panel engine."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_data_lab.impact import BeforeAfterPanel
+
+START = pd.Timestamp("2025-11-05", tz="UTC")
+END = pd.Timestamp("2025-12-20", tz="UTC")
+
+
+def _data(seed=0, n_users=30, n_posts=2000):
+    rng = np.random.default_rng(seed)
+    users = [f"u{i}" for i in range(n_users)]
+    df_posts = pd.DataFrame(
+        {
+            "account_id": rng.choice(users + ["stranger"], n_posts),
+            "created_at": pd.Timestamp("2025-11-01", tz="UTC")
+            + pd.to_timedelta(rng.integers(0, 55 * 24 * 60, n_posts), unit="min"),
+            "has_member_tag": rng.random(n_posts) < 0.7,
+            "like_count": rng.integers(0, 50, n_posts),
+            "source_table": rng.choice(["idol_a", "idol_b", "idol_c"], n_posts),
+        }
+    )
+    df_baseline = pd.DataFrame(
+        {
+            "account_id": users,
+            "group": ["Treatment" if i % 2 else "Control" for i in range(n_users)],
+            "baseline_date": [
+                START + pd.Timedelta(days=int(day), hours=int(hour))
+                for day, hour in zip(rng.integers(5, 40, n_users), rng.integers(0, 24, n_users))
+            ],
+        }
+    )
+    return df_posts, df_baseline
+
+
+def _reference(df_posts, df_baseline):
+    """The per-user loop previously used in notebook 11 Step 6."""
+    records = []
+    for _, row in df_baseline.iterrows():
+        posts = df_posts[(df_posts["account_id"] == row["account_id"]) & df_posts["has_member_tag"]]
+        posts = posts[(posts["created_at"] >= START) & (posts["created_at"] <= END)]
+        baseline = row["baseline_date"]
+        before = posts[posts["created_at"] < baseline]
+        after = posts[posts["created_at"] >= baseline]
+        days_before = max((baseline - START).days, 1)
+        days_after = max((END - baseline).days, 1)
+        rate_before = len(before) / days_before
+        rate_after = len(after) / days_after
+        window_before = posts[(posts["created_at"] >= baseline - pd.Timedelta(days=7)) & (posts["created_at"] < baseline)]
+        window_after = posts[(posts["created_at"] >= baseline) & (posts["created_at"] < baseline + pd.Timedelta(days=7))]
+        records.append(
+            {
+                "main_idol": posts["source_table"].mode().iloc[0] if len(posts) else "N/A",
+                "count_before": len(before),
+                "count_after": len(after),
+                "rate_before": rate_before,
+                "rate_after": rate_after,
+                "ratio": rate_after / rate_before if rate_before > 0 else np.nan,
+                "like_before": before["like_count"].mean() if len(before) else 0,
+                "like_after": after["like_count"].mean() if len(after) else 0,
+                "days_posted_before": window_before["created_at"].dt.date.nunique(),
+                "days_posted_after": window_after["created_at"].dt.date.nunique(),
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def test_panel_matches_per_user_loop():
+    df_posts, df_baseline = _data()
+    expected = _reference(df_posts, df_baseline)
+
+    panel = BeforeAfterPanel(df_posts, df_baseline, start=START, end=END, mask="has_member_tag")
+    df_result = panel.frame(
+        panel.mode("source_table", "main_idol"),
+        panel.rates(),
+        panel.means({"like_count": "like"}),
+        panel.active_days(window_days=7),
+    )
+
+    assert df_result["account_id"].tolist() == df_baseline["account_id"].tolist()
+    for column in expected:
+        if column == "main_idol":
+            assert df_result[column].tolist() == expected[column].tolist()
+        else:
+            np.testing.assert_allclose(df_result[column].astype(float), expected[column].astype(float), equal_nan=True)
+
+
+def test_users_without_posts_get_zero_counts_and_missing_ratio():
+    df_posts, df_baseline = _data(n_posts=10)
+    df_baseline.loc[len(df_baseline)] = ["silent", "Control", START + pd.Timedelta(days=10)]
+
+    panel = BeforeAfterPanel(df_posts, df_baseline, start=START, end=END)
+    df_rates = panel.frame(panel.rates()).set_index("account_id")
+
+    assert df_rates.loc["silent", ["count_before", "count_after"]].tolist() == [0, 0]
+    assert np.isnan(df_rates.loc["silent", "ratio"])
+    assert df_rates.loc["silent", "days_before"] == 10
+    assert panel.mode("source_table").iloc[-1, 0] == "N/A"
+
+
+def test_posts_outside_range_or_of_unknown_users_are_ignored():
+    df_posts, df_baseline = _data()
+
+    panel = BeforeAfterPanel(df_posts, df_baseline, start=START, end=END)
+
+    assert "stranger" not in set(panel.posts["account_id"])
+    assert panel.posts["created_at"].between(START, END).all()
+    assert panel.counts().to_numpy().sum() == len(panel.posts)
+    assert set(panel.posts["period"]) <= {"before", "after"}
+    with pytest.raises(KeyError):
+        panel.means(["missing_column"])
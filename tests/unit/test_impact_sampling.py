@@ -0,0 +1,58 @@
+"""Tests for the stratified post sampler."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from ai_data_lab.impact import matched_group_sample, stratified_sample
+
+
+def _posts(seed=0, n_posts=3000):
+    rng = np.random.default_rng(seed)
+    users = np.array([f"u{i}" for i in range(60)])
+    account_ids = rng.choice(users, n_posts)
+    return pd.DataFrame(
+        {
+            "post_id": [f"p{i}" for i in range(n_posts)],
+            "account_id": account_ids,
+            "group": np.where(np.isin(account_ids, users[:10]), "Treatment", "Control"),
+            "period": rng.choice(["before", "after"], n_posts),
+        }
+    )
+
+
+def test_draws_at_most_n_per_stratum_without_replacement():
+    df_posts = _posts()
+
+    sampled = stratified_sample(df_posts, ["account_id", "period"], 10, seed=42)
+
+    sizes = df_posts.groupby(["account_id", "period"]).size()
+    drawn = sampled.groupby(["account_id", "period"]).size()
+    assert (drawn == sizes.clip(upper=10)).all()
+    assert sampled["post_id"].is_unique
+
+
+def test_id_keys_are_deterministic_and_order_independent():
+    df_posts = _posts()
+    shuffled = df_posts.sample(frac=1, random_state=7)
+
+    first = stratified_sample(df_posts, ["account_id", "period"], 5, seed=42, id_col="post_id")
+    second = stratified_sample(shuffled, ["account_id", "period"], 5, seed=42, id_col="post_id")
+    other_seed = stratified_sample(df_posts, ["account_id", "period"], 5, seed=43, id_col="post_id")
+
+    assert first["post_id"].tolist() == second["post_id"].tolist()
+    assert set(first["post_id"]) != set(other_seed["post_id"])
+
+
+def test_control_sample_is_capped_at_treatment_size():
+    df_posts = _posts()
+
+    sampled = matched_group_sample(df_posts, n_per_stratum=10, seed=42, id_col="post_id")
+
+    treatment = sampled[sampled["group"] == "Treatment"]
+    control = sampled[sampled["group"] == "Control"]
+    assert len(treatment) == 10 * 2 * 10
+    assert len(control) == len(treatment)
+    assert control.groupby(["account_id", "period"]).size().max() <= 10
+    assert sampled.equals(matched_group_sample(df_posts, n_per_stratum=10, seed=42, id_col="post_id"))
@@ -0,0 +1,85 @@
+"""Tests for token-aware LLM batch packing."""
+
+from __future__ import annotations
+
+import pytest
+
+from ai_data_lab.llm.batching import (
+    BatchPacker,
+    MalformedResponseError,
+    estimate_tokens,
+    run_batches,
+    truncate_to_tokens,
+)
+
+
+def test_estimate_tokens_counts_japanese_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("応援してます") == 6
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_truncate_to_tokens_keeps_prefix_within_budget():
+    text = "あ" * 50
+    truncated = truncate_to_tokens(text, 10)
+    assert truncated == "あ" * 10
+    assert truncate_to_tokens("short", 10) == "short"
+
+
+def test_packer_respects_budget_and_keeps_order():
+    packer = BatchPacker(token_budget=100, prompt_overhead=20, item_overhead=0, max_item_tokens=50)
+    items = [(f"p{i}", "あ" * 30) for i in range(5)]
+
+    batches = packer.pack(items)
+
+    assert [batch.ids for batch in batches] == [["p0", "p1"], ["p2", "p3"], ["p4"]]
+    assert all(batch.tokens <= 80 for batch in batches)
+
+
+def test_packer_truncates_oversized_items():
+    packer = BatchPacker(token_budget=100, prompt_overhead=20, item_overhead=0, max_item_tokens=10)
+    (batch,) = packer.pack([("a", "い" * 500)])
+    assert batch.items[0].text == "い" * 10
+
+
+def test_packer_rejects_budget_below_overhead():
+    with pytest.raises(ValueError):
+        BatchPacker(token_budget=100, prompt_overhead=100)
+
+
+def test_run_batches_bisects_to_isolate_bad_item():
+    packer = BatchPacker(token_budget=1000, prompt_overhead=10, item_overhead=0)
+    batches = packer.pack([(str(i), f"post {i}") for i in range(8)])
+    assert len(batches) == 1
+
+    def call(batch):
+        if "5" in batch.ids:
+            raise MalformedResponseError("broken json")
+        return {item_id: int(item_id) * 10 for item_id in batch.ids}
+
+    outcome = run_batches(batches, call)
+
+    assert set(outcome.results) == {"0", "1", "2", "3", "4", "6", "7"}
+    assert list(outcome.failures) == ["5"]
+    assert "MalformedResponseError" in outcome.failures["5"]
+    # 1 + 2 (halves) + 2 (quarters) + 2 (pairs containing "5") = 7 calls
+    assert outcome.calls == 7
+    assert outcome.retry_calls == 6
+
+
+def test_run_batches_retries_only_missing_items():
+    packer = BatchPacker(token_budget=1000, prompt_overhead=10, item_overhead=0)
+    batches = packer.pack([(str(i), "x") for i in range(4)])
+    seen: list[list[str]] = []
+
+    def call(batch):
+        seen.append(batch.ids)
+        if len(seen) == 1:
+            return {"0": "ok", "1": "ok"}
+        return {item_id: "ok" for item_id in batch.ids}
+
+    outcome = run_batches(batches, call)
+
+    assert seen == [["0", "1", "2", "3"], ["2", "3"]]
+    assert not outcome.failures
+    assert len(outcome.results) == 4
@@ -0,0 +1,123 @@
+"""Tests for resumable bulk LLM jobs."""
+
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+import pytest
+
+from ai_data_lab.llm.bulk import BulkJob, BulkJobConfig, read_job_output, read_job_status
+from ai_data_lab.llm.schemas import SentimentScore
+
+
+def _write_posts(path, n=10):
+    pd.DataFrame(
+        {"post_id": [f"p{i}" for i in range(n)], "content": [f"distinct post number {i} about topic {i * 7}" for i in range(n)]}
+    ).to_parquet(path, index=False)
+
+
+def _config(tmp_path, **overrides):
+    values = dict(
+        task="sentiment",
+        input_path=str(tmp_path / "posts.parquet"),
+        output_dir=str(tmp_path / "out"),
+        shard_size=4,
+        token_budget=700,
+        workers=2,
+        dedup_threshold=None,
+    )
+    values.update(overrides)
+    return BulkJobConfig(**values)
+
+
+def _scorer(calls, fail_on=()):
+    def call(batch):
+        calls.extend(batch.ids)
+        if set(batch.ids) & set(fail_on):
+            raise RuntimeError("simulated crash")
+        return {item_id: SentimentScore(id=item_id, positivity=3) for item_id in batch.ids}
+
+    return call
+
+
+def test_job_writes_shards_and_manifest(tmp_path):
+    _write_posts(tmp_path / "posts.parquet")
+    calls: list[str] = []
+
+    manifest = BulkJob(_config(tmp_path), _scorer(calls)).run()
+
+    assert manifest["status"] == "completed"
+    assert sorted(manifest["shards"]) == ["00000", "00001", "00002"]
+    df_out = read_job_output(tmp_path / "out")
+    assert len(df_out) == 10
+    assert set(df_out["status"]) == {"ok"}
+    assert set(df_out["positivity"]) == {3}
+    status = read_job_status(tmp_path / "out")
+    assert status["rows_done"] == status["rows_total"] == 10
+    assert status["progress"] == 1.0
+
+
+def test_resume_skips_completed_shards_and_ledgered_items(tmp_path):
+    _write_posts(tmp_path / "posts.parquet")
+    config = _config(tmp_path)
+    job = BulkJob(config, _scorer([]))
+    manifest = job.load_manifest()
+
+    # Simulate a crash after shard 0 finished and two items of shard 1 were scored.
+    job._run_shard("00000", ["p0", "p1", "p2", "p3"], ["a", "b", "c", "d"])
+    manifest["shards"]["00000"] = {"rows": 4, "ok": 4, "failed": 0, "api_calls": 1, "path": "part-00000.parquet"}
+    job._write_manifest(manifest)
+    ledger_path = tmp_path / "out" / "_ledger" / "shard-00001.jsonl"
+    ledger_path.parent.mkdir(parents=True, exist_ok=True)
+    ledger_path.write_text(
+        "\n".join(
+            json.dumps({"item_id": item_id, "status": "ok", "result": {"id": item_id, "malice": "none", "positivity": 5}})
+            for item_id in ("p4", "p5")
+        )
+        + "\n"
+    )
+
+    calls: list[str] = []
+    BulkJob(config, _scorer(calls)).run()
+
+    assert sorted(calls) == ["p6", "p7", "p8", "p9"]
+    df_out = read_job_output(tmp_path / "out").set_index("post_id")
+    assert df_out.loc["p4", "positivity"] == 5
+    assert df_out.loc["p7", "positivity"] == 3
+    assert not ledger_path.exists()
+
+
+def test_failed_items_are_marked_not_dropped(tmp_path):
+    _write_posts(tmp_path / "posts.parquet", n=4)
+
+    manifest = BulkJob(_config(tmp_path), _scorer([], fail_on={"p2"})).run()
+
+    assert manifest["status"] == "partial"
+    df_out = read_job_output(tmp_path / "out").set_index("post_id")
+    assert df_out.loc["p2", "status"] == "failed"
+    assert "simulated crash" in df_out.loc["p2", "error"]
+    assert (df_out.drop(index="p2")["status"] == "ok").all()
+
+
+def test_resume_retries_only_failed_items(tmp_path):
+    _write_posts(tmp_path / "posts.parquet", n=8)
+    BulkJob(_config(tmp_path), _scorer([], fail_on={"p2"})).run()
+    assert (tmp_path / "out" / "_ledger" / "shard-00000.jsonl").exists()
+
+    calls: list[str] = []
+    manifest = BulkJob(_config(tmp_path), _scorer(calls)).run()
+
+    assert manifest["status"] == "completed"
+    # Shard 1 finished cleanly and is skipped; only shard 0's unscored items are sent again.
+    assert calls == ["p2"]
+    assert (read_job_output(tmp_path / "out")["status"] == "ok").all()
+    assert read_job_status(tmp_path / "out")["failed_items"] == 0
+
+
+def test_manifest_mismatch_is_rejected(tmp_path):
+    _write_posts(tmp_path / "posts.parquet", n=4)
+    BulkJob(_config(tmp_path), _scorer([])).run()
+
+    with pytest.raises(RuntimeError, match="different input"):
+        BulkJob(_config(tmp_path, shard_size=2), _scorer([])).run()
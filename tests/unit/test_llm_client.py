@@ -0,0 +1,101 @@
+"""Tests for the instrumented google-genai client wrapper."""
+
+from __future__ import annotations
+
+import pytest
+
+from ai_data_lab.llm.client import InstrumentedGenAIClient, is_transient_error
+from ai_data_lab.llm.usage import UsageRecorder
+
+
+class _Metadata:
+    prompt_token_count = 42
+    candidates_token_count = 7
+
+
+class _Response:
+    text = "{}"
+    usage_metadata = _Metadata()
+
+
+class _FlakyModels:
+    def __init__(self, failures: int, error: Exception) -> None:
+        self.failures = failures
+        self.error = error
+        self.calls: list[dict] = []
+
+    def generate_content(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return _Response()
+
+
+class _FakeClient:
+    def __init__(self, failures: int = 0, error: Exception | None = None) -> None:
+        self.models = _FlakyModels(failures, error or ConnectionError("reset"))
+
+
+class _APIError(Exception):
+    def __init__(self, code: int) -> None:
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+def test_generate_content_retries_and_records(tmp_path):
+    recorder = UsageRecorder(tmp_path / "usage.jsonl")
+    fake = _FakeClient(failures=1)
+    client = InstrumentedGenAIClient(fake, notebook="22", template="churn_risk", recorder=recorder, backoff_seconds=0)
+
+    response = client.models.generate_content(model="pro", contents="prompt", config={"temperature": 0})
+
+    assert response.text == "{}"
+    assert len(fake.models.calls) == 2
+    event = recorder.load().iloc[0]
+    assert (event["notebook"], event["template"], event["model"]) == ("22", "churn_risk", "pro")
+    assert event["retries"] == 1
+    assert event["tokens_in"] == 42
+    assert event["tokens_out"] == 7
+
+
+def test_generate_content_records_final_error_class(tmp_path):
+    recorder = UsageRecorder(tmp_path / "usage.jsonl")
+    client = InstrumentedGenAIClient(
+        _FakeClient(failures=5), notebook="08", recorder=recorder, max_retries=1, backoff_seconds=0
+    ).with_template("emotion")
+
+    with pytest.raises(ConnectionError):
+        client.models.generate_content(model="flash", contents="prompt")
+
+    event = recorder.load().iloc[0]
+    assert event["template"] == "emotion"
+    assert event["error_class"] == "ConnectionError"
+    assert event["retries"] == 1
+
+
+def test_non_transient_errors_are_not_retried(tmp_path):
+    recorder = UsageRecorder(tmp_path / "usage.jsonl")
+    fake = _FakeClient(failures=1, error=_APIError(401))
+    client = InstrumentedGenAIClient(fake, notebook="18", recorder=recorder, backoff_seconds=0)
+
+    with pytest.raises(_APIError):
+        client.models.generate_content(model="flash", contents="prompt")
+
+    assert len(fake.models.calls) == 1
+    assert recorder.load().iloc[0]["retries"] == 0
+
+
+@pytest.mark.parametrize(
+    ("error", "transient"),
+    [
+        (_APIError(429), True),
+        (_APIError(503), True),
+        (_APIError(400), False),
+        (TimeoutError(), True),
+        (ValueError("bad"), False),
+        (KeyError("text"), False),
+    ],
+)
+def test_is_transient_error(error, transient):
+    assert is_transient_error(error) is transient
@@ -0,0 +1,51 @@
+"""Tests for MinHash/LSH near-duplicate collapsing."""
+
+from __future__ import annotations
+
+import pytest
+
+from ai_data_lab.llm.dedup import find_near_duplicates, normalize_text
+
+
+def test_normalize_text_strips_urls_and_mentions():
+    assert normalize_text("＃IRC　チャレンジ @fan_01 https://t.co/xyz") == "#irc チャレンジ"
+    assert normalize_text(None) == ""
+
+
+def test_exact_and_near_duplicates_share_representative():
+    texts = [
+        "#IRCチャレンジ 参加しました！みんなも一緒に応援しよう https://t.co/aaa",
+        "今日のライブ最高だった",
+        "#IRCチャレンジ 参加しました！みんなも一緒に応援しよう https://t.co/bbb",
+        "#IRCチャレンジ 参加しました！みんなも一緒に応援しよう！！",
+        "全然関係ない投稿です",
+    ]
+
+    result = find_near_duplicates(texts, threshold=0.7, seed=1)
+
+    assert result.representative_of.tolist()[:4] == [0, 1, 0, 0]
+    assert result.representative_of[4] == 4
+    assert result.representatives.tolist() == [0, 1, 4]
+    summary = result.summary()
+    assert summary["items"] == 5
+    assert summary["clusters"] == 3
+    assert summary["largest_cluster"] == 3
+    assert summary["dedup_ratio"] == pytest.approx(0.4)
+
+
+def test_fan_out_copies_representative_results():
+    result = find_near_duplicates(["same text", "other", "same  text"], threshold=0.9)
+    fanned = result.fan_out(["a", "b", "c"], {"a": 5, "b": 1})
+    assert fanned == {"a": 5, "b": 1, "c": 5}
+
+
+def test_find_near_duplicates_is_deterministic_for_seed():
+    texts = [f"応援してます {i % 3}" for i in range(12)]
+    first = find_near_duplicates(texts, seed=7)
+    second = find_near_duplicates(texts, seed=7)
+    assert first.representative_of.tolist() == second.representative_of.tolist()
+
+
+def test_invalid_threshold_rejected():
+    with pytest.raises(ValueError):
+        find_near_duplicates(["a"], threshold=0)
@@ -0,0 +1,88 @@
+"""Tests for schema-constrained LLM output parsing."""
+
+from __future__ import annotations
+
+import pytest
+
+from ai_data_lab.llm.batching import MalformedResponseError
+from ai_data_lab.llm.schemas import SentimentBatch, SentimentScore
+from ai_data_lab.llm.structured import (
+    ItemLedger,
+    extract_json,
+    gemini_response_schema,
+    iter_array_items,
+    parse_batch_response,
+    validate_payload,
+)
+
+
+def test_gemini_response_schema_inlines_refs_and_drops_titles():
+    schema = gemini_response_schema(SentimentBatch)
+
+    item = schema["properties"]["results"]["items"]
+    assert item["properties"]["malice"]["enum"] == ["high", "low", "none"]
+    assert item["properties"]["positivity"]["maximum"] == 5
+    assert "title" not in schema
+    assert "$defs" not in schema
+    assert "default" not in item["properties"]["malice"]
+
+
+def test_extract_json_tolerates_fences():
+    assert extract_json('```json\n{"a": 1}\n```') == {"a": 1}
+    with pytest.raises(MalformedResponseError):
+        extract_json("no json here")
+
+
+def test_validate_payload_raises_on_schema_mismatch():
+    with pytest.raises(MalformedResponseError):
+        validate_payload('{"results": [{"id": "1", "positivity": 9}]}', SentimentBatch)
+
+
+def test_iter_array_items_handles_split_chunks():
+    chunks = ['{"results": [{"id": "1", "posi', 'tivity": 3}, {"id": "2",', ' "positivity": 4}]}']
+    assert [item["id"] for item in iter_array_items(chunks)] == ["1", "2"]
+
+
+def test_iter_array_items_skips_corrupt_element():
+    text = '{"results": [{"id": "1", "positivity": 3}, {"id": "2", "positivity": }, {"id": "3", "positivity": 1}]}'
+    assert [item["id"] for item in iter_array_items([text])] == ["1", "3"]
+
+
+def test_parse_batch_response_reports_per_item_failures():
+    text = (
+        '{"results": [{"id": "1", "malice": "none", "positivity": 4},'
+        ' {"id": "2", "malice": "unknown", "positivity": 2},'
+        ' {"id": "99", "positivity": 1}]}'
+    )
+
+    outcome = parse_batch_response(text, SentimentScore, expected_ids=["1", "2", "3"])
+
+    assert list(outcome.items) == ["1"]
+    assert outcome.items["1"].positivity == 4
+    assert set(outcome.failures) == {"2", "3"}
+    assert outcome.failures["3"] == "missing from response"
+    assert outcome.failures["2"].startswith("ValidationError")
+
+
+def test_item_ledger_persists_results_and_failures(tmp_path):
+    path = tmp_path / "ledger.jsonl"
+    ledger = ItemLedger(path)
+    ledger.record_success({"1": SentimentScore(id="1", positivity=5)})
+    ledger.record_failures({"2": "missing from response"})
+
+    reloaded = ItemLedger(path)
+    assert reloaded.results()["1"]["positivity"] == 5
+    assert reloaded.failures() == {"2": "missing from response"}
+    assert reloaded.todo(["1", "2", 3]) == ["2", "3"]
+
+    reloaded.record_success({"2": {"id": "2", "positivity": 1}})
+    reloaded.compact()
+    assert len(path.read_text().splitlines()) == 2
+    assert ItemLedger(path).failures() == {}
+
+
+def test_integer_ids_are_coerced_to_strings():
+    outcome = parse_batch_response('{"results": [{"id": 7, "positivity": 2}]}', SentimentScore, expected_ids=[7])
+
+    assert outcome.items["7"].id == "7"
+    assert not outcome.failures
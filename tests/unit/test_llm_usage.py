@@ -0,0 +1,67 @@
+"""Tests for LLM usage recording and summaries."""
+
+from __future__ import annotations
+
+import pytest
+
+from ai_data_lab.llm.usage import UsageEvent, UsageRecorder, main, summarize_usage
+
+
+class _Metadata:
+    prompt_token_count = 120
+    candidates_token_count = 30
+
+
+class _Response:
+    usage_metadata = _Metadata()
+
+
+def test_track_records_tokens_latency_and_errors(tmp_path):
+    recorder = UsageRecorder(tmp_path / "usage.jsonl")
+
+    with recorder.track(notebook="11", template="sentiment", model="flash") as call:
+        call.set_usage(_Response())
+    with pytest.raises(TimeoutError):
+        with recorder.track(notebook="11", template="sentiment", model="flash") as call:
+            call.add_retry()
+            raise TimeoutError("slow")
+
+    df_events = recorder.load()
+    assert len(df_events) == 2
+    assert df_events.loc[0, "tokens_in"] == 120
+    assert df_events.loc[1, "error_class"] == "TimeoutError"
+    assert df_events.loc[1, "retries"] == 1
+    assert (df_events["latency_ms"] >= 0).all()
+
+
+def test_summarize_usage_groups_and_computes_cache_hit_rate(tmp_path):
+    recorder = UsageRecorder(tmp_path / "usage.jsonl")
+    for latency in (100.0, 200.0, 300.0):
+        recorder.record(UsageEvent("11", "sentiment", "flash", latency_ms=latency, tokens_in=10, tokens_out=2, items=10))
+    recorder.record(UsageEvent("11", "sentiment", "flash", error_class="ValueError", retries=2))
+    recorder.record_cache_hits(70, notebook="11", template="sentiment", model="flash")
+    recorder.record(UsageEvent("22", "churn_risk", "pro", latency_ms=50.0))
+
+    summary = summarize_usage(recorder.load()).set_index("notebook")
+
+    row = summary.loc["11"]
+    assert row["calls"] == 4
+    assert row["errors"] == 1
+    assert row["retries"] == 2
+    assert row["tokens_in"] == 30
+    assert row["latency_p50_ms"] == pytest.approx(150.0)
+    assert row["cache_hit_rate"] == pytest.approx(70 / 101, abs=1e-4)
+    assert row["error_classes"] == "ValueError×1"
+    assert summary.loc["22", "cache_hit_rate"] == 0
+
+
+def test_cli_prints_summary(tmp_path, capsys):
+    path = tmp_path / "usage.jsonl"
+    UsageRecorder(path).record(UsageEvent("08", "emotion", "flash", latency_ms=10.0))
+
+    assert main(["--path", str(path)]) == 0
+    assert "emotion" in capsys.readouterr().out
+
+
+def test_summarize_usage_empty(tmp_path):
+    assert summarize_usage(UsageRecorder(tmp_path / "missing.jsonl").load()).empty
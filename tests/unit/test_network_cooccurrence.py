@@ -0,0 +1,60 @@
+"""Tests for the sparse co-occurrence builder."""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from ai_data_lab.network import build_cooccurrence, build_group_cooccurrence
+
+DF_EMOTIONS = pd.DataFrame(
+    {
+        "idol_name": ["A", "A", "A", "A", "A", "B", "B", "B", "B"],
+        "xPostId": ["p1", "p1", "p1", "p2", "p2", "p3", "p3", "p4", "p4"],
+        "emotion": ["喜び", "期待", "感動", "喜び", "期待", "怒り", "悲しみ", "怒り", "怒り"],
+    }
+)
+
+
+def _reference(df):
+    """The per-post nested loop previously used in notebook 08."""
+    co_occurrence = defaultdict(int)
+    counts = Counter()
+    for post_id in df["xPostId"].unique():
+        emotions = df[df["xPostId"] == post_id]["emotion"].tolist()
+        counts.update(emotions)
+        for i in range(len(emotions)):
+            for j in range(i + 1, len(emotions)):
+                co_occurrence[tuple(sorted([emotions[i], emotions[j]]))] += 1
+    return dict(co_occurrence), dict(counts)
+
+
+def test_matches_nested_loop():
+    for _, df_group in DF_EMOTIONS.groupby("idol_name"):
+        result = build_cooccurrence(df_group, item_col="xPostId", label_col="emotion")
+        pairs, counts = _reference(df_group)
+
+        assert result.pairs() == pairs
+        assert result.label_counts() == counts
+
+
+def test_groups_from_one_product_match_per_group_builds():
+    results = build_group_cooccurrence(DF_EMOTIONS, item_col="xPostId", label_col="emotion", group_col="idol_name")
+
+    assert list(results) == ["A", "B"]
+    for group, result in results.items():
+        pairs, counts = _reference(DF_EMOTIONS[DF_EMOTIONS["idol_name"] == group])
+        assert result.pairs() == pairs
+        assert result.label_counts() == counts
+
+
+def test_graph_and_edge_threshold():
+    result = build_cooccurrence(DF_EMOTIONS[DF_EMOTIONS["idol_name"] == "A"], item_col="xPostId", label_col="emotion")
+
+    graph = result.to_graph(min_weight=2, node_attrs=lambda label, count: {"color": "#000"})
+
+    assert sorted(graph.nodes) == ["喜び", "感動", "期待"]
+    assert graph.nodes["喜び"] == {"size": 2, "color": "#000"}
+    assert list(graph.edges(data="weight")) == [("喜び", "期待", 2)]
+    assert result.edges().iloc[0].tolist() == ["喜び", "期待", 2]
@@ -0,0 +1,60 @@
+"""Tests for the cached graph layouts."""
+
+from __future__ import annotations
+
+import networkx as nx
+import numpy as np
+
+from ai_data_lab.network import LayoutCache, apply_pyvis_positions
+
+
+def _graph():
+    graph = nx.Graph()
+    graph.add_weighted_edges_from([("喜び", "期待", 3), ("期待", "感動", 2), ("感動", "喜び", 2), ("怒り", "悲しみ", 2)])
+    return graph
+
+
+def test_unchanged_graph_reuses_positions_across_instances(tmp_path):
+    first = LayoutCache(tmp_path / "layouts").layout(_graph(), "A")
+
+    cache = LayoutCache(tmp_path / "layouts")
+    second = cache.layout(_graph(), "A")
+
+    assert cache.hits == 1 and cache.misses == 0
+    assert first.keys() == second.keys()
+    assert all(np.allclose(first[node], second[node]) for node in first)
+
+
+def test_small_change_is_warm_started_near_previous_positions(tmp_path):
+    cache = LayoutCache(tmp_path / "layouts")
+    before = cache.layout(_graph(), "A")
+
+    graph = _graph()
+    graph.add_edge("期待", "驚き", weight=2)
+    after = cache.layout(graph, "A")
+
+    assert cache.warm_starts == 1
+    assert set(after) == set(before) | {"驚き"}
+    shift = max(np.linalg.norm(after[node] - before[node]) for node in before)
+    assert shift < 1.0
+
+
+class _FakeNetwork:
+    def __init__(self, nodes):
+        self.nodes = [{"id": node} for node in nodes]
+        self.physics = True
+
+    def toggle_physics(self, status):
+        self.physics = status
+
+
+def test_pyvis_nodes_are_pinned(tmp_path):
+    positions = LayoutCache(tmp_path / "layouts").layout(_graph(), "A")
+    net = _FakeNetwork(["喜び", "期待", "未知"])
+
+    apply_pyvis_positions(net, positions, scale=100)
+
+    assert net.physics is False
+    assert net.nodes[0]["x"] == positions["喜び"][0] * 100
+    assert net.nodes[0]["physics"] is False
+    assert "x" not in net.nodes[2]
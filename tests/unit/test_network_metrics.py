@@ -0,0 +1,70 @@
+"""Tests for the network metrics module."""
+
+from __future__ import annotations
+
+import networkx as nx
+import pytest
+
+from ai_data_lab.network import (
+    MetricsCache,
+    betweenness_error_bound,
+    compute_group_metrics,
+    compute_network_metrics,
+    graph_digest,
+    metrics_frame,
+)
+
+
+def test_small_graphs_match_networkx_exactly():
+    graph = nx.karate_club_graph()
+
+    metrics = compute_network_metrics(graph, pivots=256)
+
+    assert metrics.exact
+    assert metrics.betweenness == pytest.approx(nx.betweenness_centrality(graph))
+    assert metrics.average_clustering == pytest.approx(nx.average_clustering(graph))
+    assert metrics.average_degree == pytest.approx(2 * graph.number_of_edges() / graph.number_of_nodes())
+
+
+def test_sampled_betweenness_stays_within_error_bound():
+    graph = nx.barabasi_albert_graph(400, 3, seed=1)
+    exact = nx.betweenness_centrality(graph)
+
+    metrics = compute_network_metrics(graph, pivots=100, seed=2)
+
+    assert not metrics.exact
+    assert metrics.betweenness_error == pytest.approx(betweenness_error_bound(400, 100))
+    assert max(abs(metrics.betweenness[node] - exact[node]) for node in graph) <= metrics.betweenness_error
+
+
+def test_digest_ignores_insertion_order_but_not_weights():
+    first = nx.Graph()
+    first.add_weighted_edges_from([("喜び", "期待", 2), ("怒り", "悲しみ", 3)])
+    second = nx.Graph()
+    second.add_weighted_edges_from([("悲しみ", "怒り", 3), ("期待", "喜び", 2)])
+    third = nx.Graph()
+    third.add_weighted_edges_from([("悲しみ", "怒り", 3), ("期待", "喜び", 5)])
+
+    assert graph_digest(first) == graph_digest(second)
+    assert graph_digest(first) != graph_digest(third)
+
+
+def test_group_metrics_are_cached(tmp_path, monkeypatch):
+    graphs = {"A": nx.path_graph(["a", "b", "c"]), "B": nx.Graph()}
+    cache = MetricsCache(tmp_path / "metrics")
+
+    first = compute_group_metrics(graphs, cache=cache, workers=1)
+
+    import ai_data_lab.network.metrics as metrics_module
+
+    def fail(args):
+        raise AssertionError("recomputed a cached graph")
+
+    monkeypatch.setattr(metrics_module, "_compute", fail)
+    second = compute_group_metrics(graphs, cache=cache, workers=1)
+
+    assert second == first
+    assert second["A"].top("betweenness") == ("b", 1.0)
+    df_metrics = metrics_frame(second)
+    assert df_metrics["group"].tolist() == ["A", "B"]
+    assert df_metrics.loc[0, "top_degree_node"] == "b"
@@ -0,0 +1,91 @@
+"""Tests for the single-scan relation profiler."""
+
+from __future__ import annotations
+
+import duckdb
+import pytest
+
+from ai_data_lab.relations import child_profile_sql, group_by_child, profile_relations
+
+RELATIONS = [
+    {"relation_id": 1, "parent_table": "orgs", "parent_key": "id", "child_table": "users", "child_key": "org_id", "relation_group": "g"},
+    {"relation_id": 2, "parent_table": "plans", "parent_key": "code", "child_table": "orgs", "child_key": "plan", "relation_group": "g"},
+    {"relation_id": 3, "parent_table": "teams", "parent_key": "id", "child_table": "users", "child_key": "team_id", "relation_group": "g"},
+]
+
+
+@pytest.fixture
+def connection():
+    connection = duckdb.connect()
+    # Snowflake functions used by the profiler, expressed in DuckDB.
+    connection.execute("CREATE MACRO to_varchar(x) AS CAST(x AS VARCHAR)")
+    connection.execute("CREATE MACRO regexp_like(x, pattern) AS regexp_matches(x, pattern)")
+    connection.execute("CREATE TABLE orgs AS SELECT * FROM (VALUES ('A', 'pro'), ('B', 'free'), ('C', NULL)) t(id, plan)")
+    connection.execute("CREATE TABLE plans AS SELECT * FROM (VALUES ('pro'), ('pro'), ('basic')) t(code)")
+    connection.execute("CREATE TABLE teams AS SELECT * FROM (VALUES (1), (2)) t(id)")
+    connection.execute(
+        "CREATE TABLE users AS SELECT * FROM (VALUES ('A', 1), ('A', 2), (' B', 9), ('a', NULL), (NULL, 1)) t(org_id, team_id)"
+    )
+    return connection
+
+
+def test_profile_matches_per_metric_counts(connection):
+    issued = []
+
+    def query(sql):
+        issued.append(sql)
+        return connection.sql(sql).df()
+
+    df_profile = profile_relations(RELATIONS, query, "main").set_index("relation_id")
+
+    # One query per child table: users is scanned once for relations 1 and 3.
+    assert len(issued) == 2
+    assert df_profile.loc[1, ["parent_count", "child_count", "join_count", "orphan_fk_count", "null_fk_count"]].tolist() == [3, 5, 2, 2, 1]
+    assert df_profile.loc[1, ["trim_mismatch_count", "uppercase_mismatch_count", "lowercase_count"]].tolist() == [1, 1, 1]
+    # Duplicate parent keys multiply like an inner join would.
+    assert df_profile.loc[2, ["parent_count", "child_count", "join_count", "orphan_fk_count", "null_fk_count"]].tolist() == [3, 3, 2, 1, 1]
+    assert df_profile.loc[3, ["join_count", "orphan_fk_count", "null_fk_count", "lowercase_count"]].tolist() == [3, 1, 1, 0]
+    assert df_profile.loc[3, "child_table_full"] == "main.users"
+
+
+def test_failing_child_query_marks_only_its_relations(connection):
+    def query(sql):
+        if "FROM main.orgs c" in sql:
+            raise RuntimeError("no access")
+        return connection.sql(sql).df()
+
+    df_profile = profile_relations(RELATIONS, query, "main")
+
+    assert df_profile["relation_id"].tolist() == [1, 2, 3]
+    assert df_profile["error"].isna().tolist() == [True, False, True]
+    assert df_profile.loc[1, "error"] == "no access"
+
+
+def test_grouping_and_single_child_table():
+    assert list(group_by_child(RELATIONS)) == ["users", "orgs"]
+    sql = child_profile_sql([RELATIONS[0], RELATIONS[2]], "DB.S")
+    assert sql.count("FROM DB.S.users c") == 1
+    with pytest.raises(ValueError):
+        child_profile_sql(RELATIONS, "DB.S")
+
+
+def test_broken_relation_does_not_fail_its_siblings(connection):
+    relations = [
+        RELATIONS[0],
+        {**RELATIONS[2], "relation_id": 4, "parent_table": "missing"},
+        RELATIONS[2],
+    ]
+    issued = []
+
+    def query(sql):
+        issued.append(sql)
+        return connection.sql(sql).df()
+
+    df_profile = profile_relations(relations, query, "main").set_index("relation_id")
+
+    # The grouped users query fails, then each relation is profiled alone.
+    assert len(issued) == 4
+    assert df_profile["error"].isna().tolist() == [True, False, True]
+    assert "missing" in df_profile.loc[4, "error"]
+    assert df_profile.loc[1, ["join_count", "orphan_fk_count"]].tolist() == [2, 2]
+    assert df_profile.loc[3, ["join_count", "orphan_fk_count"]].tolist() == [3, 1]
@@ -0,0 +1,65 @@
+"""Tests for company-name normalization and fuzzy matching."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from ai_data_lab.text import (
+    CompanyNameIndex,
+    extract_company_names_from_deals,
+    match_company_names,
+    normalize_company_name,
+    normalize_company_names,
+)
+
+
+def test_normalize_strips_legal_forms_width_and_separators():
+    assert normalize_company_name("株式会社 サンプル") == "サンプル"
+    assert normalize_company_name("サンプル㈱") == "サンプル"
+    assert normalize_company_name("（株）ＡＢＣ・テック") == "abcテック"
+    assert normalize_company_name("Sample Co., Ltd.") == "sample"
+    assert normalize_company_name("データー様") == "データー"
+    assert normalize_company_name("   ") is None
+    assert normalize_company_name(None) is None
+
+
+def test_bulk_helpers_keep_index_and_missing_values():
+    series = pd.Series(["株式会社A", None, "株式会社A", "B様向け 更新"], index=[10, 11, 12, 13])
+
+    assert normalize_company_names(series).tolist() == ["a", None, "a", "b向け更新"]
+    assert normalize_company_names(series).index.tolist() == [10, 11, 12, 13]
+    assert extract_company_names_from_deals(series).tolist() == ["株式会社A", None, "株式会社A", "B"]
+
+
+def test_candidates_rank_near_misses():
+    index = CompanyNameIndex(["株式会社サンプル商事", "サンプル工業株式会社", "まったく別の会社"])
+
+    candidates = index.candidates("サンプル商事㈱", k=2)
+    assert candidates[0].index == 0 and candidates[0].score == 1.0
+
+    fuzzy = index.candidates("サンプル商時", k=3)
+    assert fuzzy[0].index == 0
+    assert 0.0 < fuzzy[0].score < 1.0
+    assert all(candidate.index != 2 for candidate in fuzzy)
+
+
+def test_match_applies_threshold():
+    left = pd.Series(["サンプル商事", "サンプル商時", "無関係", None])
+    right = ["株式会社サンプル商事", "別会社"]
+
+    df_match = match_company_names(left, right, threshold=0.8)
+
+    assert df_match["match_index"].tolist() == [0, 0, -1, -1]
+    assert df_match["exact"].tolist() == [True, False, False, False]
+    assert df_match.loc[1, "score"] >= 0.8
+
+
+def test_match_normalizes_each_query_once():
+    # Normalizing "株式 会社サンプル" twice would strip the re-joined "株式会社".
+    index = CompanyNameIndex(["株式会社サンプル"])
+
+    df_match = index.match(["株式 会社サンプル"], threshold=0.5)
+    (candidate,) = index.candidates("株式 会社サンプル", k=1)
+
+    assert df_match.loc[0, "score"] == candidate.score < 1.0
+    assert not df_match.loc[0, "exact"]
@@ -0,0 +1,87 @@
+"""Tests for the out-of-core TF-IDF feature store."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from ai_data_lab.text import TermFeatureStore, iter_parquet_batches
+
+
+def _split(texts):
+    return [text.split() for text in texts]
+
+
+DF_POSTS = pd.DataFrame(
+    {
+        "content": ["live concert tonight", "concert tickets", "new single out", "single release live", None],
+        "group": ["A", "A", "B", "B", "B"],
+        "month": ["2025-11", "2025-12", "2025-11", "2025-11", "2025-12"],
+    }
+)
+
+
+def test_batches_accumulate_counts_and_idf(tmp_path):
+    store = TermFeatureStore(tmp_path / "features", n_features=2**12, tokenizer=_split)
+
+    store.add_batches([DF_POSTS.iloc[:2], DF_POSTS.iloc[2:]], group_col="group", period_col="month")
+
+    assert store.n_docs == 5
+    assert store.keys() == [("A", "2025-11"), ("A", "2025-12"), ("B", "2025-11"), ("B", "2025-12")]
+    assert store.counts(("B", "2025-11")).shape == (2, 2**12)
+
+    # IDF over the streamed batches equals scikit-learn's IDF on the full corpus.
+    reference = TfidfVectorizer(analyzer=str.split).fit(DF_POSTS["content"].fillna(""))
+    terms = store.term_weights(("A", "2025-11"), top=None)["term"]
+    expected = {term: reference.idf_[reference.vocabulary_[term]] for term in terms}
+    features = store._vectorizer.transform([[term] for term in terms]).indices
+    assert np.allclose(store.idf()[features], list(expected.values()))
+
+
+def test_store_reopens_and_keeps_appending(tmp_path):
+    TermFeatureStore(tmp_path / "features", n_features=2**10, tokenizer=_split).add_batch(DF_POSTS.iloc[:2], group="A")
+
+    reopened = TermFeatureStore(tmp_path / "features", n_features=2**10, tokenizer=_split)
+    reopened.add_batch(DF_POSTS.iloc[2:4], group="A")
+
+    assert reopened.n_docs == 4
+    assert reopened.counts(("A", "all")).shape[0] == 4
+    assert "concert" in set(reopened.term_weights(("A", "all"))["term"])
+
+
+def test_batch_ids_make_ingestion_idempotent(tmp_path):
+    store = TermFeatureStore(tmp_path / "features", n_features=2**10, tokenizer=_split)
+    store.add_batch(DF_POSTS.iloc[:2], group_col="group", period_col="month", batch_id="posts@v1#0")
+    document_frequency = store.document_frequency.copy()
+
+    reopened = TermFeatureStore(tmp_path / "features", n_features=2**10, tokenizer=_split)
+    assert reopened.add_batch(DF_POSTS.iloc[:2], group_col="group", batch_id="posts@v1#0") == 0
+    assert reopened.add_batch(DF_POSTS.iloc[2:], group_col="group", period_col="month", batch_id="posts@v1#1") == 3
+    assert reopened.batch_ids() == ["posts@v1#0", "posts@v1#1"]
+    assert reopened.n_docs == 5
+
+    assert reopened.drop_batch("posts@v1#1") == 3
+    assert reopened.n_docs == 2
+    assert np.array_equal(reopened.document_frequency, document_frequency)
+    assert reopened.keys() == [("A", "2025-11"), ("A", "2025-12")]
+
+
+def test_compare_ranks_distinctive_terms(tmp_path):
+    store = TermFeatureStore(tmp_path / "features", n_features=2**12, tokenizer=_split)
+    store.add_batch(DF_POSTS, group_col="group")
+
+    df_compare = store.compare(("A", "all"), ("B", "all"), top=3)
+
+    top_terms = set(df_compare["term"])
+    assert "concert" in top_terms or "single" in top_terms
+    assert (df_compare.set_index("term").loc[lambda df: df.index == "concert", "diff"] > 0).all()
+
+
+def test_iter_parquet_batches(tmp_path):
+    path = tmp_path / "posts.parquet"
+    DF_POSTS.to_parquet(path, index=False)
+
+    sizes = [len(df_batch) for df_batch in iter_parquet_batches(path, batch_size=2, columns=["content"])]
+
+    assert sizes == [2, 2, 1]
@@ -0,0 +1,70 @@
+"""Tests for the hashtag inverted index."""
+
+from __future__ import annotations
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from ai_data_lab.text import HASHTAG_PATTERN, HashtagIndex, extract_hashtag_lists
+
+TEXTS = [
+    "今日も #IRCチャレンジ #桜井 #桜井",
+    None,
+    "#桜井　#さくら 応援",
+    "タグなし",
+    "#IRCチャレンジ#さくら",
+]
+POST_IDS = ["p0", "p1", "p2", "p3", "p4"]
+
+
+def test_extraction_matches_python_regex():
+    expected = [re.findall(HASHTAG_PATTERN, text) if text else [] for text in TEXTS]
+
+    assert extract_hashtag_lists(TEXTS) == expected
+
+
+def test_pandas_series_with_missing_values():
+    contents = pd.Series(["#a x", np.nan, "#b", None, 42])
+
+    assert extract_hashtag_lists(contents) == [["#a"], [], ["#b"], [], []]
+    index = HashtagIndex.from_texts(["p0", "p1", "p2", "p3", "p4"], contents)
+    assert index.mask("#b").tolist() == [False, False, True, False, False]
+
+
+def test_postings_and_masks():
+    index = HashtagIndex.from_texts(POST_IDS, TEXTS)
+
+    assert index.mask("#IRCチャレンジ").tolist() == [True, False, False, False, True]
+    assert index.mask(["#桜井", "#さくら"]).tolist() == [True, False, True, False, True]
+    assert index.mask(["#unknown"]).sum() == 0
+    assert index.posts_with_any("#桜井").tolist() == ["p0", "p2"]
+
+
+def test_tag_counts_keep_repeat_occurrences():
+    index = HashtagIndex.from_texts(POST_IDS, TEXTS)
+
+    counts = dict(zip(index.tag_counts()["hashtag"], index.tag_counts()["count"]))
+
+    assert counts == {"#桜井": 3, "#IRCチャレンジ": 2, "#さくら": 2}
+    assert index.tag_counts(top=1)["hashtag"].tolist() == ["#桜井"]
+
+
+def test_to_frame_is_unique_post_tag_pairs():
+    index = HashtagIndex.from_texts(POST_IDS, TEXTS)
+
+    df_postings = index.to_frame()
+
+    assert len(df_postings) == 6
+    assert not df_postings.duplicated().any()
+    irc_id = int(index.tag_ids(["#IRCチャレンジ"])[0])
+    assert sorted(df_postings.loc[df_postings["tag_id"] == irc_id, "post_id"]) == ["p0", "p4"]
+
+
+def test_empty_corpus():
+    index = HashtagIndex.from_texts([], [])
+
+    assert index.mask("#a").shape == (0,)
+    assert index.tag_counts().empty
+    assert np.array_equal(index.rows_with_any([]), np.empty(0, dtype=np.int64))
@@ -0,0 +1,65 @@
+"""Tests for the Aho–Corasick keyword classifier."""
+
+from __future__ import annotations
+
+import random
+
+import pandas as pd
+
+from ai_data_lab.text import AhoCorasick, KeywordClassifier, format_keyword_spec, parse_keyword_spec
+from ai_data_lab.text.keywords import MEMO_ACTION_KEYWORDS
+
+
+def test_automaton_matches_naive_substring_search():
+    patterns = {"he": 1, "she": 2, "his": 4, "hers": 8, "s": 16}
+    automaton = AhoCorasick(patterns)
+    rng = random.Random(0)
+
+    for _ in range(300):
+        text = "".join(rng.choice("hers ") for _ in range(rng.randint(0, 12)))
+        expected = 0
+        for pattern, mask in patterns.items():
+            if pattern in text:
+                expected |= mask
+        assert automaton.match_mask(text) == expected, text
+
+
+def test_classify_is_case_insensitive_and_multi_label():
+    classifier = KeywordClassifier()
+
+    assert classifier.classify("先方にtelしてから訪問") == ["call", "visit"]
+    assert classifier.classify("MAIL送付、提案書を添付") == ["mail", "material"]
+    assert classifier.classify("特記事項なし") == []
+    assert classifier.classify(None) == []
+
+
+def test_counts_and_company_aggregates():
+    df_memo = pd.DataFrame(
+        {
+            "COMPANYID": ["a", "a", "b", "c"],
+            "CONTENT": ["架電済み", "商談MTG設定", None, "資料送付・電話"],
+        }
+    )
+    classifier = KeywordClassifier()
+
+    counts = classifier.category_counts(df_memo["CONTENT"])
+    df_companies = classifier.aggregate(df_memo, text_col="CONTENT", group_col="COMPANYID")
+
+    assert counts.to_dict() == {
+        "call": 2,
+        "mail": 0,
+        "visit": 0,
+        "meeting": 1,
+        "material": 1,
+        "any_action": 3,
+        "total": 4,
+    }
+    assert df_companies["COMPANYID"].tolist() == ["a", "c", "b"]
+    assert df_companies.set_index("COMPANYID").loc["a", ["memos", "call", "meeting"]].tolist() == [2, 1, 1]
+
+
+def test_keyword_spec_round_trip():
+    spec = format_keyword_spec(MEMO_ACTION_KEYWORDS)
+
+    assert parse_keyword_spec(spec) == MEMO_ACTION_KEYWORDS
+    assert parse_keyword_spec("# comment\ncall: 電話、TEL\n\n") == {"call": ("電話", "TEL")}
@@ -0,0 +1,109 @@
+"""Tests for the local bigram full-text index."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from ai_data_lab.text import FullTextIndex, bigram_query, bigram_tokens
+
+DF_MEMO = pd.DataFrame(
+    {
+        "ID": [1, 2, 3, 4],
+        "COMPANYID": ["c1", "c1", "c2", "c3"],
+        "CREATEDAT": ["2025-01-10", "2025-02-10", "2025-03-10", "2025-04-10"],
+        "CONTENT": ["先方に電話して商談日程を調整", "提案書をメール送付", "訪問して商談", "TEL不通"],
+    }
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    fts = FullTextIndex(tmp_path / "fts.sqlite")
+    fts.add_documents("memo", DF_MEMO, id_col="ID", text_cols="CONTENT", group_col="COMPANYID", time_col="CREATEDAT")
+    return fts
+
+
+def test_bigram_helpers():
+    assert bigram_tokens("商談 MTG") == "商談 談 mt tg g"
+    assert bigram_query("商談日程") == '"商談 談日 日程"'
+    assert bigram_query("電") == '"電"*'
+    assert bigram_query("  ") is None
+
+
+def test_search_has_substring_semantics(index):
+    assert sorted(index.search("商談")["doc_id"]) == ["1", "3"]
+    assert index.search("談日程")["doc_id"].tolist() == ["1"]
+    assert index.search("tel")["doc_id"].tolist() == ["4"]
+    assert sorted(index.search("送")["doc_id"]) == ["2"]
+    assert index.search("存在しない").empty
+
+
+def test_filters_and_limit(index):
+    assert index.search("商談", {"group": "c2"})["doc_id"].tolist() == ["3"]
+    assert sorted(index.search("", {"since": "2025-02-01", "until": "2025-04-01"})["doc_id"]) == ["2", "3"]
+    assert index.search("", {"min_length": 10})["doc_id"].tolist() == ["1"]
+    assert len(index.search("", {"corpus": "memo"}, limit=2)) == 2
+    with pytest.raises(ValueError, match="Unknown"):
+        index.search("x", {"nope": 1})
+
+
+def test_incremental_updates_only_touch_changed_rows(index):
+    df_update = DF_MEMO.copy()
+    df_update.loc[3, "CONTENT"] = "メールで連絡"
+
+    assert index.add_documents("memo", df_update, id_col="ID", text_cols="CONTENT", group_col="COMPANYID", time_col="CREATEDAT") == 1
+    assert index.count("memo") == 4
+    assert index.search("tel").empty
+    assert sorted(index.search("メール")["doc_id"]) == ["2", "4"]
+
+
+def test_multiple_text_columns_and_attrs(tmp_path):
+    fts = FullTextIndex(tmp_path / "fts.sqlite")
+    df_users = pd.DataFrame({"AccountID": ["a1", "a2"], "HandleName": ["sakura_fan", "yui"], "UserName": ["さくら", "ゆい"]})
+    fts.add_documents("users", df_users, id_col="AccountID", text_cols=["AccountID", "HandleName", "UserName"], attr_cols=["HandleName"])
+
+    df_hits = fts.search("さくら", {"corpus": "users"})
+
+    assert df_hits["doc_id"].tolist() == ["a1"]
+    assert df_hits["attrs"].iloc[0] == {"HandleName": "sakura_fan"}
+    assert fts.search("", {"attrs": {"HandleName": "yui"}})["doc_id"].tolist() == ["a2"]
+
+
+def test_query_without_searchable_characters_matches_nothing(index):
+    df_hits = index.search("・！？", {"corpus": "memo"})
+
+    assert df_hits.empty
+    assert list(df_hits.columns) == ["corpus", "doc_id", "group_key", "ts", "text", "attrs", "rank"]
+    assert len(index.search("  ", {"corpus": "memo"})) == 4
+
+
+def test_repeated_ids_are_merged_into_one_document(tmp_path):
+    fts = FullTextIndex(tmp_path / "fts.sqlite")
+    df_users = pd.DataFrame({"AccountID": ["a1", "a1", "a2"], "HandleName": ["old_handle", "new_handle", "yui"]})
+
+    assert fts.add_documents("users", df_users, id_col="AccountID", text_cols="HandleName") == 2
+    assert fts.count("users") == 2
+    assert fts.search("old_handle")["doc_id"].tolist() == ["a1"]
+    assert fts.search("new_handle")["doc_id"].tolist() == ["a1"]
+    assert fts.add_documents("users", df_users, id_col="AccountID", text_cols="HandleName") == 0
+
+
+def test_filter_contains_rechecks_each_column(tmp_path):
+    fts = FullTextIndex(tmp_path / "fts.sqlite")
+    df_users = pd.DataFrame(
+        {
+            "AccountID": ["a1", "a2", "a3"],
+            "HandleName": ["user_1", "user", "taro.yamada"],
+            "UserName": ["", "id 1", "taro"],
+        }
+    )
+    fts.add_documents("users", df_users, id_col="AccountID", text_cols=["HandleName", "UserName"])
+
+    def lookup(query):
+        return fts.filter_contains("users", df_users, query, id_col="AccountID", columns=["HandleName", "UserName"])
+
+    assert lookup("USER_1")["AccountID"].tolist() == ["a1"]
+    assert lookup("taro.yamada")["AccountID"].tolist() == ["a3"]
+    assert lookup("_")["AccountID"].tolist() == ["a1"]
+    assert lookup("1")["AccountID"].tolist() == ["a1", "a2"]
@@ -0,0 +1,54 @@
+"""Tests for the cached multi-process Janome tokenizer."""
+
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("janome")
+
+from ai_data_lab.text import TokenCache, TokenizerService, text_key  # noqa: E402
+
+
+def test_tokenize_returns_surfaces_and_pos_in_input_order(tmp_path):
+    service = TokenizerService(tmp_path / "tokens.duckdb", workers=1)
+
+    tokens = service.tokenize(["すもももももももものうち", None, "東京タワー"])
+
+    assert "".join(token.surface for token in tokens[0]) == "すもももももももものうち"
+    assert tokens[1] == []
+    assert any(token.part_of_speech.startswith("名詞") for token in tokens[2])
+
+
+def test_results_are_cached_across_service_instances(tmp_path):
+    cache_path = tmp_path / "tokens.duckdb"
+    first = TokenizerService(cache_path, workers=1)
+    expected = first.wakati(["今日は良い天気です", "今日は良い天気です"])
+    assert first.misses == 1 and first.hits == 1
+
+    second = TokenizerService(cache_path, workers=1)
+    assert second.wakati(["今日は良い天気です"]) == expected[:1]
+    assert second.misses == 0
+    assert len(TokenCache(cache_path)) == 1
+
+
+def test_process_pool_matches_in_process_tokenization(tmp_path):
+    texts = [f"ライブ{i}回目の公演に行きました" for i in range(12)]
+    serial = TokenizerService(None, workers=1).tokenize(texts)
+
+    parallel = TokenizerService(None, workers=2, chunk_size=5, min_parallel=1).tokenize(texts)
+
+    assert parallel == serial
+
+
+def test_nouns_filters_stopwords_digits_and_short_words():
+    service = TokenizerService(None, workers=1)
+
+    nouns = service.nouns(["東京タワーで2024年のライブを見た"], stopwords={"ライブ"})
+
+    assert "ライブ" not in nouns[0]
+    assert "2024" not in nouns[0]
+    assert all(len(word) >= 2 for word in nouns[0])
+
+
+def test_text_key_depends_on_namespace():
+    assert text_key("abc", "janome-0.5.0") != text_key("abc", "janome-0.6.0")